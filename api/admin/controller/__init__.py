@@ -15,9 +15,10 @@ from flask import (
     redirect,
 )
 from flask_babel import lazy_gettext as _
-from sqlalchemy.sql import func
-from sqlalchemy.sql.expression import desc, nullslast, and_, distinct, select, join
+from sqlalchemy.orm import joinedload
+from sqlalchemy.sql.expression import desc, nullslast
 
+from api.admin.dashboard_stats import DashboardStatistics
 from api.admin.exceptions import *
 from api.admin.google_oauth_admin_authentication_provider import GoogleOAuthAdminAuthenticationProvider
 from api.admin.opds import AdminAnnotator, AdminFeed
@@ -33,6 +34,7 @@ from api.authenticator import (
 from api.authenticator import LibraryAuthenticator
 from api.axis import Axis360API
 from api.bibliotheca import BibliothecaAPI
+from api.circulation_metrics import CirculationMetrics
 from api.config import (
     Configuration,
     CannotLoadConfiguration
@@ -70,12 +72,9 @@ from core.model import (
     CustomListEntry,
     DataSource,
     ExternalIntegration,
-    Hold,
     Identifier,
     Library,
     LicensePool,
-    Loan,
-    Patron,
     Timestamp,
     Work,
 )
@@ -387,6 +386,25 @@ class TimestampsController(AdminCirculationManagerController):
                 sorted[type][service] = by_collection
         return sorted
 
+    def circulation_metrics(self):
+        """Describe the circulation timings recorded by this process.
+
+        Timings are kept in memory by each server process, so when the
+        server runs several worker processes, each request only sees
+        the timings of the worker that handled it. The report includes
+        that worker's process ID, so reports from different workers
+        can be told apart.
+
+        A POST request clears the timings after they've been reported.
+        """
+        self.require_system_admin()
+        metrics = CirculationMetrics.instance()
+        report = metrics.report()
+        report['pid'] = os.getpid()
+        if flask.request.method == "POST":
+            metrics.reset()
+        return report
+
     def _sort_by_type(self, timestamps):
         """Takes a list of Timestamp objects.  Returns a dict: each key is a type of service
         (script, monitor, or coverage provider); each value is a dict in which the keys are the names
@@ -1023,142 +1041,46 @@ class LanesController(AdminCirculationManagerController):
 
 class DashboardController(AdminCirculationManagerController):
 
-    def stats(self):
+    def stats(self, statistics=None):
         library_stats = {}
 
         total_title_count = 0
         total_license_count = 0
         total_available_license_count = 0
 
+        statistics = statistics or DashboardStatistics(self._db)
+        counts_by_collection_id, counts_by_library_id = statistics.counts()
+        no_collection_counts = dict(
+            (field, 0) for field in DashboardStatistics.COLLECTION_FIELDS
+        )
+        no_library_counts = dict(
+            (field, 0) for field in DashboardStatistics.LIBRARY_FIELDS
+        )
+
         collection_counts = dict()
         for collection in self._db.query(Collection):
             if not flask.request.admin or not flask.request.admin.can_see_collection(collection):
                 continue
 
-            licensed_title_count = self._db.query(
-                LicensePool
-            ).filter(
-                LicensePool.collection_id == collection.id
-            ).filter(
-                and_(
-                    LicensePool.licenses_owned > 0,
-                    LicensePool.open_access == False,
-                )
-            ).count()
-
-            open_title_count = self._db.query(
-                LicensePool
-            ).filter(
-                LicensePool.collection_id == collection.id
-            ).filter(
-                LicensePool.open_access == True
-            ).count()
-
-            # The sum queries return None instead of 0 if there are
-            # no license pools in the db.
-
-            license_count = self._db.query(
-                func.sum(LicensePool.licenses_owned)
-            ).filter(
-                LicensePool.collection_id == collection.id
-            ).filter(
-                LicensePool.open_access == False,
-            ).all()[0][0] or 0
-
-            available_license_count = self._db.query(
-                func.sum(LicensePool.licenses_available)
-            ).filter(
-                LicensePool.collection_id == collection.id
-            ).filter(
-                LicensePool.open_access == False,
-            ).all()[0][0] or 0
-
-            total_title_count += licensed_title_count + open_title_count
-            total_license_count += license_count
-            total_available_license_count += available_license_count
-
-            collection_counts[collection.name] = dict(
-                licensed_titles=licensed_title_count,
-                open_access_titles=open_title_count,
-                licenses=license_count,
-                available_licenses=available_license_count,
+            counts = dict(
+                counts_by_collection_id.get(collection.id, no_collection_counts)
             )
-
-
-        for library in self._db.query(Library):
+            total_title_count += counts["licensed_titles"] + counts["open_access_titles"]
+            total_license_count += counts["licenses"]
+            total_available_license_count += counts["available_licenses"]
+            collection_counts[collection.name] = counts
+
+        for library in self._db.query(Library).options(
+            joinedload(Library.collections)
+        ):
             # Only include libraries this admin has librarian access to.
             if not flask.request.admin or not flask.request.admin.is_librarian(library):
                 continue
 
-            patron_count = self._db.query(Patron).filter(Patron.library_id==library.id).count()
-
-            active_loans_patron_count = self._db.query(
-                distinct(Patron.id)
-            ).join(
-                Patron.loans
-            ).filter(
-                Loan.end >= datetime.now(),
-            ).filter(
-                Patron.library_id == library.id
-            ).count()
-
-            active_patrons = select(
-                [Patron.id]
-            ).select_from(
-                join(
-                    Loan,
-                    Patron,
-                    and_(
-                        Patron.id == Loan.patron_id,
-                        Patron.library_id == library.id,
-                        Loan.id != None,
-                        Loan.end >= datetime.now()
-                    )
-                )
-            ).union(
-                select(
-                    [Patron.id]
-                ).select_from(
-                    join(
-                        Hold,
-                        Patron,
-                        and_(
-                            Patron.id == Hold.patron_id,
-                            Patron.library_id == library.id,
-                            Hold.id != None,
-                        )
-                    )
-                )
-            ).alias()
-
-
-            active_loans_or_holds_patron_count_query = select(
-                [func.count(distinct(active_patrons.c.id))]
-            ).select_from(
-                active_patrons
+            patron_counts = dict(
+                counts_by_library_id.get(library.id, no_library_counts)
             )
 
-            result = self._db.execute(active_loans_or_holds_patron_count_query)
-            active_loans_or_holds_patron_count = [r[0] for r in result][0]
-
-            loan_count = self._db.query(
-                Loan
-            ).join(
-                Loan.patron
-            ).filter(
-                Patron.library_id == library.id
-            ).filter(
-                Loan.end >= datetime.now()
-            ).count()
-
-            hold_count = self._db.query(
-                Hold
-            ).join(
-                Hold.patron
-            ).filter(
-                Patron.library_id == library.id
-            ).count()
-
             title_count = 0
             license_count = 0
             available_license_count = 0
@@ -1172,13 +1094,7 @@ class DashboardController(AdminCirculationManagerController):
                 available_license_count += counts.get("available_licenses", 0)
 
             library_stats[library.short_name] = dict(
-                patrons=dict(
-                    total=patron_count,
-                    with_active_loans=active_loans_patron_count,
-                    with_active_loans_or_holds=active_loans_or_holds_patron_count,
-                    loans=loan_count,
-                    holds=hold_count,
-                ),
+                patrons=patron_counts,
                 inventory=dict(
                     titles=title_count,
                     licenses=license_count,
@@ -1280,8 +1196,10 @@ class DashboardController(AdminCirculationManagerController):
         library = getattr(flask.request, 'library', None)
         library_short_name = library.short_name if library else None
 
+        # The CSV file is generated as it's sent, so exports covering
+        # a lot of events don't have to fit in memory.
         analytics_exporter = analytics_exporter or LocalAnalyticsExporter()
-        data = analytics_exporter.export(
+        data = analytics_exporter.export_iter(
             self._db, date_start, date_end, locations, library
         )
         return (data, date_start.strftime(date_format),
@@ -0,0 +1,319 @@
+import datetime
+import hashlib
+
+from sqlalchemy import (
+    and_,
+    case,
+    distinct,
+    func,
+    union,
+)
+from sqlalchemy.sql.expression import (
+    join,
+    select,
+    text,
+)
+
+from core.model import (
+    Hold,
+    Library,
+    LicensePool,
+    Loan,
+    Patron,
+    Timestamp,
+)
+
+
+class DashboardStatistics(object):
+    """Count the loans, holds, patrons and licenses shown on the admin
+    dashboard.
+
+    Every count is calculated for all collections (or all libraries)
+    at once, with GROUP BY queries, so the number of queries doesn't
+    depend on the size of the site.
+
+    The counts can also be stored in a pair of materialized views --
+    a snapshot -- by `DashboardStatisticsSnapshotScript`. If the
+    snapshot exists and is recent enough, the dashboard reads from it
+    instead of counting everything again.
+    """
+
+    # The time of the last refresh is stored in this Timestamp.
+    SNAPSHOT_SERVICE = "Admin dashboard statistics snapshot"
+
+    # A snapshot older than this is ignored, in case the script that
+    # refreshes it has stopped running.
+    SNAPSHOT_MAX_AGE = datetime.timedelta(hours=2)
+
+    COLLECTION_SNAPSHOT = "dashboard_collection_stats"
+    LIBRARY_SNAPSHOT = "dashboard_library_stats"
+
+    # The column that identifies a row in each snapshot view. It gets
+    # a unique index so the view can be refreshed concurrently.
+    SNAPSHOT_KEYS = {
+        COLLECTION_SNAPSHOT: "collection_id",
+        LIBRARY_SNAPSHOT: "library_id",
+    }
+
+    COLLECTION_FIELDS = [
+        "licensed_titles", "open_access_titles", "licenses",
+        "available_licenses",
+    ]
+    LIBRARY_FIELDS = [
+        "total", "with_active_loans", "with_active_loans_or_holds",
+        "loans", "holds",
+    ]
+
+    def __init__(self, _db):
+        self._db = _db
+
+    def collection_counts_query(self):
+        """A query that counts the titles and licenses in every collection.
+
+        Each row contains a collection ID followed by the values for
+        COLLECTION_FIELDS.
+        """
+        not_open_access = LicensePool.open_access == False
+        return self._db.query(
+            LicensePool.collection_id.label("collection_id"),
+            func.sum(case(
+                [(and_(LicensePool.licenses_owned > 0, not_open_access), 1)],
+                else_=0
+            )).label("licensed_titles"),
+            func.sum(case(
+                [(LicensePool.open_access == True, 1)], else_=0
+            )).label("open_access_titles"),
+            # The sums would be None instead of 0 for a collection
+            # with no licenses.
+            func.coalesce(func.sum(case(
+                [(not_open_access, LicensePool.licenses_owned)], else_=0
+            )), 0).label("licenses"),
+            func.coalesce(func.sum(case(
+                [(not_open_access, LicensePool.licenses_available)], else_=0
+            )), 0).label("available_licenses"),
+        ).group_by(LicensePool.collection_id)
+
+    def library_counts_query(self):
+        """A query that counts the patrons, loans and holds for every
+        library.
+
+        Each row contains a library ID followed by the values for
+        LIBRARY_FIELDS.
+        """
+        now = func.now()
+        loans_join = join(Loan, Patron, Loan.patron_id == Patron.id)
+        holds_join = join(Hold, Patron, Hold.patron_id == Patron.id)
+
+        patron_counts = select(
+            [Patron.library_id, func.count(Patron.id).label("total")]
+        ).group_by(Patron.library_id).alias("patron_counts")
+
+        # Loans without an end date don't count, because we don't
+        # know whether they're still active.
+        active_loan_counts = select(
+            [Patron.library_id,
+             func.count(distinct(Patron.id)).label("patrons"),
+             func.count(Loan.id).label("loans")]
+        ).select_from(loans_join).where(
+            Loan.end >= now
+        ).group_by(Patron.library_id).alias("active_loan_counts")
+
+        hold_counts = select(
+            [Patron.library_id, func.count(Hold.id).label("holds")]
+        ).select_from(holds_join).group_by(
+            Patron.library_id
+        ).alias("hold_counts")
+
+        active_patrons = union(
+            select([Patron.library_id, Patron.id]).select_from(
+                loans_join
+            ).where(Loan.end >= now),
+            select([Patron.library_id, Patron.id]).select_from(holds_join),
+        ).alias("active_patrons")
+        active_patron_counts = select(
+            [active_patrons.c.library_id,
+             func.count(distinct(active_patrons.c.id)).label("patrons")]
+        ).group_by(active_patrons.c.library_id).alias("active_patron_counts")
+
+        return self._db.query(
+            Library.id.label("library_id"),
+            func.coalesce(patron_counts.c.total, 0).label("total"),
+            func.coalesce(
+                active_loan_counts.c.patrons, 0
+            ).label("with_active_loans"),
+            func.coalesce(
+                active_patron_counts.c.patrons, 0
+            ).label("with_active_loans_or_holds"),
+            func.coalesce(active_loan_counts.c.loans, 0).label("loans"),
+            func.coalesce(hold_counts.c.holds, 0).label("holds"),
+        ).outerjoin(
+            patron_counts, patron_counts.c.library_id == Library.id
+        ).outerjoin(
+            active_loan_counts, active_loan_counts.c.library_id == Library.id
+        ).outerjoin(
+            hold_counts, hold_counts.c.library_id == Library.id
+        ).outerjoin(
+            active_patron_counts,
+            active_patron_counts.c.library_id == Library.id
+        )
+
+    def _rows_to_dict(self, rows, fields):
+        """Turn rows of (ID, value, value...) into a dictionary mapping
+        each ID to a dictionary of values.
+        """
+        results = {}
+        for row in rows:
+            row = list(row)
+            results[row[0]] = dict(
+                (field, int(value or 0))
+                for field, value in zip(fields, row[1:])
+            )
+        return results
+
+    def live_counts(self):
+        """Calculate the current counts.
+
+        :return: A 2-tuple of dictionaries (collection counts, library
+            counts), keyed by database ID.
+        """
+        return (
+            self._rows_to_dict(
+                self.collection_counts_query(), self.COLLECTION_FIELDS
+            ),
+            self._rows_to_dict(
+                self.library_counts_query(), self.LIBRARY_FIELDS
+            ),
+        )
+
+    def snapshot_exists(self):
+        """Has a snapshot been created?"""
+        for view in (self.COLLECTION_SNAPSHOT, self.LIBRARY_SNAPSHOT):
+            [exists] = self._db.execute(
+                text("SELECT to_regclass(:name) IS NOT NULL"),
+                dict(name=view)
+            ).fetchone()
+            if not exists:
+                return False
+        return True
+
+    def snapshot_counts(self):
+        """Read the counts from the snapshot.
+
+        :return: A 2-tuple of dictionaries (collection counts, library
+            counts), or None if there is no snapshot.
+        """
+        if not self.snapshot_exists():
+            return None
+        collection_rows = self._db.execute(
+            "SELECT collection_id, %s FROM %s" % (
+                ", ".join(self.COLLECTION_FIELDS), self.COLLECTION_SNAPSHOT
+            )
+        )
+        library_rows = self._db.execute(
+            "SELECT library_id, %s FROM %s" % (
+                ", ".join(self.LIBRARY_FIELDS), self.LIBRARY_SNAPSHOT
+            )
+        )
+        return (
+            self._rows_to_dict(collection_rows, self.COLLECTION_FIELDS),
+            self._rows_to_dict(library_rows, self.LIBRARY_FIELDS),
+        )
+
+    def snapshot_refreshed_at(self):
+        """When was the snapshot last refreshed?
+
+        :return: A datetime, or None if the snapshot has never been
+            refreshed.
+        """
+        return Timestamp.value(
+            self._db, self.SNAPSHOT_SERVICE, Timestamp.SCRIPT_TYPE, None
+        )
+
+    def snapshot_is_fresh(self, now=None):
+        """Was the snapshot refreshed within SNAPSHOT_MAX_AGE?"""
+        refreshed_at = self.snapshot_refreshed_at()
+        if not refreshed_at:
+            return False
+        now = now or datetime.datetime.utcnow()
+        return now - refreshed_at <= self.SNAPSHOT_MAX_AGE
+
+    def counts(self):
+        """Get the counts from the snapshot if there is a recent one;
+        otherwise calculate them.
+        """
+        counts = None
+        if self.snapshot_is_fresh():
+            counts = self.snapshot_counts()
+        return counts or self.live_counts()
+
+    def _view_sql(self, query):
+        """Render a query as SQL that can define a materialized view."""
+        return unicode(query.statement.compile(
+            dialect=self._db.bind.dialect,
+            compile_kwargs=dict(literal_binds=True)
+        ))
+
+    def _view_definition_hash(self, view):
+        """Find the hash of the SQL a snapshot view was created from.
+
+        :return: The hash stored in the view's comment, or None if the
+            view doesn't exist.
+        """
+        [comment] = self._db.execute(
+            text("SELECT obj_description(to_regclass(:name), 'pg_class')"),
+            dict(name=view)
+        ).fetchone()
+        return comment
+
+    def _create_view(self, view, sql, definition_hash):
+        """(Re)create a snapshot view along with the unique index that
+        allows it to be refreshed concurrently.
+        """
+        self._db.execute("DROP MATERIALIZED VIEW IF EXISTS %s" % view)
+        self._db.execute("CREATE MATERIALIZED VIEW %s AS %s" % (view, sql))
+        self._db.execute(
+            "CREATE UNIQUE INDEX %s_key ON %s (%s)" % (
+                view, view, self.SNAPSHOT_KEYS[view]
+            )
+        )
+        # Remember which definition the view was created from, so we
+        # know when it has to be recreated.
+        self._db.execute(
+            "COMMENT ON MATERIALIZED VIEW %s IS '%s'" % (view, definition_hash)
+        )
+
+    def refresh_snapshot(self):
+        """Bring the snapshot up to date.
+
+        The views are refreshed concurrently, so the dashboard can keep
+        reading the old counts while the new ones are calculated. A view
+        is only created from scratch the first time, or when the query
+        used to calculate live counts no longer matches the query the
+        view was created from.
+        """
+        for view, query in (
+            (self.COLLECTION_SNAPSHOT, self.collection_counts_query()),
+            (self.LIBRARY_SNAPSHOT, self.library_counts_query()),
+        ):
+            sql = self._view_sql(query)
+            definition_hash = hashlib.sha256(sql.encode("utf8")).hexdigest()
+            if self._view_definition_hash(view) == definition_hash:
+                self._db.execute(
+                    "REFRESH MATERIALIZED VIEW CONCURRENTLY %s" % view
+                )
+            else:
+                self._create_view(view, sql, definition_hash)
+        now = datetime.datetime.utcnow()
+        Timestamp.stamp(
+            self._db, service=self.SNAPSHOT_SERVICE,
+            service_type=Timestamp.SCRIPT_TYPE, start=now, finish=now
+        )
+        self._db.commit()
+
+    def drop_snapshot(self):
+        """Remove the snapshot, so the dashboard goes back to calculating
+        live counts.
+        """
+        for view in (self.COLLECTION_SNAPSHOT, self.LIBRARY_SNAPSHOT):
+            self._db.execute("DROP MATERIALIZED VIEW IF EXISTS %s" % view)
+        self._db.commit()
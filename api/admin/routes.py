@@ -3,7 +3,6 @@ import flask
 from flask import (
     Response,
     redirect,
-    make_response
 )
 import os
 
@@ -276,7 +275,7 @@ def bulk_circulation_events():
     if isinstance(data, ProblemDetail):
         return data
 
-    response = make_response(data)
+    response = Response(flask.stream_with_context(data))
 
     # If gathering events per library, include the library name in the file
     # for convenience. The start and end dates will always be included.
@@ -626,6 +625,13 @@ def change_lane_order():
 def diagnostics():
     return app.manager.timestamps_controller.diagnostics()
 
+@app.route("/admin/diagnostics/circulation_metrics", methods=["GET", "POST"])
+@returns_json_or_response_or_problem_detail
+@requires_admin
+@requires_csrf_token
+def circulation_metrics():
+    return app.manager.timestamps_controller.circulation_metrics()
+
 @app.route('/admin/sign_in_again')
 def admin_sign_in_again():
     """Allows an  admin with expired credentials to sign back in
@@ -1,13 +1,17 @@
 import datetime
+import hashlib
+import hmac
 import importlib
 import json
 import logging
+import os
 import re
 import urllib
 from abc import ABCMeta
 
 import flask
 import jwt
+from expiringdict import ExpiringDict
 from flask import (
     redirect,
     url_for)
@@ -1618,6 +1622,64 @@ class AuthenticationProvider(OPDSAuthenticationFlow):
         raise NotImplementedError()
 
 
+class CredentialCache(object):
+    """Remember, for a short time, which username/password combinations
+    the source of truth recently approved, and which patron they
+    belong to.
+
+    Credentials are never stored. Each entry is keyed by a salted hash
+    of the username and maps to a salted hash of the username and
+    password, along with a Patron ID. The salt is random and exists
+    only in the memory of this process.
+    """
+
+    def __init__(self, ttl, max_size):
+        """Constructor.
+
+        :param ttl: The number of seconds a successful check of a
+            patron's credentials remains valid.
+        :param max_size: The maximum number of patrons to remember.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._salt = os.urandom(32)
+        self._data = ExpiringDict(max_len=max_size, max_age_seconds=ttl)
+
+    def _hash(self, *values):
+        message = "\0".join(
+            (value or u"").encode("utf8") if isinstance(value, unicode)
+            else (value or "")
+            for value in values
+        )
+        return hmac.new(self._salt, message, hashlib.sha256).hexdigest()
+
+    def get(self, username, password):
+        """Find the patron these credentials recently authenticated.
+
+        :return: A Patron ID, or None if the credentials weren't
+            recently approved.
+        """
+        entry = self._data.get(self._hash(username))
+        if not entry:
+            return None
+        credentials_hash, patron_id = entry
+        if not hmac.compare_digest(
+            credentials_hash, self._hash(username, password)
+        ):
+            return None
+        return patron_id
+
+    def set(self, username, password, patron_id):
+        """Remember that the source of truth approved these credentials."""
+        self._data[self._hash(username)] = (
+            self._hash(username, password), patron_id
+        )
+
+    def invalidate(self, username):
+        """Forget any approved credentials for this username."""
+        self._data.pop(self._hash(username), None)
+
+
 class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
     """Verify a username/password, obtained through HTTP Basic Auth, with
     a remote source of truth.
@@ -1730,6 +1792,13 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
         TEST_IDENTIFIER_DESCRIPTION_FOR_REQUIRED_PASSWORD,
         "An optional Test Password for this identifier can be set in the next section.",
     ))
+    # If these are set, patrons whose credentials were recently
+    # approved by the source of truth are authenticated without
+    # asking it again.
+    CREDENTIAL_CACHE_TIME = u"credential_cache_time"
+    CREDENTIAL_CACHE_SIZE = u"credential_cache_size"
+    DEFAULT_CREDENTIAL_CACHE_SIZE = 10000
+
     TEST_PASSWORD_DESCRIPTION_REQUIRED = _("The password for the Test Identifier.")
     TEST_PASSWORD_DESCRIPTION_OPTIONAL = _("The password for the Test Identifier (above, in previous section).")
 
@@ -1798,6 +1867,17 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
         { "key": PASSWORD_LABEL,
           "label": _("Label for password entry"),
         },
+        { "key": CREDENTIAL_CACHE_TIME,
+          "label": _("Credential cache time (seconds)"),
+          "description": _("After a patron's credentials are approved, they won't be checked again for this many seconds. This saves a round trip for each request a patron makes, but a patron whose PIN is changed or whose account is closed may keep access for this long. If this is not set, credentials are checked on every request."),
+          "type": "number",
+        },
+        { "key": CREDENTIAL_CACHE_SIZE,
+          "label": _("Credential cache size"),
+          "description": _("The most patrons whose approved credentials will be remembered at once."),
+          "type": "number",
+          "default": DEFAULT_CREDENTIAL_CACHE_SIZE,
+        },
     ] + AuthenticationProvider.SETTINGS
 
     # Used in the constructor to signify that the default argument
@@ -1863,6 +1943,18 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
             or self.DEFAULT_PASSWORD_LABEL
         )
 
+        credential_cache_time = integration.setting(
+            self.CREDENTIAL_CACHE_TIME
+        ).int_value
+        if credential_cache_time and credential_cache_time > 0:
+            self.credential_cache = CredentialCache(
+                credential_cache_time,
+                integration.setting(self.CREDENTIAL_CACHE_SIZE).int_value
+                or self.DEFAULT_CREDENTIAL_CACHE_SIZE
+            )
+        else:
+            self.credential_cache = None
+
     def remote_patron_lookup(self, patron_or_patrondata):
         """Ask the remote for information about this patron, and then make sure
         the patron belongs to the library associated with thie BasicAuthenticationProvider."""
@@ -1961,6 +2053,47 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
             # need to be checked with the source of truth.
             return server_side_validation_result
 
+        # If the source of truth recently approved these credentials,
+        # there's no need to ask it again.
+        patron = self.cached_patron(_db, username, password)
+        if patron:
+            return patron
+
+        patron = self.remote_authenticate_patron(_db, username, password)
+        if self.credential_cache:
+            if isinstance(patron, Patron) and patron.id:
+                self.credential_cache.set(username, password, patron.id)
+            else:
+                self.credential_cache.invalidate(username)
+        return patron
+
+    def cached_patron(self, _db, username, password):
+        """Find the Patron for credentials that were recently approved by
+        the source of truth.
+
+        :return: A Patron, or None if the credentials aren't in the
+            cache or the patron is due to be synced with the source of
+            truth.
+        """
+        if not self.credential_cache:
+            return None
+        patron_id = self.credential_cache.get(username, password)
+        if not patron_id:
+            return None
+        patron = get_one(_db, Patron, id=patron_id, library_id=self.library_id)
+        if not patron or PatronUtility.needs_external_sync(patron):
+            # Go through the whole process, so the patron's account
+            # information gets updated.
+            return None
+        return patron
+
+    def remote_authenticate_patron(self, _db, username, password):
+        """Check credentials with the source of truth and find or create
+        the corresponding Patron.
+
+        :return: A Patron if one can be authenticated; a ProblemDetail
+            if an error occurs; None if the credentials are wrong.
+        """
         # Check these credentials with the source of truth.
         patrondata = self.remote_authenticate(username, password)
         if not patrondata or isinstance(patrondata, ProblemDetail):
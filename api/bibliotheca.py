@@ -9,8 +9,10 @@ import json
 import logging
 import os
 import re
+import threading
 import urlparse
 import time
+from multiprocessing.pool import ThreadPool
 
 import dateutil.parser
 from flask_babel import lazy_gettext as _
@@ -44,6 +46,7 @@ from core.metadata_layer import (
     MeasurementData,
     ReplacementPolicy,
     SubjectData,
+    TimestampData,
 )
 from core.model import (
     CirculationEvent,
@@ -1185,10 +1188,29 @@ class BibliothecaCirculationSweep(IdentifierSweepMonitor):
     will act like they never heard of it.
     """
     SERVICE_NAME = "Bibliotheca Circulation Sweep"
-    DEFAULT_BATCH_SIZE = 25
     PROTOCOL = ExternalIntegration.BIBLIOTHECA
 
-    def __init__(self, _db, collection, api_class=BibliothecaAPI, **kwargs):
+    # Bibliotheca is asked about this many identifiers in each request.
+    LOOKUP_SIZE = 25
+
+    # This many requests may be in flight at once.
+    LOOKUP_WORKERS = 4
+
+    # No more than this many requests will be started each second. If
+    # this is zero, there's no limit.
+    MAX_REQUESTS_PER_SECOND = 5
+
+    # Each batch is big enough to keep all the workers busy.
+    DEFAULT_BATCH_SIZE = LOOKUP_SIZE * LOOKUP_WORKERS
+
+    def __init__(self, _db, collection, api_class=BibliothecaAPI,
+                 lookup_workers=None, max_requests_per_second=None,
+                 **kwargs):
+        """Constructor.
+
+        :param lookup_workers: Override LOOKUP_WORKERS.
+        :param max_requests_per_second: Override MAX_REQUESTS_PER_SECOND.
+        """
         _db = Session.object_session(collection)
         super(BibliothecaCirculationSweep, self).__init__(
             _db, collection, **kwargs
@@ -1200,16 +1222,61 @@ class BibliothecaCirculationSweep(IdentifierSweepMonitor):
         self.replacement_policy = BibliothecaAPI.replacement_policy(_db)
         self.analytics = self.replacement_policy.analytics
 
+        if lookup_workers is None:
+            lookup_workers = self.LOOKUP_WORKERS
+        self.lookup_workers = max(lookup_workers, 1)
+        if max_requests_per_second is None:
+            max_requests_per_second = self.MAX_REQUESTS_PER_SECOND
+        self.max_requests_per_second = max_requests_per_second
+        self._request_lock = threading.Lock()
+        self._next_request_at = 0
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        """Start counting the work done in a new run."""
+        self.identifiers_processed = 0
+        self.lookup_requests = 0
+        self.lookup_seconds = 0
+
+    def run_once(self, *args, **kwargs):
+        self.reset_statistics()
+        started = time.time()
+        result = super(BibliothecaCirculationSweep, self).run_once(
+            *args, **kwargs
+        )
+        report = self.throughput_report(time.time() - started)
+        self.log.info(report)
+        if isinstance(result, TimestampData):
+            result.achievements = " ".join(
+                x for x in (result.achievements, report) if x
+            )
+        return result
+
+    def throughput_report(self, elapsed):
+        """Describe how quickly this run got through the collection.
+
+        :param elapsed: The length of the run, in seconds.
+        """
+        rate = 0
+        if elapsed > 0:
+            rate = self.identifiers_processed / float(elapsed)
+        return (
+            "Checked %d identifiers in %.1f seconds (%.1f/sec) with %d "
+            "requests, spending %.1f seconds waiting on Bibliotheca." % (
+                self.identifiers_processed, elapsed, rate,
+                self.lookup_requests, self.lookup_seconds
+            )
+        )
+
     def process_items(self, identifiers):
         identifiers_by_bibliotheca_id = dict()
-        bibliotheca_ids = set()
         for identifier in identifiers:
-            bibliotheca_ids.add(identifier.identifier)
             identifiers_by_bibliotheca_id[identifier.identifier] = identifier
+        bibliotheca_ids = sorted(identifiers_by_bibliotheca_id.keys())
 
         identifiers_not_mentioned_by_bibliotheca = set(identifiers)
         now = datetime.utcnow()
-        for metadata in self.api.bibliographic_lookup(bibliotheca_ids):
+        for metadata in self.lookup(bibliotheca_ids):
             self._process_metadata(
                 metadata, identifiers_by_bibliotheca_id,
                 identifiers_not_mentioned_by_bibliotheca,
@@ -1219,20 +1286,92 @@ class BibliothecaCirculationSweep(IdentifierSweepMonitor):
         # that Bibliotheca doesn't know about.  This is a pretty reliable
         # indication that we no longer own any licenses to the
         # book.
-        for identifier in identifiers_not_mentioned_by_bibliotheca:
-            pools = [lp for lp in identifier.licensed_through
-                     if lp.data_source.name==DataSource.BIBLIOTHECA
-                     and lp.collection == self.collection]
-            if pools:
-                [pool] = pools
-            else:
-                continue
+        for pool in self.pools_for(identifiers_not_mentioned_by_bibliotheca):
             if pool.licenses_owned > 0:
                 self.log.warn(
                     "Removing %s from circulation.",
-                    identifier.identifier
+                    pool.identifier.identifier
                 )
             pool.update_availability(0, 0, 0, 0, self.analytics, as_of=now)
+        self.identifiers_processed += len(identifiers_by_bibliotheca_id)
+
+    def pools_for(self, identifiers):
+        """Find this collection's Bibliotheca LicensePools for the given
+        identifiers, in a single query.
+        """
+        if not identifiers:
+            return []
+        return self._db.query(LicensePool).filter(
+            LicensePool.collection_id==self.collection.id
+        ).filter(
+            LicensePool.data_source_id==self.api.source.id
+        ).filter(
+            LicensePool.identifier_id.in_([x.id for x in identifiers])
+        ).all()
+
+    def lookup(self, bibliotheca_ids):
+        """Look up current information about some Bibliotheca books,
+        LOOKUP_SIZE at a time, with up to `lookup_workers` requests in
+        flight at once.
+
+        Only the HTTP requests happen in other threads; the responses
+        are parsed here, in order.
+
+        :param bibliotheca_ids: A list of Bibliotheca identifier strings.
+        :yield: A Metadata object for every book Bibliotheca knows about.
+        """
+        chunks = [
+            bibliotheca_ids[i:i+self.LOOKUP_SIZE]
+            for i in range(0, len(bibliotheca_ids), self.LOOKUP_SIZE)
+        ]
+        if self.lookup_workers == 1 or len(chunks) < 2:
+            responses = (self.lookup_request(chunk) for chunk in chunks)
+            pool = None
+        else:
+            pool = ThreadPool(min(self.lookup_workers, len(chunks)))
+            responses = (
+                result.get() for result in
+                [pool.apply_async(self.lookup_request, (chunk,))
+                 for chunk in chunks]
+            )
+        try:
+            for data in responses:
+                for metadata in self.api.item_list_parser.parse(data):
+                    yield metadata
+        finally:
+            if pool:
+                pool.terminate()
+
+    def lookup_request(self, bibliotheca_ids):
+        """Ask Bibliotheca about some books, once the rate limit allows.
+
+        This may be called from a worker thread, so it must not touch
+        the database.
+
+        :return: A string containing an XML document.
+        """
+        self.wait_for_rate_limit()
+        started = time.time()
+        try:
+            return self.api.bibliographic_lookup_request(bibliotheca_ids)
+        finally:
+            with self._request_lock:
+                self.lookup_requests += 1
+                self.lookup_seconds += time.time() - started
+
+    def wait_for_rate_limit(self):
+        """Block until another request can be made without going over
+        `max_requests_per_second`.
+        """
+        if not self.max_requests_per_second:
+            return
+        interval = 1.0 / self.max_requests_per_second
+        with self._request_lock:
+            now = time.time()
+            start_at = max(now, self._next_request_at)
+            self._next_request_at = start_at + interval
+        if start_at > now:
+            time.sleep(start_at - now)
 
     def _process_metadata(
         self, metadata, identifiers_by_bibliotheca_id,
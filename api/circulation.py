@@ -1,14 +1,24 @@
 import datetime
 import logging
+import os
 import sys
 import time
-from threading import Thread
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from threading import Lock
 
 import flask
 from flask_babel import lazy_gettext as _
+from sqlalchemy import tuple_
+from sqlalchemy.orm import (
+    contains_eager,
+    joinedload,
+)
 
 from circulation_exceptions import *
+from circulation_metrics import CirculationMetrics
 from config import Configuration
+from patron_activity_cache import PatronActivityCache
 from core.cdn import cdnify
 from core.config import CannotLoadConfiguration
 from core.mirror import MirrorUploader
@@ -17,8 +27,10 @@ from core.model import (
     CirculationEvent,
     Collection,
     ConfigurationSetting,
+    DataSource,
     DeliveryMechanism,
     ExternalIntegration,
+    Identifier,
     Library,
     LicensePoolDeliveryMechanism,
     LicensePool,
@@ -360,13 +372,101 @@ class HoldInfo(CirculationInfo):
         )
 
 
+class PatronActivityExecutor(object):
+    """A process-wide pool of threads used to ask vendor APIs about
+    a patron's loans and holds.
+
+    Creating a new thread for every vendor on every bookshelf sync is
+    expensive, so all CirculationAPI objects in a process share a
+    single pool.
+    """
+
+    _pool = None
+    _pool_size = None
+    _pid = None
+    _lock = Lock()
+
+    @classmethod
+    def pool(cls, size):
+        """Find or create the process-wide thread pool.
+
+        :param size: The number of threads to use if the pool needs to
+            be created. If an existing pool has a different size, it's
+            replaced.
+        """
+        with cls._lock:
+            if (cls._pool is not None
+                and (cls._pid != os.getpid() or cls._pool_size != size)):
+                # Either the settings have changed or we've been forked
+                # from the process that created the pool, leaving us
+                # with a pool whose threads don't exist in this process.
+                cls._shutdown()
+            if cls._pool is None:
+                cls._pool = ThreadPool(size)
+                cls._pool_size = size
+                cls._pid = os.getpid()
+            return cls._pool
+
+    @classmethod
+    def reset(cls):
+        """Shut down the process-wide thread pool. The next call to pool()
+        will create a new one.
+        """
+        with cls._lock:
+            cls._shutdown()
+
+    @classmethod
+    def _shutdown(cls):
+        if cls._pool is not None and cls._pid == os.getpid():
+            # Threads that are still waiting on a slow vendor will
+            # finish their work and then go away.
+            cls._pool.close()
+        cls._pool = None
+        cls._pool_size = None
+        cls._pid = None
+
+    @classmethod
+    def run(cls, api, patron, pin, log, metrics=None):
+        """Ask one API about a patron's activity.
+
+        This runs in a worker thread. Rather than raising an exception,
+        it returns the exception along with its traceback so the
+        caller can log it properly.
+
+        :param metrics: A CirculationMetrics used to record how long
+            the API took.
+        :return: A 3-tuple (activity, exception, trace).
+        """
+        activity = exception = trace = None
+        before = time.time()
+        try:
+            activity = api.patron_activity(patron, pin)
+            if activity is not None:
+                # Some APIs return a generator. Make sure all the work
+                # happens in this thread.
+                activity = list(activity)
+        except Exception, e:
+            exception = e
+            trace = sys.exc_info()
+        after = time.time()
+        api_name = CirculationMetrics.api_name(api)
+        log.debug("Synced %s in %.2f sec", api_name, after-before)
+        if metrics and metrics.enabled:
+            metrics.record(
+                "patron_activity", api_name, CirculationMetrics.VENDOR,
+                after-before, CirculationMetrics.outcome(exception)
+            )
+        return activity, exception, trace
+
+
 class CirculationAPI(object):
     """Implement basic circulation logic and abstract away the details
     between different circulation APIs behind generic operations like
     'borrow'.
     """
 
-    def __init__(self, _db, library, analytics=None, api_map=None):
+    def __init__(self, _db, library, analytics=None, api_map=None,
+                 activity_cache=None, metrics=None):
         """Constructor.
 
         :param _db: A database session (probably a scoped session, which is
@@ -386,6 +486,15 @@ class CirculationAPI(object):
            Since instantiating these API classes may result in API
            calls, we only instantiate one CirculationAPI per library,
            and keep them around as long as possible.
+
+        :param activity_cache: A PatronActivityCache used to avoid
+           asking the vendor APIs about the same patron over and over.
+           By default, the cache is built from the sitewide
+           configuration.
+
+        :param metrics: A CirculationMetrics used to time circulation
+           operations. By default, the process-wide CirculationMetrics
+           is used.
         """
         self._db = _db
         self.library_id = library.id
@@ -404,6 +513,25 @@ class CirculationAPI(object):
         self.collection_ids_for_sync = []
 
         self.log = logging.getLogger("Circulation API")
+
+        # These settings control the process-wide thread pool used by
+        # patron_activity(). Since CirculationAPI objects are long-lived,
+        # we only look them up once.
+        self.patron_activity_pool_size = (
+            ConfigurationSetting.sitewide(
+                _db, Configuration.PATRON_ACTIVITY_POOL_SIZE
+            ).int_value or Configuration.DEFAULT_PATRON_ACTIVITY_POOL_SIZE
+        )
+        self.default_patron_activity_timeout = (
+            ConfigurationSetting.sitewide(
+                _db, Configuration.PATRON_ACTIVITY_TIMEOUT
+            ).int_value or Configuration.DEFAULT_PATRON_ACTIVITY_TIMEOUT
+        )
+        self.activity_cache = (
+            activity_cache or PatronActivityCache.from_configuration(_db)
+        )
+        self._metrics = metrics
+
         for collection in library.collections:
             if collection.protocol in api_map:
                 api = None
@@ -423,6 +551,21 @@ class CirculationAPI(object):
     def library(self):
         return Library.by_id(self._db, self.library_id)
 
+    @property
+    def metrics(self):
+        """The CirculationMetrics used to time circulation operations."""
+        return self._metrics or CirculationMetrics.instance()
+
+    def api_name_for(self, licensepool):
+        """The name under which timings for operations on
+        `licensepool` are recorded.
+        """
+        if licensepool.open_access or licensepool.self_hosted:
+            return CirculationMetrics.api_name(None)
+        return CirculationMetrics.api_name(
+            self.api_for_license_pool(licensepool)
+        )
+
     @property
     def default_api_map(self):
         """When you see a Collection that implements protocol X, instantiate
@@ -566,6 +709,14 @@ class CirculationAPI(object):
         :return: A 3-tuple (`Loan`, `Hold`, `is_new`). Either `Loan`
             or `Hold` must be None, but not both.
         """
+        with self.metrics.timer("borrow", self.api_name_for(licensepool)):
+            return self._borrow(
+                patron, pin, licensepool, delivery_mechanism,
+                hold_notification_email
+            )
+
+    def _borrow(self, patron, pin, licensepool, delivery_mechanism,
+                hold_notification_email=None):
         # Short-circuit the request if the patron lacks borrowing
         # privileges. This can happen for a few different reasons --
         # fines, blocks, expired card, etc.
@@ -640,10 +791,13 @@ class CirculationAPI(object):
         # We try to check out the book even if we believe it's not
         # available -- someone else may have checked it in since we
         # last looked.
+        metrics = self.metrics
+        api_name = CirculationMetrics.api_name(api)
         try:
-            loan_info = api.checkout(
-                patron, pin, licensepool, internal_format
-            )
+            with metrics.timer("checkout", api_name, metrics.VENDOR):
+                loan_info = api.checkout(
+                    patron, pin, licensepool, internal_format
+                )
 
             if isinstance(loan_info, HoldInfo):
                 # If the API couldn't give us a loan, it may have given us
@@ -702,6 +856,10 @@ class CirculationAPI(object):
             # immediately.
             api.update_availability(licensepool)
             raise
+        finally:
+            # Whatever happened, the vendor's view of this patron's
+            # activity may have changed.
+            self.invalidate_activity_cache(patron, licensepool)
 
         if loan_info:
             # We successfuly secured a loan.  Now create it in our
@@ -738,16 +896,19 @@ class CirculationAPI(object):
         # the book on hold.
         if not hold_info:
             try:
-                hold_info = api.place_hold(
-                    patron, pin, licensepool,
-                    hold_notification_email
-                )
+                with metrics.timer("place_hold", api_name, metrics.VENDOR):
+                    hold_info = api.place_hold(
+                        patron, pin, licensepool,
+                        hold_notification_email
+                    )
             except AlreadyOnHold, e:
                 hold_info = HoldInfo(
                     licensepool.collection, licensepool.data_source,
                     licensepool.identifier.type, licensepool.identifier.identifier,
                     None, None, None
                 )
+            finally:
+                self.invalidate_activity_cache(patron, licensepool)
 
         # It's pretty rare that we'd go from having a loan for a book
         # to needing to put it on hold, but we do check for that case.
@@ -889,6 +1050,14 @@ class CirculationAPI(object):
         :return: A FulfillmentInfo object.
 
         """
+        with self.metrics.timer("fulfill", self.api_name_for(licensepool)):
+            return self._fulfill(
+                patron, pin, licensepool, delivery_mechanism, part,
+                fulfill_part_url, sync_on_failure
+            )
+
+    def _fulfill(self, patron, pin, licensepool, delivery_mechanism,
+                 part=None, fulfill_part_url=None, sync_on_failure=True):
         fulfillment = None
         loan = get_one(
             self._db, Loan, patron=patron, license_pool=licensepool,
@@ -902,7 +1071,7 @@ class CirculationAPI(object):
                 # TODO: Pass in only the single collection or LicensePool
                 # that needs to be synced.
                 self.sync_bookshelf(patron, pin, force=True)
-                return self.fulfill(
+                return self._fulfill(
                     patron, pin, licensepool=licensepool,
                     delivery_mechanism=delivery_mechanism,
                     part=part, fulfill_part_url=fulfill_part_url,
@@ -935,10 +1104,20 @@ class CirculationAPI(object):
             # we pass them in as keyword arguments, to minimize the
             # impact on implementation signatures. Most vendor APIs
             # will ignore one or more of these arguments.
-            fulfillment = api.fulfill(
-                patron, pin, licensepool, internal_format=internal_format,
-                part=part, fulfill_part_url=fulfill_part_url
-            )
+            metrics = self.metrics
+            try:
+                with metrics.timer(
+                    "fulfill", CirculationMetrics.api_name(api),
+                    metrics.VENDOR
+                ):
+                    fulfillment = api.fulfill(
+                        patron, pin, licensepool,
+                        internal_format=internal_format, part=part,
+                        fulfill_part_url=fulfill_part_url
+                    )
+            finally:
+                # Fulfilling a loan may lock it to a delivery mechanism.
+                self.invalidate_activity_cache(patron, licensepool)
             if not fulfillment or not (
                 fulfillment.content_link or fulfillment.content
             ):
@@ -1005,6 +1184,12 @@ class CirculationAPI(object):
 
     def revoke_loan(self, patron, pin, licensepool):
         """Revoke a patron's loan for a book."""
+        with self.metrics.timer(
+            "revoke_loan", self.api_name_for(licensepool)
+        ):
+            return self._revoke_loan(patron, pin, licensepool)
+
+    def _revoke_loan(self, patron, pin, licensepool):
         loan = get_one(
             self._db, Loan, patron=patron, license_pool=licensepool,
             on_multiple='interchangeable'
@@ -1012,12 +1197,19 @@ class CirculationAPI(object):
         if loan:
             if not licensepool.open_access and not licensepool.self_hosted:
                 api = self.api_for_license_pool(licensepool)
+                metrics = self.metrics
                 try:
-                    api.checkin(patron, pin, licensepool)
+                    with metrics.timer(
+                        "checkin", CirculationMetrics.api_name(api),
+                        metrics.VENDOR
+                    ):
+                        api.checkin(patron, pin, licensepool)
                 except NotCheckedOut, e:
                     # The book wasn't checked out in the first
                     # place. Everything's fine.
                     pass
+                finally:
+                    self.invalidate_activity_cache(patron, licensepool)
 
             __transaction = self._db.begin_nested()
             logging.info("In revoke_loan(), deleting loan #%d" % loan.id)
@@ -1038,18 +1230,31 @@ class CirculationAPI(object):
 
     def release_hold(self, patron, pin, licensepool):
         """Remove a patron's hold on a book."""
+        with self.metrics.timer(
+            "release_hold", self.api_name_for(licensepool)
+        ):
+            return self._release_hold(patron, pin, licensepool)
+
+    def _release_hold(self, patron, pin, licensepool):
         hold = get_one(
             self._db, Hold, patron=patron, license_pool=licensepool,
             on_multiple='interchangeable'
         )
         if not licensepool.open_access and not licensepool.self_hosted:
             api = self.api_for_license_pool(licensepool)
+            metrics = self.metrics
             try:
-                api.release_hold(patron, pin, licensepool)
+                with metrics.timer(
+                    "release_hold", CirculationMetrics.api_name(api),
+                    metrics.VENDOR
+                ):
+                    api.release_hold(patron, pin, licensepool)
             except NotOnHold, e:
                 # The book wasn't on hold in the first place. Everything's
                 # fine.
                 pass
+            finally:
+                self.invalidate_activity_cache(patron, licensepool)
         # Any other CannotReleaseHold exception will be propagated
         # upwards at this point
         if hold:
@@ -1067,76 +1272,121 @@ class CirculationAPI(object):
 
         return True
 
+    def invalidate_activity_cache(self, patron, licensepool=None):
+        """Forget what the vendor APIs told us about a patron's activity,
+        because we know it has changed.
+
+        :param licensepool: If this is provided, only the cached
+            activity for this LicensePool's collection is removed.
+        """
+        patron_id = getattr(patron, 'id', None)
+        if patron_id is None:
+            return
+        collection_id = None
+        if licensepool:
+            collection_id = licensepool.collection_id
+        self.activity_cache.invalidate(patron_id, collection_id)
+
+    def patron_activity_timeout(self, api):
+        """How long are we willing to wait for `api` to tell us about
+        a patron's activity?
+
+        A BaseCirculationAPI may set PATRON_ACTIVITY_TIMEOUT to
+        override the sitewide default.
+        """
+        timeout = getattr(api, 'PATRON_ACTIVITY_TIMEOUT', None)
+        if timeout is None:
+            timeout = self.default_patron_activity_timeout
+        return timeout
+
     def patron_activity(self, patron, pin):
         """Return a record of the patron's current activity
         vis-a-vis all relevant external loan sources.
 
-        We check each source in a separate thread for speed.
+        We check each source in a thread from a process-wide pool, for
+        speed. A source that doesn't answer within its deadline is
+        abandoned and treated like a source that raised an exception.
 
-        :return: A 2-tuple (loans, holds) containing `HoldInfo` and
-            `LoanInfo` objects.
-        """
-        log = self.log
-        class PatronActivityThread(Thread):
-            def __init__(self, api, patron, pin):
-                self.api = api
-                self.patron = patron
-                self.pin = pin
-                self.activity = None
-                self.exception = None
-                self.trace = None
-                super(PatronActivityThread, self).__init__()
-
-            def run(self):
-                before = time.time()
-                try:
-                    self.activity = self.api.patron_activity(
-                        self.patron, self.pin)
-                except Exception, e:
-                    self.exception = e
-                    self.trace = sys.exc_info()
-                after = time.time()
-                log.debug(
-                    "Synced %s in %.2f sec", self.api.__class__.__name__,
-                    after-before
-                )
+        If the activity cache is enabled, a source that answered
+        recently isn't asked again.
 
-        threads = []
+        :return: A 3-tuple (loans, holds, complete). `loans` and `holds`
+            contain `LoanInfo` and `HoldInfo` objects. `complete` is
+            False if any source failed or missed its deadline, in
+            which case the loans and holds only reflect the sources
+            that did answer.
+        """
+        metrics = self.metrics
+        with metrics.timer("patron_activity", "all"):
+            return self._patron_activity(patron, pin, metrics)
+
+    def _patron_activity(self, patron, pin, metrics):
+        pool = PatronActivityExecutor.pool(self.patron_activity_pool_size)
+        patron_id = getattr(patron, 'id', None)
+        use_cache = self.activity_cache.enabled and patron_id is not None
         before = time.time()
-        for api in self.api_for_collection.values():
-            thread = PatronActivityThread(api, patron, pin)
-            threads.append(thread)
-        for thread in threads:
-            thread.start()
-        for thread in threads:
-            thread.join()
+        activities = []
+        tasks = []
+        for collection_id, api in self.api_for_collection.items():
+            if use_cache:
+                activity = self.activity_cache.get(patron_id, collection_id)
+                if activity is not None:
+                    # We asked this API about this patron very recently.
+                    activities.append(activity)
+                    continue
+            result = pool.apply_async(
+                PatronActivityExecutor.run,
+                (api, patron, pin, self.log, metrics)
+            )
+            deadline = before + self.patron_activity_timeout(api)
+            tasks.append((collection_id, api, result, deadline))
+
         loans = []
         holds = []
         complete = True
-        for thread in threads:
-            if thread.exception:
+        for collection_id, api, result, deadline in tasks:
+            api_name = api.__class__.__name__
+            try:
+                activity, exception, trace = result.get(
+                    max(deadline - time.time(), 0)
+                )
+            except TimeoutError:
+                # The vendor is taking too long. We won't wait for it,
+                # and we don't have a complete picture of the
+                # patron's loans.
+                complete = False
+                self.log.error(
+                    "%s did not report patron activity within %s sec",
+                    api_name, self.patron_activity_timeout(api)
+                )
+                continue
+            if exception:
                 # Something went wrong, so we don't have a complete
                 # picture of the patron's loans.
                 complete = False
                 self.log.error(
-                    "%s errored out: %s", thread.api.__class__.__name__,
-                    thread.exception,
-                    exc_info=thread.trace
+                    "%s errored out: %s", api_name, exception,
+                    exc_info=trace
                 )
-            if thread.activity:
-                for i in thread.activity:
-                    l = None
-                    if isinstance(i, LoanInfo):
-                        l = loans
-                    elif isinstance(i, HoldInfo):
-                        l = holds
-                    else:
-                        self.log.warn(
-                            "value %r from patron_activity is neither a loan nor a hold.",
-                            i
-                        )
-                    if l is not None:
-                        l.append(i)
+            elif use_cache and activity is not None:
+                self.activity_cache.set(patron_id, collection_id, activity)
+            if activity:
+                activities.append(activity)
+
+        for activity in activities:
+            for i in activity:
+                l = None
+                if isinstance(i, LoanInfo):
+                    l = loans
+                elif isinstance(i, HoldInfo):
+                    l = holds
+                else:
+                    self.log.warn(
+                        "value %r from patron_activity is neither a loan nor a hold.",
+                        i
+                    )
+                if l is not None:
+                    l.append(i)
         after = time.time()
         self.log.debug("Full sync took %.2f sec", after-before)
         return loans, holds, complete
@@ -1180,6 +1430,11 @@ class CirculationAPI(object):
         # just before we started contacting the vendor APIs.
         last_loan_activity_sync = datetime.datetime.utcnow()
 
+        if force:
+            # The caller wants the vendors' current opinion, not
+            # a recently cached one.
+            self.invalidate_activity_cache(patron)
+
         # Update the external view of the patron's current state.
         remote_loans, remote_holds, complete = self.patron_activity(patron, pin)
         __transaction = self._db.begin_nested()
@@ -1191,6 +1446,15 @@ class CirculationAPI(object):
             # patron's loans is good enough to cache.
             last_loan_activity_sync = None
 
+        # Load the local loans and holds along with their LicensePools
+        # and Identifiers, so we can key them without a query per item.
+        local_loans = local_loans.options(
+            joinedload(Loan.license_pool).joinedload(LicensePool.identifier)
+        )
+        local_holds = local_holds.options(
+            joinedload(Hold.license_pool).joinedload(LicensePool.identifier)
+        )
+
         now = datetime.datetime.utcnow()
         local_loans_by_identifier = {}
         local_holds_by_identifier = {}
@@ -1221,12 +1485,20 @@ class CirculationAPI(object):
             key = (i.type, i.identifier)
             local_holds_by_identifier[key] = h
 
+        # Any remote loan or hold we don't already know about will
+        # need a LicensePool. Look them all up at once.
+        pools = self._license_pools_for(
+            [x for x in remote_loans
+             if (x.identifier_type, x.identifier) not in local_loans_by_identifier]
+            + [x for x in remote_holds
+               if (x.identifier_type, x.identifier) not in local_holds_by_identifier]
+        )
+
         active_loans = []
         active_holds = []
         for loan in remote_loans:
             # This is a remote loan. Find or create the corresponding
             # local loan.
-            pool = loan.license_pool(self._db)
             start = loan.start_date
             end = loan.end_date
             key = (loan.identifier_type, loan.identifier)
@@ -1242,6 +1514,7 @@ class CirculationAPI(object):
                 if end:
                     local_loan.end = end
             else:
+                pool = self._license_pool_for(loan, pools)
                 local_loan, new = pool.loan_to(patron, start, end)
 
             if loan.locked_to:
@@ -1262,7 +1535,6 @@ class CirculationAPI(object):
         for hold in remote_holds:
             # This is a remote hold. Find or create the corresponding
             # local hold.
-            pool = hold.license_pool(self._db)
             start = hold.start_date
             end = hold.end_date
             position = hold.hold_position
@@ -1276,6 +1548,7 @@ class CirculationAPI(object):
                 # start or end date have changed.
                 local_hold.update(start, end, position)
             else:
+                pool = self._license_pool_for(hold, pools)
                 local_hold, new = pool.on_hold_to(patron, start, end, position)
             active_holds.append(local_hold)
 
@@ -1295,21 +1568,30 @@ class CirculationAPI(object):
             # borrowing a book and syncing their bookshelf at the same time,
             # and the local loan was created after we got the remote loans.
             # If the loan's start date is less than a minute ago, we'll keep it.
+            stale_loans = []
             for loan in local_loans_by_identifier.values():
                 if loan.license_pool.collection_id in self.collection_ids_for_sync:
                     one_minute_ago = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
                     if loan.start < one_minute_ago:
                         logging.info("In sync_bookshelf for patron %s, deleting loan %d (patron %s)" % (patron.authorization_identifier, loan.id, loan.patron.authorization_identifier))
-                        self._db.delete(loan)
+                        stale_loans.append(loan)
                     else:
                         logging.info("In sync_bookshelf for patron %s, found local loan %d created in the past minute that wasn't in remote loans" % (patron.authorization_identifier, loan.id))
 
             # Every hold remaining in holds_by_identifier is a hold that
             # the provider doesn't know about, which means it's expired
             # and we should get rid of it.
-            for hold in local_holds_by_identifier.values():
-                if hold.license_pool.collection_id in self.collection_ids_for_sync:
-                    self._db.delete(hold)
+            stale_holds = [
+                hold for hold in local_holds_by_identifier.values()
+                if hold.license_pool.collection_id in self.collection_ids_for_sync
+            ]
+
+            self._delete_all(Loan, stale_loans)
+            self._delete_all(Hold, stale_holds)
+            if (stale_loans or stale_holds) and patron:
+                # The patron's view of their loans and holds must be
+                # reloaded to reflect the deletions.
+                self._db.expire(patron, ['loans', 'holds'])
 
         # Now that we're in sync (or not), set last_loan_activity_sync
         # to the conservative value obtained earlier.
@@ -1320,6 +1602,79 @@ class CirculationAPI(object):
         return active_loans, active_holds
 
 
+    def _license_pools_for(self, infos):
+        """Look up the LicensePools for a number of `LoanInfo` and
+        `HoldInfo` objects with a single query.
+
+        :return: A dictionary mapping (collection ID, data source name,
+            identifier type, identifier) to LicensePool. Pools that
+            don't exist yet are not included.
+        """
+        if not infos:
+            return {}
+        collection_ids = set(x.collection_id for x in infos)
+        # A collection may have more than one LicensePool for an
+        # identifier, one per data source, so the data source is part
+        # of the key, just as it is in CirculationInfo.license_pool().
+        keys = set(
+            (self._data_source_name(x), x.identifier_type, x.identifier)
+            for x in infos
+        )
+        qu = self._db.query(LicensePool).join(
+            LicensePool.identifier
+        ).join(
+            LicensePool.data_source
+        ).options(
+            contains_eager(LicensePool.identifier),
+            contains_eager(LicensePool.data_source),
+        ).filter(
+            LicensePool.collection_id.in_(collection_ids)
+        ).filter(
+            tuple_(
+                DataSource.name, Identifier.type, Identifier.identifier
+            ).in_(keys)
+        )
+        return dict(
+            ((pool.collection_id, pool.data_source.name,
+              pool.identifier.type, pool.identifier.identifier), pool)
+            for pool in qu
+        )
+
+    @classmethod
+    def _data_source_name(cls, info):
+        """The name of the data source of a `LoanInfo` or `HoldInfo`.
+
+        Like LicensePool.for_foreign_id(), CirculationInfo accepts
+        either a DataSource or its name.
+        """
+        if isinstance(info.data_source_name, DataSource):
+            return info.data_source_name.name
+        return info.data_source_name
+
+    def _license_pool_for(self, info, pools):
+        """Find the LicensePool for a `LoanInfo` or `HoldInfo` among the
+        results of _license_pools_for(), creating it if necessary.
+        """
+        key = (info.collection_id, self._data_source_name(info),
+               info.identifier_type, info.identifier)
+        pool = pools.get(key)
+        if not pool:
+            # This is the first we've heard of this book.
+            pool = info.license_pool(self._db)
+        return pool
+
+    def _delete_all(self, model, objects):
+        """Delete a number of Loans or Holds with a single statement."""
+        if not objects:
+            return
+        self._db.flush()
+        self._db.query(model).filter(
+            model.id.in_([x.id for x in objects])
+        ).delete(synchronize_session=False)
+        for x in objects:
+            self._db.expunge(x)
+
+
 class BaseCirculationAPI(object):
     """Encapsulates logic common to all circulation APIs."""
 
@@ -1388,6 +1743,11 @@ class BaseCirculationAPI(object):
     # is called "ebook-epub-adobe" in Overdrive.
     delivery_mechanism_to_internal_format = {}
 
+    # The number of seconds CirculationAPI.patron_activity() will wait
+    # for this API to report on a patron's activity. If this is None,
+    # the sitewide default is used.
+    PATRON_ACTIVITY_TIMEOUT = None
+
     def internal_format(self, delivery_mechanism):
         """Look up the internal format for this delivery mechanism or
         raise an exception.
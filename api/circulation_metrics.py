@@ -0,0 +1,230 @@
+import bisect
+import time
+from threading import Lock
+
+from circulation_exceptions import (
+    CirculationException,
+    InternalServerError,
+)
+from config import Configuration
+from core.model import ConfigurationSetting
+
+
+class CirculationMetrics(object):
+    """Keep track of how long circulation operations take.
+
+    Every measurement is filed under an operation ("borrow",
+    "fulfill", ...), the name of the vendor API involved, and a
+    phase:
+
+    * "total": the whole operation, as seen by CirculationAPI.
+    * "vendor": the time spent waiting on the vendor API.
+    * "annotation": the time spent building the OPDS response.
+
+    The time spent on everything else -- mostly the database -- is
+    the difference between "total" and "vendor".
+
+    For each (operation, API, phase) there is a histogram of timings
+    and a count of outcomes. The outcome is "success", the name of a
+    circulation exception, or "error" for any other exception.
+
+    This base class records nothing, so the instrumented code costs
+    next to nothing when metrics are disabled. A single object is
+    shared by every CirculationAPI in the process; use instance() to
+    get it.
+    """
+
+    TOTAL = "total"
+    VENDOR = "vendor"
+    ANNOTATION = "annotation"
+
+    SUCCESS = "success"
+    ERROR = "error"
+
+    # The upper bounds, in seconds, of the histogram buckets. There's
+    # one more bucket for timings longer than the last bound.
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    enabled = False
+
+    _instance = None
+    _lock = Lock()
+
+    @classmethod
+    def instance(cls):
+        """Find the process-wide CirculationMetrics object."""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = CirculationMetrics()
+        return cls._instance
+
+    @classmethod
+    def configure(cls, enabled):
+        """Turn metrics on or off for this process.
+
+        Turning metrics on when they're already on keeps the timings
+        recorded so far.
+
+        :return: The process-wide CirculationMetrics object.
+        """
+        with cls._lock:
+            current = cls._instance
+            if enabled and not (current and current.enabled):
+                cls._instance = InMemoryCirculationMetrics()
+            elif not enabled and (current is None or current.enabled):
+                cls._instance = CirculationMetrics()
+        return cls._instance
+
+    @classmethod
+    def from_configuration(cls, _db):
+        """Turn metrics on or off according to the sitewide
+        configuration.
+
+        :return: The process-wide CirculationMetrics object.
+        """
+        enabled = ConfigurationSetting.sitewide(
+            _db, Configuration.CIRCULATION_METRICS_ENABLED
+        ).bool_value or False
+        return cls.configure(enabled)
+
+    @classmethod
+    def api_name(cls, api):
+        """The name under which an API's timings are recorded."""
+        if api is None:
+            return "local"
+        return api.__class__.__name__
+
+    @classmethod
+    def outcome(cls, exception):
+        """The outcome under which a timing is recorded."""
+        if exception is None:
+            return cls.SUCCESS
+        if isinstance(exception, (CirculationException, InternalServerError)):
+            return exception.__class__.__name__
+        return cls.ERROR
+
+    def timer(self, operation, api_name, phase=TOTAL):
+        """A context manager that times the code it wraps.
+
+        An exception raised inside the block is recorded as the
+        outcome and then propagates as usual.
+        """
+        return _NO_TIMER
+
+    def record(self, operation, api_name, phase, seconds, outcome=SUCCESS):
+        """Record a single timing."""
+        pass
+
+    def report(self):
+        """Describe everything that has been recorded, in a form that
+        can be turned into JSON.
+        """
+        return dict(enabled=self.enabled, buckets=list(self.BUCKETS),
+                    timings=[])
+
+    def reset(self):
+        """Forget everything that has been recorded."""
+        pass
+
+
+class _NoTimer(object):
+    """A context manager that does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NO_TIMER = _NoTimer()
+
+
+class _Timer(object):
+    """A context manager that records how long its block took."""
+
+    def __init__(self, metrics, operation, api_name, phase):
+        self.metrics = metrics
+        self.operation = operation
+        self.api_name = api_name
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record(
+            self.operation, self.api_name, self.phase,
+            time.time() - self.start, self.metrics.outcome(exc_value)
+        )
+        return False
+
+
+class _Histogram(object):
+    """The timings and outcomes for one (operation, API, phase)."""
+
+    def __init__(self, buckets):
+        self.bounds = buckets
+        self.buckets = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_seconds = 0
+        self.max_seconds = 0
+        self.outcomes = {}
+
+    def add(self, seconds, outcome):
+        self.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+
+class InMemoryCirculationMetrics(CirculationMetrics):
+    """Record timings in the memory of the current process."""
+
+    enabled = True
+
+    def __init__(self):
+        self._histograms = {}
+        self._record_lock = Lock()
+        self.started = time.time()
+
+    def timer(self, operation, api_name, phase=CirculationMetrics.TOTAL):
+        return _Timer(self, operation, api_name, phase)
+
+    def record(self, operation, api_name, phase, seconds,
+               outcome=CirculationMetrics.SUCCESS):
+        # Timings for patron activity are recorded from worker
+        # threads.
+        key = (operation, api_name, phase)
+        with self._record_lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.BUCKETS)
+            histogram.add(seconds, outcome)
+
+    def report(self):
+        report = super(InMemoryCirculationMetrics, self).report()
+        report['seconds_recorded'] = time.time() - self.started
+        timings = report['timings']
+        with self._record_lock:
+            for (operation, api_name, phase), histogram in sorted(
+                self._histograms.items()
+            ):
+                timings.append(dict(
+                    operation=operation,
+                    api=api_name,
+                    phase=phase,
+                    count=histogram.count,
+                    total_seconds=histogram.total_seconds,
+                    max_seconds=histogram.max_seconds,
+                    buckets=list(histogram.buckets),
+                    outcomes=dict(histogram.outcomes),
+                ))
+        return report
+
+    def reset(self):
+        with self._record_lock:
+            self._histograms = {}
+            self.started = time.time()
@@ -40,6 +40,24 @@ class Configuration(CoreConfiguration):
     # documents are cached.
     AUTHENTICATION_DOCUMENT_CACHE_TIME = u"authentication_document_cache_time"
 
+    # The names of the settings that control the process-wide pool of
+    # threads used to ask vendor APIs about a patron's loans and
+    # holds, and how long we'll wait for any one vendor to answer.
+    PATRON_ACTIVITY_POOL_SIZE = u"patron_activity_pool_size"
+    DEFAULT_PATRON_ACTIVITY_POOL_SIZE = 10
+    PATRON_ACTIVITY_TIMEOUT = u"patron_activity_timeout"
+    DEFAULT_PATRON_ACTIVITY_TIMEOUT = 20
+
+    # The names of the settings that control how long we remember
+    # what the vendor APIs said about a patron's loans and holds, and
+    # where we remember it.
+    PATRON_ACTIVITY_CACHE_TIME = u"patron_activity_cache_time"
+    PATRON_ACTIVITY_CACHE_FILE = u"patron_activity_cache_file"
+
+    # The name of the setting that turns on timing of circulation
+    # operations.
+    CIRCULATION_METRICS_ENABLED = u"circulation_metrics_enabled"
+
     # The name of a setting that turns UWSGI debugging information on
     # or off.
     WSGI_DEBUG_KEY = u"wsgi_debug"
@@ -209,6 +227,48 @@ class Configuration(CoreConfiguration):
             "type": "number",
             "default": 0,
         },
+        {
+            "key": PATRON_ACTIVITY_POOL_SIZE,
+            "label": _("Number of threads used to check patron activity with vendors"),
+            "required": False,
+            "type": "number",
+            "default": DEFAULT_PATRON_ACTIVITY_POOL_SIZE,
+            "description": _("This pool of threads is shared by every request a web worker handles."),
+        },
+        {
+            "key": PATRON_ACTIVITY_TIMEOUT,
+            "label": _("Maximum time to wait for a vendor to report patron activity (in seconds)"),
+            "required": False,
+            "type": "number",
+            "default": DEFAULT_PATRON_ACTIVITY_TIMEOUT,
+            "description": _("If a vendor takes longer than this, the patron's bookshelf will be shown without that vendor's loans and holds."),
+        },
+        {
+            "key": PATRON_ACTIVITY_CACHE_TIME,
+            "label": _("Cache time for patron activity reported by vendors (in seconds)"),
+            "required": False,
+            "type": "number",
+            "default": 0,
+            "description": _("If this is set, repeated requests for a patron's bookshelf within this time will reuse the answers from the vendors instead of asking again. Borrowing, returning, or fulfilling a book clears the cache for that patron. Set this to 0 to disable the cache."),
+        },
+        {
+            "key": PATRON_ACTIVITY_CACHE_FILE,
+            "label": _("File used to share cached patron activity between processes"),
+            "required": False,
+            "description": _("The path to a SQLite database file on local disk. If this is not set, each process keeps its own cache in memory."),
+        },
+        {
+            "key": CIRCULATION_METRICS_ENABLED,
+            "label": _("Record timings for circulation operations"),
+            "required": False,
+            "type": "select",
+            "options": [
+                dict(key="true", label=_("Record timings")),
+                dict(key="false", label=_("Don't record timings")),
+            ],
+            "default": "false",
+            "description": _("If this is enabled, each web worker keeps track of how long borrowing, fulfilling, returning and syncing take for each vendor. The timings for the worker that handles the request can be seen at /admin/diagnostics/circulation_metrics, and cleared with a POST to the same URL."),
+        },
         {
             "key": CUSTOM_TOS_HREF,
             "label": _("Custom Terms of Service link"),
@@ -44,6 +44,7 @@ from authenticator import (
 from base_controller import BaseCirculationManagerController
 from circulation import CirculationAPI, FulfillmentInfo
 from circulation_exceptions import *
+from circulation_metrics import CirculationMetrics
 from config import (
     Configuration,
     CannotLoadConfiguration,
@@ -96,7 +97,6 @@ from core.model import (
     Loan,
     LicensePoolDeliveryMechanism,
     Patron,
-    Representation,
     Session,
 )
 from core.opds import (
@@ -116,6 +116,7 @@ from core.util.opds_writer import (
 )
 from core.util.problem_detail import ProblemDetail
 from custom_index import CustomIndexView
+from fulfillment_proxy import FulfillmentProxy
 from lanes import (
     load_lanes,
     ContributorFacets,
@@ -131,10 +132,12 @@ from lanes import (
     CrawlableCustomListBasedLane,
     CrawlableFacets,
 )
+from novelist import NoveListAPI
 from odl import ODLAPI
 from opds import (
     CirculationManagerAnnotator,
     LibraryAnnotator,
+    LibraryFacts,
     SharedCollectionAnnotator,
     LibraryLoanAndHoldAnnotator,
     SharedCollectionLoanAndHoldAnnotator,
@@ -230,6 +233,14 @@ class CirculationManager(object):
         self.analytics = Analytics(self._db)
         self.auth = Authenticator(self._db, self.analytics)
 
+        # Facts about each library's configuration may have changed,
+        # so look them up again the next time they're needed.
+        NoveListAPI.reset_configuration()
+        LibraryFacts.reset()
+
+        # Circulation timings may have been turned on or off.
+        CirculationMetrics.from_configuration(self._db)
+
         self.setup_external_search()
 
         # Track the Lane configuration for each library by mapping its
@@ -1385,9 +1396,11 @@ class LoanController(CirculationManagerController):
                 )
 
         # Then make the feed.
-        return LibraryLoanAndHoldAnnotator.active_loans_for(
-            self.circulation, patron
-        )
+        metrics = self.circulation.metrics
+        with metrics.timer("patron_activity", "all", metrics.ANNOTATION):
+            return LibraryLoanAndHoldAnnotator.active_loans_for(
+                self.circulation, patron
+            )
 
     def borrow(self, identifier_type, identifier, mechanism_id=None):
         """Create a new loan or hold for a book.
@@ -1465,9 +1478,14 @@ class LoanController(CirculationManagerController):
             response_kwargs['status'] = 200
         item = loan or hold
         if item:
-            return LibraryLoanAndHoldAnnotator.single_item_feed(
-                self.circulation, item, **response_kwargs
-            )
+            metrics = self.circulation.metrics
+            with metrics.timer(
+                "borrow", self.circulation.api_name_for(pool),
+                metrics.ANNOTATION
+            ):
+                return LibraryLoanAndHoldAnnotator.single_item_feed(
+                    self.circulation, item, **response_kwargs
+                )
         else:
             # This should never happen -- we should have sent a more specific
             # error earlier.
@@ -1551,7 +1569,7 @@ class LoanController(CirculationManagerController):
            specific part of a book rather than the whole thing (e.g. a
            single chapter of an audiobook).
         """
-        do_get = do_get or Representation.simple_http_get
+        do_get = do_get or FulfillmentProxy(flask.request.headers).get
 
         # Unlike most controller methods, this one has different
         # behavior whether or not the patron is authenticated. This is
@@ -1706,7 +1724,12 @@ class LoanController(CirculationManagerController):
             if fulfillment.content_type:
                 headers['Content-Type'] = fulfillment.content_type
 
-        return Response(response=content, status=status_code, headers=headers)
+        # If the content is being streamed from a remote server, pass
+        # each chunk straight through to the client.
+        return Response(
+            response=content, status=status_code, headers=headers,
+            direct_passthrough=not isinstance(content, basestring)
+        )
 
     def can_fulfill_without_loan(self, library, patron, pool, lpdm):
         """Is it acceptable to fulfill the given LicensePoolDeliveryMechanism
@@ -1782,7 +1805,12 @@ class LoanController(CirculationManagerController):
 
         work = pool.work
         annotator = self.manager.annotator(None)
-        return AcquisitionFeed.single_entry(self._db, work, annotator)
+        metrics = self.circulation.metrics
+        operation = "revoke_loan" if loan else "release_hold"
+        with metrics.timer(
+            operation, self.circulation.api_name_for(pool), metrics.ANNOTATION
+        ):
+            return AcquisitionFeed.single_entry(self._db, work, annotator)
 
     def detail(self, identifier_type, identifier):
         if flask.request.method=='DELETE':
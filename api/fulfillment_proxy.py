@@ -0,0 +1,152 @@
+import logging
+
+import requests
+
+from core.util.http import (
+    BadResponseException,
+    RemoteIntegrationException,
+)
+
+
+class FulfillmentProxy(object):
+    """Pass a book from a vendor's server through to a patron.
+
+    Some fulfillment links can't be handed to the client directly, so
+    the circulation manager has to fetch the book and serve it
+    itself. Books can be very large (an audiobook may be hundreds of
+    megabytes), so the content is never held in memory all at
+    once. Instead it's read from the vendor and written to the client
+    a chunk at a time.
+
+    Range and conditional-request headers sent by the client are
+    forwarded to the vendor, so clients can resume interrupted
+    downloads.
+    """
+
+    # The number of bytes read from the vendor at a time. This is the
+    # most content that will be held in memory for one fulfillment.
+    CHUNK_SIZE = 64 * 1024
+
+    # No matter how the proxy is configured, it won't buffer more
+    # than this.
+    MAX_CHUNK_SIZE = 1024 * 1024
+
+    # Seconds to wait for the vendor to accept a connection, and to
+    # wait for each chunk of content.
+    CONNECT_TIMEOUT = 10
+    READ_TIMEOUT = 60
+
+    # Client request headers that are passed on to the vendor.
+    REQUEST_HEADERS = [
+        "Range",
+        "If-Range",
+        "If-Match",
+        "If-None-Match",
+        "If-Modified-Since",
+        "If-Unmodified-Since",
+    ]
+
+    # Vendor response headers that are passed on to the client.
+    RESPONSE_HEADERS = [
+        "Content-Type",
+        "Content-Length",
+        "Content-Range",
+        "Content-Encoding",
+        "Content-Disposition",
+        "Accept-Ranges",
+        "ETag",
+        "Last-Modified",
+    ]
+
+    def __init__(self, request_headers=None, chunk_size=None):
+        """Constructor.
+
+        :param request_headers: The headers of the incoming client
+            request, e.g. flask.request.headers.
+        :param chunk_size: The number of bytes to read from the vendor
+            at a time.
+        """
+        self.request_headers = request_headers or {}
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        self.chunk_size = max(1, min(chunk_size, self.MAX_CHUNK_SIZE))
+        self.log = logging.getLogger("Fulfillment proxy")
+
+    def forwarded_headers(self):
+        """The client headers that should be sent on to the vendor."""
+        headers = {}
+        for name in self.REQUEST_HEADERS:
+            value = self.request_headers.get(name)
+            if value:
+                headers[name] = value
+        return headers
+
+    def get(self, url, headers=None):
+        """Start fetching a book.
+
+        This has the same signature as Representation.simple_http_get,
+        so it can be used in its place.
+
+        :param headers: Extra headers to send to the vendor.
+        :return: A 3-tuple (status code, headers, content). The
+            content is an iterator over chunks of the response body.
+        :raise BadResponseException: If the vendor had a server
+            error, just as Representation.simple_http_get would.
+        """
+        request_headers = self.forwarded_headers()
+        request_headers.update(headers or {})
+        try:
+            response = self._request(url, request_headers)
+        except requests.exceptions.RequestException, e:
+            raise RemoteIntegrationException(url, e.message)
+
+        if response.status_code // 100 == 5:
+            # Don't pass the vendor's error page on to the client as
+            # if it were the book.
+            response.close()
+            raise BadResponseException(
+                url,
+                "Got status code %s from external server, cannot continue." % (
+                    response.status_code
+                )
+            )
+
+        response_headers = {}
+        for name in self.RESPONSE_HEADERS:
+            value = response.headers.get(name)
+            if value:
+                response_headers[name] = value
+        return (
+            response.status_code, response_headers, self.chunks(url, response)
+        )
+
+    def _request(self, url, headers):
+        return requests.get(
+            url, headers=headers, stream=True, allow_redirects=True,
+            timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT)
+        )
+
+    def chunks(self, url, response):
+        """Yield the body of a vendor response a chunk at a time.
+
+        The body is passed through exactly as the vendor sent it --
+        if it was compressed, it stays compressed, so the
+        Content-Length and Content-Encoding headers remain accurate.
+
+        The connection to the vendor is closed when the content runs
+        out or when the client goes away.
+        """
+        try:
+            for chunk in response.raw.stream(
+                self.chunk_size, decode_content=False
+            ):
+                yield chunk
+        except Exception, e:
+            # The headers have already been sent, so the only way to
+            # tell the client is to stop sending content.
+            self.log.error(
+                "Error proxying fulfillment content from %s: %s", url, e,
+                exc_info=e
+            )
+            raise
+        finally:
+            response.close()
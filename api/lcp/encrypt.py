@@ -3,7 +3,9 @@ import logging
 import os
 import re
 import subprocess
+import time
 from json import JSONEncoder
+from multiprocessing.pool import ThreadPool
 
 from flask_babel import lazy_gettext as _
 
@@ -21,6 +23,7 @@ class LCPEncryptionConfiguration(ConfigurationGrouping):
 
     DEFAULT_LCPENCRYPT_LOCATION = '/go/bin/lcpencrypt'
     DEFAULT_LCPENCRYPT_DOCKER_IMAGE = 'readium/lcpencrypt'
+    DEFAULT_LCPENCRYPT_MAX_PROCESSES = 4
 
     lcpencrypt_location = ConfigurationMetadata(
         key='lcpencrypt_location',
@@ -46,6 +49,20 @@ class LCPEncryptionConfiguration(ConfigurationGrouping):
         required=False
     )
 
+    lcpencrypt_max_processes = ConfigurationMetadata(
+        key='lcpencrypt_max_processes',
+        label=_('Maximum number of lcpencrypt processes'),
+        description=_(
+            'Maximum number of books encrypted at the same time when books are imported in batches. '
+            'The default value is {0}'.format(
+                DEFAULT_LCPENCRYPT_MAX_PROCESSES
+            )
+        ),
+        type=ConfigurationAttributeType.NUMBER,
+        required=False,
+        default=DEFAULT_LCPENCRYPT_MAX_PROCESSES
+    )
+
 
 class LCPEncryptionResult(object):
     """Represents an output sent by lcpencrypt"""
@@ -361,6 +378,8 @@ class LCPEncryptor(object):
 
     OUTPUT_REGEX = re.compile(r'(\{.+\})?(.+)', re.DOTALL)
 
+    MAX_LCPENCRYPT_PROCESSES = 32
+
     def __init__(self, configuration_storage, configuration_factory):
         """Initializes a new instance of LCPEncryptor class
 
@@ -423,29 +442,31 @@ class LCPEncryptor(object):
 
         return result
 
-    def _run_lcpencrypt_locally(self, file_path, identifier, configuration):
-        """Runs lcpencrypt using a local binary
-
-        :param file_path: File path to the book to be encrypted
-        :type file_path: string
-
-        :param identifier: Book's identifier
-        :type identifier: string
+    def _get_max_processes(self, configuration):
+        """Returns the maximum number of lcpencrypt processes which can run at the same time
 
         :param configuration: LCPEncryptionConfiguration instance
         :type configuration: instance
 
-        :return: Encryption result
-        :rtype: LCPEncryptionResult
+        :return: Maximum number of lcpencrypt processes
+        :rtype: int
         """
-        self._logger.info(
-            'Started running a local lcpencrypt binary. File path: {0}. Identifier: {1}'.format(
-                file_path, identifier
-            )
-        )
+        try:
+            max_processes = int(configuration.lcpencrypt_max_processes)
+        except (TypeError, ValueError):
+            max_processes = LCPEncryptionConfiguration.DEFAULT_LCPENCRYPT_MAX_PROCESSES
 
-        parameters = LCPEncryptor.Parameters(file_path, identifier, configuration)
+        return max(1, min(max_processes, self.MAX_LCPENCRYPT_PROCESSES))
 
+    def _run_lcpencrypt(self, parameters):
+        """Runs a local lcpencrypt binary using the specified parameters
+
+        :param parameters: lcpencrypt's parameters
+        :type parameters: LCPEncryptor.Parameters
+
+        :return: Encryption result
+        :rtype: LCPEncryptionResult
+        """
         try:
             if parameters.output_file_path:
                 self._logger.info('Creating a directory tree for {0}'.format(parameters.output_file_path))
@@ -453,7 +474,12 @@ class LCPEncryptor(object):
                 output_directory = os.path.dirname(parameters.output_file_path)
 
                 if not os.path.exists(output_directory):
-                    os.makedirs(output_directory)
+                    try:
+                        os.makedirs(output_directory)
+                    except OSError:
+                        # Another lcpencrypt process could have created the same directory
+                        if not os.path.isdir(output_directory):
+                            raise
 
                 self._logger.info('Directory tree {0} has been successfully created'.format(output_directory))
 
@@ -466,6 +492,51 @@ class LCPEncryptor(object):
 
             raise LCPEncryptionException(exception.message, inner_exception=exception)
 
+        return result
+
+    def _try_to_run_lcpencrypt(self, parameters):
+        """Runs a local lcpencrypt binary without raising exceptions
+
+        :param parameters: lcpencrypt's parameters
+        :type parameters: LCPEncryptor.Parameters
+
+        :return: 3-tuple containing the encryption result (if any),
+            the exception raised during encryption (if any) and the number of seconds it took
+        :rtype: Tuple[Optional[LCPEncryptionResult], Optional[LCPEncryptionException], float]
+        """
+        start = time.time()
+
+        try:
+            result = self._run_lcpencrypt(parameters)
+
+            return result, None, time.time() - start
+        except LCPEncryptionException as exception:
+            return None, exception, time.time() - start
+
+    def _run_lcpencrypt_locally(self, file_path, identifier, configuration):
+        """Runs lcpencrypt using a local binary
+
+        :param file_path: File path to the book to be encrypted
+        :type file_path: string
+
+        :param identifier: Book's identifier
+        :type identifier: string
+
+        :param configuration: LCPEncryptionConfiguration instance
+        :type configuration: instance
+
+        :return: Encryption result
+        :rtype: LCPEncryptionResult
+        """
+        self._logger.info(
+            'Started running a local lcpencrypt binary. File path: {0}. Identifier: {1}'.format(
+                file_path, identifier
+            )
+        )
+
+        parameters = LCPEncryptor.Parameters(file_path, identifier, configuration)
+        result = self._run_lcpencrypt(parameters)
+
         self._logger.info(
             'Finished running a local lcpencrypt binary. File path: {0}. Identifier: {1}. Result: {2}'.format(
                 file_path, identifier, result
@@ -497,3 +568,51 @@ class LCPEncryptor(object):
                 return result
             else:
                 raise NotImplementedError()
+
+    def encrypt_books(self, db, books):
+        """Encrypts a batch of books running up to lcpencrypt_max_processes lcpencrypt processes at the same time
+
+        A failure to encrypt one book doesn't stop encryption of the others.
+
+        :param db: Database session
+        :type db: sqlalchemy.orm.session.Session
+
+        :param books: List of 2-tuples containing file paths to the books to be encrypted and books' identifiers
+        :type books: List[Tuple[string, string]]
+
+        :return: List of 3-tuples containing the encryption result (if any),
+            the exception raised during encryption (if any) and the number of seconds it took
+            in the same order as the books
+        :rtype: List[Tuple[Optional[LCPEncryptionResult], Optional[LCPEncryptionException], float]]
+        """
+        if not books:
+            return []
+
+        # Configuration settings are read from the database
+        # so they must be loaded before starting lcpencrypt processes in separate threads
+        with self._configuration_factory.create(
+                self._configuration_storage, db, LCPEncryptionConfiguration) as configuration:
+            if not self._lcpencrypt_exists_locally(configuration):
+                raise NotImplementedError()
+
+            parameters = [
+                LCPEncryptor.Parameters(file_path, identifier, configuration)
+                for file_path, identifier in books
+            ]
+            max_processes = min(self._get_max_processes(configuration), len(books))
+
+        self._logger.info(
+            'Started encrypting {0} books using {1} lcpencrypt processes'.format(len(books), max_processes))
+
+        pool = ThreadPool(max_processes)
+
+        try:
+            results = pool.map(self._try_to_run_lcpencrypt, parameters)
+        finally:
+            pool.terminate()
+
+        self._logger.info(
+            'Finished encrypting {0} books. Failures: {1}'.format(
+                len(books), len([result for result in results if result[1] is not None])))
+
+        return results
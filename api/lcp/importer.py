@@ -1,3 +1,71 @@
+import logging
+
+
+class LCPImportResult(object):
+    """Contains the result of importing a single book as a part of a batch"""
+
+    COPYING = 'copying'
+    ENCRYPTION = 'encryption'
+    REGISTRATION = 'registration'
+
+    def __init__(self, file_path, identifier):
+        """Initializes a new instance of LCPImportResult class
+
+        :param file_path: File path to the book to be encrypted
+        :type file_path: string
+
+        :param identifier: Book's identifier
+        :type identifier: string
+        """
+        self._file_path = file_path
+        self._identifier = identifier
+        self.encryption_result = None
+        self.exception = None
+        self.timings = {}
+
+    @property
+    def file_path(self):
+        """Returns a file path to the book
+
+        :return: File path to the book
+        :rtype: string
+        """
+        return self._file_path
+
+    @property
+    def identifier(self):
+        """Returns a book's identifier
+
+        :return: Book's identifier
+        :rtype: string
+        """
+        return self._identifier
+
+    @property
+    def succeeded(self):
+        """Returns a Boolean value indicating whether the book was successfully imported
+
+        :return: Boolean value indicating whether the book was successfully imported
+        :rtype: bool
+        """
+        return self.exception is None
+
+    def __repr__(self):
+        """Returns a string representation of a LCPImportResult object
+
+        :return: string representation of a LCPImportResult object
+        :rtype: string
+        """
+        return '<LCPImportResult(identifier={0}, succeeded={1}, timings={2})>'.format(
+            self.identifier,
+            self.succeeded,
+            ', '.join(
+                '{0}: {1:.2f}s'.format(stage, seconds)
+                for stage, seconds in sorted(self.timings.items())
+            )
+        )
+
+
 class LCPImporter(object):
     """Class implementing LCP import workflow"""
 
@@ -12,6 +80,7 @@ class LCPImporter(object):
         """
         self._lcp_encryptor = lcp_encryptor
         self._lcp_server = lcp_server
+        self._logger = logging.getLogger(__name__)
 
     def import_book(self, db, file_path, identifier):
         """Encrypts a book and sends a notification to the LCP server
@@ -30,3 +99,39 @@ class LCPImporter(object):
         """
         encrypted_content = self._lcp_encryptor.encrypt(db, file_path, identifier)
         self._lcp_server.add_content(db, encrypted_content)
+
+    def import_books(self, db, books):
+        """Encrypts a batch of books in parallel and sends notifications about them to the LCP server
+
+        Books which failed to be encrypted or registered don't stop the import of the others,
+        they are reported in the results so that they can be imported again later.
+
+        :param db: Database session
+        :type db: sqlalchemy.orm.session.Session
+
+        :param books: List of 2-tuples containing file paths to the books to be encrypted and books' identifiers
+        :type books: List[Tuple[string, string]]
+
+        :return: List of import results in the same order as the books
+        :rtype: List[LCPImportResult]
+        """
+        results = [LCPImportResult(file_path, identifier) for file_path, identifier in books]
+        encryption_results = self._lcp_encryptor.encrypt_books(db, books)
+
+        for result, (encryption_result, exception, seconds) in zip(results, encryption_results):
+            result.encryption_result = encryption_result
+            result.exception = exception
+            result.timings[LCPImportResult.ENCRYPTION] = seconds
+
+        encrypted_results = [result for result in results if result.succeeded]
+        registration_results = self._lcp_server.add_contents(
+            db, [result.encryption_result for result in encrypted_results])
+
+        for result, (exception, seconds) in zip(encrypted_results, registration_results):
+            result.exception = exception
+            result.timings[LCPImportResult.REGISTRATION] = seconds
+
+        for result in results:
+            self._logger.info('Imported book {0}'.format(result))
+
+        return results
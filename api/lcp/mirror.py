@@ -1,11 +1,15 @@
+import logging
+import os
+import shutil
 import tempfile
+import time
 
 from flask_babel import lazy_gettext as _
 from sqlalchemy.orm import Session
 
 from api.lcp.encrypt import LCPEncryptor
 from api.lcp.hash import HasherFactory
-from api.lcp.importer import LCPImporter
+from api.lcp.importer import LCPImporter, LCPImportResult
 from api.lcp.server import LCPServer
 from core.lcp.credential import LCPCredentialFactory
 from core.mirror import MirrorUploader
@@ -47,6 +51,9 @@ class LCPMirror(MinIOUploader, HasExternalIntegrationPerCollection):
         LCPMirrorConfiguration.endpoint_url.to_settings()
     ]
 
+    # Number of bytes copied from the book's representation to a temporary file at a time
+    CHUNK_SIZE = 1024 * 1024
+
     def __init__(self, integration):
         """Initializes a new instance of LCPMirror class
 
@@ -56,6 +63,7 @@ class LCPMirror(MinIOUploader, HasExternalIntegrationPerCollection):
         super(LCPMirror, self).__init__(integration)
 
         self._lcp_importer_instance = None
+        self._logger = logging.getLogger(__name__)
 
     def _create_lcp_importer(self, collection):
         """Creates a new instance of LCPImporter
@@ -118,6 +126,52 @@ class LCPMirror(MinIOUploader, HasExternalIntegrationPerCollection):
     def marc_file_url(self, library, lane, end_time, start_time=None):
         raise NotImplementedError()
 
+    def _get_identifier(self, mirror_to):
+        """Returns the book's identifier from its mirror URL
+
+        :param mirror_to: Mirror URL
+        :type mirror_to: string
+
+        :return: Book's identifier
+        :rtype: string
+        """
+        bucket = self.get_bucket(S3UploaderConfiguration.PROTECTED_CONTENT_BUCKET_KEY)
+        content_root = self.content_root(bucket)
+
+        return mirror_to.replace(content_root, '')
+
+    def _copy_content(self, representation, output_file):
+        """Copies unencrypted book's content to a file without loading it into memory at once
+
+        :param representation: Book's representation
+        :type representation: Representation
+
+        :param output_file: File object
+        :type output_file: file
+        """
+        content_file = representation.content_fh()
+
+        try:
+            shutil.copyfileobj(content_file, output_file, self.CHUNK_SIZE)
+        finally:
+            content_file.close()
+
+        output_file.flush()
+
+    @staticmethod
+    def _remove_content(db, representation):
+        """Removes unencrypted content from the database
+
+        :param db: Database session
+        :type db: sqlalchemy.orm.session.Session
+
+        :param representation: Book's representation
+        :type representation: Representation
+        """
+        transaction = db.begin_nested()
+        representation.content = None
+        transaction.commit()
+
     def mirror_one(self, representation, mirror_to, collection=None):
         """Uploads an encrypted book to the encrypted_repository via LCP License Server
 
@@ -131,15 +185,12 @@ class LCPMirror(MinIOUploader, HasExternalIntegrationPerCollection):
         :type collection: Optional[Collection]
         """
         db = Session.object_session(representation)
-        bucket = self.get_bucket(S3UploaderConfiguration.PROTECTED_CONTENT_BUCKET_KEY)
-        content_root = self.content_root(bucket)
-        identifier = mirror_to.replace(content_root, '')
+        identifier = self._get_identifier(mirror_to)
         lcp_importer = self._create_lcp_importer(collection)
 
         # First, we need to copy unencrypted book's content to a temporary file
         with tempfile.NamedTemporaryFile(suffix=representation.extension(representation.media_type)) as temporary_file:
-            temporary_file.write(representation.content_fh().read())
-            temporary_file.flush()
+            self._copy_content(representation, temporary_file)
 
             # Secondly, we execute import:
             # 1. Encrypt the temporary file containing the unencrypted book using lcpencrypt
@@ -149,9 +200,94 @@ class LCPMirror(MinIOUploader, HasExternalIntegrationPerCollection):
             lcp_importer.import_book(db, temporary_file.name, identifier)
 
         # Thirdly, we remove unencrypted content from the database
-        transaction = db.begin_nested()
-        representation.content = None
-        transaction.commit()
+        self._remove_content(db, representation)
+
+    def mirror_batch(self, representations, mirror_urls=None, collection=None):
+        """Uploads a batch of encrypted books to the encrypted_repository via LCP License Server
+
+        Books are encrypted by several lcpencrypt processes at the same time.
+        A book which failed to be copied, encrypted or registered doesn't stop the import of the others.
+        Unencrypted content is removed only from the books which were successfully imported,
+        so calling this method again with the same representations resumes the import
+        skipping the books which have already been imported.
+
+        :param representations: List of books' representations
+        :type representations: List[Representation]
+
+        :param mirror_urls: List of mirror URLs in the same order as the representations,
+            by default representations' own mirror URLs are used
+        :type mirror_urls: Optional[List[string]]
+
+        :param collection: Collection
+        :type collection: Optional[Collection]
+
+        :return: List of import results
+        :rtype: List[LCPImportResult]
+        """
+        if mirror_urls is None:
+            mirror_urls = [representation.mirror_url for representation in representations]
+
+        books = [
+            (representation, mirror_to)
+            for representation, mirror_to in zip(representations, mirror_urls)
+            if representation.content or representation.local_path
+        ]
+
+        if not books:
+            return []
+
+        db = Session.object_session(books[0][0])
+        lcp_importer = self._create_lcp_importer(collection)
+        temporary_directory = tempfile.mkdtemp()
+        results = []
+
+        try:
+            # First, we need to copy unencrypted books' content to temporary files
+            for index, (representation, mirror_to) in enumerate(books):
+                file_path = os.path.join(
+                    temporary_directory, str(index) + representation.extension(representation.media_type))
+                result = LCPImportResult(file_path, None)
+                start = time.time()
+
+                try:
+                    result = LCPImportResult(file_path, self._get_identifier(mirror_to))
+
+                    with open(file_path, 'wb') as temporary_file:
+                        self._copy_content(representation, temporary_file)
+                except Exception as exception:
+                    self._logger.exception('Failed to copy book {0} to a temporary file'.format(mirror_to))
+
+                    result.exception = exception
+
+                result.timings[LCPImportResult.COPYING] = time.time() - start
+                results.append(result)
+
+            # Secondly, we encrypt the copied books and send them to the LCP License Server
+            copied_results = [result for result in results if result.succeeded]
+            import_results = lcp_importer.import_books(
+                db, [(result.file_path, result.identifier) for result in copied_results]) if copied_results else []
+
+            for result, import_result in zip(copied_results, import_results):
+                result.encryption_result = import_result.encryption_result
+                result.exception = import_result.exception
+                result.timings.update(import_result.timings)
+        finally:
+            shutil.rmtree(temporary_directory)
+
+        # Thirdly, we remove unencrypted content of the imported books from the database
+        for (representation, mirror_to), result in zip(books, results):
+            if result.succeeded:
+                self._remove_content(db, representation)
+            else:
+                self._logger.error(
+                    'Failed to import book {0}, it will be imported again next time: {1}'.format(
+                        mirror_to, result.exception))
+
+        self._logger.info(
+            'Finished importing {0} books. Failures: {1}'.format(
+                len(results), len([result for result in results if not result.succeeded])))
+
+        return results
 
     def do_upload(self, representation):
         raise NotImplementedError()
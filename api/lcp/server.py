@@ -1,5 +1,7 @@
 import json
+import logging
 import os
+import time
 import urlparse
 
 import requests
@@ -134,6 +136,8 @@ class LCPServer(object):
         self._credential_factory = credential_factory
         self._hasher_instance = None
 
+        self._logger = logging.getLogger(__name__)
+
     def _get_hasher(self, configuration):
         """Returns a Hasher instance
 
@@ -205,7 +209,7 @@ class LCPServer(object):
         return partial_license
 
     @staticmethod
-    def _send_request(configuration, method, path, payload, json_encoder=None):
+    def _send_request(configuration, method, path, payload, json_encoder=None, session=None):
         """Sends a request to the LCP License Server
 
         :param configuration: Configuration object
@@ -220,12 +224,15 @@ class LCPServer(object):
         :param json_encoder: JSON encoder
         :type json_encoder: JSONEncoder
 
+        :param session: HTTP session used to reuse connections between requests
+        :type session: Optional[requests.Session]
+
         :return: Dictionary containing LCP License Server's response
         :rtype: Dict
         """
         json_payload = json.dumps(payload, cls=json_encoder)
         url = urlparse.urljoin(configuration.lcpserver_url, path)
-        response = requests.request(
+        response = (session or requests).request(
             method,
             url,
             data=json_payload,
@@ -240,6 +247,33 @@ class LCPServer(object):
 
         return response
 
+    def _add_content(self, configuration, encrypted_content, session=None):
+        """Notifies LCP License Server about new encrypted content
+
+        :param configuration: Configuration object
+        :type configuration: LCPServerConfiguration
+
+        :param encrypted_content: LCPEncryptionResult object containing information about encrypted content
+        :type encrypted_content: LCPEncryptionResult
+
+        :param session: HTTP session used to reuse connections between requests
+        :type session: Optional[requests.Session]
+        """
+        content_location = os.path.join(
+            configuration.lcpserver_input_directory, encrypted_content.protected_content_disposition)
+        payload = LCPEncryptionResult(
+            content_id=encrypted_content.content_id,
+            content_encryption_key=encrypted_content.content_encryption_key,
+            protected_content_location=content_location,
+            protected_content_disposition=encrypted_content.protected_content_disposition,
+            protected_content_type=encrypted_content.protected_content_type,
+            protected_content_length=encrypted_content.protected_content_length,
+            protected_content_sha256=encrypted_content.protected_content_sha256
+        )
+        path = '/contents/{0}'.format(encrypted_content.content_id)
+
+        self._send_request(configuration, 'put', path, payload, LCPEncryptorResultJSONEncoder, session)
+
     def add_content(self, db, encrypted_content):
         """Notifies LCP License Server about new encrypted content
 
@@ -251,20 +285,47 @@ class LCPServer(object):
         """
         with self._configuration_factory.create(
                 self._configuration_storage, db, LCPServerConfiguration) as configuration:
-            content_location = os.path.join(
-                configuration.lcpserver_input_directory, encrypted_content.protected_content_disposition)
-            payload = LCPEncryptionResult(
-                content_id=encrypted_content.content_id,
-                content_encryption_key=encrypted_content.content_encryption_key,
-                protected_content_location=content_location,
-                protected_content_disposition=encrypted_content.protected_content_disposition,
-                protected_content_type=encrypted_content.protected_content_type,
-                protected_content_length=encrypted_content.protected_content_length,
-                protected_content_sha256=encrypted_content.protected_content_sha256
-            )
-            path = '/contents/{0}'.format(encrypted_content.content_id)
+            self._add_content(configuration, encrypted_content)
+
+    def add_contents(self, db, encrypted_contents):
+        """Notifies LCP License Server about a batch of new encrypted content
+
+        The configuration is loaded once and all the requests share the same HTTP connection.
+        A failure to register one item doesn't stop registration of the others.
+
+        :param db: Database session
+        :type db: sqlalchemy.orm.session.Session
+
+        :param encrypted_contents: List of LCPEncryptionResult objects containing information about encrypted content
+        :type encrypted_contents: List[LCPEncryptionResult]
+
+        :return: List of 2-tuples containing the exception raised during registration (if any)
+            and the number of seconds it took in the same order as the encrypted content
+        :rtype: List[Tuple[Optional[Exception], float]]
+        """
+        results = []
+
+        if not encrypted_contents:
+            return results
+
+        with self._configuration_factory.create(
+                self._configuration_storage, db, LCPServerConfiguration) as configuration:
+            with requests.Session() as session:
+                for encrypted_content in encrypted_contents:
+                    start = time.time()
+
+                    try:
+                        self._add_content(configuration, encrypted_content, session)
+
+                        results.append((None, time.time() - start))
+                    except Exception as exception:
+                        self._logger.exception(
+                            'An unhandled exception occurred during adding content {0} to the LCP License Server'.format(
+                                encrypted_content.content_id))
+
+                        results.append((exception, time.time() - start))
 
-            self._send_request(configuration, 'put', path, payload, LCPEncryptorResultJSONEncoder)
+        return results
 
     def generate_license(self, db, content_id, patron, license_start, license_end):
         """Generates a new LCP license
@@ -27,24 +27,58 @@ from core.model import (
 class LocalAnalyticsExporter(object):
     """Export large numbers of analytics events in CSV format."""
 
+    # The number of rows fetched from the database, and written out
+    # as CSV, at a time.
+    BATCH_SIZE = 1000
+
+    HEADER = [
+        "time", "event", "identifier", "identifier_type", "title", "author",
+        "fiction", "audience", "publisher", "imprint", "language",
+        "target_age", "genres", "location"
+    ]
+
     def export(self, _db, start, end, locations=None, library=None):
+        """Export analytics events as a single CSV document.
+
+        :return: A bytestring.
+        """
+        return b"".join(
+            self.export_iter(_db, start, end, locations, library)
+        )
+
+    def export_iter(self, _db, start, end, locations=None, library=None,
+                    batch_size=None):
+        """Export analytics events as CSV, a batch of rows at a time.
 
-        # Get the results from the database.
+        Rows are read through a server-side cursor, so neither the
+        query results nor the CSV document are ever held in memory all
+        at once.
+
+        :return: An iterator over bytestrings which, concatenated,
+            make up the CSV document.
+        """
+        batch_size = batch_size or self.BATCH_SIZE
         query = self.analytics_query(start, end, locations, library)
-        results = _db.execute(query)
+        results = _db.execute(
+            query.execution_options(stream_results=True)
+        )
 
-        # Write the CSV file to a BytesIO.
-        header = [
-            "time", "event", "identifier", "identifier_type", "title", "author",
-            "fiction", "audience", "publisher", "imprint", "language",
-            "target_age", "genres", "location"
-        ]
         output = BytesIO()
         writer = csv.writer(output, encoding="utf-8")
-        writer.writerow(header)
-        writer.writerows(results)
-
-        return output.getvalue()
+        writer.writerow(self.HEADER)
+        try:
+            while True:
+                rows = results.fetchmany(batch_size)
+                if rows:
+                    writer.writerows(rows)
+                if output.tell():
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+                if not rows:
+                    break
+        finally:
+            results.close()
 
     def analytics_query(self, start, end,  locations=None, library=None):
         """Build a database query that fetches rows of analytics data.
@@ -1,4 +1,9 @@
 from pymarc import Field
+import datetime
+import json
+import logging
+import os
+import shutil
 import urllib
 
 from core.config import Configuration
@@ -11,6 +16,22 @@ from core.model import (
     Session,
 )
 
+
+class MARCExportSettings(object):
+    """A library's settings for a MARC export integration.
+
+    These are looked up once, when an export starts, instead of once
+    for every record.
+    """
+
+    def __init__(self, marc_org=None, include_summary=False,
+                 include_genres=False, web_client_urls=None):
+        self.marc_org = marc_org
+        self.include_summary = include_summary
+        self.include_genres = include_genres
+        self.web_client_urls = web_client_urls or []
+
+
 class LibraryAnnotator(Annotator):
     def __init__(self, library):
         super(LibraryAnnotator, self).__init__()
@@ -18,34 +39,66 @@ class LibraryAnnotator(Annotator):
         _db = Session.object_session(library)
         self.base_url = ConfigurationSetting.sitewide(_db, Configuration.BASE_URL_KEY).value
 
+        # MARCExportSettings for each integration this annotator has
+        # been used with, keyed by integration ID.
+        self._settings = {}
+
     def value(self, key, integration):
         _db = Session.object_session(integration)
         return ConfigurationSetting.for_library_and_externalintegration(
             _db, key, self.library, integration).value
 
+    def settings(self, integration=None):
+        """Get the library's MARCExportSettings for an integration.
+
+        The settings are only looked up the first time they're needed,
+        so an annotator should be created for each export run.
+        """
+        key = integration.id if integration else None
+        if key not in self._settings:
+            self._settings[key] = self.load_settings(integration)
+        return self._settings[key]
+
+    def load_settings(self, integration=None):
+        """Look up the library's MARCExportSettings for an integration."""
+        if not integration:
+            return MARCExportSettings(
+                web_client_urls=self.web_client_urls(self.library)
+            )
+        return MARCExportSettings(
+            marc_org=self.value(MARCExporter.MARC_ORGANIZATION_CODE, integration),
+            include_summary=(self.value(MARCExporter.INCLUDE_SUMMARY, integration) == "true"),
+            include_genres=(self.value(MARCExporter.INCLUDE_SIMPLIFIED_GENRES, integration) == "true"),
+            web_client_urls=self.web_client_urls(self.library, integration),
+        )
 
     def annotate_work_record(self, work, active_license_pool, edition,
                              identifier, record, integration=None, updated=None):
         super(LibraryAnnotator, self).annotate_work_record(
             work, active_license_pool, edition, identifier, record, integration, updated)
 
+        settings = self.settings(integration)
         if integration:
-            marc_org = self.value(MARCExporter.MARC_ORGANIZATION_CODE, integration)
-            include_summary = (self.value(MARCExporter.INCLUDE_SUMMARY, integration) == "true")
-            include_genres = (self.value(MARCExporter.INCLUDE_SIMPLIFIED_GENRES, integration) == "true")
+            if settings.marc_org:
+                self.add_marc_organization_code(record, settings.marc_org)
 
-            if marc_org:
-                self.add_marc_organization_code(record, marc_org)
-
-            if include_summary:
+            if settings.include_summary:
                 self.add_summary(record, work)
 
-            if include_genres:
+            if settings.include_genres:
                 self.add_simplified_genres(record, work)
 
-        self.add_web_client_urls(record, self.library, identifier, integration)
+        self.add_web_client_urls(
+            record, self.library, identifier, integration,
+            web_client_urls=settings.web_client_urls
+        )
+
+    def web_client_urls(self, library, integration=None):
+        """Find the base URLs of the web clients a record should link to.
 
-    def add_web_client_urls(self, record, library, identifier, integration=None):
+        These can come from the MARC export integration or from the
+        library's registrations with library registries.
+        """
         _db = Session.object_session(library)
         settings = []
 
@@ -61,10 +114,21 @@ class LibraryAnnotator(Annotator):
             ConfigurationSetting.key==Registration.LIBRARY_REGISTRATION_WEB_CLIENT,
             ConfigurationSetting.library_id==library.id
         ) if s.value]
+        return settings
+
+    def add_web_client_urls(self, record, library, identifier, integration=None,
+                            web_client_urls=None):
+        """Link a record to the book's page in each web client.
+
+        :param web_client_urls: The base URLs of the web clients. If
+            this is not provided, they will be looked up.
+        """
+        if web_client_urls is None:
+            web_client_urls = self.web_client_urls(library, integration)
 
         qualified_identifier = urllib.quote(identifier.type + "/" + identifier.identifier, safe='')
 
-        for web_client_base_url in settings:
+        for web_client_base_url in web_client_urls:
             link = "{}/{}/works/{}".format(
                 self.base_url,
                 library.short_name,
@@ -81,3 +145,100 @@ class LibraryAnnotator(Annotator):
                     indicators=["4", "0"],
                     subfields=["u", url],
                 ))
+
+
+class MARCFileCheckpoint(object):
+    """Keep track of a MARC file that's being generated in shards.
+
+    The works in the file are divided into shards, and the records
+    for each shard are written to a file in the checkpoint directory
+    as soon as they're ready. If the process is interrupted, the next
+    run picks up the same shards and only generates the ones that
+    weren't finished.
+    """
+
+    MANIFEST = "manifest.json"
+    DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+    # A checkpoint older than this is thrown away, since the works in
+    # the lane have probably changed since it was created.
+    MAX_AGE = datetime.timedelta(days=1)
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.log = logging.getLogger("MARC file checkpoint")
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, self.MANIFEST)
+
+    def shard_path(self, index):
+        return os.path.join(self.directory, "shard-%05d.mrc" % index)
+
+    def load(self, now=None):
+        """Load an earlier run's progress.
+
+        :return: A 2-tuple (shards, end_time), where `shards` is a
+            list of lists of work IDs, or None if there's no usable
+            checkpoint.
+        """
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            end_time = datetime.datetime.strptime(
+                manifest["end_time"], self.DATE_FORMAT
+            )
+            shards = manifest["shards"]
+        except (IOError, ValueError, KeyError), e:
+            self.log.error(
+                "Ignoring unreadable checkpoint in %s: %s", self.directory, e
+            )
+            self.clear()
+            return None
+
+        now = now or datetime.datetime.utcnow()
+        if end_time < now - self.MAX_AGE:
+            self.log.info("Ignoring old checkpoint in %s", self.directory)
+            self.clear()
+            return None
+        return shards, end_time
+
+    def start(self, shards, end_time):
+        """Start keeping track of a new run.
+
+        :param shards: A list of lists of work IDs.
+        :param end_time: The time the MARC file will be considered
+            up to date as of.
+        """
+        self.clear()
+        os.makedirs(self.directory)
+        manifest = dict(
+            shards=shards, end_time=end_time.strftime(self.DATE_FORMAT)
+        )
+        self._write(self.manifest_path, json.dumps(manifest))
+
+    def is_finished(self, index):
+        return os.path.exists(self.shard_path(index))
+
+    def save_shard(self, index, content):
+        """Record the MARC records for a finished shard."""
+        self._write(self.shard_path(index), content)
+
+    def read_shard(self, index):
+        with open(self.shard_path(index), "rb") as f:
+            return f.read()
+
+    def clear(self):
+        """Throw away all progress."""
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+
+    def _write(self, path, content):
+        # Write to a temporary file and move it into place, so an
+        # interrupted write doesn't look like a finished shard.
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(content)
+        os.rename(temporary, path)
@@ -1,5 +1,6 @@
 import json
 import logging
+import time
 import urllib
 from collections import Counter
 from flask_babel import lazy_gettext as _
@@ -29,6 +30,7 @@ from core.model import (
     Representation,
     Session,
     Subject,
+    Work,
     get_one,
     Equivalency,
     LicensePool,
@@ -45,7 +47,11 @@ from sqlalchemy.sql import (
     or_,
 )
 from sqlalchemy.orm import aliased
-from core.util.http import HTTP
+from core.util.http import (
+    HTTP,
+    BadResponseException,
+    RemoteIntegrationException,
+)
 
 class NoveListAPI(object):
 
@@ -66,8 +72,9 @@ class NoveListAPI(object):
     # on the same circulation manager.
     SITEWIDE = False
 
-    IS_CONFIGURED = None
-    _configuration_library_id = None
+    # Whether NoveList is configured for each library, keyed by
+    # library ID.
+    _configured_by_library = {}
 
     log = logging.getLogger("NoveList API")
     version = "2.2"
@@ -85,6 +92,15 @@ class NoveListAPI(object):
     AUTH_PARAMS = "&profile=%(profile)s&password=%(password)s"
     MAX_REPRESENTATION_AGE = 7*24*60*60      # one week
 
+    # When a library's collection is sent to NoveList in batches, this
+    # many items are sent in each request.
+    DEFAULT_BATCH_SIZE = 1000
+
+    # A batch that fails is tried this many times before giving up,
+    # waiting a little longer (in seconds) after each failure.
+    MAX_UPLOAD_ATTEMPTS = 3
+    UPLOAD_RETRY_DELAY = 5
+
     currentQueryIdentifier = None
 
     medium_to_book_format_type_values = {
@@ -121,13 +137,19 @@ class NoveListAPI(object):
 
     @classmethod
     def is_configured(cls, library):
-        if (cls.IS_CONFIGURED is None or
-            library.id != cls._configuration_library_id
-        ):
+        configured = cls._configured_by_library.get(library.id)
+        if configured is None:
             profile, password = cls.values(library)
-            cls.IS_CONFIGURED = bool(profile and password)
-            cls._configuration_library_id = library.id
-        return cls.IS_CONFIGURED
+            configured = bool(profile and password)
+            cls._configured_by_library[library.id] = configured
+        return configured
+
+    @classmethod
+    def reset_configuration(cls):
+        """Forget which libraries have NoveList configured, so it's
+        looked up again.
+        """
+        cls._configured_by_library.clear()
 
     def __init__(self, _db, profile, password):
         self._db = _db
@@ -462,13 +484,18 @@ class NoveListAPI(object):
     def get_items_from_query(self, library):
         """Gets identifiers and its related title, medium, and authors from the
         database.
-        Keeps track of the current 'ISBN' identifier and current item object that
-        is being processed. If the next ISBN being processed is new, the existing one
-        gets added to the list of items. If the ISBN is the same, then we append
-        the Author property since there are multiple contributors.
 
         :return: a list of Novelist objects to send
         """
+        return list(self.iter_items(library))
+
+    def isbn_query(self, library, since=None):
+        """Build a query for the ISBNs in a library's collections, along
+        with the title, medium, contributors and distributor of each.
+
+        :param since: If this is provided, only books whose Work or
+            LicensePool has changed since this time are included.
+        """
         collectionList = []
         for c in library.collections:
             collectionList.append(c.id)
@@ -479,14 +506,13 @@ class NoveListAPI(object):
         roles = list(Contributor.AUTHOR_ROLES)
         roles.append(Contributor.NARRATOR_ROLE)
 
-        isbnQuery = select(
-            [i1.identifier, i1.type, i2.identifier,
-            Edition.title, Edition.medium, Edition.published,
-            Contribution.role, Contributor.sort_name,
-            DataSource.name],
-        ).select_from(
-            join(LicensePool, i1, i1.id==LicensePool.identifier_id)
-            .join(Equivalency, i1.id==Equivalency.input_id, LEFT_OUTER_JOIN)
+        source = join(LicensePool, i1, i1.id==LicensePool.identifier_id)
+        if since:
+            source = source.join(
+                Work, Work.id==LicensePool.work_id, LEFT_OUTER_JOIN
+            )
+        source = (
+            source.join(Equivalency, i1.id==Equivalency.input_id, LEFT_OUTER_JOIN)
             .join(i2, Equivalency.output_id==i2.id, LEFT_OUTER_JOIN)
             .join(
                 Edition,
@@ -495,17 +521,50 @@ class NoveListAPI(object):
             .join(Contribution, Edition.id==Contribution.edition_id)
             .join(Contributor, Contribution.contributor_id==Contributor.id)
             .join(DataSource, DataSource.id==LicensePool.data_source_id)
-        ).where(
-            and_(
-                LicensePool.collection_id.in_(collectionList),
-                or_(i1.type=="ISBN", i2.type=="ISBN"),
-                or_(Contribution.role.in_(roles))
+        )
+
+        clauses = [
+            LicensePool.collection_id.in_(collectionList),
+            or_(i1.type=="ISBN", i2.type=="ISBN"),
+            or_(Contribution.role.in_(roles))
+        ]
+        if since:
+            clauses.append(
+                or_(
+                    Work.last_update_time >= since,
+                    LicensePool.availability_time >= since,
+                )
             )
+
+        return select(
+            [i1.identifier, i1.type, i2.identifier,
+            Edition.title, Edition.medium, Edition.published,
+            Contribution.role, Contributor.sort_name,
+            DataSource.name],
+        ).select_from(source).where(
+            and_(*clauses)
         ).order_by(i1.identifier, i2.identifier)
 
-        result = self._db.execute(isbnQuery)
+    def iter_items(self, library, since=None):
+        """Yield Novelist objects for the books in a library's collections.
+
+        The query is read through a server-side cursor, and rows are
+        grouped into objects as they arrive, so the whole collection
+        never has to be held in memory.
+
+        Keeps track of the current 'ISBN' identifier and current item object that
+        is being processed. If the next ISBN being processed is new, the existing one
+        is yielded. If the ISBN is the same, then we append
+        the Author property since there are multiple contributors.
+
+        :param since: If this is provided, only books that have
+            changed since this time are included.
+        """
+        query = self.isbn_query(library, since)
+        result = self._db.connection().execution_options(
+            stream_results=True
+        ).execute(query)
 
-        items = []
         newItem = None
         existingItem = None
         currentIdentifier = None
@@ -514,24 +573,25 @@ class NoveListAPI(object):
         # previously processed object and the currently processed object because
         # the identifier could be the same. If it is, we update the data
         # object to send to Novelist.
-        for item in result:
-            if newItem:
-                existingItem = newItem
-            (currentIdentifier, existingItem, newItem, addItem) = (
-                self.create_item_object(item, currentIdentifier, existingItem)
-            )
+        try:
+            for item in result:
+                if newItem:
+                    existingItem = newItem
+                (currentIdentifier, existingItem, newItem, addItem) = (
+                    self.create_item_object(item, currentIdentifier, existingItem)
+                )
 
-            if addItem and existingItem:
-                # The Role property isn't needed in the actual request.
-                del existingItem['role']
-                items.append(existingItem)
+                if addItem and existingItem:
+                    # The Role property isn't needed in the actual request.
+                    del existingItem['role']
+                    yield existingItem
+        finally:
+            result.close()
 
         # For the case when there's only one item in `result`
         if newItem:
             del newItem['role']
-            items.append(newItem)
-
-        return items
+            yield newItem
 
     def create_item_object(self, object, currentIdentifier, existingItem):
         """Returns a new item if the current identifier that was processed
@@ -644,6 +704,70 @@ class NoveListAPI(object):
 
         return content
 
+    def put_items_novelist_in_batches(self, library, since=None,
+                                      batch_size=None):
+        """Send a library's books to NoveList in batches of a fixed size.
+
+        Unlike put_items_novelist, this never builds the whole
+        collection in memory or sends it in a single request.
+
+        :param since: If this is provided, only books that have
+            changed since this time are sent.
+        :return: A list containing NoveList's response to each batch.
+        :raise BadResponseException: If a batch can't be sent, even
+            after retrying.
+        """
+        batch_size = batch_size or self.DEFAULT_BATCH_SIZE
+        responses = []
+        batch = []
+        for item in self.iter_items(library, since):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                responses.append(self.put_batch(batch))
+                batch = []
+        if batch:
+            responses.append(self.put_batch(batch))
+        return responses
+
+    def put_batch(self, items):
+        """Send one batch of books to NoveList, retrying if NoveList
+        can't be reached or rejects the request.
+
+        :return: The parsed content of NoveList's response.
+        :raise BadResponseException: If every attempt failed.
+        """
+        data = json.dumps(self.make_novelist_data_object(items))
+        headers = {
+            "AuthorizedIdentifier": self.AUTHORIZED_IDENTIFIER,
+            "Content-Type": "application/json; charset=utf-8"
+        }
+        error = None
+        for attempt in range(1, self.MAX_UPLOAD_ATTEMPTS+1):
+            try:
+                response = self.put(
+                    self.COLLECTION_DATA_API, headers, data=data
+                )
+            except RemoteIntegrationException, e:
+                error = e.message
+            else:
+                if response.status_code == 200:
+                    self.log.info(
+                        "Sent %d items to NoveList: %r", len(items),
+                        response.content
+                    )
+                    return json.loads(response.content)
+                error = "Got status code %s from NoveList: %r" % (
+                    response.status_code, response.content
+                )
+            self.log.warn(
+                "Attempt %d of %d to send %d items to NoveList failed: %s",
+                attempt, self.MAX_UPLOAD_ATTEMPTS, len(items), error
+            )
+            if attempt < self.MAX_UPLOAD_ATTEMPTS:
+                time.sleep(self.UPLOAD_RETRY_DELAY * attempt)
+
+        raise BadResponseException(self.COLLECTION_DATA_API, error)
+
     def make_novelist_data_object(self, items):
         return {
             "customer": "%s:%s" % (self.profile, self.password),
@@ -1,5 +1,6 @@
 
 import base64
+import bisect
 import json
 import uuid
 import datetime
@@ -474,161 +475,35 @@ class ODLAPI(BaseCirculationAPI, BaseSharedCollectionAPI):
     def _count_holds_before(self, hold):
         # Count holds on the license pool that started before this hold and
         # aren't expired.
-        _db = Session.object_session(hold)
-        return _db.query(Hold).filter(
-            Hold.license_pool_id==hold.license_pool_id
-        ).filter(
-            Hold.start<hold.start
-        ).filter(
-            or_(
-                Hold.end==None,
-                Hold.end>datetime.datetime.utcnow(),
-                Hold.position>0,
-            )
-        ).count()
+        queue = ODLHoldQueue.for_pool(self, hold.license_pool)
+        return queue.holds_before(hold)
 
     def _update_hold_end_date(self, hold):
-        _db = Session.object_session(hold)
-        pool = hold.license_pool
-
-        # First make sure the hold position is up-to-date, since we'll
-        # need it to calculate the end date.
-        original_position = hold.position
-        self._update_hold_position(hold)
-
-        default_loan_period = self.collection(_db).default_loan_period(
-            hold.library or hold.integration_client
-        )
-        default_reservation_period = self.collection(_db).default_reservation_period
-
-        # If the hold was already to check out and already has an end date,
-        # it doesn't need an update.
-        if hold.position == 0 and original_position == 0 and hold.end:
-            return
-
-        # If the patron is in the queue, we need to estimate when the book
-        # will be available for check out. We can do slightly better than the
-        # default calculation since we know when all current loans will expire,
-        # but we're still calculating the worst case.
-        elif hold.position > 0:
-            # Find the current loans and reserved holds for the licenses.
-            current_loans = _db.query(Loan).filter(
-                Loan.license_pool_id==pool.id
-            ).filter(
-                or_(
-                    Loan.end==None,
-                    Loan.end>datetime.datetime.utcnow()
-                )
-            ).order_by(Loan.start).all()
-            current_holds = _db.query(Hold).filter(
-                Hold.license_pool_id==pool.id
-            ).filter(
-                or_(
-                    Hold.end==None,
-                    Hold.end>datetime.datetime.utcnow(),
-                    Hold.position>0,
-                )
-            ).order_by(Hold.start).all()
-            licenses_reserved = min(pool.licenses_owned - len(current_loans), len(current_holds))
-            current_reservations = current_holds[:licenses_reserved]
-
-            # The licenses will have to go through some number of cycles
-            # before one of them gets to this hold. This leavs out the first cycle -
-            # it's already started so we'll handle it separately.
-            cycles = (hold.position - licenses_reserved - 1) / pool.licenses_owned
-
-            # Each of the owned licenses is currently either on loan or reserved.
-            # Figure out which license this hold will eventually get if every
-            # patron keeps their loans and holds for the maximum time.
-            copy_index = (hold.position - licenses_reserved - 1)  % pool.licenses_owned
-
-            # In the worse case, the first cycle ends when a current loan expires, or
-            # after a current reservation is checked out and then expires.
-            if len(current_loans) > copy_index:
-                next_cycle_start = current_loans[copy_index].end
-            else:
-                reservation = current_reservations[copy_index - len(current_loans)]
-                next_cycle_start = reservation.end + datetime.timedelta(days=default_loan_period)
-
-            # Assume all cycles after the first cycle take the maximum time.
-            cycle_period = default_loan_period + default_reservation_period
-            hold.end = next_cycle_start + datetime.timedelta(days=(cycle_period * cycles))
-
-        # If the end date isn't set yet or the position just became 0, the
-        # hold just became available. The patron's reservation period starts now.
-        else:
-            hold.end = datetime.datetime.utcnow() + datetime.timedelta(days=default_reservation_period)
+        """Recalculate a hold's position and estimated end date."""
+        queue = ODLHoldQueue.for_pool(self, hold.license_pool)
+        queue.update_hold(hold)
 
     def _update_hold_position(self, hold):
-        _db = Session.object_session(hold)
-        pool = hold.license_pool
-        loans_count = _db.query(Loan).filter(
-            Loan.license_pool_id==pool.id,
-        ).filter(
-            or_(
-                Loan.end==None,
-                Loan.end > datetime.datetime.utcnow()
-            )
-        ).count()
-        holds_count = self._count_holds_before(hold)
-
-        remaining_licenses = pool.licenses_owned - loans_count
-
-        if remaining_licenses > holds_count:
-            # The hold is ready to check out.
-            hold.position = 0
-
-        else:
-            # Add 1 since position 0 indicates the hold is ready.
-            hold.position = holds_count + 1
+        queue = ODLHoldQueue.for_pool(self, hold.license_pool)
+        queue.update_hold_position(hold)
 
     def update_hold_queue(self, licensepool):
         # Update the pool and the next holds in the queue when a license is reserved.
-        _db = Session.object_session(licensepool)
-
-        loans_count = _db.query(Loan).filter(
-            Loan.license_pool_id==licensepool.id
-        ).filter(
-            or_(
-                Loan.end==None,
-                Loan.end>datetime.datetime.utcnow()
-            )
-        ).count()
-        remaining_licenses = licensepool.licenses_owned - loans_count
+        self.update_hold_queues([licensepool])
 
-        holds = _db.query(Hold).filter(
-            Hold.license_pool_id==licensepool.id
-        ).filter(
-            or_(
-                Hold.end==None,
-                Hold.end>datetime.datetime.utcnow(),
-                Hold.position>0,
-            )
-        ).order_by(
-            Hold.start
-        ).all()
+    def update_hold_queues(self, licensepools):
+        """Update availability information for a number of pools, along
+        with the holds that just got a reserved license.
 
-        if len(holds) > remaining_licenses:
-            new_licenses_available = 0
-            new_licenses_reserved = remaining_licenses
-            new_patrons_in_hold_queue = len(holds)
-        else:
-            new_licenses_available = remaining_licenses - len(holds)
-            new_licenses_reserved = len(holds)
-            new_patrons_in_hold_queue = len(holds)
-        licensepool.update_availability(
-            licensepool.licenses_owned,
-            new_licenses_available,
-            new_licenses_reserved,
-            new_patrons_in_hold_queue,
-            analytics=self.analytics,
-            as_of=datetime.datetime.utcnow(),
-        )
+        The loans and holds for all of the pools are loaded with two
+        queries, no matter how many pools there are.
 
-        for hold in holds[:licensepool.licenses_reserved]:
-            if hold.position != 0:
-                # This hold just got a reserved license.
-                self._update_hold_end_date(hold)
+        :return: The number of pools updated.
+        """
+        queues = ODLHoldQueue.for_pools(self, licensepools)
+        for queue in queues.values():
+            queue.update_pool()
+        return len(queues)
 
     def place_hold(self, patron, pin, licensepool, notification_email_address):
         """Create a new hold."""
@@ -712,9 +587,14 @@ class ODLAPI(BaseCirculationAPI, BaseSharedCollectionAPI):
                 _db.delete(hold)
                 self.update_hold_queue(hold.license_pool)
             else:
-                self._update_hold_end_date(hold)
                 remaining_holds.append(hold)
 
+        queues = ODLHoldQueue.for_pools(
+            self, [hold.license_pool for hold in remaining_holds]
+        )
+        for hold in remaining_holds:
+            queues[hold.license_pool_id].update_hold(hold)
+
         return [
             LoanInfo(
                 loan.license_pool.collection,
@@ -776,6 +656,197 @@ class ODLAPI(BaseCirculationAPI, BaseSharedCollectionAPI):
         return self._release_hold(hold)
 
 
+class ODLHoldQueue(object):
+    """The hold queue for one ODL LicensePool.
+
+    The pool's active loans and holds are loaded once, and every
+    position and estimated end date is calculated from them in memory.
+    Changes are made to the Hold objects and written to the database
+    together on the next flush.
+    """
+
+    def __init__(self, api, licensepool, loans, holds, now=None):
+        """Constructor.
+
+        :param api: An ODLAPI.
+        :param licensepool: A LicensePool.
+        :param loans: The pool's active Loans, ordered by start date.
+        :param holds: The pool's active Holds, ordered by start date.
+        """
+        self.api = api
+        self.licensepool = licensepool
+        self.loans = loans
+        self.holds = holds
+        self.now = now or datetime.datetime.utcnow()
+        self._hold_starts = [hold.start for hold in holds]
+        self._loan_periods = {}
+
+    @classmethod
+    def for_pool(cls, api, licensepool):
+        return cls.for_pools(api, [licensepool])[licensepool.id]
+
+    @classmethod
+    def for_pools(cls, api, licensepools):
+        """Load the hold queues for a number of pools at once.
+
+        :return: A dictionary mapping LicensePool ID to ODLHoldQueue.
+        """
+        pools = dict((pool.id, pool) for pool in licensepools)
+        if not pools:
+            return {}
+        _db = Session.object_session(pools.values()[0])
+        now = datetime.datetime.utcnow()
+
+        loans = defaultdict(list)
+        for loan in _db.query(Loan).filter(
+            Loan.license_pool_id.in_(pools.keys())
+        ).filter(
+            or_(
+                Loan.end==None,
+                Loan.end>now,
+            )
+        ).order_by(Loan.license_pool_id, Loan.start):
+            loans[loan.license_pool_id].append(loan)
+
+        holds = defaultdict(list)
+        for hold in _db.query(Hold).filter(
+            Hold.license_pool_id.in_(pools.keys())
+        ).filter(
+            or_(
+                Hold.end==None,
+                Hold.end>now,
+                Hold.position>0,
+            )
+        ).order_by(Hold.license_pool_id, Hold.start):
+            holds[hold.license_pool_id].append(hold)
+
+        return dict(
+            (pool_id, cls(api, pool, loans[pool_id], holds[pool_id], now))
+            for pool_id, pool in pools.items()
+        )
+
+    @property
+    def remaining_licenses(self):
+        """The number of licenses that aren't on loan."""
+        return self.licensepool.licenses_owned - len(self.loans)
+
+    def holds_before(self, hold):
+        """Count the active holds that started before this one."""
+        return bisect.bisect_left(self._hold_starts, hold.start)
+
+    def update_pool(self):
+        """Update the pool's availability, and the holds that have just
+        gotten a reserved license.
+        """
+        licensepool = self.licensepool
+        remaining_licenses = self.remaining_licenses
+        holds = self.holds
+        if len(holds) > remaining_licenses:
+            new_licenses_available = 0
+            new_licenses_reserved = remaining_licenses
+            new_patrons_in_hold_queue = len(holds)
+        else:
+            new_licenses_available = remaining_licenses - len(holds)
+            new_licenses_reserved = len(holds)
+            new_patrons_in_hold_queue = len(holds)
+        licensepool.update_availability(
+            licensepool.licenses_owned,
+            new_licenses_available,
+            new_licenses_reserved,
+            new_patrons_in_hold_queue,
+            analytics=self.api.analytics,
+            as_of=self.now,
+        )
+
+        for hold in holds[:licensepool.licenses_reserved]:
+            if hold.position != 0:
+                # This hold just got a reserved license.
+                self.update_hold(hold)
+
+    def update_hold_position(self, hold):
+        holds_count = self.holds_before(hold)
+        if self.remaining_licenses > holds_count:
+            # The hold is ready to check out.
+            hold.position = 0
+        else:
+            # Add 1 since position 0 indicates the hold is ready.
+            hold.position = holds_count + 1
+
+    def _loan_period(self, hold):
+        """Find the default loan period for the library or client that
+        owns a hold.
+        """
+        owner = hold.library or hold.integration_client
+        if owner is None:
+            # default_loan_period copes with a missing owner.
+            key = (None, None)
+        else:
+            key = (owner.__class__, owner.id)
+        if key not in self._loan_periods:
+            self._loan_periods[key] = self.collection.default_loan_period(
+                owner
+            )
+        return self._loan_periods[key]
+
+    @property
+    def collection(self):
+        return self.licensepool.collection
+
+    def update_hold(self, hold):
+        """Recalculate a hold's position and estimated end date."""
+        pool = self.licensepool
+
+        # First make sure the hold position is up-to-date, since we'll
+        # need it to calculate the end date.
+        original_position = hold.position
+        self.update_hold_position(hold)
+
+        default_loan_period = self._loan_period(hold)
+        default_reservation_period = self.collection.default_reservation_period
+
+        # If the hold was already to check out and already has an end date,
+        # it doesn't need an update.
+        if hold.position == 0 and original_position == 0 and hold.end:
+            return
+
+        # If the patron is in the queue, we need to estimate when the book
+        # will be available for check out. We can do slightly better than the
+        # default calculation since we know when all current loans will expire,
+        # but we're still calculating the worst case.
+        elif hold.position > 0:
+            current_loans = self.loans
+            current_holds = self.holds
+            licenses_reserved = min(pool.licenses_owned - len(current_loans), len(current_holds))
+            current_reservations = current_holds[:licenses_reserved]
+
+            # The licenses will have to go through some number of cycles
+            # before one of them gets to this hold. This leavs out the first cycle -
+            # it's already started so we'll handle it separately.
+            cycles = (hold.position - licenses_reserved - 1) // pool.licenses_owned
+
+            # Each of the owned licenses is currently either on loan or reserved.
+            # Figure out which license this hold will eventually get if every
+            # patron keeps their loans and holds for the maximum time.
+            copy_index = (hold.position - licenses_reserved - 1)  % pool.licenses_owned
+
+            # In the worse case, the first cycle ends when a current loan expires, or
+            # after a current reservation is checked out and then expires.
+            if len(current_loans) > copy_index:
+                next_cycle_start = current_loans[copy_index].end
+            else:
+                reservation = current_reservations[copy_index - len(current_loans)]
+                next_cycle_start = reservation.end + datetime.timedelta(days=default_loan_period)
+
+            # Assume all cycles after the first cycle take the maximum time.
+            cycle_period = default_loan_period + default_reservation_period
+            hold.end = next_cycle_start + datetime.timedelta(days=(cycle_period * cycles))
+
+        # If the end date isn't set yet or the position just became 0, the
+        # hold just became available. The patron's reservation period starts now.
+        else:
+            hold.end = self.now + datetime.timedelta(days=default_reservation_period)
+
+
 class ODLXMLParser(OPDSXMLParser):
     NAMESPACES = dict(OPDSXMLParser.NAMESPACES,
                       odl="http://opds-spec.org/odl")
@@ -922,36 +993,59 @@ class ODLHoldReaper(CollectionMonitor):
     SERVICE_NAME = "ODL Hold Reaper"
     PROTOCOL = ODLAPI.NAME
 
+    # The hold queues for this many pools are recalculated together.
+    POOL_BATCH_SIZE = 100
+
     def __init__(self, _db, collection=None, api=None, **kwargs):
         super(ODLHoldReaper, self).__init__(_db, collection, **kwargs)
         self.api = api or ODLAPI(_db, collection)
 
-    def run_once(self, progress):
-        # Find holds that have expired.
-        expired_holds = self._db.query(Hold).join(
-            Hold.license_pool
-        ).filter(
+    def expired_holds(self, now):
+        """A query for the holds in this collection that were ready to
+        check out but have expired.
+        """
+        pools_in_collection = self._db.query(LicensePool.id).filter(
             LicensePool.collection_id==self.api.collection_id
+        )
+        return self._db.query(Hold).filter(
+            Hold.license_pool_id.in_(pools_in_collection)
         ).filter(
-            Hold.end<datetime.datetime.utcnow()
+            Hold.end<now
         ).filter(
             Hold.position==0
         )
 
-        changed_pools = set()
+    def run_once(self, progress):
+        now = datetime.datetime.utcnow()
+        expired_holds = self.expired_holds(now)
+
+        # Find every pool that will need its hold queue recalculated,
+        # then delete all the expired holds with one statement.
+        changed_pool_ids = [
+            pool_id for [pool_id] in
+            expired_holds.with_entities(Hold.license_pool_id).distinct()
+        ]
         total_deleted_holds = 0
-        for hold in expired_holds:
-            changed_pools.add(hold.license_pool)
-            self._db.delete(hold)
-            total_deleted_holds += 1
+        if changed_pool_ids:
+            total_deleted_holds = expired_holds.delete(
+                synchronize_session='fetch'
+            )
 
-        for pool in changed_pools:
-            self.api.update_hold_queue(pool)
+        # Each pool is recalculated once, no matter how many of its
+        # holds expired.
+        pools_updated = 0
+        for i in range(0, len(changed_pool_ids), self.POOL_BATCH_SIZE):
+            batch = changed_pool_ids[i:i+self.POOL_BATCH_SIZE]
+            pools = self._db.query(LicensePool).filter(
+                LicensePool.id.in_(batch)
+            ).all()
+            pools_updated += self.api.update_hold_queues(pools)
 
         message = "Holds deleted: %d. License pools updated: %d" % (
             total_deleted_holds,
-            len(changed_pools)
+            pools_updated
         )
+        self.log.info(message)
         progress = TimestampData(achievements=message)
         return progress
 
@@ -4,6 +4,7 @@ import copy
 import logging
 from flask import url_for
 from lxml import etree
+from werkzeug.urls import url_quote
 from collections import defaultdict
 import uuid
 
@@ -79,6 +80,7 @@ class CirculationManagerAnnotator(Annotator):
         self.active_fulfillments_by_work = active_fulfillments_by_work
         self.hidden_content_types = hidden_content_types
         self.test_mode = test_mode
+        self._url_templates = {}
 
     def is_work_entry_solo(self, work):
         """Return a boolean value indicating whether the work's OPDS catalog entry is served by itself,
@@ -119,6 +121,61 @@ class CirculationManagerAnnotator(Annotator):
         else:
             return url_for(*args, **kwargs)
 
+    # Stands in for a route argument while a URL template is being
+    # built. It's made of characters that are never quoted.
+    URL_TEMPLATE_PLACEHOLDER = "URLTEMPLATE%dARGUMENT"
+
+    def templated_url_for(self, route, **kwargs):
+        """Build the same URL as url_for(route, _external=True, **kwargs).
+
+        Building a URL through Flask is slow, and each entry in a feed
+        needs several of them. So the first time a route is used with
+        a given set of arguments, the URL is built with placeholders
+        instead of argument values. After that, the argument values
+        are quoted and dropped into the template.
+
+        If an argument would go into the query string rather than the
+        path, there's no template and url_for() is used every time.
+        """
+        if self.test_mode:
+            return self.url_for(route, _external=True, **kwargs)
+
+        # url_for() ignores arguments whose value is None.
+        names = tuple(sorted(
+            name for name, value in kwargs.items() if value is not None
+        ))
+        key = (route, names)
+        if key not in self._url_templates:
+            self._url_templates[key] = self._url_template(route, names)
+        template = self._url_templates[key]
+        if template is None:
+            return self.url_for(route, _external=True, **kwargs)
+
+        # This is how Werkzeug quotes values in the path of a URL.
+        return template % dict(
+            (name, url_quote(kwargs[name], charset="utf-8", safe="/:"))
+            for name in names
+        )
+
+    def _url_template(self, route, names):
+        """Build a template for templated_url_for().
+
+        :return: A string to be filled in with the % operator, or None
+            if the route can't be turned into a template.
+        """
+        placeholders = dict(
+            (name, self.URL_TEMPLATE_PLACEHOLDER % i)
+            for i, name in enumerate(names)
+        )
+        url = self.url_for(route, _external=True, **placeholders)
+        path = url.split("?", 1)[0]
+        template = url.replace("%", "%%")
+        for name, placeholder in placeholders.items():
+            if path.count(placeholder) != 1 or url.count(placeholder) != 1:
+                return None
+            template = template.replace(placeholder, "%%(%s)s" % name)
+        return template
+
     def cdn_url_for(self, *args, **kwargs):
         if self.test_mode:
             return self.test_url_for(True, *args, **kwargs)
@@ -477,6 +534,43 @@ class CirculationManagerAnnotator(Annotator):
         return feed_class.single_entry(_db, work, annotator, **response_kwargs)
 
 
+class LibraryFacts(object):
+    """Facts about a library's configuration that affect every entry in
+    the library's feeds.
+
+    These are looked up once per library and reused, across feeds and
+    requests, until reset() is called because the site configuration
+    has changed.
+    """
+
+    __slots__ = ['novelist_configured', 'analytics_configured']
+
+    # LibraryFacts for each library, keyed by library ID.
+    _by_library = {}
+
+    def __init__(self, novelist_configured=False, analytics_configured=False):
+        self.novelist_configured = novelist_configured
+        self.analytics_configured = analytics_configured
+
+    @classmethod
+    def for_library(cls, library):
+        if not library:
+            return cls()
+        facts = cls._by_library.get(library.id)
+        if facts is None:
+            facts = cls(
+                novelist_configured=NoveListAPI.is_configured(library),
+                analytics_configured=Analytics.is_configured(library),
+            )
+            cls._by_library[library.id] = facts
+        return facts
+
+    @classmethod
+    def reset(cls):
+        """Forget everything, so the facts are looked up again."""
+        cls._by_library.clear()
+
+
 class LibraryAnnotator(CirculationManagerAnnotator):
 
     TERMS_OF_SERVICE = Configuration.TERMS_OF_SERVICE
@@ -539,6 +633,7 @@ class LibraryAnnotator(CirculationManagerAnnotator):
         self._top_level_title = top_level_title
         self.identifies_patrons = library_identifies_patrons
         self.facets = facets or None
+        self.library_facts = LibraryFacts.for_library(library)
 
     @classmethod
     def _hidden_content_types(self, library):
@@ -672,12 +767,11 @@ class LibraryAnnotator(CirculationManagerAnnotator):
         feed.add_link_to_entry(
             entry,
             rel='issues',
-            href=self.url_for(
+            href=self.templated_url_for(
                 'report',
                 identifier_type=identifier.type,
                 identifier=identifier.identifier,
-                library_short_name=self.library.short_name,
-                _external=True
+                library_short_name=self.library.short_name
             )
         )
 
@@ -692,7 +786,7 @@ class LibraryAnnotator(CirculationManagerAnnotator):
         if work.series:
             self.add_series_link(work, feed, entry)
 
-        if NoveListAPI.is_configured(self.library):
+        if self.library_facts.novelist_configured:
             # If NoveList Select is configured, there might be
             # recommendations, too.
             feed.add_link_to_entry(
@@ -700,28 +794,28 @@ class LibraryAnnotator(CirculationManagerAnnotator):
                 rel='recommendations',
                 type=OPDSFeed.ACQUISITION_FEED_TYPE,
                 title='Recommended Works',
-                href=self.url_for(
+                href=self.templated_url_for(
                     'recommendations',
                     identifier_type=identifier.type,
                     identifier=identifier.identifier,
-                    library_short_name=self.library.short_name,
-                    _external=True
+                    library_short_name=self.library.short_name
                 )
             )
 
         # Add a link for related books if available.
-        if self.related_books_available(work, self.library):
+        if self.related_books_available(
+            work, self.library, self.library_facts.novelist_configured
+        ):
             feed.add_link_to_entry(
                 entry,
                 rel='related',
                 type=OPDSFeed.ACQUISITION_FEED_TYPE,
                 title='Recommended Works',
-                href=self.url_for(
+                href=self.templated_url_for(
                     'related_books',
                     identifier_type=identifier.type,
                     identifier=identifier.identifier,
-                    library_short_name=self.library.short_name,
-                    _external=True
+                    library_short_name=self.library.short_name
                 )
             )
 
@@ -731,38 +825,40 @@ class LibraryAnnotator(CirculationManagerAnnotator):
                 entry,
                 rel="http://www.w3.org/ns/oa#annotationService",
                 type=AnnotationWriter.CONTENT_TYPE,
-                href=self.url_for(
+                href=self.templated_url_for(
                     'annotations_for_work',
                     identifier_type=identifier.type,
                     identifier=identifier.identifier,
-                    library_short_name=self.library.short_name,
-                    _external=True
+                    library_short_name=self.library.short_name
                 )
             )
 
-        if Analytics.is_configured(self.library):
+        if self.library_facts.analytics_configured:
             feed.add_link_to_entry(
                 entry,
                 rel="http://librarysimplified.org/terms/rel/analytics/open-book",
-                href=self.url_for(
+                href=self.templated_url_for(
                     'track_analytics_event',
                     identifier_type=identifier.type,
                     identifier=identifier.identifier,
                     event_type=CirculationEvent.OPEN_BOOK,
-                    library_short_name=self.library.short_name,
-                    _external=True
+                    library_short_name=self.library.short_name
                 )
             )
 
     @classmethod
-    def related_books_available(cls, work, library):
+    def related_books_available(cls, work, library, novelist_configured=None):
         """:return: bool asserting whether related books might exist for a particular Work
+
+        :param novelist_configured: Whether NoveList is configured for
+            the library, if that's already known.
         """
         contributions = work.sort_author and work.sort_author != Edition.UNKNOWN_AUTHOR
-
-        return (contributions
-                or work.series
-                or NoveListAPI.is_configured(library))
+        if contributions or work.series:
+            return True
+        if novelist_configured is None:
+            novelist_configured = NoveListAPI.is_configured(library)
+        return novelist_configured
 
     def language_and_audience_key_from_work(self, work):
         language_key = work.language
@@ -1040,11 +1136,10 @@ class LibraryAnnotator(CirculationManagerAnnotator):
     def revoke_link(self, active_license_pool, active_loan, active_hold):
         if not self.identifies_patrons:
             return
-        url = self.url_for(
+        url = self.templated_url_for(
             'revoke_loan_or_hold',
             license_pool_id=active_license_pool.id,
-            library_short_name=self.library.short_name,
-            _external=True)
+            library_short_name=self.library.short_name)
         kw = dict(href=url, rel=OPDSFeed.REVOKE_LOAN_REL)
         revoke_link_tag = OPDSFeed.makeelement("link", **kw)
         return revoke_link_tag
@@ -1062,13 +1157,12 @@ class LibraryAnnotator(CirculationManagerAnnotator):
             # Following this link will borrow the book but not set
             # its delivery mechanism.
             mechanism_id = None
-        borrow_url = self.url_for(
+        borrow_url = self.templated_url_for(
             "borrow",
             identifier_type=identifier.type,
             identifier=identifier.identifier,
             mechanism_id=mechanism_id,
-            library_short_name=self.library.short_name,
-            _external=True)
+            library_short_name=self.library.short_name)
         rel = OPDSFeed.BORROW_REL
         borrow_link = AcquisitionFeed.link(
             rel=rel, href=borrow_url, type=OPDSFeed.ENTRY_TYPE
@@ -1117,12 +1211,11 @@ class LibraryAnnotator(CirculationManagerAnnotator):
         if not format_types:
             return None
 
-        fulfill_url = self.url_for(
+        fulfill_url = self.templated_url_for(
             "fulfill",
             license_pool_id=license_pool.id,
             mechanism_id=delivery_mechanism.id,
-            library_short_name=self.library.short_name,
-            _external=True
+            library_short_name=self.library.short_name
         )
 
         link_tag = AcquisitionFeed.acquisition_link(
@@ -1142,12 +1235,11 @@ class LibraryAnnotator(CirculationManagerAnnotator):
 
     def open_access_link(self, pool, lpdm):
         link_tag = super(LibraryAnnotator, self).open_access_link(pool, lpdm)
-        fulfill_url = self.url_for(
+        fulfill_url = self.templated_url_for(
             "fulfill",
             license_pool_id=pool.id,
             mechanism_id=lpdm.delivery_mechanism.id,
-            library_short_name=self.library.short_name,
-            _external=True
+            library_short_name=self.library.short_name
         )
         link_tag.attrib.update(dict(href=fulfill_url))
         return link_tag
@@ -6,6 +6,8 @@ import re
 import requests
 import flask
 import urlparse
+from collections import deque
+from multiprocessing.pool import ThreadPool
 from flask_babel import lazy_gettext as _
 
 from sqlalchemy.orm import contains_eager
@@ -980,7 +982,14 @@ class OverdriveAPI(BaseOverdriveAPI, BaseCirculationAPI, HasSelfTests):
             return True
         raise CannotReleaseHold(response.content)
 
-    def circulation_lookup(self, book):
+    def circulation_lookup(self, book, exception_on_401=False):
+        """Ask Overdrive for current circulation information about a book.
+
+        This only makes an HTTP request. As long as `exception_on_401`
+        is True, it never needs to refresh the Bearer Token, so it
+        doesn't touch the database and can run in a thread that
+        doesn't own the database session.
+        """
         if isinstance(book, basestring):
             book_id = book
             circulation_link = self.endpoint(
@@ -994,7 +1003,9 @@ class OverdriveAPI(BaseOverdriveAPI, BaseCirculationAPI, HasSelfTests):
             # Make sure we use v2 of the availability API,
             # even if Overdrive gave us a link to v1.
             circulation_link = self.make_link_safe(circulation_link)
-        return book, self.get(circulation_link, {})
+        return book, self.get(
+            circulation_link, {}, exception_on_401=exception_on_401
+        )
 
     def update_formats(self, licensepool):
         """Update the format information for a single book.
@@ -1027,6 +1038,7 @@ class OverdriveAPI(BaseOverdriveAPI, BaseCirculationAPI, HasSelfTests):
         created for the LicensePool and set as presentation-ready.
         """
         # Retrieve current circulation information about this book
+        book = content = None
         try:
             book, (status_code, headers, content) = self.circulation_lookup(
                 book_id
@@ -1037,7 +1049,21 @@ class OverdriveAPI(BaseOverdriveAPI, BaseCirculationAPI, HasSelfTests):
                 "HTTP exception communicating with Overdrive",
                 exc_info=e
             )
+        return self.update_licensepool_with_availability(
+            book_id, book, status_code, content
+        )
 
+    def update_licensepool_with_availability(self, book_id, book,
+                                             status_code, content):
+        """Update a book's LicensePool using the response to a
+        circulation_lookup() call.
+
+        :param book_id: The book that was looked up.
+        :param book: The book description returned by circulation_lookup().
+        :param status_code: The status code of Overdrive's response,
+            or None if there was no response.
+        :param content: The body of Overdrive's response.
+        """
         # TODO: If you ask for a book that you know about, and
         # Overdrive says the book doesn't exist in the collection,
         # then it's appropriate to update an existing
@@ -1256,11 +1282,33 @@ class OverdriveCirculationMonitor(CollectionMonitor, TimelineMonitor):
     PROTOCOL = ExternalIntegration.OVERDRIVE
     OVERLAP = datetime.timedelta(minutes=1)
 
-    def __init__(self, _db, collection, api_class=OverdriveAPI, analytics_class=Analytics):
-        """Constructor."""
+    # The number of threads that fetch availability information from
+    # Overdrive while earlier books are being written to the
+    # database. If this is zero, each book is looked up and then
+    # written before moving on to the next one.
+    PREFETCH_WORKERS = 0
+
+    # Commit the database session after this many books have been
+    # processed.
+    COMMIT_BATCH_SIZE = 1
+
+    def __init__(self, _db, collection, api_class=OverdriveAPI,
+                 analytics_class=Analytics, prefetch_workers=None,
+                 commit_batch_size=None):
+        """Constructor.
+
+        :param prefetch_workers: Override PREFETCH_WORKERS.
+        :param commit_batch_size: Override COMMIT_BATCH_SIZE.
+        """
         super(OverdriveCirculationMonitor, self).__init__(_db, collection)
         self.api = api_class(_db, collection)
         self.analytics = analytics_class(_db)
+        if prefetch_workers is None:
+            prefetch_workers = self.PREFETCH_WORKERS
+        self.prefetch_workers = max(prefetch_workers, 0)
+        self.commit_batch_size = max(
+            commit_batch_size or self.COMMIT_BATCH_SIZE, 1
+        )
 
     def recently_changed_ids(self, start, cutoff):
         return self.api.recently_changed_ids(start, cutoff)
@@ -1278,26 +1326,118 @@ class OverdriveCirculationMonitor(CollectionMonitor, TimelineMonitor):
         # Ask for changes between the last time covered by the Monitor
         # and the current time.
         total_books = 0
-        for book in self.recently_changed_ids(start, cutoff):
-            total_books += 1
-            if not total_books % 100:
-                self.log.info("%s books processed", total_books)
-            if not book:
-                continue
-            license_pool, is_new, is_changed = self.api.update_licensepool(book)
-            # Log a circulation event for this work.
-            if is_new:
-                for library in self.collection.libraries:
-                    self.analytics.collect_event(
-                        library, license_pool, CirculationEvent.DISTRIBUTOR_TITLE_ADD, license_pool.last_checked
-                    )
-
+        uncommitted = 0
+        books = self.prefetch(self.recently_changed_ids(start, cutoff))
+        try:
+            for book, availability in books:
+                total_books += 1
+                if not total_books % 100:
+                    self.log.info("%s books processed", total_books)
+                if not book:
+                    continue
+                license_pool, is_new, is_changed = self.process_book(
+                    book, availability
+                )
+                # Log a circulation event for this work.
+                if is_new:
+                    for library in self.collection.libraries:
+                        self.analytics.collect_event(
+                            library, license_pool, CirculationEvent.DISTRIBUTOR_TITLE_ADD, license_pool.last_checked
+                        )
+
+                uncommitted += 1
+                if uncommitted >= self.commit_batch_size:
+                    self._db.commit()
+                    uncommitted = 0
+
+                # Books are processed in the order Overdrive gave
+                # them to us, so should_stop() sees the same books it
+                # would have seen without prefetching. Any
+                # availability information fetched for later books
+                # is thrown away.
+                if self.should_stop(start, book, is_changed):
+                    break
+        finally:
+            books.close()
+        if uncommitted:
             self._db.commit()
-            if self.should_stop(start, book, is_changed):
-                break
 
         progress.achievements = "Books processed: %d." % total_books
 
+    def prefetch(self, books):
+        """Start looking up availability information for books before
+        they're needed.
+
+        :param books: An iterator over book descriptions from
+            recently_changed_ids().
+
+        :yield: A 2-tuple (book, availability) for each book, in the
+            original order. `availability` is an AsyncResult that will
+            contain the result of circulation_lookup(), or None if
+            the book hasn't been looked up.
+        """
+        if not self.prefetch_workers:
+            for book in books:
+                yield book, None
+            return
+
+        # Make sure the collection token has been looked up before the
+        # threads need it.
+        self.api.collection_token
+
+        # Don't get too far ahead of the database writer, since
+        # should_stop() may tell us to stop at any time.
+        max_pending = self.prefetch_workers * 2
+        books = iter(books)
+        pending = deque()
+        pool = ThreadPool(self.prefetch_workers)
+        try:
+            while True:
+                for book in books:
+                    availability = None
+                    if book:
+                        # If the Bearer Token has expired, the lookup
+                        # will fail rather than try to refresh the
+                        # token in a thread.
+                        availability = pool.apply_async(
+                            self.api.circulation_lookup, (book,),
+                            dict(exception_on_401=True)
+                        )
+                    pending.append((book, availability))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                yield pending.popleft()
+        finally:
+            pool.terminate()
+
+    def process_book(self, book, availability=None):
+        """Update the LicensePool for a book.
+
+        :param availability: An AsyncResult from prefetch(). If this
+            is None or the prefetch failed, the book's availability
+            information is looked up now.
+
+        :return: A 3-tuple (LicensePool, is_new, is_changed).
+        """
+        if availability is None:
+            return self.api.update_licensepool(book)
+
+        try:
+            book, (status_code, headers, content) = availability.get()
+        except Exception, e:
+            # This includes an expired Bearer Token, which can only
+            # be refreshed in this thread.
+            self.log.warn(
+                "Prefetching availability for %r failed, trying again: %s",
+                book, e
+            )
+            return self.api.update_licensepool(book)
+        return self.api.update_licensepool_with_availability(
+            book, book, status_code, content
+        )
+
 
 class NewTitlesOverdriveCollectionMonitor(OverdriveCirculationMonitor):
     """Monitor the Overdrive collection for newly added titles.
@@ -1308,6 +1448,8 @@ class NewTitlesOverdriveCollectionMonitor(OverdriveCirculationMonitor):
     SERVICE_NAME = "Overdrive New Title Monitor"
     OVERLAP = datetime.timedelta(days=7)
     DEFAULT_START_TIME = OverdriveCirculationMonitor.NEVER
+    PREFETCH_WORKERS = 4
+    COMMIT_BATCH_SIZE = 25
 
     def recently_changed_ids(self, start, cutoff):
         """Ignore the dates and return all IDs."""
@@ -1370,6 +1512,9 @@ class RecentOverdriveCollectionMonitor(OverdriveCirculationMonitor):
     # that haven't changed, you're probably done.
     MAXIMUM_CONSECUTIVE_UNCHANGED_BOOKS=100
 
+    PREFETCH_WORKERS = 4
+    COMMIT_BATCH_SIZE = 25
+
     def __init__(self, *args, **kwargs):
         super(RecentOverdriveCollectionMonitor, self).__init__(*args, **kwargs)
         self.consecutive_unchanged_books = 0
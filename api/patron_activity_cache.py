@@ -0,0 +1,212 @@
+import cPickle as pickle
+import logging
+import sqlite3
+import time
+from threading import Lock
+
+from expiringdict import ExpiringDict
+
+from config import Configuration
+from core.model import ConfigurationSetting
+
+
+class PatronActivityCache(object):
+    """Remember, for a short time, what a vendor API said about a
+    patron's loans and holds.
+
+    Mobile clients tend to request a patron's bookshelf several times
+    in a row. This lets a burst of requests share a single round of
+    vendor API calls.
+
+    Entries are keyed by (patron ID, collection ID). The cached value
+    is the list of `LoanInfo` and `HoldInfo` objects returned by the
+    API for that collection's patron_activity().
+
+    This base class caches nothing. Subclasses provide actual storage.
+    """
+
+    # By default, cache nothing.
+    DEFAULT_TTL = 0
+
+    # The maximum number of entries an in-memory cache will hold.
+    DEFAULT_MAX_SIZE = 10000
+
+    def __init__(self, ttl=None):
+        """Constructor.
+
+        :param ttl: The number of seconds an entry remains valid.
+        """
+        if ttl is None:
+            ttl = self.DEFAULT_TTL
+        self.ttl = ttl
+        self.log = logging.getLogger("Patron activity cache")
+
+    @classmethod
+    def from_configuration(cls, _db):
+        """Build the cache described by the sitewide configuration.
+
+        :return: A PatronActivityCache.
+        """
+        ttl = ConfigurationSetting.sitewide(
+            _db, Configuration.PATRON_ACTIVITY_CACHE_TIME
+        ).int_value
+        if not ttl:
+            return PatronActivityCache()
+        path = ConfigurationSetting.sitewide(
+            _db, Configuration.PATRON_ACTIVITY_CACHE_FILE
+        ).value
+        if path:
+            # Every web worker on this host will see the same cache.
+            return SQLitePatronActivityCache(path, ttl)
+        return InMemoryPatronActivityCache(ttl)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, patron_id, collection_id):
+        """Look up cached activity.
+
+        :return: A list of `LoanInfo` and `HoldInfo` objects, or None if
+            there is no valid cache entry.
+        """
+        return None
+
+    def set(self, patron_id, collection_id, activity):
+        """Cache the activity reported for a patron by a collection's API.
+
+        :param activity: A list of `LoanInfo` and `HoldInfo` objects.
+        """
+        pass
+
+    def invalidate(self, patron_id, collection_id=None):
+        """Remove cached activity for a patron.
+
+        :param collection_id: If this is provided, only activity for
+            this collection is removed. Otherwise all of the patron's
+            cached activity is removed.
+        """
+        pass
+
+
+class InMemoryPatronActivityCache(PatronActivityCache):
+    """Cache patron activity in the memory of the current process."""
+
+    def __init__(self, ttl=None, max_size=None):
+        super(InMemoryPatronActivityCache, self).__init__(ttl)
+        self._data = ExpiringDict(
+            max_len=max_size or self.DEFAULT_MAX_SIZE,
+            max_age_seconds=self.ttl
+        )
+
+    def get(self, patron_id, collection_id):
+        return self._data.get((patron_id, collection_id))
+
+    def set(self, patron_id, collection_id, activity):
+        self._data[(patron_id, collection_id)] = list(activity)
+
+    def invalidate(self, patron_id, collection_id=None):
+        if collection_id is not None:
+            self._data.pop((patron_id, collection_id), None)
+            return
+        for key in list(self._data.keys()):
+            if key[0] == patron_id:
+                self._data.pop(key, None)
+
+
+class SQLitePatronActivityCache(PatronActivityCache):
+    """Cache patron activity in a SQLite database on local disk, so it
+    can be shared between processes.
+    """
+
+    CREATE_TABLE = """CREATE TABLE IF NOT EXISTS patron_activity (
+        patron_id INTEGER NOT NULL,
+        collection_id INTEGER NOT NULL,
+        expires REAL NOT NULL,
+        activity BLOB NOT NULL,
+        PRIMARY KEY (patron_id, collection_id)
+    )"""
+
+    def __init__(self, path, ttl=None):
+        """Constructor.
+
+        :param path: The path to the SQLite database file. It will be
+            created if necessary.
+        """
+        super(SQLitePatronActivityCache, self).__init__(ttl)
+        self.path = path
+        self._initialized = False
+        self._lock = Lock()
+
+    def _connection(self):
+        connection = sqlite3.connect(self.path, timeout=5)
+        if not self._initialized:
+            with self._lock:
+                with connection:
+                    connection.execute(self.CREATE_TABLE)
+                self._initialized = True
+        return connection
+
+    def _execute(self, sql, parameters):
+        """Run a statement in its own transaction.
+
+        The cache is an optimization, so database errors are logged
+        rather than raised.
+
+        :return: A list of result rows, or None if there was an error.
+        """
+        try:
+            connection = self._connection()
+            try:
+                with connection:
+                    return connection.execute(sql, parameters).fetchall()
+            finally:
+                connection.close()
+        except sqlite3.Error, e:
+            self.log.error(
+                "Error accessing patron activity cache %s: %s", self.path, e
+            )
+            return None
+
+    def get(self, patron_id, collection_id):
+        rows = self._execute(
+            "SELECT activity FROM patron_activity WHERE patron_id=? AND collection_id=? AND expires>?",
+            (patron_id, collection_id, time.time())
+        )
+        if not rows:
+            return None
+        [(data,)] = rows
+        try:
+            return pickle.loads(str(data))
+        except Exception, e:
+            self.log.error("Could not unpickle cached patron activity: %s", e)
+            return None
+
+    def set(self, patron_id, collection_id, activity):
+        try:
+            data = pickle.dumps(list(activity), pickle.HIGHEST_PROTOCOL)
+        except Exception, e:
+            # Some API put something in a LoanInfo that can't be stored
+            # outside this process. Don't cache it.
+            self.log.warn("Could not pickle patron activity: %s", e)
+            return
+        now = time.time()
+        self._execute(
+            "DELETE FROM patron_activity WHERE expires<=?", (now,)
+        )
+        self._execute(
+            "INSERT OR REPLACE INTO patron_activity (patron_id, collection_id, expires, activity) VALUES (?, ?, ?, ?)",
+            (patron_id, collection_id, now + self.ttl, sqlite3.Binary(data))
+        )
+
+    def invalidate(self, patron_id, collection_id=None):
+        if collection_id is not None:
+            self._execute(
+                "DELETE FROM patron_activity WHERE patron_id=? AND collection_id=?",
+                (patron_id, collection_id)
+            )
+        else:
+            self._execute(
+                "DELETE FROM patron_activity WHERE patron_id=?",
+                (patron_id,)
+            )
@@ -1,5 +1,6 @@
 import logging
 from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
 import requests
 from flask_babel import lazy_gettext as _
@@ -22,6 +23,7 @@ class ProQuestAPIClientConfiguration(ConfigurationGrouping):
     """Contains configuration settings of ProQuest API client."""
 
     DEFAULT_PAGE_SIZE = 5000
+    DEFAULT_CONCURRENT_PAGE_DOWNLOADS = 4
 
     books_catalog_service_url = ConfigurationMetadata(
         key="books_catalog_service_url",
@@ -43,6 +45,18 @@ class ProQuestAPIClientConfiguration(ConfigurationGrouping):
         default=DEFAULT_PAGE_SIZE,
     )
 
+    concurrent_page_downloads = ConfigurationMetadata(
+        key="concurrent_page_downloads",
+        label=_("Concurrent feed page downloads"),
+        description=_(
+            "This value determines how many feed pages "
+            "can be downloaded from the BooksCatalog service at the same time."
+        ),
+        type=ConfigurationAttributeType.NUMBER,
+        required=False,
+        default=DEFAULT_CONCURRENT_PAGE_DOWNLOADS,
+    )
+
     partner_auth_token_service_url = ConfigurationMetadata(
         key="partner_auth_token_service_url",
         label=_("PartnerAuthToken service's URL"),
@@ -208,11 +222,31 @@ class ProQuestBook(object):
         return self._content_type
 
 
+class ProQuestFeedDownloadSettings(object):
+    """Contains the configuration settings required to download feed pages.
+
+    ProQuestAPIClientConfiguration loads its settings using a database session
+    which can't be shared between threads downloading feed pages.
+    """
+
+    def __init__(self, configuration):
+        """Initialize a new instance of ProQuestFeedDownloadSettings class.
+
+        :param configuration: Configuration object
+        :type configuration: ProQuestAPIClientConfiguration
+        """
+        self.books_catalog_service_url = configuration.books_catalog_service_url
+        self.page_size = configuration.page_size
+        self.http_proxy_url = configuration.http_proxy_url
+        self.https_proxy_url = configuration.https_proxy_url
+
+
 class ProQuestAPIClient(object):
     """ProQuest API client."""
 
     MAX_PAGE_INDEX = 32766
     MAX_PAGE_SIZE = 32766
+    MAX_CONCURRENT_PAGE_DOWNLOADS = 16
 
     RESPONSE_STATUS_CODE_FIELD = "statusCode"
     RESPONSE_OPDS_FEED_FIELD = "opdsFeed"
@@ -511,9 +545,54 @@ class ProQuestAPIClient(object):
 
             return feed
 
+    def _try_to_download_feed_page(self, settings, page):
+        """Download a single page of a paginated OPDS 2.0 feed without raising exceptions.
+
+        This method is run in worker threads, so any exception is returned to the caller
+        which decides whether it means the end of the feed.
+
+        :param settings: Settings required to download feed pages
+        :type settings: ProQuestFeedDownloadSettings
+
+        :param page: Page index
+        :type page: int
+
+        :return: 2-tuple containing the feed's page (if any) and the exception raised while downloading it (if any)
+        :rtype: Tuple[Optional[dict], Optional[Exception]]
+        """
+        try:
+            return self._download_feed_page(settings, page, settings.page_size), None
+        except Exception as exception:
+            return None, exception
+
+    def _get_concurrent_page_downloads(self, configuration):
+        """Return the number of feed pages that can be downloaded at the same time.
+
+        :param configuration: Configuration object
+        :type configuration: ProQuestAPIClientConfiguration
+
+        :return: Number of feed pages that can be downloaded at the same time
+        :rtype: int
+        """
+        concurrent_page_downloads = configuration.concurrent_page_downloads
+
+        try:
+            concurrent_page_downloads = int(concurrent_page_downloads)
+        except (TypeError, ValueError):
+            concurrent_page_downloads = (
+                ProQuestAPIClientConfiguration.DEFAULT_CONCURRENT_PAGE_DOWNLOADS
+            )
+
+        return max(1, min(concurrent_page_downloads, self.MAX_CONCURRENT_PAGE_DOWNLOADS))
+
     def download_all_feed_pages(self, db):
         """Download all available feed pages.
 
+        Pages are downloaded in batches of `concurrent_page_downloads` pages at a time
+        but they are returned in order.
+        The feed doesn't tell how many pages it has, so the end of the feed is detected
+        by the first page that can't be downloaded.
+
         :param db: Database session
         :type db: sqlalchemy.orm.session.Session
 
@@ -528,32 +607,51 @@ class ProQuestAPIClient(object):
         )
 
         with self._get_configuration(db) as configuration:
+            settings = ProQuestFeedDownloadSettings(configuration)
+            concurrent_page_downloads = self._get_concurrent_page_downloads(
+                configuration
+            )
+
+        pool = ThreadPool(concurrent_page_downloads)
+
+        try:
             page = 1
 
             while True:
-                try:
-                    feed = self._download_feed_page(
-                        configuration, page, configuration.page_size
-                    )
-                    page += 1
+                pages = range(page, page + concurrent_page_downloads)
+                results = pool.map(
+                    lambda page_index: self._try_to_download_feed_page(
+                        settings, page_index
+                    ),
+                    pages,
+                )
 
-                    yield feed
-                except HTTPError as error:
-                    self._logger.debug(
-                        "Got an HTTP error {0}, assuming we reached the end of the feed".format(
-                            error
+                for feed, error in results:
+                    if isinstance(error, HTTPError):
+                        self._logger.debug(
+                            "Got an HTTP error {0}, assuming we reached the end of the feed".format(
+                                error
+                            )
                         )
-                    )
-                    break
-                except ProQuestAPIInvalidJSONResponseError:
-                    self._logger.exception(
-                        "Got unexpected ProQuestAPIIncorrectResponseError, assuming we reached the end of the feed"
-                    )
-                    break
+                        return
+                    elif isinstance(error, ProQuestAPIInvalidJSONResponseError):
+                        self._logger.error(
+                            "Got unexpected ProQuestAPIIncorrectResponseError, assuming we reached the end of the feed",
+                            exc_info=error,
+                        )
+                        return
+                    elif error is not None:
+                        raise error
 
-        self._logger.info(
-            "Finished downloading all of the pages of a paginated OPDS 2.0 feed"
-        )
+                    yield feed
+
+                page += concurrent_page_downloads
+        finally:
+            pool.terminate()
+
+            self._logger.info(
+                "Finished downloading all of the pages of a paginated OPDS 2.0 feed"
+            )
 
     def create_token(self, db, affiliation_id):
         """Create a new JWT bearer token.
@@ -10,7 +10,7 @@ import six
 import webpub_manifest_parser.opds2.ast as opds2_ast
 from flask_babel import lazy_gettext as _
 from requests import HTTPError
-from sqlalchemy import or_
+from sqlalchemy import Column, MetaData, String, Table, exists, or_
 from webpub_manifest_parser.utils import encode
 
 from api.circulation import BaseCirculationAPI, FulfillmentInfo, LoanInfo
@@ -18,6 +18,7 @@ from api.circulation_exceptions import CannotFulfill, CannotLoan
 from api.proquest.client import ProQuestAPIClientConfiguration, ProQuestAPIClientFactory
 from api.proquest.credential import ProQuestCredentialManager
 from api.proquest.identifier import ProQuestIdentifierParser
+from api.proquest.model import ProQuestPublicationFingerprint
 from api.saml.metadata.model import SAMLAttributeType
 from core.classifier import Classifier
 from core.exceptions import BaseError
@@ -763,6 +764,10 @@ class ProQuestOPDS2Importer(OPDS2Importer, BaseCirculationAPI, HasExternalIntegr
 class ProQuestOPDS2ImportMonitor(OPDS2ImportMonitor, HasExternalIntegration):
     PROTOCOL = ExternalIntegration.PROQUEST
 
+    # Temporary table used to find items which are no longer present in the feed
+    FEED_IDENTIFIERS_TABLE = "proquest_feed_identifiers"
+    FEED_IDENTIFIERS_BATCH_SIZE = 10000
+
     def __init__(
         self,
         client_factory,
@@ -804,6 +809,13 @@ class ProQuestOPDS2ImportMonitor(OPDS2ImportMonitor, HasExternalIntegration):
         self._client = self._client_factory.create(self)
         self._process_removals = process_removals
 
+        # Fingerprints of the publications imported during the previous runs
+        self._fingerprints = {}
+        # Fingerprints of the publications on the current feed page which will be saved after they are imported
+        self._pending_fingerprints = {}
+        # Identifiers of the publications skipped because they haven't changed since the last import
+        self._unchanged_identifiers = []
+
         self._logger = logging.getLogger(__name__)
 
     def _parse_identifier(self, identifier):
@@ -885,17 +897,125 @@ class ProQuestOPDS2ImportMonitor(OPDS2ImportMonitor, HasExternalIntegration):
 
         return feed_page_files
 
+    @staticmethod
+    def _get_raw_publications(feed):
+        """Return all the publications in the raw feed.
+
+        :param feed: ProQuest OPDS 2.0 feed in a form of a Python dictionary
+        :type feed: dict
+
+        :return: An iterable list of publications containing in the feed
+        :rtype: Iterable[dict]
+        """
+        for publication in feed.get("publications") or []:
+            yield publication
+
+        for group in feed.get("groups") or []:
+            for publication in group.get("publications") or []:
+                yield publication
+
+    def _load_fingerprints(self):
+        """Load fingerprints of the publications imported during the previous runs.
+
+        :return: Dictionary containing ProQuest Doc IDs and fingerprints of the publications
+        :rtype: Dict[str, str]
+        """
+        fingerprints = self._db.query(
+            ProQuestPublicationFingerprint.identifier,
+            ProQuestPublicationFingerprint.fingerprint,
+        ).filter(ProQuestPublicationFingerprint.collection_id == self.collection_id)
+
+        return dict(fingerprints)
+
+    def _is_publication_changed(self, publication):
+        """Check whether the publication has changed since the last import and keep track of its fingerprint.
+
+        :param publication: Publication in a form of a Python dictionary
+        :type publication: dict
+
+        :return: Boolean value indicating whether the publication must be imported
+        :rtype: bool
+        """
+        identifier = publication.get("metadata", {}).get("identifier")
+        result = (
+            ProQuestIdentifierParser().parse(identifier)
+            if is_string(identifier)
+            else None
+        )
+
+        if not result:
+            # We can't keep track of publications without a valid identifier,
+            # so we let the importer decide what to do with them.
+            return True
+
+        _, document_id = result
+        fingerprint = ProQuestPublicationFingerprint.calculate_fingerprint(publication)
+
+        if (
+            not self.force_reimport
+            and self._fingerprints.get(document_id) == fingerprint
+        ):
+            self._unchanged_identifiers.append(document_id)
+
+            return False
+
+        self._pending_fingerprints[document_id] = (identifier, fingerprint)
+
+        return True
+
+    def _remove_unchanged_publications(self, feed):
+        """Remove publications which haven't changed since the last import from the raw feed.
+
+        :param feed: ProQuest OPDS 2.0 feed in a form of a Python dictionary
+        :type feed: dict
+
+        :return: Number of publications left in the feed
+        :rtype: int
+        """
+        number_of_publications = 0
+
+        if feed.get("publications"):
+            feed["publications"] = [
+                publication
+                for publication in feed["publications"]
+                if self._is_publication_changed(publication)
+            ]
+            number_of_publications += len(feed["publications"])
+
+        if feed.get("groups"):
+            groups = []
+
+            for group in feed["groups"]:
+                if group.get("publications"):
+                    group["publications"] = [
+                        publication
+                        for publication in group["publications"]
+                        if self._is_publication_changed(publication)
+                    ]
+                    number_of_publications += len(group["publications"])
+
+                    if not group["publications"] and not group.get("navigation"):
+                        continue
+
+                groups.append(group)
+
+            feed["groups"] = groups
+
+        return number_of_publications
+
     def _parse_feed_page(self, page, feed_page_file):
         """Parse the ProQuest feed page residing in a temporary file on a local disk.
 
+        Publications which haven't changed since the last import are removed from the page before parsing it.
+
         :param page: Index of the page
         :type page: int
 
         :param feed_page_file: Absolute path to a temporary file containing the feed page
         :type feed_page_file: str
 
-        :return: Parsed OPDS feed page
-        :rtype: opds2_ast.OPDS2Feed
+        :return: Parsed OPDS feed page or None if none of the page's publications has changed
+        :rtype: Optional[opds2_ast.OPDS2Feed]
         """
         self._logger.info("Page # {0}. Started parsing the feed".format(page))
 
@@ -904,51 +1024,191 @@ class ProQuestOPDS2ImportMonitor(OPDS2ImportMonitor, HasExternalIntegration):
         ) as feed_page_file_handle:
             feed = feed_page_file_handle.read()
 
-        feed = parse_feed(feed, silent=False)
+        self._pending_fingerprints = {}
+        feed = json.loads(feed)
+        number_of_publications = sum(1 for _ in self._get_raw_publications(feed))
+
+        if number_of_publications and not self._remove_unchanged_publications(feed):
+            self._logger.info(
+                "Page # {0}. None of {1} publications has changed since the last import".format(
+                    page, number_of_publications
+                )
+            )
+
+            return None
+
+        feed = parse_feed(json.dumps(feed), silent=False)
 
         self._logger.info("Page # {0}. Finished parsing the feed".format(page))
 
         return feed
 
+    def _save_fingerprints(self, failures):
+        """Save fingerprints of the successfully imported publications from the current feed page.
+
+        :param failures: Dictionary containing import failures keyed by identifiers
+        :type failures: Dict
+        """
+        failed_document_ids = set()
+
+        if failures:
+            # Failures are keyed either by raw identifiers from the feed or by URNs of the Identifier objects,
+            # so we look up URNs of all the pending publications in one query.
+            parser = ProQuestIdentifierParser()
+
+            for key in failures:
+                result = parser.parse(key) if is_string(key) else None
+
+                if result:
+                    failed_document_ids.add(result[1])
+
+            pending_identifiers = self._db.query(Identifier).filter(
+                Identifier.type == Identifier.PROQUEST_ID,
+                Identifier.identifier.in_(list(self._pending_fingerprints.keys())),
+            )
+
+            for identifier in pending_identifiers:
+                if identifier.urn in failures:
+                    failed_document_ids.add(identifier.identifier)
+
+        fingerprints = {}
+
+        for document_id, (_, fingerprint) in self._pending_fingerprints.items():
+            if document_id not in failed_document_ids:
+                fingerprints[document_id] = fingerprint
+
+        self._pending_fingerprints = {}
+
+        if not fingerprints:
+            return
+
+        existing_fingerprints = self._db.query(ProQuestPublicationFingerprint).filter(
+            ProQuestPublicationFingerprint.collection_id == self.collection_id,
+            ProQuestPublicationFingerprint.identifier.in_(list(fingerprints.keys())),
+        )
+
+        for existing_fingerprint in existing_fingerprints:
+            existing_fingerprint.fingerprint = fingerprints.pop(
+                existing_fingerprint.identifier
+            )
+
+        for document_id, fingerprint in fingerprints.items():
+            self._db.add(
+                ProQuestPublicationFingerprint(
+                    self.collection_id, document_id, fingerprint
+                )
+            )
+
     def _collect_feed_identifiers(self, feed, feed_identifiers):
-        """Keep track of all identifiers in the ProQuest feed and save them in a list.
+        """Keep track of all identifiers in the ProQuest feed and save them in a set.
 
         :param feed: ProQuest OPDS 2.0 feed
         :type feed: opds2_ast.OPDS2Feed
 
-        :param feed_identifiers: List of identifiers in the ProQuest feed
-        :type feed_identifiers: List[str]
+        :param feed_identifiers: Set of identifiers in the ProQuest feed
+        :type feed_identifiers: Set[str]
         """
+        identifier_parser = ProQuestIdentifierParser()
+
         for publication in self._get_publications(feed):
-            identifier = parse_identifier(self._db, publication.metadata.identifier)
+            result = identifier_parser.parse(publication.metadata.identifier)
+
+            if result:
+                _, document_id = result
+
+                feed_identifiers.add(document_id)
 
-            feed_identifiers.append(identifier.identifier)
+    def _create_feed_identifiers_table(self, feed_identifiers):
+        """Create a temporary table containing all the identifiers present in the ProQuest feed.
+
+        :param feed_identifiers: Set of identifiers present in the ProQuest feed
+        :type feed_identifiers: Set[str]
+
+        :return: Temporary table containing the identifiers
+        :rtype: sqlalchemy.Table
+        """
+        feed_identifiers_table = Table(
+            self.FEED_IDENTIFIERS_TABLE,
+            MetaData(),
+            Column("identifier", String, primary_key=True),
+            prefixes=["TEMPORARY"],
+            postgresql_on_commit="DROP",
+        )
+        feed_identifiers_table.create(self._db.connection())
+
+        feed_identifiers = list(feed_identifiers)
+
+        for index in range(0, len(feed_identifiers), self.FEED_IDENTIFIERS_BATCH_SIZE):
+            self._db.execute(
+                feed_identifiers_table.insert(),
+                [
+                    {"identifier": identifier}
+                    for identifier in feed_identifiers[
+                        index : index + self.FEED_IDENTIFIERS_BATCH_SIZE
+                    ]
+                ],
+            )
+
+        return feed_identifiers_table
 
     def _clean_removed_items(self, feed_identifiers):
         """Make items that are no longer present in the ProQuest feed to be invisible in the CM's catalog.
 
-        :param feed_identifiers: List of identifiers present in the ProQuest feed
-        :type feed_identifiers: List[str]
+        :param feed_identifiers: Set of identifiers present in the ProQuest feed
+        :type feed_identifiers: Set[str]
+
+        :return: Number of items which were made invisible
+        :rtype: int
         """
+        if not feed_identifiers:
+            # Most likely the feed couldn't be downloaded, so we can't tell which items were removed.
+            self._logger.warning(
+                "The ProQuest feed doesn't contain any identifiers, skipping removals"
+            )
+
+            return 0
+
         self._logger.info(
             "Started removing identifiers that are no longer present in the ProQuest feed"
         )
 
-        items_to_remove = (
+        feed_identifiers_table = self._create_feed_identifiers_table(feed_identifiers)
+
+        in_feed = exists().where(
+            Identifier.id == LicensePool.identifier_id
+        ).where(Identifier.identifier == feed_identifiers_table.c.identifier)
+
+        removed_items = (
             self._db.query(LicensePool)
-            .join(Collection)
-            .join(Identifier)
-            .filter(Collection.id == self.collection_id)
-            .filter(~Identifier.identifier.in_(feed_identifiers))
+            .filter(LicensePool.collection_id == self.collection_id)
+            .filter(LicensePool.unlimited_access == True)
+            .filter(~in_feed)
+            .update(
+                {LicensePool.unlimited_access: False}, synchronize_session="fetch"
+            )
         )
 
-        for item in items_to_remove:
-            item.unlimited_access = False
+        # Publications which are added back to the feed must be imported again even if they haven't changed.
+        self._db.query(ProQuestPublicationFingerprint).filter(
+            ProQuestPublicationFingerprint.collection_id == self.collection_id
+        ).filter(
+            ~exists().where(
+                ProQuestPublicationFingerprint.identifier
+                == feed_identifiers_table.c.identifier
+            )
+        ).delete(synchronize_session=False)
+
+        # The table is also dropped when the transaction ends.
+        feed_identifiers_table.drop(self._db.connection())
 
         self._logger.info(
-            "Finished removing identifiers that are no longer present in the ProQuest feed"
+            "Finished removing {0} identifiers that are no longer present in the ProQuest feed".format(
+                removed_items
+            )
         )
 
+        return removed_items
+
     def _get_feeds(self):
         """Return a generator object traversing through a list of the ProQuest OPDS 2.0 feed pages.
 
@@ -960,6 +1220,9 @@ class ProQuestOPDS2ImportMonitor(OPDS2ImportMonitor, HasExternalIntegration):
         feed_pages_directory = tempfile.mkdtemp()
 
         try:
+            self._fingerprints = self._load_fingerprints()
+            self._unchanged_identifiers = []
+
             feed_page_files = self._download_feed_pages(feed_pages_directory)
 
             page = 1
@@ -971,6 +1234,10 @@ class ProQuestOPDS2ImportMonitor(OPDS2ImportMonitor, HasExternalIntegration):
             for feed_page_file in feed_page_files:
                 feed = self._parse_feed_page(page, feed_page_file)
 
+                if feed is None:
+                    page += 1
+                    continue
+
                 # FIXME: We cannot short-circuit the feed import process
                 #  because ProQuest feed is not ordered by the publication's modified date.
                 #  This issue will be addressed in https://jira.nypl.org/browse/SIMPLY-3343
@@ -1014,8 +1281,8 @@ class ProQuestOPDS2ImportMonitor(OPDS2ImportMonitor, HasExternalIntegration):
         self._logger.info("Finished fetching ProQuest paged OPDS 2.0 feeds")
 
     def run_once(self, progress_ignore):
-        # This list is used to keep track of all identifiers in the ProQuest feed.
-        feed_identifiers = []
+        # This set is used to keep track of all identifiers in the ProQuest feed.
+        feed_identifiers = set()
 
         feeds = self._get_feeds()
         total_imported = 0
@@ -1029,14 +1296,20 @@ class ProQuestOPDS2ImportMonitor(OPDS2ImportMonitor, HasExternalIntegration):
             imported_editions, failures = self.import_one_feed(feed)
             total_imported += len(imported_editions)
             total_failures += len(failures)
+            self._save_fingerprints(failures)
             self._db.commit()
 
-        achievements = "Items imported: %d. Failures: %d." % (
+        achievements = "Items imported: %d. Unchanged: %d. Failures: %d." % (
             total_imported,
+            len(self._unchanged_identifiers),
             total_failures,
         )
 
         if self._process_removals:
-            self._clean_removed_items(feed_identifiers)
+            # Publications skipped because they haven't changed are still present in the feed.
+            feed_identifiers.update(self._unchanged_identifiers)
+
+            removed_items = self._clean_removed_items(feed_identifiers)
+            achievements += " Removed: %d." % removed_items
 
         return TimestampData(achievements=achievements)
@@ -0,0 +1,62 @@
+import hashlib
+import json
+
+from sqlalchemy import Column, ForeignKey, Integer, String, UniqueConstraint
+
+from core.model import Base
+
+
+class ProQuestPublicationFingerprint(Base):
+    """Contains a fingerprint of the publication's metadata last imported from the ProQuest feed.
+
+    ProQuest feed doesn't contain modification dates, so ProQuestOPDS2ImportMonitor uses fingerprints
+    to find out which publications have changed since the last import and skips the rest.
+    """
+
+    __tablename__ = "proquestpublicationfingerprints"
+
+    id = Column(Integer, primary_key=True)
+    collection_id = Column(
+        Integer, ForeignKey("collections.id"), index=True, nullable=False
+    )
+    identifier = Column(String, nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+
+    __table_args__ = (UniqueConstraint("collection_id", "identifier"),)
+
+    def __init__(self, collection_id, identifier, fingerprint):
+        """Initialize a new instance of ProQuestPublicationFingerprint class.
+
+        :param collection_id: ID of the ProQuest collection
+        :type collection_id: int
+
+        :param identifier: ProQuest Doc ID
+        :type identifier: str
+
+        :param fingerprint: Hash of the publication's metadata
+        :type fingerprint: str
+        """
+        self.collection_id = collection_id
+        self.identifier = identifier
+        self.fingerprint = fingerprint
+
+    def __repr__(self):
+        return "<ProQuestPublicationFingerprint(id={0}, collection_id={1}, identifier={2}, fingerprint={3})>".format(
+            self.id, self.collection_id, self.identifier, self.fingerprint
+        )
+
+    @staticmethod
+    def calculate_fingerprint(publication):
+        """Calculate a fingerprint of the publication's metadata.
+
+        :param publication: Publication in a form of a Python dictionary as it was returned by the ProQuest API
+        :type publication: dict
+
+        :return: Hex digest of the publication's metadata
+        :rtype: str
+        """
+        publication = json.dumps(
+            publication, default=str, ensure_ascii=True, sort_keys=True
+        )
+
+        return hashlib.sha256(publication.encode("utf-8")).hexdigest()
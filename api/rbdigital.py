@@ -2482,31 +2482,114 @@ class RBDigitalCirculationMonitor(CollectionMonitor):
         self.analytics = Analytics(self._db)
 
     def process_availability(self, media_type='eBook'):
+        """Update the availability of every title of one media type.
+
+        The current availability of every LicensePool in the
+        collection is loaded up front, so most titles can be checked
+        without touching the database. Only LicensePools whose
+        availability has changed are loaded and updated, a batch at a
+        time. Titles we've never seen before go through
+        update_licensepool_for_identifier, which creates their
+        LicensePools.
+
+        :param media_type: 'eBook' or 'eAudio'
+        :return: The number of titles processed.
+        """
         # get list of all titles, with availability info
         policy = self.api.default_circulation_replacement_policy
         availability_list = self.api.get_ebook_availability_info(media_type=media_type)
+        current = self.current_availability()
+        changes = {}
+        new_count = 0
         item_count = 0
         for availability in availability_list:
+            item_count += 1
             isbn = availability['isbn']
             # boolean True/False value, not number of licenses
             available = availability['availability']
 
+            if isbn in current:
+                # We don't know exactly how many licenses there are,
+                # only that we own at least one and whether any are
+                # available.
+                pool_id, licenses_owned, licenses_available = current[isbn]
+                new_licenses_available = 1 if available else 0
+                if (licenses_owned != 1
+                    or licenses_available != new_licenses_available):
+                    changes[pool_id] = new_licenses_available
+                    if len(changes) >= self.batch_size:
+                        self.apply_availability_changes(changes)
+                        changes = {}
+                continue
+
             medium = availability.get('mediaType')
             license_pool, is_new, is_changed = self.api.update_licensepool_for_identifier(
                 isbn, available, medium, policy
             )
+            current[isbn] = (
+                license_pool.id, license_pool.licenses_owned,
+                license_pool.licenses_available
+            )
             # Log a circulation event for this work.
             if is_new:
                 for library in self.collection.libraries:
                     self.analytics.collect_event(
                         library, license_pool, CirculationEvent.DISTRIBUTOR_TITLE_ADD, license_pool.last_checked)
 
-            item_count += 1
-            if item_count % self.batch_size == 0:
+            new_count += 1
+            if new_count % self.batch_size == 0:
                 self._db.commit()
 
+        self.apply_availability_changes(changes)
+        self._db.commit()
         return item_count
 
+    def current_availability(self):
+        """Find the current availability of every LicensePool in the
+        collection, with a single query.
+
+        :return: A dictionary mapping each RBdigital ID to a 3-tuple
+            (LicensePool ID, licenses owned, licenses available).
+        """
+        qu = self._db.query(
+            Identifier.identifier, LicensePool.id,
+            LicensePool.licenses_owned, LicensePool.licenses_available
+        ).join(
+            LicensePool.identifier
+        ).filter(
+            LicensePool.collection_id==self.collection.id
+        ).filter(
+            Identifier.type==Identifier.RB_DIGITAL_ID
+        )
+        return dict(
+            (isbn, (pool_id, owned, available))
+            for isbn, pool_id, owned, available in qu
+        )
+
+    def apply_availability_changes(self, changes):
+        """Update the availability of a batch of LicensePools.
+
+        The LicensePools are loaded with a single query and written
+        in a single flush. Going through
+        LicensePool.update_availability means the usual circulation
+        events are still recorded.
+
+        :param changes: A dictionary mapping LicensePool IDs to the
+            new number of licenses available.
+        """
+        if not changes:
+            return
+        now = datetime.datetime.utcnow()
+        pools = self._db.query(LicensePool).filter(
+            LicensePool.id.in_(changes.keys())
+        )
+        for pool in pools:
+            pool.update_availability(
+                1, changes[pool.id], pool.licenses_reserved,
+                pool.patrons_in_hold_queue, self.analytics, as_of=now
+            )
+        self._db.commit()
+
     def run_once(self, progress):
         """Update the availability information of all titles in the
         RBdigital collection.
@@ -123,7 +123,10 @@ class SAMLAuthenticationManager(object):
         return auth
 
     def _get_auth_object(self, db, idp_entity_id):
-        """Return a cached OneLogin_Saml2_Auth object.
+        """Return an OneLogin_Saml2_Auth object for the current request.
+
+        The object depends on the request so it can't be reused,
+        but the settings it's built from are cached by SAMLOneLoginConfiguration.
 
         :param db: Database session
         :type db: sqlalchemy.orm.session.Session
@@ -293,6 +296,14 @@ class SAMLAuthenticationManager(object):
 class SAMLAuthenticationManagerFactory(object):
     """Responsible for creating SAMLAuthenticationManager instances"""
 
+    def __init__(self, metadata_cache=None):
+        """Initialize a new instance of SAMLAuthenticationManagerFactory class.
+
+        :param metadata_cache: Optional cache of OneLogin settings shared between requests
+        :type metadata_cache: Optional[api.saml.metadata.cache.SAMLMetadataCache]
+        """
+        self._metadata_cache = metadata_cache
+
     def create(self, configuration):
         """
         Creates a new instance of SAMLAuthenticationManager class
@@ -303,7 +314,9 @@ class SAMLAuthenticationManagerFactory(object):
         :return: SAML authentication manager
         :rtype: SAMLAuthenticationManager
         """
-        onelogin_configuration = SAMLOneLoginConfiguration(configuration)
+        onelogin_configuration = SAMLOneLoginConfiguration(
+            configuration, self._metadata_cache
+        )
         subject_parser = SAMLSubjectParser()
         parser = DSLParser()
         visitor = DSLEvaluationVisitor()
@@ -7,6 +7,7 @@ from flask_babel import lazy_gettext as _
 from onelogin.saml2.settings import OneLogin_Saml2_Settings
 
 from api.saml.metadata.federations import incommon
+from api.saml.metadata.cache import SAMLMetadataCache
 from api.saml.metadata.federations.model import (
     SAMLFederatedIdentityProvider,
     SAMLFederation,
@@ -211,7 +212,14 @@ class SAMLConfiguration(ConfigurationGrouping):
 
     IDP_DISPLAY_NAME_DEFAULT_TEMPLATE = "Identity Provider #{0}"
 
-    def __init__(self, configuration_storage, db, metadata_parser):
+    def __init__(
+        self,
+        configuration_storage,
+        db,
+        metadata_parser,
+        metadata_cache=None,
+        integration_id=None,
+    ):
         """Initializes a new instance of SAMLConfiguration class
 
         :param configuration_storage: SAML configuration storage
@@ -219,12 +227,21 @@ class SAMLConfiguration(ConfigurationGrouping):
 
         :param metadata_parser: SAML metadata parser
         :type metadata_parser: SAMLMetadataParser
+
+        :param metadata_cache: Optional cache of parsed IdP metadata shared between requests
+        :type metadata_cache: Optional[api.saml.metadata.cache.SAMLMetadataCache]
+
+        :param integration_id: ID of the SAML integration, used to partition the cache
+        :type integration_id: Optional[int]
         """
         super(SAMLConfiguration, self).__init__(configuration_storage, db)
 
         self._metadata_parser = metadata_parser
+        self._metadata_cache = metadata_cache
+        self._integration_id = integration_id
 
         self._identity_providers = None
+        self._identity_provider_hashes = []
         self._service_provider = None
 
     def _get_federated_identity_providers(self, db):
@@ -253,9 +270,27 @@ class SAMLConfiguration(ConfigurationGrouping):
             .all()
         )
 
+    def _parse_identity_providers(self, xml_metadata):
+        """Parse IdP XML metadata.
+
+        :param xml_metadata: XML metadata containing one or more IdPs
+        :type xml_metadata: str
+
+        :return: List of IdentityProviderMetadata objects
+        :rtype: List[IdentityProviderMetadata]
+
+        :raise: SAMLParsingError
+        """
+        parsing_results = self._metadata_parser.parse(xml_metadata)
+
+        return [parsing_result.provider for parsing_result in parsing_results]
+
     def _load_identity_providers(self, db):
         """Loads IdP settings from the library's configuration settings
 
+        When a metadata cache is available, XML documents that have already been
+        parsed are not parsed again.
+
         :param db: Database session
         :type db: sqlalchemy.orm.session.Session
 
@@ -264,28 +299,42 @@ class SAMLConfiguration(ConfigurationGrouping):
 
         :raise: SAMLParsingError
         """
-        identity_providers = []
+        xml_metadata_documents = []
 
         if self.non_federated_identity_provider_xml_metadata:
-            parsing_results = self._metadata_parser.parse(
+            xml_metadata_documents.append(
                 self.non_federated_identity_provider_xml_metadata
             )
-            identity_providers = [
-                parsing_result.provider for parsing_result in parsing_results
-            ]
 
         if self.federated_identity_provider_entity_ids:
             for identity_provider_metadata in self._get_federated_identity_providers(
                 db
             ):
-                parsing_results = self._metadata_parser.parse(
-                    identity_provider_metadata.xml_metadata
+                xml_metadata_documents.append(identity_provider_metadata.xml_metadata)
+
+        if self._metadata_cache is None:
+            identity_providers = []
+
+            for xml_metadata in xml_metadata_documents:
+                identity_providers.extend(
+                    self._parse_identity_providers(xml_metadata)
                 )
 
-                for parsing_result in parsing_results:
-                    identity_providers.append(parsing_result.provider)
+            return identity_providers
 
-        return identity_providers
+        xml_metadata_hashes = [
+            (SAMLMetadataCache.hash(xml_metadata), xml_metadata)
+            for xml_metadata in xml_metadata_documents
+        ]
+        self._identity_provider_hashes = [
+            xml_metadata_hash for xml_metadata_hash, _ in xml_metadata_hashes
+        ]
+
+        return self._metadata_cache.get_identity_providers(
+            self._integration_id,
+            xml_metadata_hashes,
+            self._parse_identity_providers,
+        )
 
     def _load_service_provider(self, db):
         """Loads SP settings from the library's configuration settings
@@ -355,6 +404,43 @@ class SAMLConfiguration(ConfigurationGrouping):
 
         return self._service_provider
 
+    @property
+    def metadata_cache(self):
+        """Return the cache of parsed metadata (if any).
+
+        :return: Cache of parsed metadata
+        :rtype: Optional[api.saml.metadata.cache.SAMLMetadataCache]
+        """
+        return self._metadata_cache
+
+    @property
+    def integration_id(self):
+        """Return the ID of the SAML integration this configuration belongs to.
+
+        :return: ID of the SAML integration
+        :rtype: Optional[int]
+        """
+        return self._integration_id
+
+    def get_metadata_fingerprint(self, db):
+        """Return a hash of all the metadata the OneLogin settings are built from.
+
+        :param db: Database session
+        :type db: sqlalchemy.orm.session.Session
+
+        :return: Hash of the SP's and IdPs' metadata and the toolkit's settings
+        :rtype: str
+        """
+        self.get_identity_providers(db)
+
+        return SAMLMetadataCache.hash(
+            self.service_provider_xml_metadata,
+            self.service_provider_private_key,
+            self.service_provider_debug_mode,
+            self.service_provider_strict_mode,
+            *self._identity_provider_hashes
+        )
+
 
 class SAMLSettings(dict):
     """Converts SAMLConfiguration to SETTINGS-compatible dictionary.
@@ -422,11 +508,17 @@ class SAMLSettings(dict):
 class SAMLConfigurationFactory(ConfigurationFactory):
     """Factory creating new instances of SAMLConfiguration class."""
 
-    def __init__(self, parser):
+    def __init__(self, parser, metadata_cache=None, integration_id=None):
         """Initialize a new instance of SAMLConfigurationFactory class.
 
         :param parser: SAMLMetadataParser object
         :type parser: api.saml.metadata.parser.SAMLMetadataParser
+
+        :param metadata_cache: Optional cache of parsed IdP metadata shared between requests
+        :type metadata_cache: Optional[api.saml.metadata.cache.SAMLMetadataCache]
+
+        :param integration_id: ID of the SAML integration, used to partition the cache
+        :type integration_id: Optional[int]
         """
         if not isinstance(parser, SAMLMetadataParser):
             raise ValueError(
@@ -436,6 +528,8 @@ class SAMLConfigurationFactory(ConfigurationFactory):
             )
 
         self._parser = parser
+        self._metadata_cache = metadata_cache
+        self._integration_id = integration_id
 
     @contextmanager
     def create(self, configuration_storage, db, configuration_grouping_class):
@@ -461,7 +555,11 @@ class SAMLConfigurationFactory(ConfigurationFactory):
             )
 
         with configuration_grouping_class(
-            configuration_storage, db, self._parser
+            configuration_storage,
+            db,
+            self._parser,
+            self._metadata_cache,
+            self._integration_id,
         ) as configuration_bucket:
             yield configuration_bucket
 
@@ -491,13 +589,17 @@ class SAMLOneLoginConfiguration(object):
     SECURITY = "security"
     AUTHN_REQUESTS_SIGNED = "authnRequestsSigned"
 
-    def __init__(self, configuration):
+    def __init__(self, configuration, metadata_cache=None):
         """Initializes a new instance of SAMLOneLoginConfiguration class
 
         :param configuration: Configuration object containing SAML metadata
         :type configuration: api.saml.configuration.model.SAMLConfiguration
+
+        :param metadata_cache: Optional cache of OneLogin settings shared between requests
+        :type metadata_cache: Optional[api.saml.metadata.cache.SAMLMetadataCache]
         """
         self._configuration = configuration
+        self._metadata_cache = metadata_cache
         self._service_provider = None
         self._identity_providers = {}
 
@@ -655,6 +757,32 @@ class SAMLOneLoginConfiguration(object):
     def get_settings(self, db, idp_entity_id):
         """Returns a dictionary containing SP's and IdP's settings in the OneLogin's SAML Toolkit format
 
+        If the configuration has a metadata cache, settings built before from the same metadata are reused.
+
+        :param db: Database session
+        :type db: sqlalchemy.orm.session.Session
+
+        :param idp_entity_id: IdP's entity ID
+        :type idp_entity_id: string
+
+        :return: Dictionary containing SP's and IdP's settings in the OneLogin's SAML Toolkit format
+        :rtype: Dict
+        """
+        metadata_cache = self._metadata_cache
+
+        if metadata_cache is None:
+            return self._build_settings(db, idp_entity_id)
+
+        return metadata_cache.get_settings(
+            self._configuration.integration_id,
+            self._configuration.get_metadata_fingerprint(db),
+            idp_entity_id,
+            lambda: self._build_settings(db, idp_entity_id),
+        )
+
+    def _build_settings(self, db, idp_entity_id):
+        """Build a dictionary containing SP's and IdP's settings in the OneLogin's SAML Toolkit format
+
         :param db: Database session
         :type db: sqlalchemy.orm.session.Session
 
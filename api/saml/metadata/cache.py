@@ -0,0 +1,170 @@
+import hashlib
+import logging
+from copy import deepcopy
+from threading import Lock
+
+import six
+
+
+class SAMLMetadataCache(object):
+    """Process-wide cache of parsed IdP metadata and OneLogin settings.
+
+    Parsing IdP metadata with lxml and building OneLogin settings out of
+    it is expensive, and a library may have dozens of federated IdPs.
+    This cache keeps the results around between requests.
+
+    Entries are kept separately for each SAML integration and are keyed
+    by a hash of the XML they were built from, so a change to the
+    metadata (made by an admin or by SAMLMetadataMonitor) is picked up
+    the next time the configuration is loaded. Only the entries built
+    from an integration's current metadata are retained.
+    """
+
+    _instance = None
+    _instance_lock = Lock()
+
+    def __init__(self):
+        """Initialize a new instance of SAMLMetadataCache class."""
+        self._identity_providers = {}
+        self._settings = {}
+        self._lock = Lock()
+
+        self._logger = logging.getLogger(__name__)
+
+    @classmethod
+    def instance(cls):
+        """Return the process-wide SAMLMetadataCache object.
+
+        :return: SAMLMetadataCache object
+        :rtype: SAMLMetadataCache
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = SAMLMetadataCache()
+
+        return cls._instance
+
+    @staticmethod
+    def hash(*values):
+        """Return a hash of the specified values.
+
+        :param values: List of strings (None is allowed)
+        :type values: List[Optional[str]]
+
+        :return: Hex digest of the values
+        :rtype: str
+        """
+        digest = hashlib.sha256()
+
+        for value in values:
+            value = six.text_type(value) if value is not None else u""
+            digest.update(value.encode("utf-8"))
+            digest.update(b"\0")
+
+        return digest.hexdigest()
+
+    def get_identity_providers(self, integration_id, xml_metadata_hashes, parse):
+        """Return parsed IdP metadata for each of the specified XML documents.
+
+        Documents which have not been parsed before are parsed using `parse`.
+        Entries for documents which are no longer in the integration's
+        configuration are dropped.
+
+        :param integration_id: ID of the SAML integration
+        :type integration_id: int
+
+        :param xml_metadata_hashes: List of (hash, XML metadata) 2-tuples
+        :type xml_metadata_hashes: List[Tuple[str, str]]
+
+        :param parse: Function converting XML metadata into a list of IdentityProviderMetadata objects
+        :type parse: Callable
+
+        :return: List of IdentityProviderMetadata objects
+        :rtype: List[api.saml.metadata.model.SAMLIdentityProviderMetadata]
+        """
+        with self._lock:
+            cached = self._identity_providers.get(integration_id, {})
+
+        current = {}
+        identity_providers = []
+
+        for xml_metadata_hash, xml_metadata in xml_metadata_hashes:
+            if xml_metadata_hash in current:
+                parsed = current[xml_metadata_hash]
+            elif xml_metadata_hash in cached:
+                parsed = cached[xml_metadata_hash]
+            else:
+                parsed = parse(xml_metadata)
+
+            current[xml_metadata_hash] = parsed
+            identity_providers.extend(parsed)
+
+        with self._lock:
+            self._identity_providers[integration_id] = current
+
+        return identity_providers
+
+    def get_settings(self, integration_id, fingerprint, idp_entity_id, build):
+        """Return OneLogin settings for the specified IdP.
+
+        :param integration_id: ID of the SAML integration
+        :type integration_id: int
+
+        :param fingerprint: Hash of all the metadata the integration's settings are built from
+        :type fingerprint: str
+
+        :param idp_entity_id: IdP's entity ID
+        :type idp_entity_id: str
+
+        :param build: Function building the settings dictionary when it's not cached
+        :type build: Callable
+
+        :return: Dictionary containing SP's and IdP's settings in the OneLogin's SAML Toolkit format
+        :rtype: Dict
+        """
+        with self._lock:
+            cached_fingerprint, cached = self._settings.get(
+                integration_id, (None, {})
+            )
+
+            if cached_fingerprint == fingerprint and idp_entity_id in cached:
+                return deepcopy(cached[idp_entity_id])
+
+        settings = build()
+
+        with self._lock:
+            cached_fingerprint, cached = self._settings.get(
+                integration_id, (None, {})
+            )
+
+            if cached_fingerprint != fingerprint:
+                cached = {}
+                self._settings[integration_id] = (fingerprint, cached)
+
+            cached[idp_entity_id] = settings
+
+        # The settings are handed over to OneLogin, so we return a copy
+        # to keep the cached version intact.
+        return deepcopy(settings)
+
+    def invalidate(self, integration_id=None):
+        """Drop cached entries.
+
+        :param integration_id: ID of the SAML integration whose entries must be dropped.
+            If it's None, all entries are dropped
+        :type integration_id: Optional[int]
+        """
+        self._logger.debug(
+            "Invalidating cached SAML metadata for integration {0}".format(
+                integration_id if integration_id is not None else "(all)"
+            )
+        )
+
+        with self._lock:
+            if integration_id is None:
+                self._identity_providers = {}
+                self._settings = {}
+            else:
+                self._identity_providers.pop(integration_id, None)
+                self._settings.pop(integration_id, None)
@@ -2,6 +2,8 @@ import logging
 
 from defusedxml.lxml import tostring
 from onelogin.saml2.idp_metadata_parser import OneLogin_Saml2_IdPMetadataParser
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.request import Request, urlopen
 
 from api.saml.metadata.federations.model import (
     SAMLFederatedIdentityProvider,
@@ -17,6 +19,53 @@ class SAMLMetadataLoadingError(BaseError):
     """Raised in the case of any errors occurred during loading of SAML metadata from a remote source"""
 
 
+class SAMLMetadataResponse(object):
+    """Contains metadata downloaded from a remote source along with its HTTP cache validators."""
+
+    def __init__(self, xml_metadata, etag=None, last_modified=None):
+        """Initialize a new instance of SAMLMetadataResponse class.
+
+        :param xml_metadata: XML string containing metadata
+        :type xml_metadata: string
+
+        :param etag: Value of the ETag header
+        :type etag: Optional[string]
+
+        :param last_modified: Value of the Last-Modified header
+        :type last_modified: Optional[string]
+        """
+        self._xml_metadata = xml_metadata
+        self._etag = etag
+        self._last_modified = last_modified
+
+    @property
+    def xml_metadata(self):
+        """Return the XML string containing metadata.
+
+        :return: XML string containing metadata
+        :rtype: string
+        """
+        return self._xml_metadata
+
+    @property
+    def etag(self):
+        """Return the value of the ETag header.
+
+        :return: Value of the ETag header
+        :rtype: Optional[string]
+        """
+        return self._etag
+
+    @property
+    def last_modified(self):
+        """Return the value of the Last-Modified header.
+
+        :return: Value of the Last-Modified header
+        :rtype: Optional[string]
+        """
+        return self._last_modified
+
+
 class SAMLMetadataLoader(object):
     """Loads SAML metadata from a remote source (e.g. InCommon Metadata Service)"""
 
@@ -47,6 +96,62 @@ class SAMLMetadataLoader(object):
 
         return xml_metadata
 
+    def load_idp_metadata_if_modified(self, url, etag=None, last_modified=None):
+        """Load IdP metadata in an XML format from the specified url using a conditional GET request.
+
+        :param url: URL of a metadata service
+        :type url: string
+
+        :param etag: ETag of the previously loaded metadata
+        :type etag: Optional[string]
+
+        :param last_modified: Last-Modified date of the previously loaded metadata
+        :type last_modified: Optional[string]
+
+        :return: SAMLMetadataResponse object or None if the metadata has not changed
+        :rtype: Optional[SAMLMetadataResponse]
+
+        :raise: MetadataLoadError
+        """
+        self._logger.info(
+            "Started loading IdP XML metadata from {0} (ETag = {1}, Last-Modified = {2})".format(
+                url, etag, last_modified
+            )
+        )
+
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        try:
+            response = urlopen(Request(url, headers=headers))
+            xml_metadata = response.read()
+            response_headers = response.info()
+        except HTTPError as exception:
+            if exception.code == 304:
+                self._logger.info("IdP XML metadata from {0} has not changed".format(url))
+
+                return None
+
+            raise SAMLMetadataLoadingError(inner_exception=exception)
+        except Exception as exception:
+            raise SAMLMetadataLoadingError(inner_exception=exception)
+
+        if not xml_metadata:
+            raise SAMLMetadataLoadingError(
+                "IdP XML metadata loaded from {0} is empty".format(url)
+            )
+
+        self._logger.info("Finished loading IdP XML metadata from {0}".format(url))
+
+        return SAMLMetadataResponse(
+            xml_metadata,
+            response_headers.get("ETag"),
+            response_headers.get("Last-Modified"),
+        )
+
 
 class SAMLFederatedIdentityProviderLoader(object):
     """Loads metadata of federated IdPs from the specified metadata service."""
@@ -108,14 +213,41 @@ class SAMLFederatedIdentityProviderLoader(object):
 
         return first_or_default(localized_values).value
 
-    def load(self, federation):
+    def _get_display_name(self, idp):
+        """Return the IdP's display name.
+
+        :param idp: IdP's metadata
+        :type idp: api.saml.metadata.model.SAMLIdentityProviderMetadata
+
+        :return: IdP's display name
+        :rtype: str
+        """
+        if idp.ui_info.display_names:
+            return self._try_to_get_an_english_value(idp.ui_info.display_names)
+        elif idp.organization.organization_display_names:
+            return self._try_to_get_an_english_value(
+                idp.organization.organization_display_names
+            )
+        elif idp.organization.organization_names:
+            return self._try_to_get_an_english_value(
+                idp.organization.organization_names
+            )
+        else:
+            return idp.entity_id
+
+    def load(self, federation, if_modified=False):
         """Loads metadata of federated IdPs from the specified metadata service.
 
         :param federation: SAML federation where loaded IdPs belong to
         :type federation: api.saml.metadata.federations.model.SAMLFederation
 
-        :return: List of SAMLFederatedIdP objects
-        :rtype: Iterable[api.saml.configuration.SAMLFederatedIdentityProvider]
+        :param if_modified: Boolean value indicating whether the metadata must be downloaded
+            only if it has changed since the last time.
+            In this case the federation's HTTP cache validators are updated
+        :type if_modified: bool
+
+        :return: List of SAMLFederatedIdP objects or None if the metadata has not changed
+        :rtype: Optional[Iterable[api.saml.configuration.SAMLFederatedIdentityProvider]]
         """
         if not isinstance(federation, SAMLFederation):
             raise ValueError(
@@ -127,29 +259,35 @@ class SAMLFederatedIdentityProviderLoader(object):
         self._logger.info("Started loading federated IdP's for {0}".format(federation))
 
         federated_idps = []
-        metadata = self._loader.load_idp_metadata(federation.idp_metadata_service_url)
 
-        self._validator.validate(federation, metadata)
+        if if_modified:
+            response = self._loader.load_idp_metadata_if_modified(
+                federation.idp_metadata_service_url,
+                federation.metadata_etag,
+                federation.metadata_last_modified,
+            )
 
-        parsing_results = self._parser.parse(bytes(metadata))
+            if response is None:
+                self._logger.info(
+                    "Metadata of federated IdP's for {0} has not changed".format(
+                        federation
+                    )
+                )
 
-        for parsing_result in parsing_results:
-            idp = parsing_result.provider
+                return None
 
-            if idp.ui_info.display_names:
-                display_name = self._try_to_get_an_english_value(
-                    idp.ui_info.display_names
-                )
-            elif idp.organization.organization_display_names:
-                display_name = self._try_to_get_an_english_value(
-                    idp.organization.organization_display_names
-                )
-            elif idp.organization.organization_names:
-                display_name = self._try_to_get_an_english_value(
-                    idp.organization.organization_names
-                )
-            else:
-                display_name = idp.entity_id
+            metadata = response.xml_metadata
+        else:
+            metadata = self._loader.load_idp_metadata(
+                federation.idp_metadata_service_url
+            )
+
+        self._validator.validate(federation, metadata)
+
+        # The aggregate may contain thousands of IdPs so we process it one EntityDescriptor at a time
+        for parsing_result in self._parser.iterparse(bytes(metadata)):
+            idp = parsing_result.provider
+            display_name = self._get_display_name(idp)
 
             xml_metadata = tostring(parsing_result.xml_node)
             federated_idp = SAMLFederatedIdentityProvider(
@@ -158,6 +296,10 @@ class SAMLFederatedIdentityProviderLoader(object):
 
             federated_idps.append(federated_idp)
 
+        if if_modified:
+            federation.metadata_etag = response.etag
+            federation.metadata_last_modified = response.last_modified
+
         self._logger.info(
             "Finished loading {0} federated IdP's for {1}".format(
                 len(federated_idps), federation
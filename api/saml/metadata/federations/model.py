@@ -1,3 +1,5 @@
+import hashlib
+
 from sqlalchemy import ARRAY, Column, DateTime, ForeignKey, Integer, String, Text
 from sqlalchemy.orm import relationship
 
@@ -15,6 +17,10 @@ class SAMLFederation(Base):
     idp_metadata_service_url = Column(String(2048), nullable=False)
     last_updated_at = Column(DateTime(), nullable=True)
 
+    # HTTP cache validators of the last downloaded metadata used to make conditional requests
+    metadata_etag = Column(String(256), nullable=True)
+    metadata_last_modified = Column(String(256), nullable=True)
+
     certificate = Column(Text(), nullable=True)
 
     identity_providers = relationship("SAMLFederatedIdentityProvider")
@@ -81,6 +87,7 @@ class SAMLFederatedIdentityProvider(Base):
     display_name = Column(String(256), nullable=False)
 
     xml_metadata = Column(Text(), nullable=False)
+    xml_metadata_hash = Column(String(64), nullable=True)
 
     federation_id = Column(Integer, ForeignKey("samlfederations.id"), index=True)
     federation = relationship("SAMLFederation", foreign_keys=federation_id)
@@ -117,6 +124,22 @@ class SAMLFederatedIdentityProvider(Base):
         self.entity_id = entity_id
         self.display_name = display_name
         self.xml_metadata = xml_metadata
+        self.xml_metadata_hash = self.calculate_xml_metadata_hash(xml_metadata)
+
+    @staticmethod
+    def calculate_xml_metadata_hash(xml_metadata):
+        """Calculate a hash of the IdP's XML metadata used to find out whether it has changed.
+
+        :param xml_metadata: IdP's XML metadata
+        :type xml_metadata: str
+
+        :return: Hex digest of the XML metadata
+        :rtype: str
+        """
+        if not isinstance(xml_metadata, bytes):
+            xml_metadata = xml_metadata.encode("utf-8")
+
+        return hashlib.sha256(xml_metadata).hexdigest()
 
     def __eq__(self, other):
         """Compare two SAMLFederatedIdentityProvider objects.
@@ -1,7 +1,13 @@
 import datetime
 import logging
 
-from api.saml.metadata.federations.model import SAMLFederation
+from sqlalchemy.orm import defer
+
+from api.saml.metadata.cache import SAMLMetadataCache
+from api.saml.metadata.federations.model import (
+    SAMLFederatedIdentityProvider,
+    SAMLFederation,
+)
 from core.monitor import Monitor
 
 
@@ -10,25 +16,40 @@ class SAMLMetadataMonitor(Monitor):
 
     MAX_AGE = datetime.timedelta(days=1)
 
-    def __init__(self, db, loader):
+    def __init__(self, db, loader, metadata_cache=None, incremental=True):
         """Initialize a new instance of SAMLMetadataMonitor class.
 
         :param loader: IdP loader
         :type loader: api.saml.loader.SAMLFederatedIdPLoader
+
+        :param metadata_cache: Cache of parsed metadata which must be invalidated once federations are updated
+        :type metadata_cache: Optional[api.saml.metadata.cache.SAMLMetadataCache]
+
+        :param incremental: Boolean value indicating whether the monitor should only insert, update or delete
+            IdPs that have changed instead of replacing all of them.
+            In this mode the metadata is not downloaded again if the metadata service reports it hasn't changed
+        :type incremental: bool
         """
         super(SAMLMetadataMonitor, self).__init__(db)
 
         self._loader = loader
+        self._metadata_cache = (
+            metadata_cache
+            if metadata_cache is not None
+            else SAMLMetadataCache.instance()
+        )
+        self._incremental = incremental
         self._logger = logging.getLogger(__name__)
 
-    def _update_saml_federation_idps_metadata(self, saml_federation):
-        """Update IdPs' metadata belonging to the specified SAML federation.
+    def _replace_saml_federation_idps_metadata(self, saml_federation):
+        """Replace all IdPs belonging to the specified SAML federation with the freshly loaded ones.
 
         :param saml_federation: SAML federation
         :type saml_federation: api.saml.metadata.federations.model.SAMLFederation
-        """
-        self._logger.info("Started processing {0}".format(saml_federation))
 
+        :return: Boolean value indicating whether IdPs have changed
+        :rtype: bool
+        """
         for existing_identity_provider in saml_federation.identity_providers:
             self._db.delete(existing_identity_provider)
 
@@ -37,8 +58,109 @@ class SAMLMetadataMonitor(Monitor):
         for new_identity_provider in new_identity_providers:
             self._db.add(new_identity_provider)
 
+        return True
+
+    def _merge_saml_federation_idps_metadata(self, saml_federation):
+        """Insert, update or delete only those IdPs belonging to the specified SAML federation which have changed.
+
+        IdPs are matched by their entity IDs and compared using hashes of their XML metadata
+        so that the (potentially large) XML metadata of existing IdPs doesn't have to be loaded.
+
+        :param saml_federation: SAML federation
+        :type saml_federation: api.saml.metadata.federations.model.SAMLFederation
+
+        :return: Boolean value indicating whether IdPs have changed
+        :rtype: bool
+        """
+        existing_identity_providers = {
+            identity_provider.entity_id: identity_provider
+            for identity_provider in self._db.query(SAMLFederatedIdentityProvider)
+            .options(defer(SAMLFederatedIdentityProvider.xml_metadata))
+            .filter(SAMLFederatedIdentityProvider.federation_id == saml_federation.id)
+        }
+
+        # There is no point in a conditional request if we don't have IdPs yet
+        new_identity_providers = self._loader.load(
+            saml_federation, if_modified=bool(existing_identity_providers)
+        )
+
+        if new_identity_providers is None:
+            return False
+
+        inserted = updated = unchanged = 0
+        processed_entity_ids = set()
+
+        for new_identity_provider in new_identity_providers:
+            entity_id = new_identity_provider.entity_id
+
+            if entity_id in processed_entity_ids:
+                self._logger.warning(
+                    "IdP {0} is declared more than once in {1}, ignoring the duplicate".format(
+                        entity_id, saml_federation
+                    )
+                )
+                continue
+
+            processed_entity_ids.add(entity_id)
+            existing_identity_provider = existing_identity_providers.get(entity_id)
+
+            if existing_identity_provider is None:
+                self._db.add(new_identity_provider)
+                inserted += 1
+            elif (
+                existing_identity_provider.xml_metadata_hash
+                != new_identity_provider.xml_metadata_hash
+                or existing_identity_provider.display_name
+                != new_identity_provider.display_name
+            ):
+                existing_identity_provider.display_name = (
+                    new_identity_provider.display_name
+                )
+                existing_identity_provider.xml_metadata = (
+                    new_identity_provider.xml_metadata
+                )
+                existing_identity_provider.xml_metadata_hash = (
+                    new_identity_provider.xml_metadata_hash
+                )
+                updated += 1
+            else:
+                unchanged += 1
+
+        deleted = 0
+        for entity_id, existing_identity_provider in existing_identity_providers.items():
+            if entity_id not in processed_entity_ids:
+                self._db.delete(existing_identity_provider)
+                deleted += 1
+
+        self._logger.info(
+            "{0}: {1} IdPs inserted, {2} updated, {3} deleted, {4} unchanged".format(
+                saml_federation, inserted, updated, deleted, unchanged
+            )
+        )
+
+        return bool(inserted or updated or deleted)
+
+    def _update_saml_federation_idps_metadata(self, saml_federation):
+        """Update IdPs' metadata belonging to the specified SAML federation.
+
+        :param saml_federation: SAML federation
+        :type saml_federation: api.saml.metadata.federations.model.SAMLFederation
+        """
+        self._logger.info("Started processing {0}".format(saml_federation))
+
+        if self._incremental:
+            changed = self._merge_saml_federation_idps_metadata(saml_federation)
+        else:
+            changed = self._replace_saml_federation_idps_metadata(saml_federation)
+
         saml_federation.last_updated_at = datetime.datetime.utcnow()
 
+        if changed:
+            # Cached entries are keyed by a hash of the metadata, so other processes
+            # will notice the change on their own; this only frees up the stale
+            # entries held by the current process.
+            self._metadata_cache.invalidate()
+
         self._logger.info("Finished processing {0}".format(saml_federation))
 
     def run_once(self, progress):
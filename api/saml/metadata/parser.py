@@ -1,8 +1,9 @@
 import logging
+from io import BytesIO
 
 from defusedxml.lxml import fromstring
 from flask_babel import lazy_gettext as _
-from lxml.etree import XMLSyntaxError
+from lxml.etree import XMLSyntaxError, iterparse
 from onelogin.saml2.constants import OneLogin_Saml2_Constants
 from onelogin.saml2.utils import OneLogin_Saml2_Utils
 
@@ -556,6 +557,110 @@ class SAMLMetadataParser(object):
 
         return self._select_first_indexed_element(nodes)
 
+    def _parse_entity_descriptor(self, entity_descriptor_node):
+        """Parses an EntityDescriptor node and translates it into a list of
+        IdentityProviderMetadata/ServiceProviderMetadata objects
+
+        :param entity_descriptor_node: EntityDescriptor node
+        :type entity_descriptor_node: defusedxml.lxml.RestrictedElement
+
+        :return: List of SAMLMetadataParsingResult objects
+        :rtype: List[SAMLMetadataParsingResult]
+
+        :raise: MetadataParsingError
+        """
+        parsing_results = []
+
+        idp_descriptor_nodes = OneLogin_Saml2_Utils.query(
+            entity_descriptor_node, "./md:IDPSSODescriptor"
+        )
+        idps = self._parse_providers(
+            entity_descriptor_node,
+            idp_descriptor_nodes,
+            self._parse_idp_metadata,
+        )
+
+        for idp in idps:
+            parsing_result = SAMLMetadataParsingResult(idp, entity_descriptor_node)
+            parsing_results.append(parsing_result)
+
+        sp_descriptor_nodes = OneLogin_Saml2_Utils.query(
+            entity_descriptor_node, "./md:SPSSODescriptor"
+        )
+        sps = self._parse_providers(
+            entity_descriptor_node, sp_descriptor_nodes, self._parse_sp_metadata
+        )
+
+        for sp in sps:
+            parsing_result = SAMLMetadataParsingResult(sp, entity_descriptor_node)
+            parsing_results.append(parsing_result)
+
+        return parsing_results
+
+    def iterparse(self, xml_metadata):
+        """Parses an XML string containing SAML metadata one EntityDescriptor at a time.
+
+        Unlike parse, this method never builds the DOM of the whole document,
+        which makes it suitable for aggregates containing thousands of providers (e.g. InCommon).
+        Each EntityDescriptor node is discarded once the next result is requested,
+        so SAMLMetadataParsingResult.xml_node must be used before moving on.
+
+        :param xml_metadata: XML string containing SAML metadata
+        :type xml_metadata: string
+
+        :return: Iterator over SAMLMetadataParsingResult objects
+        :rtype: Iterator[SAMLMetadataParsingResult]
+
+        :raise: MetadataParsingError
+        """
+        self._logger.info(
+            "Started parsing an XML string containing SAML metadata incrementally"
+        )
+
+        entity_descriptor_tag = "{{{0}}}EntityDescriptor".format(
+            OneLogin_Saml2_Constants.NS_MD
+        )
+        events = iterparse(
+            BytesIO(bytes(xml_metadata)),
+            events=("start", "end"),
+            load_dtd=False,
+            no_network=True,
+            resolve_entities=False,
+        )
+        root_found = False
+
+        try:
+            for event, node in events:
+                if event == "start":
+                    if not root_found and node.getroottree().docinfo.doctype:
+                        raise SAMLMetadataParsingError(
+                            _("DTDs are not allowed in SAML metadata")
+                        )
+
+                    root_found = True
+                    continue
+
+                if node.tag != entity_descriptor_tag:
+                    continue
+
+                for parsing_result in self._parse_entity_descriptor(node):
+                    yield parsing_result
+
+                # Free the memory taken by the EntityDescriptors we've already processed
+                node.clear()
+                while node.getprevious() is not None:
+                    del node.getparent()[0]
+        except XMLSyntaxError as exception:
+            self._logger.exception(
+                "An unexpected error occurred during parsing an XML string containing SAML metadata"
+            )
+
+            raise SAMLMetadataParsingError(inner_exception=exception)
+
+        self._logger.info(
+            "Finished parsing an XML string containing SAML metadata incrementally"
+        )
+
     def parse(self, xml_metadata):
         """Parses an XML string containing SAML metadata and translates it into a list of
         IdentityProviderMetadata/ServiceProviderMetadata objects
@@ -579,33 +684,9 @@ class SAMLMetadataParser(object):
             )
 
             for entity_descriptor_node in entity_descriptor_nodes:
-                idp_descriptor_nodes = OneLogin_Saml2_Utils.query(
-                    entity_descriptor_node, "./md:IDPSSODescriptor"
-                )
-                idps = self._parse_providers(
-                    entity_descriptor_node,
-                    idp_descriptor_nodes,
-                    self._parse_idp_metadata,
+                parsing_results.extend(
+                    self._parse_entity_descriptor(entity_descriptor_node)
                 )
-
-                for idp in idps:
-                    parsing_result = SAMLMetadataParsingResult(
-                        idp, entity_descriptor_node
-                    )
-                    parsing_results.append(parsing_result)
-
-                sp_descriptor_nodes = OneLogin_Saml2_Utils.query(
-                    entity_descriptor_node, "./md:SPSSODescriptor"
-                )
-                sps = self._parse_providers(
-                    entity_descriptor_node, sp_descriptor_nodes, self._parse_sp_metadata
-                )
-
-                for sp in sps:
-                    parsing_result = SAMLMetadataParsingResult(
-                        sp, entity_descriptor_node
-                    )
-                    parsing_results.append(parsing_result)
         except XMLSyntaxError as exception:
             self._logger.exception(
                 "An unexpected error occurred during parsing an XML string containing SAML metadata"
@@ -12,6 +12,7 @@ from api.problem_details import *
 from api.saml.auth import SAMLAuthenticationManager, SAMLAuthenticationManagerFactory
 from api.saml.configuration.model import SAMLConfiguration, SAMLConfigurationFactory
 from api.saml.configuration.validator import SAMLSettingsValidator
+from api.saml.metadata.cache import SAMLMetadataCache
 from api.saml.metadata.filter import SAMLSubjectFilter
 from api.saml.metadata.model import (
     SAMLLocalizedMetadataItem,
@@ -75,8 +76,13 @@ class SAMLWebSSOAuthenticationProvider(
 
         self._logger = logging.getLogger(__name__)
         self._configuration_storage = ConfigurationStorage(self)
-        self._configuration_factory = SAMLConfigurationFactory(SAMLMetadataParser())
-        self._authentication_manager_factory = SAMLAuthenticationManagerFactory()
+        metadata_cache = SAMLMetadataCache.instance()
+        self._configuration_factory = SAMLConfigurationFactory(
+            SAMLMetadataParser(), metadata_cache, integration.id
+        )
+        self._authentication_manager_factory = SAMLAuthenticationManagerFactory(
+            metadata_cache
+        )
 
         db = Session.object_session(library)
 
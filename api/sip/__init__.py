@@ -4,7 +4,10 @@ from api.authenticator import (
     BasicAuthenticationProvider,
     PatronData,
 )
-from api.sip.client import SIPClient
+from api.sip.client import (
+    SIPClient,
+    SIPConnectionPool,
+)
 from core.util.http import RemoteIntegrationException
 from core.util import MoneyUtility
 from core.model import ExternalIntegration
@@ -26,6 +29,7 @@ class SIP2AuthenticationProvider(BasicAuthenticationProvider):
     SSL_KEY = "ssl_key"
     ILS = "ils"
     PATRON_STATUS_BLOCK = "patron status block"
+    CONNECTION_POOL_SIZE = "connection pool size"
 
     SETTINGS = [
         { "key": ExternalIntegration.URL, "label": _("Server"), "required": True },
@@ -76,6 +80,12 @@ class SIP2AuthenticationProvider(BasicAuthenticationProvider):
           ],
           "default": "true",
         },
+        { "key": CONNECTION_POOL_SIZE,
+          "label": _("Connection pool size"),
+          "description": _("The number of connections to the SIP2 server each web server process may keep open between patron authentications, avoiding a new connection and login each time. Set this to 0 to open a new connection for every authentication. Make sure the SIP2 server allows enough simultaneous connections for all of your web server processes."),
+          "type": "number",
+          "default": 0,
+        },
     ] + BasicAuthenticationProvider.SETTINGS
 
     # Map the reasons why SIP2 might report a patron is blocked to the
@@ -147,19 +157,46 @@ class SIP2AuthenticationProvider(BasicAuthenticationProvider):
             self.fields_that_deny_borrowing = SIPClient.PATRON_STATUS_FIELDS_THAT_DENY_BORROWING_PRIVILEGES
         else:
             self.fields_that_deny_borrowing = []
+        self.connection_pool_size = integration.setting(
+            self.CONNECTION_POOL_SIZE
+        ).int_value or 0
+
+    def _client(self):
+        """Create a SIPClient for this integration's server."""
+        return SIPClient(
+            target_server=self.server, target_port=self.port,
+            login_user_id=self.login_user_id, login_password=self.login_password,
+            location_code=self.location_code, institution_id=self.institution_id, separator=self.field_separator,
+            use_ssl=self.use_ssl, ssl_cert=self.ssl_cert, ssl_key=self.ssl_key,
+            dialect=self.dialect
+        )
+
+    @property
+    def connection_pool(self):
+        """The pool of connections to this integration's server, or None
+        if connections aren't pooled.
+        """
+        if self.client or self.connection_pool_size <= 0:
+            return None
+        return SIPConnectionPool.get(
+            self.server, self.port, self.login_user_id, self._client,
+            self.connection_pool_size
+        )
 
     def patron_information(self, username, password):
         try:
+            pool = self.connection_pool
+            if pool:
+                def lookup(sip):
+                    info = sip.patron_information(username, password)
+                    sip.end_session(username, password)
+                    return info
+                return pool.run(lookup)
+
             if self.client:
                 sip = self.client
             else:
-                sip = SIPClient(
-                    target_server=self.server, target_port=self.port,
-                    login_user_id=self.login_user_id, login_password=self.login_password,
-                    location_code=self.location_code, institution_id=self.institution_id, separator=self.field_separator,
-                    use_ssl=self.use_ssl, ssl_cert=self.ssl_cert, ssl_key=self.ssl_key,
-                    dialect=self.dialect
-                )
+                sip = self._client()
             sip.connect()
             sip.login()
             info = sip.patron_information(username, password)
@@ -200,13 +237,7 @@ class SIP2AuthenticationProvider(BasicAuthenticationProvider):
         if self.client:
             sip = self.client
         else:
-            sip = SIPClient(
-                target_server=self.server, target_port=self.port,
-                login_user_id=self.login_user_id, login_password=self.login_password,
-                location_code=self.location_code, institution_id=self.institution_id, separator=self.field_separator,
-                use_ssl=self.use_ssl, ssl_cert=self.ssl_cert, ssl_key=self.ssl_key,
-                dialect=self.dialect
-            )
+            sip = self._client()
 
         connection = self.run_test(
             ("Test Connection"),
@@ -32,6 +32,8 @@ import re
 import socket
 import ssl
 import tempfile
+import time
+from threading import Lock
 from api.sip.dialect import GenericILS
 
 # SIP2 defines a large number of fields which are used in request and
@@ -77,6 +79,16 @@ fixed._add('recall_items_count', 4)
 fixed._add('unavailable_holds_count', 4)
 fixed._add('login_ok', 1)
 fixed._add('end_session', 1)
+fixed._add('online_status', 1)
+fixed._add('checkin_ok', 1)
+fixed._add('checkout_ok', 1)
+fixed._add('acs_renewal_policy', 1)
+fixed._add('status_update_ok', 1)
+fixed._add('offline_ok', 1)
+fixed._add('timeout_period', 3)
+fixed._add('retries_allowed', 3)
+fixed._add('date_time_sync', 18)
+fixed._add('protocol_version', 4)
 
 class named(object):
     """A variable-length field in a SIP2 response."""
@@ -149,6 +161,9 @@ named._add("home_address", "BD")
 named._add("email_address", "BE")
 named._add("phone_number", "BF")
 named._add("sequence_number", "AY")
+named._add("library_name", "AM")
+named._add("supported_messages", "BX")
+named._add("terminal_location", "AN")
 
 # The spec doesn't say there can be more than one screen message,
 # but I have seen it happen.
@@ -314,6 +329,15 @@ class SIPClient(Constants):
         else:
             return None
 
+    def sc_status(self, *args, **kwargs):
+        """Ask the server about its status.
+
+        This is a cheap way to check that a connection still works.
+        """
+        return self.make_request(
+            self.sc_status_message, self.acs_status_parser, *args, **kwargs
+        )
+
     def connect(self):
         """Create a socket connection to a SIP server."""
         try:
@@ -469,6 +493,41 @@ class SIPClient(Constants):
             message += self.separator + "AD" + patron_password
         return message
 
+    def sc_status_message(self, status_code="0", max_print_width="999",
+                          protocol_version="2.00"):
+        """Generate a message asking for the status of the ACS.
+
+        Format of message to send to ILS:
+        99<status code><max print width><protocol version>
+        status code: 1-char, 0 (SC OK), 1 (out of paper) or 2 (shutting down)
+        max print width: 3-char
+        protocol version: 4-char, x.xx
+        """
+        return "99" + status_code + max_print_width + protocol_version
+
+    def acs_status_parser(self, message):
+        """Parse the response to an SC status message."""
+        return self.parse_response(
+            message,
+            98,
+            fixed.online_status,
+            fixed.checkin_ok,
+            fixed.checkout_ok,
+            fixed.acs_renewal_policy,
+            fixed.status_update_ok,
+            fixed.offline_ok,
+            fixed.timeout_period,
+            fixed.retries_allowed,
+            fixed.date_time_sync,
+            fixed.protocol_version,
+            named.institution_id.required,
+            named.library_name,
+            named.supported_messages.required,
+            named.terminal_location,
+            named.screen_message,
+            named.print_line
+        )
+
     def end_session_response_parser(self, message):
         """Parse the response from a end session message."""
         return self.parse_response(
@@ -832,6 +891,178 @@ class SIPClient(Constants):
         return text
 
 
+class SIPConnectionPool(object):
+    """Logged-in connections to a SIP2 server, kept open for reuse.
+
+    Connecting (possibly with an SSL handshake) and logging in can
+    take longer than the patron information request itself. A pool
+    lets a series of authentications share a connection.
+
+    Pools are shared by everything in this process that connects to
+    the same server as the same SIP user.
+    """
+
+    log = logging.getLogger("SIP connection pool")
+
+    # The most idle connections to one server a process will keep open.
+    DEFAULT_SIZE = 5
+
+    # A connection that has been idle for this many seconds is checked
+    # with an SC Status message before it's reused, since the server
+    # may have closed it.
+    HEALTH_CHECK_INTERVAL = 30
+
+    _pools = {}
+    _pools_lock = Lock()
+
+    def __init__(self, client_factory, size=None,
+                 health_check_interval=None, clock=time.time):
+        """Constructor.
+
+        :param client_factory: A function that creates a new,
+            unconnected SIPClient.
+        :param size: The most idle connections to keep open.
+        :param clock: A function that returns the current time in
+            seconds. Only intended for use during testing.
+        """
+        self.client_factory = client_factory
+        if size is None:
+            size = self.DEFAULT_SIZE
+        self.size = size
+        if health_check_interval is None:
+            health_check_interval = self.HEALTH_CHECK_INTERVAL
+        self.health_check_interval = health_check_interval
+        self.clock = clock
+        self._idle = []
+        self._lock = Lock()
+        self._pid = os.getpid()
+
+    @classmethod
+    def get(cls, target_server, target_port, login_user_id, client_factory,
+            size=None):
+        """Find or create the pool for a SIP2 server.
+
+        :param client_factory: A function that creates a new,
+            unconnected SIPClient. This replaces any factory the pool
+            already had, so new connections use the latest settings.
+        """
+        key = (target_server, target_port, login_user_id)
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if not pool:
+                pool = cls(client_factory, size)
+                cls._pools[key] = pool
+            else:
+                pool.client_factory = client_factory
+                if size is not None:
+                    pool.size = size
+        return pool
+
+    @classmethod
+    def reset(cls):
+        """Close every pooled connection."""
+        with cls._pools_lock:
+            pools = cls._pools.values()
+            cls._pools = {}
+        for pool in pools:
+            pool.close()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+        for client, last_used in idle:
+            self.discard(client)
+
+    def new_client(self):
+        """Create a new connection and log in."""
+        client = self.client_factory()
+        client.connect()
+        try:
+            client.login()
+        except Exception:
+            self.discard(client)
+            raise
+        return client
+
+    def checkout(self):
+        """Get a logged-in client for exclusive use.
+
+        :return: A 2-tuple (client, reused). `reused` is True if the
+            client came from the pool rather than being newly created.
+        """
+        while True:
+            with self._lock:
+                if self._pid != os.getpid():
+                    # This process was forked. The idle sockets belong
+                    # to the parent process.
+                    self._idle = []
+                    self._pid = os.getpid()
+                if not self._idle:
+                    break
+                client, last_used = self._idle.pop()
+            if (self.clock() - last_used < self.health_check_interval
+                or self.healthy(client)):
+                return client, True
+            self.discard(client)
+        return self.new_client(), False
+
+    def checkin(self, client):
+        """Return a client to the pool once it's no longer in use."""
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append((client, self.clock()))
+                return
+        self.discard(client)
+
+    def discard(self, client):
+        """Close a client's connection without returning it to the pool."""
+        try:
+            client.disconnect()
+        except Exception, e:
+            self.log.info("Error disconnecting from SIP server: %s", e)
+
+    def healthy(self, client):
+        """Check whether an idle connection still works."""
+        try:
+            status = client.sc_status()
+        except IOError, e:
+            self.log.info("Pooled SIP connection failed health check: %s", e)
+            return False
+        return status.get('online_status') == 'Y'
+
+    def run(self, operation):
+        """Call `operation` with a logged-in client.
+
+        If a reused connection fails -- the server may have closed it,
+        or it may keep asking for messages to be resent -- it's thrown
+        away and the operation is retried on a new connection.
+
+        :param operation: A function that takes a SIPClient.
+        :return: Whatever `operation` returns.
+        """
+        client, reused = self.checkout()
+        try:
+            result = operation(client)
+        except IOError, e:
+            self.discard(client)
+            if not reused:
+                raise
+            self.log.info("Reconnecting to SIP server after error: %s", e)
+            client = self.new_client()
+            try:
+                result = operation(client)
+            except Exception, e:
+                self.discard(client)
+                raise
+        except Exception, e:
+            self.discard(client)
+            raise
+        self.checkin(client)
+        return result
+
+
 class MockSIPClient(SIPClient):
     """A SIP client that relies on canned responses rather than a socket
     connection.
@@ -0,0 +1,4 @@
+-- Columns used by SAMLMetadataMonitor to refresh federated IdPs incrementally.
+ALTER TABLE samlfederations ADD COLUMN IF NOT EXISTS metadata_etag varchar(256);
+ALTER TABLE samlfederations ADD COLUMN IF NOT EXISTS metadata_last_modified varchar(256);
+ALTER TABLE samlfederatedidps ADD COLUMN IF NOT EXISTS xml_metadata_hash varchar(64);
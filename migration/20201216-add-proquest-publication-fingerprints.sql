@@ -0,0 +1,9 @@
+-- Fingerprints used by ProQuestOPDS2ImportMonitor to skip publications which haven't changed since the last import.
+CREATE TABLE IF NOT EXISTS proquestpublicationfingerprints (
+    id serial PRIMARY KEY,
+    collection_id integer NOT NULL REFERENCES collections(id),
+    identifier varchar NOT NULL,
+    fingerprint varchar(64) NOT NULL,
+    UNIQUE (collection_id, identifier)
+);
+CREATE INDEX IF NOT EXISTS ix_proquestpublicationfingerprints_collection_id ON proquestpublicationfingerprints (collection_id);
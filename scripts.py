@@ -1,9 +1,12 @@
 # encoding: utf-8
 import argparse
 import csv
+import functools
 import logging
+import multiprocessing
 import os
 import sys
+import tempfile
 import time
 from cStringIO import StringIO
 from datetime import (
@@ -16,6 +19,7 @@ from sqlalchemy import (
     or_,
 )
 
+from api.admin.dashboard_stats import DashboardStatistics
 from api.adobe_vendor_id import (
     AuthdataUtility,
 )
@@ -29,7 +33,10 @@ from api.config import (
 from api.controller import CirculationManager
 from api.lanes import create_default_lanes
 from api.local_analytics_exporter import LocalAnalyticsExporter
-from api.marc import LibraryAnnotator as MARCLibraryAnnotator
+from api.marc import (
+    LibraryAnnotator as MARCLibraryAnnotator,
+    MARCFileCheckpoint,
+)
 from api.novelist import (
     NoveListAPI
 )
@@ -51,14 +58,21 @@ from api.overdrive import (
 )
 from core.entrypoint import EntryPoint
 from core.external_list import CustomListFromCSV
-from core.external_search import ExternalSearchIndex
+from core.external_search import (
+    ExternalSearchIndex,
+    SortKeyPagination,
+)
 from core.lane import Lane
 from core.lane import (
     Pagination,
     Facets,
     FeaturedFacets,
+    WorkList,
+)
+from core.marc import (
+    MARCExporter,
+    MARCExporterFacets,
 )
-from core.marc import MARCExporter
 from core.metadata_layer import (
     CirculationData,
     FormatData,
@@ -79,12 +93,15 @@ from core.model import (
     Edition,
     ExternalIntegration,
     get_one,
+    get_one_or_create,
     Hold,
     Hyperlink,
     Identifier,
+    Library,
     LicensePool,
     Loan,
     Representation,
+    Resource,
     RightsStatus,
     SessionManager,
     Subject,
@@ -296,6 +313,28 @@ class UpdateStaffPicksScript(Script):
         return StringIO(representation.content)
 
 
+# The script used by a CacheRepresentationPerLane worker process.
+_lane_worker = None
+
+
+def _initialize_lane_worker(script_class, cmd_args):
+    """Set up a worker process for a script that processes lanes in
+    parallel.
+
+    Each worker has its own database session and its own copy of the
+    script.
+    """
+    global _lane_worker
+    _db = SessionManager.session(Configuration.database_url())
+    _lane_worker = script_class(_db, cmd_args=cmd_args)
+    _lane_worker.start_worker()
+
+
+def _run_lane_task(task):
+    """Run one of a script's tasks in a worker process."""
+    return _lane_worker.process_task(*task)
+
+
 class CacheRepresentationPerLane(TimestampScript, LaneSweeperScript):
 
     name = "Cache one representation per lane"
@@ -320,6 +359,12 @@ class CacheRepresentationPerLane(TimestampScript, LaneSweeperScript):
             type=int,
             default=1
         )
+        parser.add_argument(
+            '--workers',
+            help='Generate feeds in this many processes at once.',
+            type=int,
+            default=1
+        )
         return parser
 
     def __init__(self, _db=None, cmd_args=None, testing=False, manager=None,
@@ -339,6 +384,7 @@ class CacheRepresentationPerLane(TimestampScript, LaneSweeperScript):
         """
 
         super(CacheRepresentationPerLane, self).__init__(_db, *args, **kwargs)
+        self.cmd_args = cmd_args
         self.parse_args(cmd_args)
         if not manager:
             manager = CirculationManager(self._db, testing=testing)
@@ -360,6 +406,7 @@ class CacheRepresentationPerLane(TimestampScript, LaneSweeperScript):
                     self.log.warn("Ignored unrecognized language code %s", alpha)
         self.max_depth = parsed.max_depth
         self.min_depth = parsed.min_depth
+        self.workers = max(parsed.workers, 1)
 
         # Return the parsed arguments in case a subclass needs to
         # process more args.
@@ -409,13 +456,124 @@ class CacheRepresentationPerLane(TimestampScript, LaneSweeperScript):
         client = self.app.test_client()
         ctx = self.app.test_request_context(base_url=self.base_url)
         ctx.push()
-        super(CacheRepresentationPerLane, self).process_library(library)
+        if self.workers > 1:
+            self.process_library_in_parallel(library)
+        else:
+            super(CacheRepresentationPerLane, self).process_library(library)
         ctx.pop()
         end = time.time()
         self.log.info(
             "Processed library %s in %.2fsec", library.short_name, end-begin
         )
 
+    def lanes_to_process(self, library):
+        """Find the library's lanes that should be processed, in the same
+        order LaneSweeperScript would process them.
+        """
+        queue = [WorkList.top_level_for_library(self._db, library)]
+        while queue:
+            new_queue = []
+            for lane in queue:
+                if self.should_process_lane(lane):
+                    yield lane
+                new_queue.extend(lane.children)
+            queue = new_queue
+
+    def make_worker_pool(self):
+        """Create the pool of processes that will generate feeds."""
+        return multiprocessing.Pool(
+            self.workers, initializer=_initialize_lane_worker,
+            initargs=(self.__class__, self.cmd_args)
+        )
+
+    def start_worker(self):
+        """Prepare this script to generate feeds in a worker process."""
+        self._worker_context = self.app.test_request_context(
+            base_url=self.base_url
+        )
+        self._worker_context.push()
+
+    def process_library_in_parallel(self, library):
+        """Generate the feeds for a library's lanes in a pool of
+        worker processes.
+
+        Each set of facets for each lane is a separate task. A failure
+        in one task is logged, and doesn't stop the others.
+
+        :return: A dictionary mapping lane ID to a dictionary of
+            statistics about that lane's feeds.
+        """
+        tasks = []
+        lanes = {}
+        for lane in self.lanes_to_process(library):
+            if not isinstance(lane, Lane):
+                # A WorkList that's not stored in the database can't
+                # be handed to another process. Process it here.
+                self.process_lane(lane)
+                continue
+            lanes[lane.id] = dict(
+                identifier=lane.full_identifier, tasks=0, feeds=0, bytes=0,
+                seconds=0, errors=0
+            )
+            for index, facets in enumerate(self.facets(lane)):
+                tasks.append((lane.id, index))
+                lanes[lane.id]['tasks'] += 1
+
+        # Don't leave a transaction open while the workers run.
+        self._db.commit()
+        self.log.info(
+            "Generating feeds for %d lanes (%d tasks) in %d processes.",
+            len(lanes), len(tasks), self.workers
+        )
+        pool = self.make_worker_pool()
+        try:
+            for done, result in enumerate(
+                pool.imap_unordered(_run_lane_task, tasks), 1
+            ):
+                stats = lanes[result['lane_id']]
+                stats['tasks'] -= 1
+                stats['seconds'] += result['seconds']
+                stats['feeds'] += result['feeds']
+                stats['bytes'] += result['bytes']
+                if result['error']:
+                    stats['errors'] += 1
+                if not stats['tasks']:
+                    self.log.info(
+                        "Finished %s: %d feeds, %d bytes, %.2fsec, %d errors.",
+                        stats['identifier'], stats['feeds'], stats['bytes'],
+                        stats['seconds'], stats['errors']
+                    )
+                self.log.info("Progress: %d/%d tasks done.", done, len(tasks))
+        finally:
+            pool.close()
+            pool.join()
+        return lanes
+
+    def process_task(self, lane_id, facets_index):
+        """Generate the feeds for one set of facets for one lane.
+
+        :return: A dictionary describing the work that was done.
+        """
+        result = dict(
+            lane_id=lane_id, feeds=0, bytes=0, seconds=0, error=None
+        )
+        begin = time.time()
+        try:
+            lane = get_one(self._db, Lane, id=lane_id)
+            facets = list(self.facets(lane))[facets_index]
+            feeds = self.process_facets(lane, facets)
+            self._db.commit()
+            result['feeds'] = len(feeds)
+            result['bytes'] = sum(len(x.data) for x in feeds)
+        except Exception, e:
+            self._db.rollback()
+            self.log.error(
+                "Error generating feeds for lane %s", lane_id, exc_info=e
+            )
+            result['error'] = repr(e)
+        result['seconds'] = time.time() - begin
+        return result
+
     def process_lane(self, lane):
         """Generate a number of feeds for this lane.
         One feed will be generated for each combination of Facets and
@@ -423,26 +581,31 @@ class CacheRepresentationPerLane(TimestampScript, LaneSweeperScript):
         """
         cached_feeds = []
         for facets in self.facets(lane):
-            for pagination in self.pagination(lane):
-                extra_description = ""
-                if facets:
-                    extra_description += " Facets: %s." % facets.query_string
-                if pagination:
-                    extra_description += " Pagination: %s." % pagination.query_string
+            cached_feeds.extend(self.process_facets(lane, facets))
+        return cached_feeds
+
+    def process_facets(self, lane, facets):
+        """Generate every page of this lane's feed for one set of facets."""
+        cached_feeds = []
+        for pagination in self.pagination(lane):
+            extra_description = ""
+            if facets:
+                extra_description += " Facets: %s." % facets.query_string
+            if pagination:
+                extra_description += " Pagination: %s." % pagination.query_string
+            self.log.info(
+                "Generating feed for %s.%s", lane.full_identifier,
+                extra_description
+            )
+            a = time.time()
+            feed = self.do_generate(lane, facets, pagination)
+            b = time.time()
+            if feed:
+                cached_feeds.append(feed)
                 self.log.info(
-                    "Generating feed for %s.%s", lane.full_identifier,
-                    extra_description
+                    "Took %.2f sec to make %d bytes.", (b-a),
+                    len(feed.data)
                 )
-                a = time.time()
-                feed = self.do_generate(lane, facets, pagination)
-                b = time.time()
-                if feed:
-                    cached_feeds.append(feed)
-                    self.log.info(
-                        "Took %.2f sec to make %d bytes.", (b-a),
-                        len(feed.data)
-                    )
-        total_size = sum(len(x.data) for x in cached_feeds)
         return cached_feeds
 
     def facets(self, lane):
@@ -708,17 +871,49 @@ class CacheMARCFiles(LaneSweeperScript):
             help="Generate new MARC files even if MARC files have already been generated recently enough",
             dest='force', action='store_true',
         )
+        parser.add_argument(
+            '--workers',
+            help='Generate each MARC file in shards, using this many worker processes. Progress is saved after each shard, so an interrupted run can be resumed.',
+            type=int,
+            default=1,
+        )
+        parser.add_argument(
+            '--shard-size',
+            help='The number of works in each shard.',
+            type=int,
+            default=CacheMARCFiles.DEFAULT_SHARD_SIZE,
+        )
+        parser.add_argument(
+            '--checkpoint-dir',
+            help='Save the progress of sharded runs in this directory.',
+            default=os.path.join(tempfile.gettempdir(), "marc-checkpoints"),
+        )
         return parser
 
+    # The number of works to look up in the search index at a time.
+    QUERY_BATCH_SIZE = 500
+
+    DEFAULT_SHARD_SIZE = 1000
+
+    # S3 won't accept a part of a multipart upload smaller than 5 MB,
+    # except for the last part.
+    MINIMUM_UPLOAD_PART_SIZE = 5 * 1024 * 1024
+
     def __init__(self, _db=None, cmd_args=None, *args, **kwargs):
         super(CacheMARCFiles, self).__init__(_db, *args, **kwargs)
+        self.cmd_args = cmd_args
         self.parse_args(cmd_args)
+        self._search_engine = None
+        self._annotators = {}
 
     def parse_args(self, cmd_args=None):
         parser = self.arg_parser(self._db)
         parsed = parser.parse_args(cmd_args)
         self.max_depth = parsed.max_depth
         self.force = parsed.force
+        self.workers = max(parsed.workers, 1)
+        self.shard_size = max(parsed.shard_size, 1)
+        self.checkpoint_dir = parsed.checkpoint_dir
         return parsed
 
     def should_process_library(self, library):
@@ -786,8 +981,13 @@ class CacheMARCFiles(LaneSweeperScript):
             self.log.info("No storage External Integration was found.")
             return
 
+        if self.workers > 1:
+            export = functools.partial(self.export_in_shards, exporter)
+        else:
+            export = exporter.records
+
         # First update the file with ALL the records.
-        records = exporter.records(
+        records = export(
             lane, annotator, storage_integration
         )
 
@@ -797,10 +997,233 @@ class CacheMARCFiles(LaneSweeperScript):
             # Allow one day of overlap to ensure we don't miss anything due to script timing.
             start_time = last_update - timedelta(days=1)
 
-            records = exporter.records(
+            records = export(
                 lane, annotator, storage_integration, start_time=start_time
             )
 
+    @property
+    def search_engine(self):
+        if not self._search_engine:
+            self._search_engine = ExternalSearchIndex(self._db)
+        return self._search_engine
+
+    def checkpoint(self, lane, start_time=None):
+        """Find the MARCFileCheckpoint for one of a lane's MARC files."""
+        if isinstance(lane, Lane):
+            library = lane.library
+            lane_name = "lane-%s" % lane.id
+        else:
+            library = lane.get_library(self._db)
+            lane_name = "all"
+        if start_time:
+            file_name = "updates-since-%s" % start_time.strftime(
+                "%Y%m%d%H%M%S"
+            )
+        else:
+            file_name = "full"
+        return MARCFileCheckpoint(os.path.join(
+            self.checkpoint_dir, library.short_name, lane_name, file_name
+        ))
+
+    def work_ids(self, lane, start_time=None):
+        """Find the IDs of the works that go into one of a lane's MARC
+        files, in the order the exporter would use.
+        """
+        facets = MARCExporterFacets(start_time=start_time)
+        pagination = SortKeyPagination(size=self.QUERY_BATCH_SIZE)
+        work_ids = []
+        while pagination is not None:
+            works = lane.works(
+                self._db, pagination=pagination, facets=facets,
+                search_engine=self.search_engine
+            )
+            work_ids.extend(work.id for work in works)
+            pagination = pagination.next_page
+        return work_ids
+
+    def export_in_shards(self, exporter, lane, annotator, mirror_integration,
+                         start_time=None):
+        """Generate a MARC file for a lane in a pool of worker
+        processes, and upload it to `mirror_integration`.
+
+        This does the same job as MARCExporter.records, but the
+        lane's works are divided into shards and each shard's records
+        are created by a worker. Finished shards are saved to a
+        checkpoint, so if this run is interrupted the next one only
+        creates the records for the shards that weren't finished.
+
+        :return: The CachedMARCFile, or None if the file couldn't be
+            finished.
+        """
+        library = annotator.library
+        checkpoint = self.checkpoint(lane, start_time)
+        progress = checkpoint.load()
+        if progress:
+            shards, end_time = progress
+            self.log.info(
+                "Resuming MARC file for %s from checkpoint in %s",
+                lane.display_name, checkpoint.directory
+            )
+        else:
+            end_time = datetime.utcnow()
+            work_ids = self.work_ids(lane, start_time)
+            shards = [
+                work_ids[i:i+self.shard_size]
+                for i in range(0, len(work_ids), self.shard_size)
+            ]
+            checkpoint.start(shards, end_time)
+
+        tasks = [
+            (library.id, exporter.integration.id, checkpoint.directory,
+             index, shard)
+            for index, shard in enumerate(shards)
+            if not checkpoint.is_finished(index)
+        ]
+        self.log.info(
+            "%s: %d shards, %d left to process",
+            lane.display_name, len(shards), len(tasks)
+        )
+
+        failures = 0
+        if tasks:
+            # Don't leave a transaction open while the workers run.
+            self._db.commit()
+            pool = self.make_worker_pool()
+            try:
+                for result in pool.imap_unordered(_run_lane_task, tasks):
+                    if result['error']:
+                        failures += 1
+                        self.log.error(
+                            "Error creating shard %d of the MARC file for %s: %s",
+                            result['index'], lane.display_name,
+                            result['error']
+                        )
+            finally:
+                pool.close()
+                pool.join()
+
+        if failures:
+            self.log.error(
+                "%d shards of the MARC file for %s failed; run again to resume.",
+                failures, lane.display_name
+            )
+            return None
+
+        cached = self.upload_shards(
+            lane, library, checkpoint, len(shards), mirror_integration,
+            start_time, end_time
+        )
+        if cached:
+            checkpoint.clear()
+        return cached
+
+    def upload_shards(self, lane, library, checkpoint, shard_count,
+                      mirror_integration, start_time, end_time, mirror=None):
+        """Upload a MARC file from the shards in a checkpoint, as a
+        multipart upload.
+
+        :return: The CachedMARCFile, or None if the upload failed.
+        """
+        mirror = mirror or MirrorUploader.implementation(mirror_integration)
+        url = mirror.marc_file_url(library, lane, end_time, start_time)
+        representation, ignore = get_one_or_create(
+            self._db, Representation, url=url,
+            media_type=Representation.MARC_MEDIA_TYPE
+        )
+
+        with mirror.multipart_upload(representation, url) as upload:
+            part = StringIO()
+            parts = 0
+            for index in range(shard_count):
+                part.write(checkpoint.read_shard(index))
+                if part.tell() >= self.MINIMUM_UPLOAD_PART_SIZE:
+                    upload.upload_part(part.getvalue())
+                    parts += 1
+                    part = StringIO()
+            # A multipart upload can't be completed without any parts,
+            # so if the lane has no records -- as with a delta when
+            # nothing has changed -- upload an empty file, the way
+            # MARCExporter.records does.
+            if part.tell() or not parts:
+                upload.upload_part(part.getvalue())
+
+        representation.fetched_at = end_time
+        if representation.mirror_exception:
+            self.log.error(
+                "Could not upload the MARC file for %s: %s",
+                lane.display_name, representation.mirror_exception
+            )
+            return None
+
+        cached, is_new = get_one_or_create(
+            self._db, CachedMARCFile, library=library,
+            lane=(lane if isinstance(lane, Lane) else None),
+            start_time=start_time,
+            create_method_kwargs=dict(representation=representation)
+        )
+        if not is_new:
+            cached.representation = representation
+        cached.end_time = end_time
+        self._db.commit()
+        return cached
+
+    def make_worker_pool(self):
+        """Create the pool of processes that will create MARC records."""
+        return multiprocessing.Pool(
+            self.workers, initializer=_initialize_lane_worker,
+            initargs=(self.__class__, self.cmd_args)
+        )
+
+    def start_worker(self):
+        """Prepare this script to create MARC records in a worker process."""
+        pass
+
+    def process_task(self, library_id, integration_id, checkpoint_directory,
+                     index, work_ids):
+        """Create the MARC records for one shard of a MARC file and save
+        them to the checkpoint.
+
+        :return: A dictionary with the shard index, the number of
+            records created, and the error message, if any.
+        """
+        result = dict(index=index, records=0, error=None)
+        try:
+            integration = get_one(self._db, ExternalIntegration, id=integration_id)
+            annotator = self._annotators.get(library_id)
+            if not annotator:
+                library = get_one(self._db, Library, id=library_id)
+                annotator = MARCLibraryAnnotator(library)
+                self._annotators[library_id] = annotator
+
+            works = self._db.query(Work).filter(Work.id.in_(work_ids))
+            works_by_id = dict((work.id, work) for work in works)
+            output = StringIO()
+            for work_id in work_ids:
+                work = works_by_id.get(work_id)
+                if not work:
+                    # The work was deleted since the shards were planned.
+                    continue
+                record = MARCExporter.create_record(
+                    work, annotator, integration=integration
+                )
+                if record:
+                    output.write(record.as_marc())
+                    result['records'] += 1
+
+            # create_record caches the parts of each record that
+            # don't depend on the library.
+            self._db.commit()
+            MARCFileCheckpoint(checkpoint_directory).save_shard(
+                index, output.getvalue()
+            )
+        except Exception, e:
+            self.log.error(
+                "Error creating MARC records for shard %d", index, exc_info=e
+            )
+            self._db.rollback()
+            result['error'] = str(e)
+        return result
+
 
 class AdobeAccountIDResetScript(PatronInputScript):
 
@@ -1069,6 +1492,38 @@ class LoanReaperScript(TimestampScript):
         self._db.commit()
 
 
+class DashboardStatisticsSnapshotScript(TimestampScript):
+    """Store the counts shown on the admin dashboard in a snapshot, so the
+    dashboard doesn't have to calculate them on every request.
+
+    Once this script has been run, the dashboard will show the counts
+    as of the last time it was run, so it should be run regularly. If
+    it stops running, the dashboard goes back to live counts once the
+    snapshot is older than DashboardStatistics.SNAPSHOT_MAX_AGE.
+    """
+
+    name = "Refresh admin dashboard statistics snapshot"
+
+    @classmethod
+    def arg_parser(cls):
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            '--drop',
+            help="Remove the snapshot, so the dashboard calculates live counts again.",
+            action='store_true',
+        )
+        return parser
+
+    def do_run(self, cmd_args=None, statistics=None):
+        parsed = self.arg_parser().parse_args(cmd_args)
+        statistics = statistics or DashboardStatistics(self._db)
+        if parsed.drop:
+            self.log.info("Removing the dashboard statistics snapshot.")
+            statistics.drop_snapshot()
+        else:
+            statistics.refresh_snapshot()
+
+
 class DisappearingBookReportScript(Script):
 
     """Print a TSV-format report on books that used to be in the
@@ -1759,6 +2214,126 @@ class DirectoryImportScript(TimestampScript):
         return None, None, None
 
 
+class LCPBatchMirrorScript(TimestampScript):
+    """Encrypt and mirror the books in LCP collections which still hold
+    unencrypted content, a batch at a time.
+
+    DirectoryImportScript mirrors LCP books one at a time as they are
+    imported. A book that couldn't be encrypted or registered with the
+    LCP License Server keeps its unencrypted content, and this script
+    imports it again, running several lcpencrypt processes at once.
+    """
+
+    name = "Mirror unencrypted books in LCP collections"
+
+    DEFAULT_BATCH_SIZE = 50
+
+    @classmethod
+    def arg_parser(cls):
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            '--collection',
+            help="Only mirror books in the LCP collection with this name. Can be repeated.",
+            dest='collection_names',
+            metavar='NAME',
+            action='append',
+            default=[],
+        )
+        parser.add_argument(
+            '--batch-size',
+            help="Encrypt this many books at a time.",
+            type=int,
+            default=cls.DEFAULT_BATCH_SIZE,
+        )
+        return parser
+
+    def collections(self, names=None):
+        """Find the LCP collections to process."""
+        qu = self._db.query(Collection).join(
+            ExternalIntegration,
+            Collection.external_integration_id == ExternalIntegration.id
+        ).filter(
+            ExternalIntegration.protocol == ExternalIntegration.LCP
+        )
+        if names:
+            qu = qu.filter(Collection.name.in_(names))
+        return qu.order_by(Collection.id).all()
+
+    def unencrypted_books(self, collection, after_id, batch_size):
+        """Find the next batch of books in an LCP collection which still
+        hold unencrypted content.
+
+        :return: A list of 2-tuples (Representation, Identifier),
+            ordered by Representation ID.
+        """
+        return self._db.query(Representation, Identifier).join(
+            Resource, Resource.representation_id == Representation.id
+        ).join(
+            Hyperlink, Hyperlink.resource_id == Resource.id
+        ).join(
+            Identifier, Hyperlink.identifier_id == Identifier.id
+        ).join(
+            LicensePool, LicensePool.identifier_id == Identifier.id
+        ).filter(
+            LicensePool.collection_id == collection.id
+        ).filter(
+            Hyperlink.rel == Hyperlink.GENERIC_OPDS_ACQUISITION
+        ).filter(
+            Representation.content != None
+        ).filter(
+            Representation.id > after_id
+        ).order_by(Representation.id).limit(batch_size).all()
+
+    def do_run(self, cmd_args=None):
+        parsed = self.arg_parser().parse_args(cmd_args)
+        for collection in self.collections(parsed.collection_names):
+            mirror = MirrorUploader.for_collection(
+                collection, ExternalIntegrationLink.PROTECTED_ACCESS_BOOKS
+            )
+            if not mirror:
+                self.log.error(
+                    "Collection %s has no protected access books mirror.",
+                    collection.name
+                )
+                continue
+            self.mirror_collection(collection, mirror, parsed.batch_size)
+
+    def mirror_collection(self, collection, mirror, batch_size):
+        """Mirror every book in the collection that still holds
+        unencrypted content.
+
+        :return: A 2-tuple (books imported, failures).
+        """
+        imported = failures = 0
+        # Books that fail keep their content, so we page by ID rather
+        # than querying for the first batch again.
+        after_id = 0
+        while True:
+            books = self.unencrypted_books(collection, after_id, batch_size)
+            if not books:
+                break
+            after_id = books[-1][0].id
+            results = mirror.mirror_batch(
+                [representation for representation, identifier in books],
+                mirror_urls=[
+                    mirror.book_url(identifier)
+                    for representation, identifier in books
+                ],
+                collection=collection
+            )
+            self._db.commit()
+            for result in results:
+                if result.succeeded:
+                    imported += 1
+                else:
+                    failures += 1
+        self.log.info(
+            "%s: %d books imported, %d failures.",
+            collection.name, imported, failures
+        )
+        return imported, failures
+
+
 class LaneResetScript(LibraryInputScript):
     """Reset a library's lanes based on language configuration or estimates
     of the library's current collection."""
@@ -1822,16 +2397,105 @@ You'll get another chance to back out before the database session is committed."
         create_default_lanes(self._db, library)
 
 class NovelistSnapshotScript(TimestampScript, LibraryInputScript):
+    """Send each library's collection to NoveList.
+
+    By default the whole collection is sent in a single request. If
+    --batch-size is given, the collection is read a little at a time
+    and sent in batches of that size, and only books that have changed
+    since the library's last successful upload are sent. A library
+    that has never been uploaded gets its whole collection.
+    """
+
+    @classmethod
+    def arg_parser(cls, _db):
+        parser = super(NovelistSnapshotScript, cls).arg_parser(_db)
+        parser.add_argument(
+            '--batch-size',
+            help="Send the collection to NoveList in batches of this many books.",
+            type=int,
+        )
+        parser.add_argument(
+            '--full',
+            help="Send every book, even if it hasn't changed since the last upload. Only used with --batch-size.",
+            action='store_true',
+        )
+        return parser
+
+    def upload_service_name(self, library):
+        """The name of the Timestamp that records a library's last
+        successful upload.
+        """
+        return "%s (library %d)" % (self.script_name, library.id)
+
+    def last_successful_upload(self, library):
+        """When did the last successful upload of this library's
+        collection start?
+
+        Each library has its own Timestamp, so a library that was
+        skipped by a run -- because it wasn't configured yet, or wasn't
+        one of the libraries the script was run for -- doesn't miss
+        the books that changed before that run.
+
+        :return: A datetime, or None if the library's collection has
+            never been uploaded.
+        """
+        timestamp = get_one(
+            self._db, Timestamp, service=self.upload_service_name(library),
+            service_type=Timestamp.SCRIPT_TYPE, collection=None
+        )
+        if not timestamp or timestamp.exception:
+            return None
+        return timestamp.start
+
+    def record_upload(self, library, start):
+        """Record a successful upload of a library's collection."""
+        Timestamp.stamp(
+            self._db, service=self.upload_service_name(library),
+            service_type=Timestamp.SCRIPT_TYPE, collection=None,
+            start=start, finish=datetime.utcnow()
+        )
+        self._db.commit()
 
     def do_run(self, output=sys.stdout, *args, **kwargs):
         parsed = self.parse_command_line(self._db, *args, **kwargs)
+
+        failures = []
         for library in parsed.libraries:
             try:
                 api = NoveListAPI.from_config(library)
             except CannotLoadConfiguration as e:
                 self.log.info(e.message)
                 continue
-            if (api):
+            if not api:
+                continue
+
+            # Anything that changes while the collection is being sent
+            # will be sent again next time.
+            start = datetime.utcnow()
+            if parsed.batch_size:
+                since = None
+                if not parsed.full:
+                    since = self.last_successful_upload(library)
+                try:
+                    responses = api.put_items_novelist_in_batches(
+                        library, since=since, batch_size=parsed.batch_size
+                    )
+                except Exception as e:
+                    # Keep going with the other libraries. This
+                    # library's timestamp isn't updated, so the books
+                    # that weren't sent will be sent next time.
+                    self.log.error(
+                        "Could not send %s to NoveList: %s", library.name, e,
+                        exc_info=e
+                    )
+                    failures.append(library.name)
+                    continue
+                output.write(
+                    "Sent %s to NoveList in %d batches\n" % (
+                        library.name, len(responses)
+                    )
+                )
+            else:
                 response = api.put_items_novelist(library)
 
                 if (response):
@@ -1839,6 +2503,12 @@ class NovelistSnapshotScript(TimestampScript, LibraryInputScript):
                     result += str(response)
 
                     output.write(result)
+            self.record_upload(library, start)
+
+        if failures:
+            raise Exception(
+                "Could not send to NoveList: %s" % ", ".join(failures)
+            )
 
 class ODLImportScript(OPDSImportScript):
     """Import information from the feed associated
@@ -1869,6 +2539,10 @@ class LocalAnalyticsExportScript(Script):
             help="Include circulation events that happened before this time.",
             required=True,
         )
+        parser.add_argument(
+            '--output',
+            help="Write the CSV file to this path instead of standard output.",
+        )
         return parser
 
     def do_run(self, output=sys.stdout, cmd_args=None, exporter=None):
@@ -1878,4 +2552,13 @@ class LocalAnalyticsExportScript(Script):
         end = parsed.end
 
         exporter = exporter or LocalAnalyticsExporter()
-        output.write(exporter.export(self._db, start, end))
+        if parsed.output:
+            with open(parsed.output, "wb") as output_file:
+                self.write(exporter, start, end, output_file)
+        else:
+            self.write(exporter, start, end, output)
+
+    def write(self, exporter, start, end, output):
+        """Write CSV data to `output` as it's generated."""
+        for chunk in exporter.export_iter(self._db, start, end):
+            output.write(chunk)
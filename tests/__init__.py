@@ -1,5 +1,14 @@
 import os
 
+import pytest
+
+# Benchmarks are slow, and their timings only mean something on a
+# quiet machine, so they only run when SIMPLIFIED_RUN_BENCHMARKS is set.
+benchmark = pytest.mark.skipif(
+    not os.environ.get("SIMPLIFIED_RUN_BENCHMARKS"),
+    reason="Set SIMPLIFIED_RUN_BENCHMARKS to run benchmarks."
+)
+
 
 def sample_data(filename, sample_data_dir):
     base_path = os.path.split(__file__)[0]
@@ -1,5 +1,6 @@
 import csv
 import json
+import os
 import re
 from StringIO import StringIO
 from contextlib import contextmanager
@@ -32,6 +33,7 @@ from api.authenticator import (
     PatronData,
 )
 from api.axis import (Axis360API, MockAxis360API)
+from api.circulation_metrics import CirculationMetrics
 from api.config import (
     Configuration,
 )
@@ -881,6 +883,40 @@ class TestTimestampsController(AdminControllerTest):
         assert other_timestamp.get("start") == self.start
         assert other_timestamp.get("achievements") == None
 
+    def test_circulation_metrics(self):
+        metrics = CirculationMetrics.configure(True)
+        try:
+            metrics.record("borrow", "MockAPI", metrics.TOTAL, 0.2)
+
+            # Only a system admin can see the timings.
+            with self.request_context_with_admin("/"):
+                pytest.raises(
+                    AdminNotAuthorized,
+                    self.manager.timestamps_controller.circulation_metrics
+                )
+
+            with self.request_context_with_admin("/"):
+                self.admin.add_role(AdminRole.SYSTEM_ADMIN)
+                response = self.manager.timestamps_controller.circulation_metrics()
+            assert True == response['enabled']
+            [timing] = response['timings']
+            assert "borrow" == timing['operation']
+            assert 1 == timing['count']
+
+            # The timings only come from this process.
+            assert os.getpid() == response['pid']
+
+            # A GET request doesn't change anything.
+            assert 1 == len(metrics.report()['timings'])
+
+            # A POST request clears the timings after they're reported.
+            with self.request_context_with_admin("/", method="POST"):
+                response = self.manager.timestamps_controller.circulation_metrics()
+            assert 1 == len(response['timings'])
+            assert [] == metrics.report()['timings']
+        finally:
+            CirculationMetrics.configure(False)
+
 class TestFeedController(AdminControllerTest):
 
     def setup_method(self):
@@ -1743,6 +1779,9 @@ class TestDashboardController(AdminControllerTest):
         # the current day.
         with self.app.test_request_context("/"):
             response, requested_date, date_end, library_short_name = self.manager.admin_dashboard_controller.bulk_circulation_events()
+
+            # The CSV file is generated a piece at a time.
+            response = "".join(response)
         reader = csv.reader(
             [row for row in response.split("\r\n") if row],
             dialect=csv.excel
@@ -1759,7 +1798,7 @@ class TestDashboardController(AdminControllerTest):
         # Now verify that this works by passing incoming query
         # parameters into a LocalAnalyticsExporter object.
         class MockLocalAnalyticsExporter(object):
-            def export(self, _db, date_start, date_end, locations, library):
+            def export_iter(self, _db, date_start, date_end, locations, library):
                 self.called_with = (
                     _db, date_start, date_end, locations, library
                 )
@@ -1782,7 +1821,7 @@ class TestDashboardController(AdminControllerTest):
             assert self._default_library == args.pop(0)
             assert [] == args
 
-            # The data returned is whatever export() returned.
+            # The data returned is whatever export_iter() returned.
             assert "A CSV file" == response
 
             # The other data is necessary to build a filename for the
@@ -2054,6 +2093,41 @@ class TestDashboardController(AdminControllerTest):
                 assert 0 == c3_data.get('licenses')
                 assert 0 == c3_data.get('available_licenses')
 
+    def test_stats_uses_statistics_counts(self):
+        # The controller doesn't do any counting itself; it arranges
+        # the counts it gets from DashboardStatistics, which might
+        # come from a snapshot.
+        collection = self._default_collection
+        library = self._default_library
+
+        class MockStatistics(object):
+            def counts(self):
+                return (
+                    {collection.id: dict(
+                        licensed_titles=1, open_access_titles=2,
+                        licenses=3, available_licenses=4
+                    )},
+                    {library.id: dict(
+                        total=5, with_active_loans=6,
+                        with_active_loans_or_holds=7, loans=8, holds=9
+                    )},
+                )
+
+        with self.request_context_with_admin("/"):
+            self.admin.add_role(AdminRole.SYSTEM_ADMIN)
+            response = self.manager.admin_dashboard_controller.stats(
+                statistics=MockStatistics()
+            )
+            for data in [response.get(library.short_name), response.get("total")]:
+                assert dict(
+                    total=5, with_active_loans=6,
+                    with_active_loans_or_holds=7, loans=8, holds=9
+                ) == data.get("patrons")
+                assert dict(
+                    titles=3, licenses=3, available_licenses=4
+                ) == data.get("inventory")
+                assert 3 == data.get("collections")[collection.name]["licenses"]
+
 
 class SettingsControllerTest(AdminControllerTest):
     """Test some part of the settings controller."""
@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+
+from api.admin.dashboard_stats import DashboardStatistics
+from core.model import Timestamp
+from core.testing import DatabaseTest
+
+
+class TestDashboardStatistics(DatabaseTest):
+
+    def setup_method(self):
+        super(TestDashboardStatistics, self).setup_method()
+        self.statistics = DashboardStatistics(self._db)
+
+    def teardown_method(self):
+        self.statistics.drop_snapshot()
+        super(TestDashboardStatistics, self).teardown_method()
+
+    def test_live_counts(self):
+        collection = self._default_collection
+        library = self._default_library
+        other_library = self._library()
+
+        edition, pool = self._edition(
+            with_license_pool=True, with_open_access_download=False
+        )
+        pool.open_access = False
+        pool.licenses_owned = 10
+        pool.licenses_available = 4
+
+        edition, no_licenses = self._edition(
+            with_license_pool=True, with_open_access_download=False
+        )
+        no_licenses.open_access = False
+        no_licenses.licenses_owned = 0
+        no_licenses.licenses_available = 0
+
+        edition, open_access_pool = self._edition(
+            with_open_access_download=True
+        )
+
+        # One patron has an active loan and a hold.
+        patron1 = self._patron()
+        pool.loan_to(patron1, end=datetime.utcnow() + timedelta(days=5))
+        no_licenses.on_hold_to(patron1)
+
+        # One patron has an open-access loan with no end date, which
+        # doesn't count as active.
+        patron2 = self._patron()
+        open_access_pool.loan_to(patron2)
+
+        # One patron in another library has a hold.
+        patron3 = self._patron(library=other_library)
+        pool.on_hold_to(patron3)
+
+        by_collection, by_library = self.statistics.live_counts()
+
+        assert dict(
+            licensed_titles=1, open_access_titles=1, licenses=10,
+            available_licenses=4
+        ) == by_collection[collection.id]
+
+        assert dict(
+            total=2, with_active_loans=1, with_active_loans_or_holds=1,
+            loans=1, holds=1
+        ) == by_library[library.id]
+
+        assert dict(
+            total=1, with_active_loans=0, with_active_loans_or_holds=1,
+            loans=0, holds=1
+        ) == by_library[other_library.id]
+
+        # A library with no patrons is still counted.
+        empty_library = self._library()
+        by_collection, by_library = self.statistics.live_counts()
+        assert dict(
+            total=0, with_active_loans=0, with_active_loans_or_holds=0,
+            loans=0, holds=0
+        ) == by_library[empty_library.id]
+
+    def test_snapshot(self):
+        # Initially there is no snapshot, so counts are calculated live.
+        assert False == self.statistics.snapshot_exists()
+        assert None == self.statistics.snapshot_counts()
+
+        edition, pool = self._edition(
+            with_license_pool=True, with_open_access_download=False
+        )
+        pool.open_access = False
+        pool.licenses_owned = 3
+        pool.licenses_available = 1
+        self._patron()
+
+        live = self.statistics.live_counts()
+        self.statistics.refresh_snapshot()
+        assert True == self.statistics.snapshot_exists()
+        assert live == self.statistics.snapshot_counts()
+        assert live == self.statistics.counts()
+
+        # Once the snapshot is taken, changes don't show up until it's
+        # refreshed.
+        pool.licenses_owned = 5
+        self._patron()
+        self._db.commit()
+        assert live == self.statistics.counts()
+        collection_id = self._default_collection.id
+        library_id = self._default_library.id
+        assert 3 == self.statistics.counts()[0][collection_id]["licenses"]
+
+        self.statistics.refresh_snapshot()
+        by_collection, by_library = self.statistics.counts()
+        assert 5 == by_collection[collection_id]["licenses"]
+        assert 2 == by_library[library_id]["total"]
+
+        # Dropping the snapshot goes back to live counts.
+        self.statistics.drop_snapshot()
+        assert False == self.statistics.snapshot_exists()
+        pool.licenses_owned = 6
+        assert 6 == self.statistics.counts()[0][collection_id]["licenses"]
+
+    def test_refresh_snapshot_keeps_views_until_definition_changes(self):
+        def view_oid(view):
+            [oid] = self._db.execute(
+                "SELECT to_regclass('%s')::oid" % view
+            ).fetchone()
+            return oid
+
+        view = DashboardStatistics.COLLECTION_SNAPSHOT
+        self.statistics.refresh_snapshot()
+        original = view_oid(view)
+
+        # The view has a unique index, so it can be refreshed
+        # concurrently.
+        [index] = self._db.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = '%s'" % view
+        ).fetchone()
+        assert "UNIQUE" in index
+
+        # Refreshing the snapshot doesn't recreate the views.
+        self.statistics.refresh_snapshot()
+        assert original == view_oid(view)
+
+        # But if the view was created from a different definition,
+        # it's recreated.
+        self._db.execute(
+            "COMMENT ON MATERIALIZED VIEW %s IS 'outdated'" % view
+        )
+        self.statistics.refresh_snapshot()
+        assert original != view_oid(view)
+        assert True == self.statistics.snapshot_exists()
+
+    def test_stale_snapshot_is_ignored(self):
+        edition, pool = self._edition(
+            with_license_pool=True, with_open_access_download=False
+        )
+        pool.open_access = False
+        pool.licenses_owned = 3
+        collection_id = self._default_collection.id
+
+        # There's no snapshot yet, so it isn't fresh.
+        assert None == self.statistics.snapshot_refreshed_at()
+        assert False == self.statistics.snapshot_is_fresh()
+
+        self.statistics.refresh_snapshot()
+        assert True == self.statistics.snapshot_is_fresh()
+        pool.licenses_owned = 5
+        self._db.commit()
+        assert 3 == self.statistics.counts()[0][collection_id]["licenses"]
+
+        # If the snapshot hasn't been refreshed for too long, the
+        # dashboard goes back to live counts.
+        timestamp = Timestamp.lookup(
+            self._db, DashboardStatistics.SNAPSHOT_SERVICE,
+            Timestamp.SCRIPT_TYPE, None
+        )
+        timestamp.finish = (
+            datetime.utcnow() - DashboardStatistics.SNAPSHOT_MAX_AGE
+            - timedelta(minutes=1)
+        )
+        assert False == self.statistics.snapshot_is_fresh()
+        assert True == self.statistics.snapshot_exists()
+        assert 5 == self.statistics.counts()[0][collection_id]["licenses"]
+
+        # Refreshing the snapshot makes it fresh again.
+        self.statistics.refresh_snapshot()
+        assert True == self.statistics.snapshot_is_fresh()
+        assert 5 == self.statistics.counts()[0][collection_id]["licenses"]
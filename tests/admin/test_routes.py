@@ -797,6 +797,13 @@ class TestTimestamps(AdminRouteTest):
         url = "/admin/diagnostics"
         self.assert_authenticated_request_calls(url, self.controller.diagnostics)
 
+    def test_circulation_metrics(self):
+        url = "/admin/diagnostics/circulation_metrics"
+        self.assert_authenticated_request_calls(
+            url, self.controller.circulation_metrics
+        )
+        self.assert_supported_methods(url, 'GET', 'POST')
+
 class TestAdminView(AdminRouteTest):
 
     CONTROLLER_NAME = "admin_view_controller"
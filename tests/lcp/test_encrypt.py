@@ -101,3 +101,54 @@ class TestLCPEncryptor(DatabaseTest):
                         # Assert
                         result = encryptor.encrypt(self._db, file_path, identifier.identifier)
                         assert result == expected_result
+
+    def test_encrypt_books(self):
+        # Arrange
+        integration_owner = create_autospec(spec=HasExternalIntegration)
+        integration_owner.external_integration = MagicMock(return_value=self._integration)
+        configuration_storage = ConfigurationStorage(integration_owner)
+        configuration_factory = ConfigurationFactory()
+        encryptor = LCPEncryptor(configuration_storage, configuration_factory)
+        books = [
+            (fixtures.EXISTING_BOOK_FILE_PATH, fixtures.BOOK_IDENTIFIER),
+            (fixtures.NOT_EXISTING_BOOK_FILE_PATH, 'NOT_EXISTING_BOOK'),
+        ]
+        expected_result = LCPEncryptionResult(
+            content_id=fixtures.BOOK_IDENTIFIER,
+            content_encryption_key=fixtures.CONTENT_ENCRYPTION_KEY,
+            protected_content_location=fixtures.PROTECTED_CONTENT_LOCATION,
+            protected_content_disposition=fixtures.PROTECTED_CONTENT_DISPOSITION,
+            protected_content_type=fixtures.PROTECTED_CONTENT_TYPE,
+            protected_content_length=fixtures.PROTECTED_CONTENT_LENGTH,
+            protected_content_sha256=fixtures.PROTECTED_CONTENT_SHA256
+        )
+
+        def run_lcpencrypt(parameters):
+            if fixtures.EXISTING_BOOK_FILE_PATH in parameters:
+                return fixtures.LCPENCRYPT_SUCCESSFUL_ENCRYPTION_RESULT
+
+            return fixtures.LCPENCRYPT_NOT_EXISTING_DIRECTORY_RESULT
+
+        with configuration_factory.create(configuration_storage, self._db, LCPEncryptionConfiguration) as configuration:
+            configuration.lcpencrypt_location = LCPEncryptionConfiguration.DEFAULT_LCPENCRYPT_LOCATION
+            configuration.lcpencrypt_max_processes = 2
+
+            with Patcher() as patcher:
+                patcher.fs.create_file(LCPEncryptionConfiguration.DEFAULT_LCPENCRYPT_LOCATION)
+                patcher.fs.create_file(fixtures.EXISTING_BOOK_FILE_PATH)
+
+                with patch('subprocess.check_output') as subprocess_check_output_mock:
+                    subprocess_check_output_mock.side_effect = run_lcpencrypt
+
+                    # Act
+                    results = encryptor.encrypt_books(self._db, books)
+
+                    # Assert
+                    # A failure to encrypt the second book doesn't affect the first one
+                    assert subprocess_check_output_mock.call_count == 2
+                    [(result_1, exception_1, _), (result_2, exception_2, _)] = results
+                    assert result_1 == expected_result
+                    assert exception_1 is None
+                    assert result_2 is None
+                    assert exception_2 == LCPEncryptionException(
+                        fixtures.LCPENCRYPT_NOT_EXISTING_DIRECTORY_RESULT.strip())
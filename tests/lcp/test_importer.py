@@ -1,8 +1,8 @@
 import sqlalchemy
 from mock import MagicMock, create_autospec
 
-from api.lcp.encrypt import LCPEncryptionResult, LCPEncryptor
-from api.lcp.importer import LCPImporter
+from api.lcp.encrypt import LCPEncryptionException, LCPEncryptionResult, LCPEncryptor
+from api.lcp.importer import LCPImporter, LCPImportResult
 from api.lcp.server import LCPServer
 
 
@@ -34,3 +34,66 @@ class TestLCPImporter(object):
         lcp_encryptor.encrypt.assert_called_once_with(db, file_path, identifier)
         lcp_server.add_content.assert_called_once_with(db, encrypted_content)
 
+    def test_import_books(self):
+        # Arrange
+        books = [
+            ('/opt/readium/raw_books/book1.epub', '1'),
+            ('/opt/readium/raw_books/book2.epub', '2'),
+            ('/opt/readium/raw_books/book3.epub', '3')
+        ]
+        encrypted_content_1 = LCPEncryptionResult(
+            content_id='1',
+            content_encryption_key='12345',
+            protected_content_location='/opt/readium/files/encrypted',
+            protected_content_disposition='encrypted_book',
+            protected_content_type='application/epub+zip',
+            protected_content_length=12345,
+            protected_content_sha256='12345'
+        )
+        encrypted_content_3 = LCPEncryptionResult(
+            content_id='3',
+            content_encryption_key='12345',
+            protected_content_location='/opt/readium/files/encrypted',
+            protected_content_disposition='encrypted_book',
+            protected_content_type='application/epub+zip',
+            protected_content_length=12345,
+            protected_content_sha256='12345'
+        )
+        encryption_exception = LCPEncryptionException('Encryption failed')
+        registration_exception = Exception('LCP License Server is not available')
+        lcp_encryptor = create_autospec(spec=LCPEncryptor)
+        lcp_encryptor.encrypt_books = MagicMock(return_value=[
+            (encrypted_content_1, None, 1.0),
+            (None, encryption_exception, 2.0),
+            (encrypted_content_3, None, 3.0)
+        ])
+        lcp_server = create_autospec(spec=LCPServer)
+        lcp_server.add_contents = MagicMock(return_value=[
+            (None, 0.1),
+            (registration_exception, 0.3)
+        ])
+        importer = LCPImporter(lcp_encryptor, lcp_server)
+        db = create_autospec(spec=sqlalchemy.orm.session.Session)
+
+        # Act
+        result_1, result_2, result_3 = importer.import_books(db, books)
+
+        # Assert
+        lcp_encryptor.encrypt_books.assert_called_once_with(db, books)
+        # Only successfully encrypted books are sent to the LCP License Server
+        lcp_server.add_contents.assert_called_once_with(db, [encrypted_content_1, encrypted_content_3])
+
+        assert result_1.identifier == '1'
+        assert result_1.succeeded == True
+        assert result_1.encryption_result == encrypted_content_1
+        assert result_1.timings == {LCPImportResult.ENCRYPTION: 1.0, LCPImportResult.REGISTRATION: 0.1}
+
+        assert result_2.identifier == '2'
+        assert result_2.succeeded == False
+        assert result_2.exception == encryption_exception
+        assert result_2.timings == {LCPImportResult.ENCRYPTION: 2.0}
+
+        assert result_3.identifier == '3'
+        assert result_3.succeeded == False
+        assert result_3.exception == registration_exception
+        assert result_3.timings == {LCPImportResult.ENCRYPTION: 3.0, LCPImportResult.REGISTRATION: 0.3}
@@ -1,6 +1,6 @@
 from mock import create_autospec, patch, ANY
 
-from api.lcp.importer import LCPImporter
+from api.lcp.importer import LCPImporter, LCPImportResult
 from api.lcp.mirror import LCPMirror
 from core.model import ExternalIntegration, Identifier, DataSource, Representation
 from core.s3 import S3UploaderConfiguration, MinIOUploaderConfiguration
@@ -46,3 +46,129 @@ class TestLCPMirror(DatabaseTest):
 
             # Assert
             lcp_importer.import_book.assert_called_once_with(self._db, ANY, expected_identifier)
+
+    def test_mirror_batch(self):
+        # Arrange
+        mirror_url_1 = 'http://encrypted-books.minio/12345'
+        mirror_url_2 = 'http://encrypted-books.minio/12346'
+        representation_1, _ = self._representation(media_type=Representation.EPUB_MEDIA_TYPE, content='book 1')
+        representation_1.mirror_url = mirror_url_1
+        representation_2, _ = self._representation(media_type=Representation.EPUB_MEDIA_TYPE, content='book 2')
+        representation_2.mirror_url = mirror_url_2
+        copied_content = {}
+
+        def import_books(db, books):
+            results = []
+
+            for file_path, identifier in books:
+                with open(file_path, 'rb') as book_file:
+                    copied_content[identifier] = book_file.read()
+
+                result = LCPImportResult(file_path, identifier)
+
+                if identifier == '12346' and len(books) == 2:
+                    result.exception = Exception('lcpencrypt failed')
+
+                results.append(result)
+
+            return results
+
+        lcp_importer = create_autospec(spec=LCPImporter)
+        lcp_importer.import_books.side_effect = import_books
+
+        with patch('api.lcp.mirror.LCPImporter') as lcp_importer_constructor:
+            lcp_importer_constructor.return_value = lcp_importer
+
+            # Act
+            result_1, result_2 = self._lcp_mirror.mirror_batch(
+                [representation_1, representation_2], collection=self._lcp_collection)
+
+            # Assert
+            assert copied_content == {'12345': 'book 1', '12346': 'book 2'}
+            assert result_1.succeeded == True
+            assert LCPImportResult.COPYING in result_1.timings
+            assert result_2.succeeded == False
+
+            # Unencrypted content is removed only from the imported book
+            assert representation_1.content is None
+            assert representation_2.content == 'book 2'
+
+            # Act
+            # Mirroring the same batch again imports only the book which failed last time
+            [result] = self._lcp_mirror.mirror_batch(
+                [representation_1, representation_2], collection=self._lcp_collection)
+
+            # Assert
+            assert result.identifier == '12346'
+            assert result.succeeded == True
+            assert representation_2.content is None
+
+    def test_mirror_batch_continues_after_copying_failure(self):
+        # Arrange
+        representation_1, _ = self._representation(media_type=Representation.EPUB_MEDIA_TYPE, content='book 1')
+        representation_1.mirror_url = 'http://encrypted-books.minio/12345'
+        representation_2, _ = self._representation(media_type=Representation.EPUB_MEDIA_TYPE, content='book 2')
+        representation_2.mirror_url = 'http://encrypted-books.minio/12346'
+
+        lcp_importer = create_autospec(spec=LCPImporter)
+        lcp_importer.import_books.side_effect = lambda db, books: [
+            LCPImportResult(file_path, identifier) for file_path, identifier in books
+        ]
+
+        with patch('api.lcp.mirror.LCPImporter') as lcp_importer_constructor, \
+                patch.object(representation_1, 'content_fh', side_effect=IOError('Disk is full')):
+            lcp_importer_constructor.return_value = lcp_importer
+
+            # Act
+            result_1, result_2 = self._lcp_mirror.mirror_batch(
+                [representation_1, representation_2], collection=self._lcp_collection)
+
+            # Assert
+            # Only the book which was copied is encrypted
+            lcp_importer.import_books.assert_called_once_with(self._db, [(ANY, '12346')])
+
+            assert result_1.succeeded == False
+            assert isinstance(result_1.exception, IOError)
+            assert LCPImportResult.COPYING in result_1.timings
+            assert representation_1.content == 'book 1'
+
+            assert result_2.succeeded == True
+            assert representation_2.content is None
+
+    def test_mirror_batch_with_mirror_urls(self):
+        # Arrange
+        # Neither representation has been mirrored yet
+        representation_1, _ = self._representation(media_type=Representation.EPUB_MEDIA_TYPE, content='book 1')
+        representation_2, _ = self._representation(media_type=Representation.EPUB_MEDIA_TYPE, content='book 2')
+
+        lcp_importer = create_autospec(spec=LCPImporter)
+        lcp_importer.import_books.side_effect = lambda db, books: [
+            LCPImportResult(file_path, identifier) for file_path, identifier in books
+        ]
+
+        with patch('api.lcp.mirror.LCPImporter') as lcp_importer_constructor:
+            lcp_importer_constructor.return_value = lcp_importer
+
+            # Act
+            # A book without a mirror URL fails without stopping the others
+            result_1, result_2 = self._lcp_mirror.mirror_batch(
+                [representation_1, representation_2], collection=self._lcp_collection)
+
+            # Assert
+            assert result_1.succeeded == False
+            assert result_2.succeeded == False
+            assert representation_1.content == 'book 1'
+            assert lcp_importer.import_books.called == False
+
+            # Act
+            result_1, result_2 = self._lcp_mirror.mirror_batch(
+                [representation_1, representation_2],
+                mirror_urls=['http://encrypted-books.minio/12345', 'http://encrypted-books.minio/12346'],
+                collection=self._lcp_collection)
+
+            # Assert
+            lcp_importer.import_books.assert_called_once_with(self._db, [(ANY, '12345'), (ANY, '12346')])
+            assert result_1.succeeded == True
+            assert result_2.succeeded == True
+            assert representation_1.content is None
+            assert representation_2.content is None
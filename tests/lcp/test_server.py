@@ -85,6 +85,42 @@ class TestLCPServer(DatabaseTest):
                 assert json_request['protected-content-length'] == encrypted_content.protected_content_length
                 assert json_request['protected-content-sha256'] == encrypted_content.protected_content_sha256
 
+    def test_add_contents(self):
+        # Arrange
+        encrypted_contents = [
+            LCPEncryptionResult(
+                content_id=content_id,
+                content_encryption_key='12345',
+                protected_content_location='/opt/readium/files/encrypted',
+                protected_content_disposition='encrypted_book',
+                protected_content_type='application/epub+zip',
+                protected_content_length=12345,
+                protected_content_sha256='12345'
+            )
+            for content_id in ['1', '2', '3']
+        ]
+
+        with self._configuration_factory.create(
+                self._configuration_storage, self._db, LCPServerConfiguration) as configuration:
+            configuration.lcpserver_url = fixtures.LCPSERVER_URL
+            configuration.lcpserver_user = fixtures.LCPSERVER_USER
+            configuration.lcpserver_password = fixtures.LCPSERVER_PASSWORD
+            configuration.lcpserver_input_directory = '/tmp/encrypted_books'
+
+            with requests_mock.Mocker() as request_mock:
+                request_mock.put(urlparse.urljoin(fixtures.LCPSERVER_URL, '/contents/1'))
+                request_mock.put(urlparse.urljoin(fixtures.LCPSERVER_URL, '/contents/2'), status_code=500)
+                request_mock.put(urlparse.urljoin(fixtures.LCPSERVER_URL, '/contents/3'))
+
+                # Act
+                results = self._lcp_server.add_contents(self._db, encrypted_contents)
+
+                # Assert
+                # A failure to add the second item doesn't stop adding the third one
+                assert request_mock.call_count == 3
+                assert [exception is None for exception, _ in results] == [True, False, True]
+                assert all(seconds >= 0 for _, seconds in results)
+
     @parameterized.expand([
         ('none_rights', None, None, None, None),
         (
@@ -189,6 +189,84 @@ class TestProQuestAPIClient(DatabaseTest):
             # Assert
             assert [expected_feed_1, expected_feed_2] == list(feeds)
 
+    @parameterized.expand(
+        [
+            ("sequentially", 1),
+            ("in_windows_smaller_than_feed", 2),
+            ("in_windows_larger_than_feed", 8),
+        ]
+    )
+    def test_download_all_feed_pages_returns_pages_in_order(
+        self, _, concurrent_page_downloads
+    ):
+        # Arrange
+        page_size = 10
+        expected_feeds = [
+            {"metadata": {"title": "Page {0}".format(page)}} for page in range(1, 6)
+        ]
+
+        with self._configuration_factory.create(
+            self._configuration_storage, self._db, ProQuestAPIClientConfiguration
+        ) as configuration:
+            configuration.books_catalog_service_url = BOOKS_CATALOG_SERVICE_URL
+            configuration.page_size = page_size
+            configuration.concurrent_page_downloads = concurrent_page_downloads
+
+        with requests_mock.Mocker() as request_mock:
+            for page, expected_feed in enumerate(expected_feeds, 1):
+                request_mock.get(
+                    URLUtility.build_url(
+                        BOOKS_CATALOG_SERVICE_URL,
+                        {"page": page, "hitsPerPage": page_size},
+                    ),
+                    json={
+                        ProQuestAPIClient.RESPONSE_STATUS_CODE_FIELD: 200,
+                        ProQuestAPIClient.RESPONSE_OPDS_FEED_FIELD: expected_feed,
+                    },
+                )
+
+            # All the pages after the last one return an error.
+            for page in range(len(expected_feeds) + 1, len(expected_feeds) + 9):
+                request_mock.get(
+                    URLUtility.build_url(
+                        BOOKS_CATALOG_SERVICE_URL,
+                        {"page": page, "hitsPerPage": page_size},
+                    ),
+                    status_code=404,
+                )
+
+            # Act
+            feeds = self._client.download_all_feed_pages(self._db)
+
+            # Assert
+            assert expected_feeds == list(feeds)
+
+    @parameterized.expand(
+        [
+            (
+                "default_value_when_setting_is_not_set",
+                None,
+                ProQuestAPIClientConfiguration.DEFAULT_CONCURRENT_PAGE_DOWNLOADS,
+            ),
+            ("lower_bound", 0, 1),
+            ("upper_bound", 1000, ProQuestAPIClient.MAX_CONCURRENT_PAGE_DOWNLOADS),
+            ("configured_value", 3, 3),
+        ]
+    )
+    def test_get_concurrent_page_downloads(self, _, setting_value, expected_result):
+        # Arrange
+        with self._configuration_factory.create(
+            self._configuration_storage, self._db, ProQuestAPIClientConfiguration
+        ) as configuration:
+            if setting_value is not None:
+                configuration.concurrent_page_downloads = setting_value
+
+            # Act
+            result = self._client._get_concurrent_page_downloads(configuration)
+
+        # Assert
+        assert expected_result == result
+
     @parameterized.expand(
         [
             ("in_the_case_of_http_error_status_code", {"status_code": 401}, HTTPError),
@@ -27,6 +27,7 @@ from api.proquest.importer import (
     ProQuestOPDS2ImporterConfiguration,
     ProQuestOPDS2ImportMonitor,
 )
+from api.proquest.model import ProQuestPublicationFingerprint
 from api.saml.metadata.model import (
     SAMLAttribute,
     SAMLAttributeStatement,
@@ -1380,3 +1381,210 @@ class TestProQuestOPDS2ImportMonitor(DatabaseTest):
         # Assert
         # Make sure that ProQuestOPDS2ImportMonitor.import_one_feed was called only for the page # 1
         monitor.import_one_feed.assert_has_calls(expected_calls)
+
+    def test_monitor_skips_unchanged_publications(self):
+        """This test makes sure that the monitor keeps track of fingerprints of the imported publications
+        and doesn't import publications which haven't changed since the last run.
+        """
+        # Arrange
+        client = create_autospec(spec=ProQuestAPIClient)
+        client.download_all_feed_pages = MagicMock(
+            side_effect=lambda _: [json.loads(fixtures.PROQUEST_RAW_FEED)]
+        )
+
+        client_factory = create_autospec(spec=ProQuestAPIClientFactory)
+        client_factory.create = MagicMock(return_value=client)
+
+        monitor = ProQuestOPDS2ImportMonitor(
+            client_factory, self._db, self._proquest_collection, ProQuestOPDS2Importer
+        )
+        monitor.import_one_feed = MagicMock(return_value=([], []))
+
+        # Act
+        # 1. The first run imports both publications and saves their fingerprints.
+        monitor.run_once(False)
+
+        # Assert
+        assert 1 == monitor.import_one_feed.call_count
+        fingerprints = self._db.query(ProQuestPublicationFingerprint).all()
+        assert set(
+            [
+                fixtures.PROQUEST_RAW_PUBLICATION_1_ID,
+                fixtures.PROQUEST_RAW_PUBLICATION_2_ID,
+            ]
+        ) == set([fingerprint.identifier for fingerprint in fingerprints])
+        for fingerprint in fingerprints:
+            assert self._proquest_collection.id == fingerprint.collection_id
+
+        # Act
+        # 2. The second run gets the same feed, so there is nothing to import.
+        timestamp = monitor.run_once(False)
+
+        # Assert
+        assert 1 == monitor.import_one_feed.call_count
+        assert "Unchanged: 2." in timestamp.achievements
+
+        # Act
+        # 3. Forcing the reimport ignores the fingerprints.
+        monitor.force_reimport = True
+        monitor.run_once(False)
+
+        # Assert
+        assert 2 == monitor.import_one_feed.call_count
+
+    def test_monitor_does_not_save_fingerprints_of_failed_publications(self):
+        """This test makes sure that publications which failed to import are imported again during the next run."""
+        # Arrange
+        client = create_autospec(spec=ProQuestAPIClient)
+        client.download_all_feed_pages = MagicMock(
+            side_effect=lambda _: [json.loads(fixtures.PROQUEST_RAW_FEED)]
+        )
+
+        client_factory = create_autospec(spec=ProQuestAPIClientFactory)
+        client_factory.create = MagicMock(return_value=client)
+
+        monitor = ProQuestOPDS2ImportMonitor(
+            client_factory, self._db, self._proquest_collection, ProQuestOPDS2Importer
+        )
+        failed_identifier = "urn:proquest.com/document-id/{0}".format(
+            fixtures.PROQUEST_RAW_PUBLICATION_2_ID
+        )
+        monitor.import_one_feed = MagicMock(
+            return_value=([], {failed_identifier: MagicMock()})
+        )
+
+        # Act
+        monitor.run_once(False)
+
+        # Assert
+        [fingerprint] = self._db.query(ProQuestPublicationFingerprint).all()
+        assert fixtures.PROQUEST_RAW_PUBLICATION_1_ID == fingerprint.identifier
+
+        # Act
+        monitor.run_once(False)
+
+        # Assert
+        # Only the publication which failed to import is left in the feed.
+        assert 2 == monitor.import_one_feed.call_count
+        [_, (feed,), _] = monitor.import_one_feed.mock_calls[1]
+        [group] = feed.groups
+        [publication] = group.publications
+        assert failed_identifier == publication.metadata.identifier
+
+    def test_monitor_does_not_save_fingerprints_of_failures_keyed_by_urn(self):
+        """This test makes sure that failures keyed by URNs of Identifier objects are also taken into account."""
+        # Arrange
+        client = create_autospec(spec=ProQuestAPIClient)
+        client.download_all_feed_pages = MagicMock(
+            side_effect=lambda _: [json.loads(fixtures.PROQUEST_RAW_FEED)]
+        )
+
+        client_factory = create_autospec(spec=ProQuestAPIClientFactory)
+        client_factory.create = MagicMock(return_value=client)
+
+        monitor = ProQuestOPDS2ImportMonitor(
+            client_factory, self._db, self._proquest_collection, ProQuestOPDS2Importer
+        )
+        failed_identifier = self._identifier(
+            identifier_type=Identifier.PROQUEST_ID,
+            foreign_id=fixtures.PROQUEST_RAW_PUBLICATION_2_ID,
+        )
+        monitor.import_one_feed = MagicMock(
+            return_value=([], {failed_identifier.urn: MagicMock()})
+        )
+
+        # Act
+        monitor.run_once(False)
+
+        # Assert
+        [fingerprint] = self._db.query(ProQuestPublicationFingerprint).all()
+        assert fixtures.PROQUEST_RAW_PUBLICATION_1_ID == fingerprint.identifier
+
+    def test_clean_removed_items(self):
+        """This test makes sure that the monitor hides only the items which are no longer present in the feed."""
+        # Arrange
+        client = create_autospec(spec=ProQuestAPIClient)
+        client_factory = create_autospec(spec=ProQuestAPIClientFactory)
+        client_factory.create = MagicMock(return_value=client)
+
+        monitor = ProQuestOPDS2ImportMonitor(
+            client_factory, self._db, self._proquest_collection, ProQuestOPDS2Importer
+        )
+
+        license_pools = []
+        for _ in range(3):
+            _, license_pool = self._edition(
+                identifier_type=Identifier.PROQUEST_ID,
+                with_license_pool=True,
+                collection=self._proquest_collection,
+            )
+            license_pool.unlimited_access = True
+            license_pools.append(license_pool)
+
+        # The item from another collection must be left intact.
+        _, other_license_pool = self._edition(
+            identifier_type=Identifier.PROQUEST_ID,
+            with_license_pool=True,
+            collection=self._default_collection,
+        )
+        other_license_pool.unlimited_access = True
+
+        present_license_pool, removed_license_pool_1, removed_license_pool_2 = (
+            license_pools
+        )
+        removed_license_pool_2.unlimited_access = False
+
+        for license_pool in license_pools:
+            self._db.add(
+                ProQuestPublicationFingerprint(
+                    self._proquest_collection.id,
+                    license_pool.identifier.identifier,
+                    "fingerprint",
+                )
+            )
+        self._db.flush()
+
+        # Act
+        removed_items = monitor._clean_removed_items(
+            set([present_license_pool.identifier.identifier])
+        )
+
+        # Assert
+        # Only one item was visible and is no longer present in the feed.
+        assert 1 == removed_items
+        assert True == present_license_pool.unlimited_access
+        assert False == removed_license_pool_1.unlimited_access
+        assert False == removed_license_pool_2.unlimited_access
+        assert True == other_license_pool.unlimited_access
+
+        # Fingerprints of the removed items were deleted.
+        [fingerprint] = self._db.query(ProQuestPublicationFingerprint).all()
+        assert present_license_pool.identifier.identifier == fingerprint.identifier
+
+        # The temporary table was dropped, so the monitor can process removals again.
+        assert 0 == monitor._clean_removed_items(
+            set([present_license_pool.identifier.identifier])
+        )
+
+    def test_clean_removed_items_does_nothing_when_feed_is_empty(self):
+        # Arrange
+        client = create_autospec(spec=ProQuestAPIClient)
+        client_factory = create_autospec(spec=ProQuestAPIClientFactory)
+        client_factory.create = MagicMock(return_value=client)
+
+        monitor = ProQuestOPDS2ImportMonitor(
+            client_factory, self._db, self._proquest_collection, ProQuestOPDS2Importer
+        )
+        _, license_pool = self._edition(
+            identifier_type=Identifier.PROQUEST_ID,
+            with_license_pool=True,
+            collection=self._proquest_collection,
+        )
+        license_pool.unlimited_access = True
+
+        # Act
+        removed_items = monitor._clean_removed_items(set())
+
+        # Assert
+        assert 0 == removed_items
+        assert True == license_pool.unlimited_access
@@ -11,6 +11,7 @@ from api.saml.configuration.model import (
     SAMLConfigurationFactory,
     SAMLOneLoginConfiguration,
 )
+from api.saml.metadata.cache import SAMLMetadataCache
 from api.saml.metadata.federations import incommon
 from api.saml.metadata.federations.model import (
     SAMLFederatedIdentityProvider,
@@ -224,6 +225,58 @@ class TestSAMLConfiguration(DatabaseTest):
                 [call(federated_idp_1.xml_metadata), call(federated_idp_2.xml_metadata)]
             )
 
+    def test_get_identity_providers_reuses_cached_idps(self):
+        # Arrange
+        identity_providers_metadata = fixtures.CORRECT_XML_WITH_MULTIPLE_IDPS
+
+        metadata_parser = SAMLMetadataParser()
+        metadata_parser.parse = MagicMock(side_effect=metadata_parser.parse)
+
+        configuration_storage = ConfigurationStorage(self._saml_integration_association)
+
+        metadata_cache = SAMLMetadataCache()
+        saml_configuration_factory = SAMLConfigurationFactory(
+            metadata_parser, metadata_cache, self._saml_provider_integration.id
+        )
+
+        with saml_configuration_factory.create(
+            configuration_storage, self._db, SAMLConfiguration
+        ) as configuration:
+            configuration.non_federated_identity_provider_xml_metadata = (
+                identity_providers_metadata
+            )
+            first_identity_providers = configuration.get_identity_providers(self._db)
+            first_fingerprint = configuration.get_metadata_fingerprint(self._db)
+
+        # Act
+        with saml_configuration_factory.create(
+            configuration_storage, self._db, SAMLConfiguration
+        ) as configuration:
+            identity_providers = configuration.get_identity_providers(self._db)
+
+            # Assert
+            assert first_identity_providers == identity_providers
+            assert first_fingerprint == configuration.get_metadata_fingerprint(
+                self._db
+            )
+            metadata_parser.parse.assert_called_once_with(identity_providers_metadata)
+
+        # Once the metadata changes, it gets parsed again
+        with saml_configuration_factory.create(
+            configuration_storage, self._db, SAMLConfiguration
+        ) as configuration:
+            configuration.non_federated_identity_provider_xml_metadata = (
+                fixtures.CORRECT_XML_WITH_IDP_1
+            )
+            identity_providers = configuration.get_identity_providers(self._db)
+
+            assert 1 == len(identity_providers)
+            assert fixtures.IDP_1_ENTITY_ID == identity_providers[0].entity_id
+            assert first_fingerprint != configuration.get_metadata_fingerprint(
+                self._db
+            )
+            assert 2 == metadata_parser.parse.call_count
+
     def test_get_identity_providers_returns_both_non_federated_and_federated_idps(self):
         # Arrange
         non_federated_identity_providers_metadata = (
@@ -532,3 +585,50 @@ class TestSAMLOneLoginConfiguration(object):
         service_provider_strict_mode_mock.assert_called_with()
         configuration.get_service_provider.assert_called_with(db)
         configuration.get_identity_providers.assert_called_with(db)
+
+    def test_get_settings_uses_metadata_cache(self):
+        # Arrange
+        configuration = create_autospec(spec=SAMLConfiguration)
+        type(configuration).service_provider_debug_mode = PropertyMock(
+            return_value=False
+        )
+        type(configuration).service_provider_strict_mode = PropertyMock(
+            return_value=False
+        )
+        type(configuration).integration_id = PropertyMock(return_value=1)
+        configuration.get_metadata_fingerprint = MagicMock(
+            return_value="fingerprint"
+        )
+        configuration.get_service_provider = MagicMock(
+            return_value=SERVICE_PROVIDER_WITH_CERTIFICATE
+        )
+        configuration.get_identity_providers = MagicMock(
+            return_value=IDENTITY_PROVIDERS
+        )
+        metadata_cache = SAMLMetadataCache()
+        db = create_autospec(spec=sqlalchemy.orm.session.Session)
+
+        expected_result = SAMLOneLoginConfiguration(configuration).get_settings(
+            db, IDENTITY_PROVIDERS[0].entity_id
+        )
+        configuration.get_service_provider.reset_mock()
+
+        # Act
+        first_result = SAMLOneLoginConfiguration(
+            configuration, metadata_cache
+        ).get_settings(db, IDENTITY_PROVIDERS[0].entity_id)
+        first_result["idp"]["entityId"] = "modified by OneLogin"
+        second_result = SAMLOneLoginConfiguration(
+            configuration, metadata_cache
+        ).get_settings(db, IDENTITY_PROVIDERS[0].entity_id)
+
+        # Assert
+        assert expected_result == second_result
+        configuration.get_service_provider.assert_called_once_with(db)
+
+        # Once the metadata changes, the settings are built again
+        configuration.get_metadata_fingerprint.return_value = "new fingerprint"
+        SAMLOneLoginConfiguration(configuration, metadata_cache).get_settings(
+            db, IDENTITY_PROVIDERS[0].entity_id
+        )
+        assert 2 == configuration.get_service_provider.call_count
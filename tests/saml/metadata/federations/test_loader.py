@@ -1,13 +1,18 @@
 import pytest
 from mock import MagicMock, create_autospec, patch
+from six.moves.urllib.error import HTTPError
 
 from api.saml.metadata.federations import incommon
 from api.saml.metadata.federations.loader import (
     SAMLFederatedIdentityProviderLoader,
     SAMLMetadataLoader,
     SAMLMetadataLoadingError,
+    SAMLMetadataResponse,
+)
+from api.saml.metadata.federations.model import (
+    SAMLFederatedIdentityProvider,
+    SAMLFederation,
 )
-from api.saml.metadata.federations.model import SAMLFederation
 from api.saml.metadata.federations.validator import SAMLFederatedMetadataValidator
 from api.saml.metadata.parser import SAMLMetadataParser
 from tests.saml import fixtures
@@ -63,6 +68,64 @@ class TestSAMLMetadataLoader(object):
         assert fixtures.CORRECT_XML_WITH_MULTIPLE_IDPS == xml_metadata
 
 
+    @patch("api.saml.metadata.federations.loader.urlopen")
+    def test_load_idp_metadata_if_modified(self, urlopen_mock):
+        # Arrange
+        url = "http://md.incommon.org/InCommon/metadata.xml"
+        urlopen_response_mock = MagicMock()
+        urlopen_response_mock.read = MagicMock(
+            return_value=fixtures.CORRECT_XML_WITH_IDP_1
+        )
+        urlopen_response_mock.info = MagicMock(
+            return_value={"ETag": "new-etag", "Last-Modified": "new-last-modified"}
+        )
+        urlopen_mock.return_value = urlopen_response_mock
+        metadata_loader = SAMLMetadataLoader()
+
+        # Act
+        response = metadata_loader.load_idp_metadata_if_modified(
+            url, "etag", "last-modified"
+        )
+
+        # Assert
+        [request] = urlopen_mock.call_args[0]
+        assert url == request.get_full_url()
+        assert "etag" == request.get_header("If-none-match")
+        assert "last-modified" == request.get_header("If-modified-since")
+
+        assert fixtures.CORRECT_XML_WITH_IDP_1 == response.xml_metadata
+        assert "new-etag" == response.etag
+        assert "new-last-modified" == response.last_modified
+
+    @patch("api.saml.metadata.federations.loader.urlopen")
+    def test_load_idp_metadata_if_modified_returns_none_when_not_modified(
+        self, urlopen_mock
+    ):
+        # Arrange
+        url = "http://md.incommon.org/InCommon/metadata.xml"
+        urlopen_mock.side_effect = HTTPError(url, 304, "Not Modified", {}, None)
+        metadata_loader = SAMLMetadataLoader()
+
+        # Act
+        response = metadata_loader.load_idp_metadata_if_modified(url, "etag")
+
+        # Assert
+        assert None == response
+
+    @patch("api.saml.metadata.federations.loader.urlopen")
+    def test_load_idp_metadata_if_modified_raises_error_when_request_fails(
+        self, urlopen_mock
+    ):
+        # Arrange
+        url = "http://md.incommon.org/InCommon/metadata.xml"
+        urlopen_mock.side_effect = HTTPError(url, 500, "Server Error", {}, None)
+        metadata_loader = SAMLMetadataLoader()
+
+        # Act
+        with pytest.raises(SAMLMetadataLoadingError):
+            metadata_loader.load_idp_metadata_if_modified(url, "etag")
+
+
 class TestSAMLFederatedIdentityProviderLoader(object):
     def test_load(self):
         # Arrange
@@ -81,7 +144,7 @@ class TestSAMLFederatedIdentityProviderLoader(object):
         )
 
         metadata_loader.load_idp_metadata = MagicMock(return_value=xml_metadata)
-        metadata_parser.parse = MagicMock(side_effect=metadata_parser.parse)
+        metadata_parser.iterparse = MagicMock(side_effect=metadata_parser.iterparse)
 
         # Act
         idps = idp_loader.load(saml_federation)
@@ -100,4 +163,51 @@ class TestSAMLFederatedIdentityProviderLoader(object):
         metadata_loader.load_idp_metadata.assert_called_once_with(
             federation_idp_metadata_service_url
         )
-        metadata_parser.parse.assert_called_once_with(xml_metadata)
+        metadata_parser.iterparse.assert_called_once_with(xml_metadata)
+        assert (
+            SAMLFederatedIdentityProvider.calculate_xml_metadata_hash(
+                idps[0].xml_metadata
+            )
+            == idps[0].xml_metadata_hash
+        )
+
+    def test_load_if_modified(self):
+        # Arrange
+        metadata_loader = create_autospec(spec=SAMLMetadataLoader)
+        metadata_validator = create_autospec(spec=SAMLFederatedMetadataValidator)
+        metadata_parser = SAMLMetadataParser()
+        idp_loader = SAMLFederatedIdentityProviderLoader(
+            metadata_loader, metadata_validator, metadata_parser
+        )
+        saml_federation = SAMLFederation(
+            incommon.FEDERATION_TYPE, incommon.IDP_METADATA_SERVICE_URL
+        )
+        saml_federation.metadata_etag = "etag"
+        saml_federation.metadata_last_modified = "last-modified"
+
+        metadata_loader.load_idp_metadata_if_modified = MagicMock(
+            return_value=SAMLMetadataResponse(
+                fixtures.CORRECT_XML_WITH_IDP_1, "new-etag", "new-last-modified"
+            )
+        )
+
+        # Act
+        idps = idp_loader.load(saml_federation, if_modified=True)
+
+        # Assert
+        assert 1 == len(idps)
+        assert fixtures.IDP_1_ENTITY_ID == idps[0].entity_id
+        metadata_loader.load_idp_metadata_if_modified.assert_called_once_with(
+            incommon.IDP_METADATA_SERVICE_URL, "etag", "last-modified"
+        )
+        metadata_loader.load_idp_metadata.assert_not_called()
+        assert "new-etag" == saml_federation.metadata_etag
+        assert "new-last-modified" == saml_federation.metadata_last_modified
+
+        # When the metadata hasn't changed, there is nothing to do
+        metadata_loader.load_idp_metadata_if_modified = MagicMock(return_value=None)
+        metadata_validator.validate.reset_mock()
+
+        assert None == idp_loader.load(saml_federation, if_modified=True)
+        metadata_validator.validate.assert_not_called()
+        assert "new-etag" == saml_federation.metadata_etag
@@ -1,5 +1,6 @@
 from mock import MagicMock, create_autospec
 
+from api.saml.metadata.cache import SAMLMetadataCache
 from api.saml.metadata.federations.loader import SAMLFederatedIdentityProviderLoader
 from api.saml.metadata.federations.model import (
     SAMLFederatedIdentityProvider,
@@ -45,3 +46,124 @@ class TestSAMLMetadataMonitor(DatabaseTest):
         # Assert
         identity_providers = self._db.query(SAMLFederatedIdentityProvider).all()
         assert expected_federated_identity_providers == identity_providers
+
+    def test_incremental_update(self):
+        # Arrange
+        federation = SAMLFederation("Test federation", "http://incommon.org/metadata")
+        unchanged_identity_provider = SAMLFederatedIdentityProvider(
+            federation,
+            fixtures.IDP_1_ENTITY_ID,
+            fixtures.IDP_1_UI_INFO_EN_DISPLAY_NAME,
+            fixtures.CORRECT_XML_WITH_IDP_1,
+        )
+        updated_identity_provider = SAMLFederatedIdentityProvider(
+            federation,
+            fixtures.IDP_2_ENTITY_ID,
+            fixtures.IDP_2_UI_INFO_EN_DISPLAY_NAME,
+            fixtures.CORRECT_XML_WITH_IDP_2,
+        )
+        deleted_identity_provider = SAMLFederatedIdentityProvider(
+            federation,
+            "http://deleted.org/idp/shibboleth",
+            "Deleted IdP",
+            fixtures.CORRECT_XML_WITH_IDP_1,
+        )
+        self._db.add_all(
+            [
+                federation,
+                unchanged_identity_provider,
+                updated_identity_provider,
+                deleted_identity_provider,
+            ]
+        )
+        self._db.flush()
+        unchanged_identity_provider_id = unchanged_identity_provider.id
+        updated_identity_provider_id = updated_identity_provider.id
+
+        loaded_identity_providers = [
+            SAMLFederatedIdentityProvider(
+                federation,
+                fixtures.IDP_1_ENTITY_ID,
+                fixtures.IDP_1_UI_INFO_EN_DISPLAY_NAME,
+                fixtures.CORRECT_XML_WITH_IDP_1,
+            ),
+            SAMLFederatedIdentityProvider(
+                federation,
+                fixtures.IDP_2_ENTITY_ID,
+                "New display name",
+                fixtures.CORRECT_XML_WITH_MULTIPLE_IDPS,
+            ),
+            SAMLFederatedIdentityProvider(
+                federation,
+                "http://inserted.org/idp/shibboleth",
+                "Inserted IdP",
+                fixtures.CORRECT_XML_WITH_IDP_2,
+            ),
+        ]
+        loader = create_autospec(spec=SAMLFederatedIdentityProviderLoader)
+        loader.load = MagicMock(return_value=loaded_identity_providers)
+        metadata_cache = create_autospec(spec=SAMLMetadataCache)
+
+        monitor = SAMLMetadataMonitor(self._db, loader, metadata_cache)
+
+        # Act
+        monitor.run_once(None)
+
+        # Assert
+        loader.load.assert_called_once_with(federation, if_modified=True)
+        metadata_cache.invalidate.assert_called_once_with()
+
+        identity_providers = {
+            identity_provider.entity_id: identity_provider
+            for identity_provider in self._db.query(SAMLFederatedIdentityProvider)
+        }
+        assert set(
+            [
+                fixtures.IDP_1_ENTITY_ID,
+                fixtures.IDP_2_ENTITY_ID,
+                "http://inserted.org/idp/shibboleth",
+            ]
+        ) == set(identity_providers.keys())
+
+        # Existing IdPs are updated in place
+        assert (
+            unchanged_identity_provider_id
+            == identity_providers[fixtures.IDP_1_ENTITY_ID].id
+        )
+        updated = identity_providers[fixtures.IDP_2_ENTITY_ID]
+        assert updated_identity_provider_id == updated.id
+        assert "New display name" == updated.display_name
+        assert fixtures.CORRECT_XML_WITH_MULTIPLE_IDPS == updated.xml_metadata
+        assert (
+            SAMLFederatedIdentityProvider.calculate_xml_metadata_hash(
+                fixtures.CORRECT_XML_WITH_MULTIPLE_IDPS
+            )
+            == updated.xml_metadata_hash
+        )
+
+    def test_incremental_update_does_nothing_when_metadata_has_not_changed(self):
+        # Arrange
+        federation = SAMLFederation("Test federation", "http://incommon.org/metadata")
+        identity_provider = SAMLFederatedIdentityProvider(
+            federation,
+            fixtures.IDP_1_ENTITY_ID,
+            fixtures.IDP_1_UI_INFO_EN_DISPLAY_NAME,
+            fixtures.CORRECT_XML_WITH_IDP_1,
+        )
+        self._db.add_all([federation, identity_provider])
+
+        loader = create_autospec(spec=SAMLFederatedIdentityProviderLoader)
+        loader.load = MagicMock(return_value=None)
+        metadata_cache = create_autospec(spec=SAMLMetadataCache)
+
+        monitor = SAMLMetadataMonitor(self._db, loader, metadata_cache)
+
+        # Act
+        monitor.run_once(None)
+
+        # Assert
+        assert [identity_provider] == self._db.query(
+            SAMLFederatedIdentityProvider
+        ).all()
+        assert federation.last_updated_at is not None
+        metadata_cache.invalidate.assert_not_called()
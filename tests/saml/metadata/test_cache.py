@@ -0,0 +1,90 @@
+from mock import MagicMock
+
+from api.saml.metadata.cache import SAMLMetadataCache
+
+
+class TestSAMLMetadataCache(object):
+    def test_hash(self):
+        assert SAMLMetadataCache.hash("a", "b") == SAMLMetadataCache.hash("a", "b")
+        assert SAMLMetadataCache.hash("ab", "") != SAMLMetadataCache.hash("a", "b")
+        assert SAMLMetadataCache.hash(None) == SAMLMetadataCache.hash("")
+        assert SAMLMetadataCache.hash(u"\u00e9") != SAMLMetadataCache.hash(u"e")
+
+    def test_get_identity_providers(self):
+        # Arrange
+        cache = SAMLMetadataCache()
+        parse = MagicMock(side_effect=lambda xml_metadata: [xml_metadata.upper()])
+
+        # Act
+        result = cache.get_identity_providers(
+            1, [("hash-a", "a"), ("hash-b", "b")], parse
+        )
+
+        # Assert
+        assert ["A", "B"] == result
+        assert 2 == parse.call_count
+
+        # Documents which have already been parsed are not parsed again
+        result = cache.get_identity_providers(
+            1, [("hash-b", "b"), ("hash-c", "c")], parse
+        )
+        assert ["B", "C"] == result
+        assert 3 == parse.call_count
+
+        # Entries are kept separately for each integration
+        cache.get_identity_providers(2, [("hash-b", "b")], parse)
+        assert 4 == parse.call_count
+
+        # Documents which are no longer used have been dropped
+        cache.get_identity_providers(1, [("hash-a", "a")], parse)
+        assert 5 == parse.call_count
+
+    def test_get_settings(self):
+        # Arrange
+        cache = SAMLMetadataCache()
+        build = MagicMock(side_effect=lambda: {"idp": {"entityId": "idp"}})
+
+        # Act
+        result = cache.get_settings(1, "fingerprint", "idp", build)
+        result["idp"]["entityId"] = "changed"
+
+        # Assert
+        assert {"idp": {"entityId": "idp"}} == cache.get_settings(
+            1, "fingerprint", "idp", build
+        )
+        assert 1 == build.call_count
+
+        cache.get_settings(1, "fingerprint", "another-idp", build)
+        assert 2 == build.call_count
+
+        # A new fingerprint means the metadata has changed
+        cache.get_settings(1, "new-fingerprint", "idp", build)
+        assert 3 == build.call_count
+        cache.get_settings(1, "new-fingerprint", "another-idp", build)
+        assert 4 == build.call_count
+
+    def test_invalidate(self):
+        # Arrange
+        cache = SAMLMetadataCache()
+        parse = MagicMock(return_value=["idp"])
+        build = MagicMock(return_value={})
+
+        for integration_id in (1, 2):
+            cache.get_identity_providers(integration_id, [("hash", "xml")], parse)
+            cache.get_settings(integration_id, "fingerprint", "idp", build)
+
+        # Act
+        cache.invalidate(1)
+
+        # Assert
+        cache.get_identity_providers(1, [("hash", "xml")], parse)
+        cache.get_identity_providers(2, [("hash", "xml")], parse)
+        assert 3 == parse.call_count
+
+        cache.invalidate()
+
+        cache.get_settings(2, "fingerprint", "idp", build)
+        assert 3 == build.call_count
+
+    def test_instance(self):
+        assert SAMLMetadataCache.instance() is SAMLMetadataCache.instance()
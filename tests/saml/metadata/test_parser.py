@@ -487,6 +487,56 @@ class TestSAMLMetadataParser(object):
             ) ==
             parsing_results[1].provider)
 
+    @parameterized.expand(
+        [
+            ("one_idp", fixtures.CORRECT_XML_WITH_IDP_1),
+            ("multiple_idps", fixtures.CORRECT_XML_WITH_MULTIPLE_IDPS),
+            ("one_sp", fixtures.CORRECT_XML_WITH_ONE_SP),
+        ]
+    )
+    def test_iterparse_returns_the_same_results_as_parse(self, _, xml_metadata):
+        # Arrange
+        metadata_parser = SAMLMetadataParser()
+        expected_results = metadata_parser.parse(xml_metadata)
+
+        # Act
+        results = []
+        for parsing_result in metadata_parser.iterparse(xml_metadata):
+            # XML nodes are discarded as soon as we move on to the next result
+            results.append(
+                (parsing_result.provider, parsing_result.xml_node.get("entityID"))
+            )
+
+        # Assert
+        assert [
+            (result.provider, result.xml_node.get("entityID"))
+            for result in expected_results
+        ] == results
+
+    @parameterized.expand(
+        [
+            ("incorrect_format", fixtures.INCORRECT_XML),
+            (
+                "missing_sso_service",
+                fixtures.INCORRECT_XML_WITH_ONE_IDP_METADATA_WITHOUT_SSO_SERVICE,
+            ),
+            (
+                "dtd",
+                '<?xml version="1.0"?><!DOCTYPE md [<!ENTITY a "a">]>'
+                '<md:EntitiesDescriptor xmlns:md="urn:oasis:names:tc:SAML:2.0:metadata"/>',
+            ),
+        ]
+    )
+    def test_iterparse_raises_exception_when_xml_metadata_is_incorrect(
+        self, _, xml_metadata
+    ):
+        # Arrange
+        metadata_parser = SAMLMetadataParser()
+
+        # Act
+        with pytest.raises(SAMLMetadataParsingError):
+            list(metadata_parser.iterparse(xml_metadata))
+
     def test_parse_raises_exception_when_sp_metadata_does_not_contain_acs_service(self):
         # Arrange
         metadata_parser = SAMLMetadataParser()
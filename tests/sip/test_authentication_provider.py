@@ -1,7 +1,10 @@
 from datetime import datetime
 
 import pytest
-from api.sip.client import MockSIPClient
+from api.sip.client import (
+    MockSIPClient,
+    SIPConnectionPool,
+)
 from api.sip import SIP2AuthenticationProvider
 from core.util.http import RemoteIntegrationException
 from api.authenticator import PatronData
@@ -186,6 +189,54 @@ class TestSIP2AuthenticationProvider(DatabaseTest):
         patrondata = auth.remote_authenticate("user", "pass")
         assert None == patrondata
 
+    def test_remote_authenticate_with_connection_pool(self):
+        integration = self._external_integration(self._str)
+        integration.url = "server.local"
+        integration.username = "user1"
+
+        # By default, connections aren't pooled.
+        provider = SIP2AuthenticationProvider(self._default_library, integration)
+        assert 0 == provider.connection_pool_size
+        assert None == provider.connection_pool
+
+        clients = []
+        test = self
+        class Mock(SIP2AuthenticationProvider):
+            def _client(self):
+                client = MockSIPClient("user1")
+                client.queue_response("941")
+                client.queue_response(test.sierra_valid_login)
+                client.queue_response(test.end_session_response)
+                clients.append(client)
+                return client
+
+        integration.setting(
+            SIP2AuthenticationProvider.CONNECTION_POOL_SIZE
+        ).value = 2
+        provider = Mock(self._default_library, integration)
+        pool = provider.connection_pool
+        assert isinstance(pool, SIPConnectionPool)
+        assert 2 == pool.size
+
+        try:
+            # The first authentication creates a connection and logs in.
+            patrondata = provider.remote_authenticate("user", "pass")
+            assert "12345" == patrondata.authorization_identifier
+
+            # The next one reuses the connection, without logging in
+            # again.
+            clients[0].queue_response(self.sierra_valid_login)
+            clients[0].queue_response(self.end_session_response)
+            patrondata = provider.remote_authenticate("user", "pass")
+            assert "12345" == patrondata.authorization_identifier
+
+            [client] = clients
+            assert ['93', '63', '35', '63', '35'] == [
+                x[:2] for x in client.requests
+            ]
+        finally:
+            SIPConnectionPool.reset()
+
     def test_remote_authenticate_no_password(self):
 
         integration = self._external_integration(self._str)
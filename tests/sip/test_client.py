@@ -6,6 +6,7 @@ import ssl
 from api.sip.client import (
     MockSIPClient,
     SIPClient,
+    SIPConnectionPool,
 )
 from api.sip.dialect import (
     GenericILS,
@@ -419,3 +420,173 @@ class TestClientDialects(object):
         self.sip.end_session('username', 'password')
         assert self.sip.read_count == 0
         assert self.sip.write_count == 0
+
+
+class TestSCStatus(object):
+
+    acs_status = "98YYYYNN99900320180903    1234562.00AOnypl |AMNew York Public Library|BNYYYYYYYYYYYYYYYY|BXYYYYYYYYYYYYYYYY|AY1AZ0000"
+
+    def test_sc_status_message(self):
+        sip = MockSIPClient()
+        assert "9909992.00" == sip.sc_status_message()
+        assert "9920402.00" == sip.sc_status_message("2", "040")
+
+    def test_sc_status(self):
+        sip = MockSIPClient()
+        sip.queue_response(self.acs_status)
+        response = sip.sc_status()
+        assert "99" == sip.requests[0][:2]
+        assert "Y" == response['online_status']
+        assert "999" == response['timeout_period']
+        assert "003" == response['retries_allowed']
+        assert "2.00" == response['protocol_version']
+        assert "nypl " == response['institution_id']
+        assert "New York Public Library" == response['library_name']
+
+
+class TestSIPConnectionPool(object):
+
+    patron_information = '64Y                201610050000114734                        AOnypl |AA12345|AENo Name|BLN|AY1AZC9DE'
+
+    def setup_method(self):
+        self.clients = []
+        self.now = 1000
+
+    def teardown_method(self):
+        SIPConnectionPool.reset()
+
+    def factory(self):
+        """Create a client that will successfully log in."""
+        client = MockSIPClient('user_id', 'password')
+        client.disconnected = False
+        def disconnect():
+            client.disconnected = True
+        client.disconnect = disconnect
+        client.queue_response('941')
+        self.clients.append(client)
+        return client
+
+    def pool(self, **kwargs):
+        return SIPConnectionPool(
+            self.factory, clock=lambda: self.now, **kwargs
+        )
+
+    def lookup(self, client):
+        client.queue_response(self.patron_information)
+        return client.patron_information('12345')
+
+    def test_connection_is_reused(self):
+        pool = self.pool()
+        assert '12345' == pool.run(self.lookup)['patron_identifier']
+        assert '12345' == pool.run(self.lookup)['patron_identifier']
+
+        # Only one connection was made, and it only logged in once.
+        [client] = self.clients
+        assert ["Creating new socket connection."] == client.status
+        assert 3 == len(client.requests)
+        assert client.requests[0].startswith('93')
+        assert client.requests[1].startswith('63')
+        assert client.requests[2].startswith('63')
+        assert False == client.disconnected
+
+    def test_size(self):
+        pool = self.pool(size=1)
+        client1, reused = pool.checkout()
+        client2, reused = pool.checkout()
+        assert False == reused
+        assert 2 == len(self.clients)
+
+        # Only one idle connection is kept open.
+        pool.checkin(client1)
+        pool.checkin(client2)
+        assert False == client1.disconnected
+        assert True == client2.disconnected
+        assert (client1, True) == pool.checkout()
+
+        # If the size is 0, nothing is kept open.
+        pool = self.pool(size=0)
+        client, reused = pool.checkout()
+        pool.checkin(client)
+        assert True == client.disconnected
+
+    def test_health_check(self):
+        pool = self.pool(health_check_interval=30)
+        client, reused = pool.checkout()
+        pool.checkin(client)
+
+        # A recently used connection is reused without being checked.
+        self.now += 10
+        assert (client, True) == pool.checkout()
+        assert 1 == len(client.requests)
+        pool.checkin(client)
+
+        # A connection that's been idle for a while is checked with
+        # an SC Status message.
+        self.now += 60
+        client.queue_response(TestSCStatus.acs_status)
+        assert (client, True) == pool.checkout()
+        assert client.requests[-1].startswith('99')
+        pool.checkin(client)
+
+        # If the check fails, the connection is thrown away and a new
+        # one is made.
+        self.now += 60
+        client.queue_response('98N')
+        new_client, reused = pool.checkout()
+        assert False == reused
+        assert new_client != client
+        assert True == client.disconnected
+
+    def test_reconnect_after_error(self):
+        pool = self.pool()
+        pool.run(self.lookup)
+        [client] = self.clients
+
+        # The server stops responding on the pooled connection, other
+        # than to keep asking for the message to be resent.
+        def lookup(sip):
+            if sip is client:
+                for i in range(sip.MAXIMUM_RETRIES):
+                    sip.queue_response('96')
+            return self.lookup(sip)
+
+        info = pool.run(lookup)
+        assert '12345' == info['patron_identifier']
+
+        # The broken connection was thrown away and replaced.
+        old_client, new_client = self.clients
+        assert True == old_client.disconnected
+        assert False == new_client.disconnected
+        assert (new_client, True) == pool.checkout()
+
+    def test_error_on_new_connection_is_raised(self):
+        pool = self.pool()
+        def doomed(sip):
+            raise IOError("Doom!")
+        pytest.raises(IOError, pool.run, doomed)
+
+        # The connection wasn't retried, and it wasn't kept.
+        [client] = self.clients
+        assert True == client.disconnected
+        assert [] == pool._idle
+
+    def test_get(self):
+        pool = SIPConnectionPool.get("server", 6001, "user_id", self.factory, 3)
+        assert self.factory == pool.client_factory
+        assert 3 == pool.size
+
+        # Pools are shared by server, port and login user.
+        other_factory = lambda: None
+        assert pool == SIPConnectionPool.get("server", 6001, "user_id", other_factory)
+        assert other_factory == pool.client_factory
+        assert 3 == pool.size
+        assert pool != SIPConnectionPool.get("server", 6001, "other_user", self.factory)
+        assert pool != SIPConnectionPool.get("server", 6002, "user_id", self.factory)
+
+        # reset() closes all connections and forgets all pools.
+        pool.client_factory = self.factory
+        client, reused = pool.checkout()
+        pool.checkin(client)
+        SIPConnectionPool.reset()
+        assert True == client.disconnected
+        assert pool != SIPConnectionPool.get("server", 6001, "user_id", self.factory)
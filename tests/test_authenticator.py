@@ -48,6 +48,7 @@ from api.authenticator import (
     LibraryAuthenticator,
     AuthenticationProvider,
     BasicAuthenticationProvider,
+    CredentialCache,
     OAuthController,
     OAuthAuthenticationProvider,
     PatronData,
@@ -2224,6 +2225,44 @@ class TestBasicAuthenticationProvider(AuthenticatorTest):
 
 
 
+class TestCredentialCache(object):
+
+    def test_get_set_invalidate(self):
+        cache = CredentialCache(60, 10)
+        assert None == cache.get("user", "pass")
+
+        cache.set("user", "pass", 5)
+        assert 5 == cache.get("user", "pass")
+        assert None == cache.get("user", "other pass")
+        assert None == cache.get("other user", "pass")
+
+        # Unicode credentials and missing passwords work.
+        cache.set(u"us\u00e9r", None, 6)
+        assert 6 == cache.get(u"us\u00e9r", None)
+        assert 6 == cache.get(u"us\u00e9r", "")
+
+        # Only one set of credentials is remembered per username.
+        cache.set("user", "new pass", 5)
+        assert None == cache.get("user", "pass")
+        assert 5 == cache.get("user", "new pass")
+
+        cache.invalidate("user")
+        assert None == cache.get("user", "new pass")
+
+    def test_credentials_are_not_stored(self):
+        cache = CredentialCache(60, 10)
+        cache.set("user", "secret pin", 5)
+        [(key, (credentials_hash, patron_id))] = cache._data.items()
+        for value in (key, credentials_hash):
+            assert "user" not in value
+            assert "secret pin" not in value
+
+        # Another cache uses a different salt.
+        other = CredentialCache(60, 10)
+        other.set("user", "secret pin", 5)
+        assert other._data.keys() != cache._data.keys()
+
+
 class TestBasicAuthenticationProviderAuthenticate(AuthenticatorTest):
     """Test the complex BasicAuthenticationProvider.authenticate method."""
 
@@ -2498,6 +2537,56 @@ class TestBasicAuthenticationProviderAuthenticate(AuthenticatorTest):
         # new identifiers.
         assert new_username == patron.username
 
+    def test_credential_cache(self):
+        patron = self._patron()
+        patron.last_external_sync = datetime.datetime.utcnow()
+        patrondata = PatronData(permanent_id=patron.external_identifier)
+
+        class CountingMockBasic(MockBasic):
+            remote_calls = 0
+            def remote_authenticate(self, username, password):
+                self.remote_calls += 1
+                return self.patrondata
+
+        # By default, there's no cache, so every authentication is
+        # checked with the source of truth.
+        provider = self.mock_basic(patrondata=patrondata)
+        assert None == provider.credential_cache
+
+        integration = self._external_integration(
+            self._str, ExternalIntegration.PATRON_AUTH_GOAL
+        )
+        integration.setting(BasicAuthenticationProvider.CREDENTIAL_CACHE_TIME).value = 60
+        provider = CountingMockBasic(
+            self._default_library, integration, patrondata=patrondata
+        )
+        assert 60 == provider.credential_cache.ttl
+        assert BasicAuthenticationProvider.DEFAULT_CREDENTIAL_CACHE_SIZE == provider.credential_cache.max_size
+
+        # The first authentication goes to the source of truth. The
+        # next one doesn't.
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert 1 == provider.remote_calls
+
+        # A different password is checked with the source of truth.
+        # When it's rejected, the cached credentials are forgotten.
+        provider.patrondata = None
+        wrong = dict(username="user", password="wrong")
+        assert None == provider.authenticate(self._db, wrong)
+        assert 2 == provider.remote_calls
+        assert None == provider.cached_patron(self._db, "user", "pass")
+
+        provider.patrondata = patrondata
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert 3 == provider.remote_calls
+        assert patron == provider.cached_patron(self._db, "user", "pass")
+
+        # A patron who needs to be synced with the source of truth
+        # isn't authenticated from the cache.
+        patron.last_external_sync = None
+        assert None == provider.cached_patron(self._db, "user", "pass")
+
     # Notice what's missing: If a patron has no permanent identifier,
     # _and_ their username and authorization identifier both change,
     # then we have no way of locating them in our database. They will
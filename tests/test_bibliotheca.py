@@ -7,6 +7,7 @@ import os
 import pkgutil
 import mock
 import random
+import time
 
 from core.testing import DatabaseTest
 from . import sample_data
@@ -650,6 +651,135 @@ class TestBibliothecaCirculationSweep(BibliothecaAPITest):
         ]) ==
             sorted(types))
 
+    def test_constructor(self):
+        monitor = BibliothecaCirculationSweep(
+            self._db, self.collection, api_class=self.api
+        )
+        assert monitor.LOOKUP_WORKERS == monitor.lookup_workers
+        assert (monitor.MAX_REQUESTS_PER_SECOND ==
+                monitor.max_requests_per_second)
+
+        monitor = BibliothecaCirculationSweep(
+            self._db, self.collection, api_class=self.api,
+            lookup_workers=0, max_requests_per_second=0
+        )
+        # There's always at least one worker.
+        assert 1 == monitor.lookup_workers
+        assert 0 == monitor.max_requests_per_second
+
+    def test_lookup(self):
+        # lookup() splits identifiers into LOOKUP_SIZE chunks and
+        # makes the requests in parallel, but the results come back
+        # in the original order.
+        data = self.sample_data("item_metadata_list_mini.xml")
+        monitor = BibliothecaCirculationSweep(
+            self._db, self.collection, api_class=self.api,
+            lookup_workers=3, max_requests_per_second=0
+        )
+        monitor.LOOKUP_SIZE = 2
+        requested = []
+        def lookup_request(ids):
+            requested.append(ids)
+            return data
+        monitor.lookup_request = lookup_request
+
+        ids = ["a", "b", "c", "d", "e"]
+        results = list(monitor.lookup(ids))
+        assert (sorted([["a", "b"], ["c", "d"], ["e"]]) ==
+                sorted(requested))
+        assert (["ddf4gr9", "apfve89"] * 3 ==
+                [x.primary_identifier.identifier for x in results])
+
+    def test_lookup_request(self):
+        # lookup_request() makes an HTTP request and keeps track of
+        # how many requests were made.
+        monitor = BibliothecaCirculationSweep(
+            self._db, self.collection, api_class=self.api
+        )
+        self.api.queue_response(200, content="some data")
+        assert "some data" == monitor.lookup_request(["a", "b"])
+        url = self.api.requests.pop()[1]
+        assert url == self.api.full_url("items") + "/a,b"
+        assert 1 == monitor.lookup_requests
+        assert monitor.lookup_seconds >= 0
+
+    def test_wait_for_rate_limit(self):
+        monitor = BibliothecaCirculationSweep(
+            self._db, self.collection, api_class=self.api,
+            max_requests_per_second=20
+        )
+        start = time.time()
+        for i in range(5):
+            monitor.wait_for_rate_limit()
+        # The first request happens right away; the next four are
+        # spaced 1/20 of a second apart.
+        assert time.time() - start >= 0.19
+
+        # With no limit, there's no wait.
+        monitor.max_requests_per_second = 0
+        monitor._next_request_at = time.time() + 60
+        start = time.time()
+        monitor.wait_for_rate_limit()
+        assert time.time() - start < 1
+
+    def test_process_items_removes_missing_pools(self):
+        # Bibliotheca knows about one book but not the other.
+        data = self.sample_data("item_metadata_single.xml")
+        self.api.queue_response(200, content=data)
+
+        known = self._identifier(
+            identifier_type=Identifier.BIBLIOTHECA_ID, foreign_id="ddf4gr9"
+        )
+        edition, missing_pool = self._edition(
+            identifier_type=Identifier.BIBLIOTHECA_ID,
+            data_source_name=DataSource.BIBLIOTHECA, with_license_pool=True,
+            collection=self.collection
+        )
+        missing_pool.licenses_owned = 5
+        missing_pool.licenses_available = 2
+
+        # A pool for the same identifier in another collection is
+        # left alone.
+        other_pool = self._licensepool(
+            edition, data_source_name=DataSource.BIBLIOTHECA,
+            collection=self._collection()
+        )
+        other_pool.licenses_owned = 5
+        other_pool.licenses_available = 2
+
+        monitor = BibliothecaCirculationSweep(
+            self._db, self.collection, api_class=self.api
+        )
+        monitor.process_items([known, missing_pool.identifier])
+
+        assert 0 == missing_pool.licenses_owned
+        assert 0 == missing_pool.licenses_available
+        assert 5 == other_pool.licenses_owned
+        [pool] = known.licensed_through
+        assert self.collection == pool.collection
+
+        assert 2 == monitor.identifiers_processed
+        assert 1 == monitor.lookup_requests
+
+    def test_throughput_report(self):
+        monitor = BibliothecaCirculationSweep(
+            self._db, self.collection, api_class=self.api
+        )
+        monitor.identifiers_processed = 100
+        monitor.lookup_requests = 4
+        monitor.lookup_seconds = 2.5
+        assert (
+            "Checked 100 identifiers in 10.0 seconds (10.0/sec) with 4 "
+            "requests, spending 2.5 seconds waiting on Bibliotheca." ==
+            monitor.throughput_report(10)
+        )
+        assert "(0.0/sec)" in monitor.throughput_report(0)
+
+        monitor.reset_statistics()
+        assert 0 == monitor.identifiers_processed
+        assert 0 == monitor.lookup_requests
+        assert 0 == monitor.lookup_seconds
+
 
 # Tests of the various parser classes.
 #
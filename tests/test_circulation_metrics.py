@@ -0,0 +1,131 @@
+import pytest
+
+from api.circulation_exceptions import (
+    NoAvailableCopies,
+    RemoteInitiatedServerError,
+)
+from api.circulation_metrics import (
+    CirculationMetrics,
+    InMemoryCirculationMetrics,
+)
+from api.config import Configuration
+from core.model import ConfigurationSetting
+from core.testing import DatabaseTest
+
+
+class TestCirculationMetrics(DatabaseTest):
+
+    def teardown_method(self):
+        CirculationMetrics.configure(False)
+        super(TestCirculationMetrics, self).teardown_method()
+
+    def test_disabled_metrics_record_nothing(self):
+        metrics = CirculationMetrics()
+        assert False == metrics.enabled
+        with metrics.timer("borrow", "MockAPI"):
+            pass
+        metrics.record("borrow", "MockAPI", metrics.TOTAL, 1)
+        assert [] == metrics.report()['timings']
+
+        # The same do-nothing timer is used every time.
+        assert metrics.timer("a", "b") is metrics.timer("c", "d")
+
+        # Exceptions still propagate.
+        def raises():
+            with metrics.timer("borrow", "MockAPI"):
+                raise NoAvailableCopies()
+        pytest.raises(NoAvailableCopies, raises)
+
+    def test_outcome(self):
+        m = CirculationMetrics.outcome
+        assert "success" == m(None)
+        assert "NoAvailableCopies" == m(NoAvailableCopies())
+        assert ("RemoteInitiatedServerError" ==
+                m(RemoteInitiatedServerError("oops", "service")))
+        assert "error" == m(ValueError())
+
+    def test_api_name(self):
+        assert "local" == CirculationMetrics.api_name(None)
+        assert "object" == CirculationMetrics.api_name(object())
+
+    def test_record_and_report(self):
+        metrics = InMemoryCirculationMetrics()
+        assert True == metrics.enabled
+
+        metrics.record("borrow", "MockAPI", metrics.TOTAL, 0.01)
+        metrics.record("borrow", "MockAPI", metrics.TOTAL, 0.5)
+        metrics.record(
+            "borrow", "MockAPI", metrics.TOTAL, 120, "NoAvailableCopies"
+        )
+        metrics.record("checkout", "MockAPI", metrics.VENDOR, 0.07)
+
+        report = metrics.report()
+        assert list(metrics.BUCKETS) == report['buckets']
+        borrow, checkout = report['timings']
+
+        assert "borrow" == borrow['operation']
+        assert "MockAPI" == borrow['api']
+        assert "total" == borrow['phase']
+        assert 3 == borrow['count']
+        assert 120.51 == round(borrow['total_seconds'], 2)
+        assert 120 == borrow['max_seconds']
+        assert dict(success=2, NoAvailableCopies=1) == borrow['outcomes']
+
+        # Each timing went into the right bucket. The last bucket is
+        # for timings longer than the last bound.
+        buckets = borrow['buckets']
+        assert len(metrics.BUCKETS) + 1 == len(buckets)
+        assert 1 == buckets[0]
+        assert 1 == buckets[metrics.BUCKETS.index(0.5)]
+        assert 1 == buckets[-1]
+        assert 3 == sum(buckets)
+
+        assert "vendor" == checkout['phase']
+        assert 1 == checkout['buckets'][1]
+
+        metrics.reset()
+        assert [] == metrics.report()['timings']
+
+    def test_timer(self):
+        metrics = InMemoryCirculationMetrics()
+        with metrics.timer("fulfill", "MockAPI", metrics.VENDOR):
+            pass
+
+        def raises(exception):
+            with metrics.timer("fulfill", "MockAPI", metrics.VENDOR):
+                raise exception
+        pytest.raises(NoAvailableCopies, raises, NoAvailableCopies())
+        pytest.raises(ValueError, raises, ValueError())
+
+        [timing] = metrics.report()['timings']
+        assert 3 == timing['count']
+        assert (dict(success=1, NoAvailableCopies=1, error=1) ==
+                timing['outcomes'])
+
+    def test_configure(self):
+        metrics = CirculationMetrics.configure(False)
+        assert False == metrics.enabled
+        assert metrics is CirculationMetrics.instance()
+
+        metrics = CirculationMetrics.configure(True)
+        assert isinstance(metrics, InMemoryCirculationMetrics)
+        assert metrics is CirculationMetrics.instance()
+        metrics.record("borrow", "MockAPI", metrics.TOTAL, 1)
+
+        # Turning metrics on again keeps what's been recorded.
+        assert metrics is CirculationMetrics.configure(True)
+        assert 1 == len(metrics.report()['timings'])
+
+        assert False == CirculationMetrics.configure(False).enabled
+
+    def test_from_configuration(self):
+        setting = ConfigurationSetting.sitewide(
+            self._db, Configuration.CIRCULATION_METRICS_ENABLED
+        )
+        assert False == CirculationMetrics.from_configuration(self._db).enabled
+
+        setting.value = "true"
+        assert True == CirculationMetrics.from_configuration(self._db).enabled
+
+        setting.value = "false"
+        assert False == CirculationMetrics.from_configuration(self._db).enabled
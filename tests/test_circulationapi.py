@@ -1,9 +1,12 @@
 """Test the CirculationAPI."""
+import logging
+import threading
 from datetime import datetime, timedelta
 
 import flask
 import pytest
 from flask import Flask
+from sqlalchemy import event
 from parameterized import parameterized
 
 from api.authenticator import LibraryAuthenticator, PatronData
@@ -17,8 +20,15 @@ from api.circulation import (
     FulfillmentInfo,
     HoldInfo,
     LoanInfo,
+    PatronActivityExecutor,
 )
 from api.circulation_exceptions import *
+from api.circulation_metrics import (
+    CirculationMetrics,
+    InMemoryCirculationMetrics,
+)
+from api.config import Configuration
+from api.patron_activity_cache import InMemoryPatronActivityCache
 from api.testing import MockCirculationAPI
 from core.config import CannotLoadConfiguration
 from core.mock_analytics_provider import MockAnalyticsProvider
@@ -1208,6 +1218,96 @@ class TestCirculationAPI(DatabaseTest):
         assert self.IN_TWO_WEEKS == hold.end
         assert 0 == hold.position
 
+    def test_sync_bookshelf_uses_a_fixed_number_of_queries(self):
+        # Syncing the bookshelf takes the same number of SQL
+        # statements no matter how many loans and holds the patron
+        # has.
+        def statements_for_sync(size):
+            patron = self._patron()
+            self.circulation.remote_loans = []
+            self.circulation.remote_holds = []
+            for i in range(size):
+                # A loan and a hold the vendor knows about...
+                edition, pool = self._edition(
+                    data_source_name=DataSource.BIBLIOTHECA,
+                    identifier_type=Identifier.BIBLIOTHECA_ID,
+                    with_license_pool=True, collection=self.collection
+                )
+                pool.loan_to(patron)
+                self.circulation.add_remote_loan(
+                    pool.collection, pool.data_source, pool.identifier.type,
+                    pool.identifier.identifier, None, None
+                )
+                edition, pool = self._edition(
+                    data_source_name=DataSource.BIBLIOTHECA,
+                    identifier_type=Identifier.BIBLIOTHECA_ID,
+                    with_license_pool=True, collection=self.collection
+                )
+                pool.on_hold_to(patron)
+                self.circulation.add_remote_hold(
+                    pool.collection, pool.data_source, pool.identifier.type,
+                    pool.identifier.identifier, None, None, None
+                )
+
+                # ...and a loan and a hold it doesn't know about.
+                edition, pool = self._edition(
+                    data_source_name=DataSource.BIBLIOTHECA,
+                    identifier_type=Identifier.BIBLIOTHECA_ID,
+                    with_license_pool=True, collection=self.collection
+                )
+                loan, ignore = pool.loan_to(patron)
+                loan.start = self.YESTERDAY
+                edition, pool = self._edition(
+                    data_source_name=DataSource.BIBLIOTHECA,
+                    identifier_type=Identifier.BIBLIOTHECA_ID,
+                    with_license_pool=True, collection=self.collection
+                )
+                pool.on_hold_to(patron)
+            self._db.commit()
+
+            statements = []
+            def count(conn, cursor, statement, *args):
+                statements.append(statement)
+            connection = self._db.connection()
+            event.listen(connection, "before_cursor_execute", count)
+            try:
+                loans, holds = self.circulation.sync_bookshelf(patron, "1234")
+            finally:
+                event.remove(connection, "before_cursor_execute", count)
+
+            # The stale loans and holds were deleted.
+            assert size == len(loans)
+            assert size == len(holds)
+            assert size == self._db.query(Loan).filter(Loan.patron==patron).count()
+            assert size == self._db.query(Hold).filter(Hold.patron==patron).count()
+            return len(statements)
+
+        assert statements_for_sync(2) == statements_for_sync(5)
+
+    def test_license_pools_for_uses_data_source(self):
+        # A collection can have two LicensePools for the same
+        # identifier, from different data sources.
+        edition, other_pool = self._edition(
+            data_source_name=DataSource.OVERDRIVE,
+            with_license_pool=True, collection=self.collection
+        )
+        other_pool.identifier = self.identifier
+
+        loan = LoanInfo(
+            self.collection, DataSource.BIBLIOTHECA, self.identifier.type,
+            self.identifier.identifier, None, None
+        )
+        other_loan = LoanInfo(
+            self.collection, other_pool.data_source, self.identifier.type,
+            self.identifier.identifier, None, None
+        )
+        pools = self.circulation._license_pools_for([loan, other_loan])
+        assert 2 == len(pools)
+        assert self.pool == self.circulation._license_pool_for(loan, pools)
+        assert other_pool == self.circulation._license_pool_for(
+            other_loan, pools
+        )
+
     def test_sync_bookshelf_applies_locked_delivery_mechanism_to_loan(self):
 
         # By the time we hear about the patron's loan, they've already
@@ -1282,6 +1382,60 @@ class TestCirculationAPI(DatabaseTest):
         assert [] == self.patron.loans
         assert self.patron.last_loan_activity_sync > updated
 
+    def test_license_pools_for(self):
+        # Pools for a number of LoanInfo and HoldInfo objects are
+        # looked up together.
+        edition, pool2 = self._edition(
+            data_source_name=DataSource.BIBLIOTHECA,
+            identifier_type=Identifier.BIBLIOTHECA_ID,
+            with_license_pool=True, collection=self.collection
+        )
+        loan = LoanInfo(
+            self.collection, DataSource.BIBLIOTHECA, self.identifier.type,
+            self.identifier.identifier, None, None
+        )
+        hold = HoldInfo(
+            self.collection, DataSource.BIBLIOTHECA, pool2.identifier.type,
+            pool2.identifier.identifier, None, None, 1
+        )
+        unknown = LoanInfo(
+            self.collection, DataSource.BIBLIOTHECA, Identifier.BIBLIOTHECA_ID,
+            "unknown", None, None
+        )
+        pools = self.circulation._license_pools_for([loan, hold, unknown])
+        assert {
+            (self.collection.id, self.identifier.type,
+             self.identifier.identifier): self.pool,
+            (self.collection.id, pool2.identifier.type,
+             pool2.identifier.identifier): pool2,
+        } == pools
+
+        # A pool in a different collection with the same identifier
+        # isn't a match.
+        other = LoanInfo(
+            self._collection(), DataSource.BIBLIOTHECA,
+            self.identifier.type, self.identifier.identifier, None, None
+        )
+        assert {} == self.circulation._license_pools_for([other])
+        assert {} == self.circulation._license_pools_for([])
+
+        # _license_pool_for finds a pool in the dictionary, or creates
+        # one if necessary.
+        assert self.pool == self.circulation._license_pool_for(loan, pools)
+        new_pool = self.circulation._license_pool_for(unknown, pools)
+        assert "unknown" == new_pool.identifier.identifier
+        assert self.collection == new_pool.collection
+
+    def test_delete_all(self):
+        loan, ignore = self.pool.loan_to(self.patron)
+        hold, ignore = self.pool.on_hold_to(self._patron())
+        self._db.commit()
+
+        self.circulation._delete_all(Loan, [loan])
+        self.circulation._delete_all(Hold, [])
+        assert [] == self._db.query(Loan).all()
+        assert [hold] == self._db.query(Hold).all()
+
     def test_patron_activity(self):
         # Get a CirculationAPI that doesn't mock out its API's patron activity.
         circulation = CirculationAPI(
@@ -1305,6 +1459,277 @@ class TestCirculationAPI(DatabaseTest):
         assert 0 == len(holds)
         assert False == complete
 
+    def test_metrics(self):
+        metrics = InMemoryCirculationMetrics()
+        self.circulation._metrics = metrics
+        assert metrics == self.circulation.metrics
+
+        # Checking out fails, so a hold is placed instead.
+        self.remote.queue_checkout(NoAvailableCopies())
+        holdinfo = HoldInfo(
+            self.pool.collection, self.pool.data_source,
+            self.identifier.type, self.identifier.identifier,
+            None, None, 10
+        )
+        self.remote.queue_hold(holdinfo)
+        self.borrow()
+
+        # Releasing the hold fails.
+        self.remote.queue_release_hold(CannotReleaseHold())
+        pytest.raises(
+            CannotReleaseHold, self.circulation.release_hold,
+            self.patron, '1234', self.pool
+        )
+
+        api_name = self.remote.__class__.__name__
+        assert api_name == self.circulation.api_name_for(self.pool)
+        timings = dict(
+            ((x['operation'], x['phase']), x)
+            for x in metrics.report()['timings']
+        )
+        assert set([
+            ("borrow", "total"), ("checkout", "vendor"),
+            ("place_hold", "vendor"), ("release_hold", "total"),
+            ("release_hold", "vendor"),
+        ]) == set(timings.keys())
+        for timing in timings.values():
+            assert api_name == timing['api']
+            assert 1 == timing['count']
+
+        # The outcome of each operation was recorded.
+        assert dict(success=1) == timings[("borrow", "total")]['outcomes']
+        assert (dict(NoAvailableCopies=1) ==
+                timings[("checkout", "vendor")]['outcomes'])
+        assert dict(success=1) == timings[("place_hold", "vendor")]['outcomes']
+        assert (dict(CannotReleaseHold=1) ==
+                timings[("release_hold", "total")]['outcomes'])
+
+        # Open-access books don't involve a vendor.
+        self.pool.open_access = True
+        assert "local" == self.circulation.api_name_for(self.pool)
+
+    def test_patron_activity_metrics(self):
+        metrics = InMemoryCirculationMetrics()
+        circulation = CirculationAPI(
+            self._db, self._default_library, api_map={
+                ExternalIntegration.BIBLIOTHECA : MockBibliothecaAPI
+            }, metrics=metrics
+        )
+        mock_bibliotheca = circulation.api_for_collection[self.collection.id]
+        mock_bibliotheca.queue_response(500, content="Error")
+        circulation.patron_activity(self.patron, "1234")
+
+        total, vendor = metrics.report()['timings']
+        assert ("patron_activity", "all", "total") == (
+            total['operation'], total['api'], total['phase']
+        )
+        assert ("patron_activity", "MockBibliothecaAPI", "vendor") == (
+            vendor['operation'], vendor['api'], vendor['phase']
+        )
+        # The vendor failed, but patron_activity() as a whole didn't.
+        assert dict(success=1) == total['outcomes']
+        assert 1 == vendor['count']
+        assert CirculationMetrics.SUCCESS not in vendor['outcomes']
+
+    def test_patron_activity_returns_partial_results_on_timeout(self):
+        # One API answers right away; the other takes longer than
+        # it's allowed.
+        class Fast(object):
+            PATRON_ACTIVITY_TIMEOUT = None
+            def patron_activity(self, patron, pin):
+                return [LoanInfo(
+                    1, DataSource.BIBLIOTHECA, Identifier.BIBLIOTHECA_ID,
+                    "fast", None, None
+                )]
+
+        class Slow(object):
+            PATRON_ACTIVITY_TIMEOUT = 0.1
+            def __init__(self):
+                self.finished = threading.Event()
+            def patron_activity(self, patron, pin):
+                self.finished.wait(5)
+                return [LoanInfo(
+                    1, DataSource.OVERDRIVE, Identifier.OVERDRIVE_ID,
+                    "slow", None, None
+                )]
+
+        circulation = CirculationAPI(self._db, self._default_library)
+        slow = Slow()
+        circulation.api_for_collection = {1: Fast(), 2: slow}
+
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+
+        # We got the answer from the fast API, but since the slow API
+        # didn't answer, we know our picture is incomplete.
+        assert ["fast"] == [x.identifier for x in loans]
+        assert [] == holds
+        assert False == complete
+        slow.finished.set()
+
+    def test_patron_activity_uses_cache(self):
+        class Mock(object):
+            PATRON_ACTIVITY_TIMEOUT = None
+            calls = 0
+            def patron_activity(self, patron, pin):
+                self.calls += 1
+                return [LoanInfo(
+                    self.collection_id, DataSource.BIBLIOTHECA,
+                    Identifier.BIBLIOTHECA_ID, "loan", None, None
+                )]
+
+        cache = InMemoryPatronActivityCache(ttl=60)
+        circulation = CirculationAPI(
+            self._db, self._default_library, activity_cache=cache
+        )
+        api = Mock()
+        api.collection_id = self.collection.id
+        circulation.api_for_collection = {self.collection.id: api}
+
+        # The first time, the API is called and its answer is cached.
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+        assert 1 == api.calls
+        assert ["loan"] == [x.identifier for x in loans]
+        assert True == complete
+        assert 1 == len(cache.get(self.patron.id, self.collection.id))
+
+        # The second time, the cached answer is used.
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+        assert 1 == api.calls
+        assert ["loan"] == [x.identifier for x in loans]
+        assert True == complete
+
+        # Forcing a bookshelf sync clears the cache.
+        circulation.sync_bookshelf(self.patron, "1234", force=True)
+        assert 2 == api.calls
+
+        # So does a circulation operation on one of the collection's books.
+        pool = self._licensepool(None, collection=self.collection)
+        circulation.invalidate_activity_cache(self.patron, pool)
+        assert None == cache.get(self.patron.id, self.collection.id)
+
+        # An API that raises an exception isn't cached.
+        class Broken(Mock):
+            def patron_activity(self, patron, pin):
+                self.calls += 1
+                raise Exception("oops")
+        broken = Broken()
+        circulation.api_for_collection = {self.collection.id: broken}
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+        assert False == complete
+        assert None == cache.get(self.patron.id, self.collection.id)
+
+    def test_circulation_operations_invalidate_activity_cache(self):
+        cache = InMemoryPatronActivityCache(ttl=60)
+        circulation = MockCirculationAPI(
+            self._db, self._default_library,
+            api_map={ExternalIntegration.BIBLIOTHECA : MockBibliothecaAPI},
+            activity_cache=cache
+        )
+
+        def prime():
+            cache.set(self.patron.id, self.pool.collection_id, ["activity"])
+
+        prime()
+        circulation.queue_checkout(
+            self.pool, LoanInfo(
+                self.pool.collection, self.pool.data_source.name,
+                self.pool.identifier.type, self.pool.identifier.identifier,
+                None, None
+            )
+        )
+        circulation.borrow(
+            self.patron, '1234', self.pool, self.delivery_mechanism
+        )
+        assert None == cache.get(self.patron.id, self.pool.collection_id)
+
+        prime()
+        circulation.queue_checkin(self.pool, True)
+        circulation.revoke_loan(self.patron, '1234', self.pool)
+        assert None == cache.get(self.patron.id, self.pool.collection_id)
+
+        prime()
+        circulation.queue_release_hold(self.pool, True)
+        circulation.release_hold(self.patron, '1234', self.pool)
+        assert None == cache.get(self.patron.id, self.pool.collection_id)
+
+    def test_patron_activity_timeout(self):
+        circulation = CirculationAPI(self._db, self._default_library)
+        assert (Configuration.DEFAULT_PATRON_ACTIVITY_TIMEOUT ==
+                circulation.default_patron_activity_timeout)
+
+        class Mock(object):
+            PATRON_ACTIVITY_TIMEOUT = None
+        api = Mock()
+
+        # By default, the sitewide timeout is used.
+        assert (Configuration.DEFAULT_PATRON_ACTIVITY_TIMEOUT ==
+                circulation.patron_activity_timeout(api))
+
+        # An API can specify its own timeout.
+        api.PATRON_ACTIVITY_TIMEOUT = 5
+        assert 5 == circulation.patron_activity_timeout(api)
+
+        # The sitewide default can be changed.
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.PATRON_ACTIVITY_TIMEOUT
+        ).value = 7
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.PATRON_ACTIVITY_POOL_SIZE
+        ).value = 3
+        circulation = CirculationAPI(self._db, self._default_library)
+        api.PATRON_ACTIVITY_TIMEOUT = None
+        assert 7 == circulation.patron_activity_timeout(api)
+        assert 3 == circulation.patron_activity_pool_size
+
+
+class TestPatronActivityExecutor(object):
+
+    def teardown_method(self):
+        PatronActivityExecutor.reset()
+
+    def test_pool(self):
+        # The pool is created once and shared.
+        pool = PatronActivityExecutor.pool(2)
+        assert pool == PatronActivityExecutor.pool(2)
+        assert 2 == PatronActivityExecutor._pool_size
+
+        # If the size changes, a new pool is created.
+        pool2 = PatronActivityExecutor.pool(3)
+        assert pool2 != pool
+        assert 3 == PatronActivityExecutor._pool_size
+
+        # If the process is forked, a new pool is created.
+        PatronActivityExecutor._pid = -1
+        pool3 = PatronActivityExecutor.pool(3)
+        assert pool3 != pool2
+
+        PatronActivityExecutor.reset()
+        assert None == PatronActivityExecutor._pool
+
+    def test_run(self):
+        log = logging.getLogger("test")
+
+        class Mock(object):
+            def patron_activity(self, patron, pin):
+                return ["activity", patron, pin]
+        activity, exception, trace = PatronActivityExecutor.run(
+            Mock(), "patron", "pin", log
+        )
+        assert ["activity", "patron", "pin"] == activity
+        assert None == exception
+        assert None == trace
+
+        # An exception is returned rather than raised.
+        class Broken(object):
+            def patron_activity(self, patron, pin):
+                raise Exception("oops")
+        activity, exception, trace = PatronActivityExecutor.run(
+            Broken(), "patron", "pin", log
+        )
+        assert None == activity
+        assert "oops" == str(exception)
+        assert Exception == trace[0]
+
     def test_can_fulfill_without_loan(self):
         """Can a title can be fulfilled without an active loan?  It depends on
         the BaseCirculationAPI implementation for that title's colelction.
@@ -18,6 +18,7 @@ import flask
 import urlparse
 
 import pytest
+import requests_mock
 from flask import Response as FlaskResponse
 from flask import url_for
 from flask_sqlalchemy_session import current_session
@@ -55,11 +56,15 @@ from api.lanes import (
     SeriesLane,
     create_default_lanes,
 )
-from api.novelist import MockNoveListAPI
+from api.novelist import (
+    MockNoveListAPI,
+    NoveListAPI,
+)
 from api.odl import MockODLAPI
 from api.opds import (
     CirculationManagerAnnotator,
     LibraryAnnotator,
+    LibraryFacts,
     SharedCollectionAnnotator,
 )
 from api.problem_details import *
@@ -495,6 +500,19 @@ class TestCirculationManager(CirculationControllerTest):
         # Restore the CustomIndexView.for_library implementation
         CustomIndexView.for_library = old_for_library
 
+    def test_load_settings_resets_library_facts(self):
+        # Facts about a library's configuration are cached across
+        # requests.
+        facts = LibraryFacts.for_library(self._default_library)
+        assert facts == LibraryFacts.for_library(self._default_library)
+        NoveListAPI.is_configured(self._default_library)
+        assert self._default_library.id in NoveListAPI._configured_by_library
+
+        # When the site configuration is reloaded, they're thrown out.
+        self.manager.load_settings()
+        assert facts != LibraryFacts.for_library(self._default_library)
+        assert {} == NoveListAPI._configured_by_library
+
     def test_exception_during_external_search_initialization_is_stored(self):
 
         class BadSearch(CirculationManager):
@@ -2203,6 +2221,51 @@ class TestLoanController(CirculationControllerTest):
             # returned directly.
             assert "Here's your response" == result
 
+    def test_fulfill_streams_remote_content(self):
+        # If a non-open-access book has to be fetched from a remote
+        # server, it's passed through to the client a chunk at a time.
+        content_link = "http://vendor/book.epub"
+
+        class MockCirculationAPI(object):
+            def fulfill(slf, *args, **kwargs):
+                return FulfillmentInfo(
+                    self._default_collection, None, None, None,
+                    content_link, "application/epub+zip", None, None
+                )
+
+        controller = self.manager.loans
+        controller.manager.circulation_apis[self._default_library.id] = MockCirculationAPI()
+        self.pool.open_access = False
+
+        with requests_mock.Mocker() as vendor:
+            vendor.get(
+                content_link, status_code=206, content="the book",
+                headers={"Content-Range": "bytes 0-7/100",
+                         "Content-Length": "8",
+                         "X-Vendor-Secret": "secret"}
+            )
+            with self.request_context_with_library(
+                "/", headers={"Authorization": self.valid_auth,
+                              "Range": "bytes=0-7"}
+            ):
+                authenticated = controller.authenticated_patron_from_request()
+                loan, ignore = self.pool.loan_to(authenticated)
+                response = controller.fulfill(
+                    self.pool.id, self.mech2.delivery_mechanism.id
+                )
+
+                # The Range header was sent on to the vendor.
+                [request] = vendor.request_history
+                assert "bytes=0-7" == request.headers["Range"]
+
+                # The response is streamed rather than buffered.
+                assert True == response.is_streamed
+                assert 206 == response.status_code
+                assert "application/epub+zip" == response.headers["Content-Type"]
+                assert "bytes 0-7/100" == response.headers["Content-Range"]
+                assert "X-Vendor-Secret" not in response.headers
+                assert "the book" == "".join(response.response)
+
     def test_fulfill_without_active_loan(self):
 
         controller = self.manager.loans
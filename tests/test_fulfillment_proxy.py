@@ -0,0 +1,113 @@
+import pytest
+import requests
+import requests_mock
+
+from api.fulfillment_proxy import FulfillmentProxy
+from core.util.http import (
+    BadResponseException,
+    RemoteIntegrationException,
+)
+
+
+class TestFulfillmentProxy(object):
+
+    URL = "http://vendor/book.mp3"
+
+    def test_chunk_size(self):
+        assert FulfillmentProxy.CHUNK_SIZE == FulfillmentProxy().chunk_size
+        assert 10 == FulfillmentProxy(chunk_size=10).chunk_size
+
+        # The buffer size can't be set above the maximum.
+        proxy = FulfillmentProxy(chunk_size=FulfillmentProxy.MAX_CHUNK_SIZE * 10)
+        assert FulfillmentProxy.MAX_CHUNK_SIZE == proxy.chunk_size
+
+    def test_forwarded_headers(self):
+        proxy = FulfillmentProxy({
+            "Range": "bytes=100-",
+            "If-None-Match": '"etag"',
+            "Authorization": "Basic secret",
+            "Cookie": "session",
+        })
+        assert {"Range": "bytes=100-", "If-None-Match": '"etag"'} == proxy.forwarded_headers()
+
+    def test_get(self):
+        proxy = FulfillmentProxy(
+            {"Range": "bytes=0-9", "Authorization": "Basic secret"},
+            chunk_size=4
+        )
+        with requests_mock.Mocker() as vendor:
+            vendor.get(
+                self.URL, status_code=206, content="0123456789",
+                headers={"Content-Type": "audio/mpeg",
+                         "Content-Range": "bytes 0-9/1000",
+                         "Set-Cookie": "vendor-session"}
+            )
+            status, headers, content = proxy.get(
+                self.URL, headers={"Accept-Encoding": "deflate"}
+            )
+
+            # Range headers from the client, and headers from the
+            # caller, were sent to the vendor. Credentials were not.
+            [request] = vendor.request_history
+            assert "bytes=0-9" == request.headers["Range"]
+            assert "deflate" == request.headers["Accept-Encoding"]
+            assert "Authorization" not in request.headers
+
+        assert 206 == status
+        assert "audio/mpeg" == headers["Content-Type"]
+        assert "bytes 0-9/1000" == headers["Content-Range"]
+        assert "Set-Cookie" not in headers
+
+        # The content comes out in chunks no bigger than the chunk size.
+        assert ["0123", "4567", "89"] == list(content)
+
+    def test_not_modified(self):
+        proxy = FulfillmentProxy({"If-None-Match": '"etag"'})
+        with requests_mock.Mocker() as vendor:
+            vendor.get(self.URL, status_code=304, headers={"ETag": '"etag"'})
+            status, headers, content = proxy.get(self.URL)
+        assert 304 == status
+        assert '"etag"' == headers["ETag"]
+        assert [] == list(content)
+
+    def test_connection_error(self):
+        proxy = FulfillmentProxy()
+        with requests_mock.Mocker() as vendor:
+            vendor.get(self.URL, exc=requests.exceptions.ConnectTimeout)
+            with pytest.raises(RemoteIntegrationException):
+                proxy.get(self.URL)
+
+    def test_server_error(self):
+        # A server error from the vendor becomes an exception, so the
+        # patron gets a problem detail rather than the vendor's error
+        # page.
+        proxy = FulfillmentProxy()
+        with requests_mock.Mocker() as vendor:
+            vendor.get(
+                self.URL, status_code=500, content="Internal Server Error",
+                headers={"Content-Type": "text/html"}
+            )
+            with pytest.raises(BadResponseException):
+                proxy.get(self.URL)
+
+    def test_response_closed(self):
+        # The connection to the vendor is closed once the client stops
+        # reading, even if it doesn't read everything.
+        class MockRaw(object):
+            def stream(self, chunk_size, decode_content):
+                assert False == decode_content
+                yield "a"
+                yield "b"
+
+        class MockResponse(object):
+            raw = MockRaw()
+            closed = False
+            def close(self):
+                self.closed = True
+
+        proxy = FulfillmentProxy()
+        response = MockResponse()
+        chunks = proxy.chunks(self.URL, response)
+        assert "a" == next(chunks)
+        chunks.close()
+        assert True == response.closed
@@ -232,3 +232,44 @@ class TestLocalAnalyticsExporter(DatabaseTest):
         for row in rows:
             assert 14 == len(row)
             assert constant == row[2:]
+
+    def test_export_iter(self):
+        exporter = LocalAnalyticsExporter()
+        w1 = self._work(with_open_access_download=True)
+        [lp1] = w1.license_pools
+        time = datetime.now() - timedelta(minutes=10)
+        for i in range(5):
+            get_one_or_create(
+                self._db, CirculationEvent,
+                license_pool=lp1, type=CirculationEvent.DISTRIBUTOR_CHECKOUT,
+                start=time, end=time
+            )
+            time += timedelta(minutes=1)
+        self._db.commit()
+
+        yesterday = date.today() - timedelta(days=1)
+        tomorrow = date.today() + timedelta(days=1)
+
+        # With a batch size of two, the header and the first two rows
+        # come in the first chunk, then two more rows, then one.
+        chunks = list(exporter.export_iter(
+            self._db, yesterday, tomorrow, batch_size=2
+        ))
+        assert 3 == len(chunks)
+        assert [3, 2, 1] == [
+            len([x for x in chunk.split("\r\n") if x]) for chunk in chunks
+        ]
+        assert chunks[0].startswith("time,event,identifier")
+
+        # export() puts the chunks together.
+        assert "".join(chunks) == exporter.export(
+            self._db, yesterday, tomorrow
+        )
+
+        # If there are no events, there's just the header.
+        [chunk] = list(exporter.export_iter(
+            self._db, tomorrow, tomorrow, batch_size=2
+        ))
+        assert ["time,event,identifier,identifier_type,title,author,fiction,audience,publisher,imprint,language,target_age,genres,location"] == [
+            x for x in chunk.split("\r\n") if x
+        ]
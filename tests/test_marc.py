@@ -1,6 +1,13 @@
 from pymarc import Record
+import datetime
+import os
+import shutil
+import tempfile
+import time
 import urllib
 
+from sqlalchemy import event
+
 from core.testing import DatabaseTest
 from core.config import Configuration
 from core.model import (
@@ -8,10 +15,16 @@ from core.model import (
     ExternalIntegration,
 )
 
-from api.marc import LibraryAnnotator
+from api.marc import (
+    LibraryAnnotator,
+    MARCExportSettings,
+    MARCFileCheckpoint,
+)
 from core.marc import MARCExporter
 from api.registry import Registration
 
+from . import benchmark
+
 class TestLibraryAnnotator(DatabaseTest):
 
     def test_annotate_work_record(self):
@@ -28,7 +41,8 @@ class TestLibraryAnnotator(DatabaseTest):
             def add_simplified_genres(self, record, work):
                 self.called_with['add_simplified_genres'] = [record, work]
 
-            def add_web_client_urls(self, record, library, identifier, integration):
+            def add_web_client_urls(self, record, library, identifier, integration,
+                                    web_client_urls=None):
                 self.called_with['add_web_client_urls'] = [record, library, identifier, integration]
 
             # Also check that the parent class annotate_work_record is called.
@@ -181,3 +195,199 @@ class TestLibraryAnnotator(DatabaseTest):
 
         assert ["4", "0"] == field2.indicators
         assert expected_client_url_1 == field2.get_subfields("u")[0]
+
+    def test_settings(self):
+        integration = self._external_integration(
+            ExternalIntegration.MARC_EXPORT, ExternalIntegration.CATALOG_GOAL,
+            libraries=[self._default_library])
+        registry = self._external_integration(
+            ExternalIntegration.OPDS_REGISTRATION, ExternalIntegration.DISCOVERY_GOAL,
+            libraries=[self._default_library])
+
+        def setting(key, value, integration=integration):
+            ConfigurationSetting.for_library_and_externalintegration(
+                self._db, key, self._default_library, integration
+            ).value = value
+
+        setting(MARCExporter.MARC_ORGANIZATION_CODE, "marc org")
+        setting(MARCExporter.INCLUDE_SUMMARY, "true")
+        setting(MARCExporter.WEB_CLIENT_URL, "http://marc_client")
+        setting(Registration.LIBRARY_REGISTRATION_WEB_CLIENT,
+                "http://registry_client", registry)
+
+        annotator = LibraryAnnotator(self._default_library)
+        settings = annotator.settings(integration)
+        assert isinstance(settings, MARCExportSettings)
+        assert "marc org" == settings.marc_org
+        assert True == settings.include_summary
+        assert False == settings.include_genres
+        assert (["http://marc_client", "http://registry_client"] ==
+                settings.web_client_urls)
+
+        # Without a MARC export integration, only the registry's web
+        # client is used.
+        no_integration = annotator.settings()
+        assert None == no_integration.marc_org
+        assert ["http://registry_client"] == no_integration.web_client_urls
+
+        # The settings are looked up once and then reused, even if
+        # they change.
+        setting(MARCExporter.MARC_ORGANIZATION_CODE, "new marc org")
+        assert settings == annotator.settings(integration)
+        assert "marc org" == annotator.settings(integration).marc_org
+
+        # A new annotator sees the new settings.
+        annotator = LibraryAnnotator(self._default_library)
+        assert "new marc org" == annotator.settings(integration).marc_org
+
+    def marc_export_lane(self, size):
+        """Create a MARC export integration with every setting that
+        affects a record, and a lane of `size` works.
+
+        :return: A 3-tuple (integration, lane, works).
+        """
+        integration = self._external_integration(
+            ExternalIntegration.MARC_EXPORT, ExternalIntegration.CATALOG_GOAL,
+            libraries=[self._default_library])
+        for key, value in (
+            (MARCExporter.MARC_ORGANIZATION_CODE, "marc org"),
+            (MARCExporter.INCLUDE_SUMMARY, "true"),
+            (MARCExporter.INCLUDE_SIMPLIFIED_GENRES, "true"),
+            (MARCExporter.WEB_CLIENT_URL, "http://web_client"),
+        ):
+            ConfigurationSetting.for_library_and_externalintegration(
+                self._db, key, self._default_library, integration
+            ).value = value
+
+        lane = self._lane(genres=["Science Fiction"])
+        works = [
+            self._work(with_license_pool=True, genre="Science Fiction")
+            for i in range(size)
+        ]
+        self._db.commit()
+        return integration, lane, works
+
+    def test_settings_looked_up_once_per_export(self):
+        # Do the work bin/cache_marc_files does for each record: build
+        # and annotate a MARC record for every book in a synthetic lane.
+        integration, lane, works = self.marc_export_lane(50)
+        annotator = LibraryAnnotator(lane.library)
+
+        # Count the queries that look up configuration settings.
+        settings_queries = []
+        def count(conn, cursor, statement, *args):
+            if "configurationsettings" in statement:
+                settings_queries.append(statement)
+        connection = self._db.connection()
+        event.listen(connection, "before_cursor_execute", count)
+
+        try:
+            records = [
+                MARCExporter.create_record(
+                    works[0], annotator, force_create=True,
+                    integration=integration
+                )
+            ]
+
+            # The first record looks up the MARC organization code,
+            # the summary and genre flags, the integration's web client
+            # URL and the library's registry web client URLs.
+            assert 5 == len(settings_queries)
+
+            # The other records don't look up any settings.
+            records += [
+                MARCExporter.create_record(
+                    work, annotator, force_create=True,
+                    integration=integration
+                )
+                for work in works[1:]
+            ]
+            assert 5 == len(settings_queries)
+        finally:
+            event.remove(connection, "before_cursor_execute", count)
+
+        assert len(works) == len([r for r in records if r])
+        for record in records:
+            [field] = record.get_fields("856")
+
+    @benchmark
+    def test_records_per_second(self):
+        # Time the work bin/cache_marc_files does for each record, with
+        # the settings looked up once per export and, as before they
+        # were cached, once per record.
+        integration, lane, works = self.marc_export_lane(200)
+
+        def records_per_second(new_annotator_per_record):
+            annotator = LibraryAnnotator(lane.library)
+            start = time.time()
+            for work in works:
+                if new_annotator_per_record:
+                    annotator = LibraryAnnotator(lane.library)
+                MARCExporter.create_record(
+                    work, annotator, force_create=True,
+                    integration=integration
+                )
+            return len(works) / max(time.time() - start, 0.001)
+
+        # Warm up, so neither run pays for first-time setup.
+        records_per_second(False)
+
+        uncached = records_per_second(True)
+        cached = records_per_second(False)
+        assert cached > uncached, (
+            "%.1f records per second with settings looked up once, %.1f with settings looked up for every record." % (
+                cached, uncached
+            )
+        )
+
+
+class TestMARCFileCheckpoint(object):
+
+    def setup_method(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = MARCFileCheckpoint(
+            os.path.join(self.directory, "library", "lane")
+        )
+
+    def teardown_method(self):
+        shutil.rmtree(self.directory)
+
+    def test_lifecycle(self):
+        # Initially there's nothing to resume.
+        assert None == self.checkpoint.load()
+
+        end_time = datetime.datetime(2020, 1, 1, 10, 30, 15)
+        self.checkpoint.start([[1, 2], [3]], end_time)
+        now = end_time + datetime.timedelta(hours=1)
+        assert ([[1, 2], [3]], end_time) == self.checkpoint.load(now=now)
+        assert False == self.checkpoint.is_finished(0)
+
+        self.checkpoint.save_shard(0, "records")
+        assert True == self.checkpoint.is_finished(0)
+        assert False == self.checkpoint.is_finished(1)
+        assert "records" == self.checkpoint.read_shard(0)
+
+        # Starting over throws away the finished shards.
+        self.checkpoint.start([[4]], end_time)
+        assert False == self.checkpoint.is_finished(0)
+
+        self.checkpoint.clear()
+        assert False == os.path.exists(self.checkpoint.directory)
+        assert None == self.checkpoint.load()
+
+    def test_unusable_checkpoints_are_discarded(self):
+        end_time = datetime.datetime(2020, 1, 1)
+        self.checkpoint.start([[1]], end_time)
+        self.checkpoint.save_shard(0, "records")
+
+        # A checkpoint that's too old isn't resumed.
+        now = end_time + MARCFileCheckpoint.MAX_AGE * 2
+        assert None == self.checkpoint.load(now=now)
+        assert False == os.path.exists(self.checkpoint.directory)
+
+        # Neither is one with a corrupted manifest.
+        self.checkpoint.start([[1]], end_time)
+        with open(self.checkpoint.manifest_path, "w") as f:
+            f.write("not json")
+        assert None == self.checkpoint.load(now=end_time)
+        assert False == os.path.exists(self.checkpoint.directory)
@@ -22,7 +22,9 @@ from api.novelist import (
     NoveListAPI,
 )
 from core.util.http import (
-    HTTP
+    HTTP,
+    BadResponseException,
+    RemoteIntegrationException,
 )
 from core.testing import MockRequestsResponse
 
@@ -40,7 +42,7 @@ class TestNoveListAPI(DatabaseTest):
         self.novelist = NoveListAPI.from_config(self._default_library)
 
     def teardown_method(self):
-        NoveListAPI.IS_CONFIGURED = None
+        NoveListAPI.reset_configuration()
         super(TestNoveListAPI, self).teardown_method()
 
     def sample_data(self, filename):
@@ -70,14 +72,24 @@ class TestNoveListAPI(DatabaseTest):
     def test_is_configured(self):
         # If an ExternalIntegration exists, the API is_configured
         assert True == NoveListAPI.is_configured(self._default_library)
-        # A class variable is set to reduce future database requests.
-        assert self._default_library.id == NoveListAPI._configuration_library_id
+        # The answer is stored to reduce future database requests.
+        assert True == NoveListAPI._configured_by_library[self._default_library.id]
 
         # If an ExternalIntegration doesn't exist for the library, it is not.
         library = self._library()
         assert False == NoveListAPI.is_configured(library)
-        # And the class variable is updated.
-        assert library.id == NoveListAPI._configuration_library_id
+        # And the answer for that library is stored separately.
+        assert False == NoveListAPI._configured_by_library[library.id]
+
+        # Asking about the libraries in turn doesn't look anything up
+        # again.
+        self.integration.password = None
+        assert True == NoveListAPI.is_configured(self._default_library)
+        assert False == NoveListAPI.is_configured(library)
+
+        # Until the stored answers are thrown out.
+        NoveListAPI.reset_configuration()
+        assert False == NoveListAPI.is_configured(self._default_library)
 
     def test_review_response(self):
         invalid_credential_response = (403, {}, 'HTML Access Denied page')
@@ -421,6 +433,39 @@ class TestNoveListAPI(DatabaseTest):
 
         assert items == [item]
 
+    def test_iter_items_since(self):
+        edition = self._edition(identifier_type=Identifier.ISBN)
+        pool = self._licensepool(edition, collection=self._default_collection)
+        self._contributor(sort_name=edition.sort_author, name=edition.author)
+        work = self._work(presentation_edition=edition)
+        work.license_pools.append(pool)
+
+        now = datetime.datetime.utcnow()
+        an_hour_ago = now - datetime.timedelta(hours=1)
+        work.last_update_time = an_hour_ago
+        pool.availability_time = an_hour_ago
+
+        [item] = list(self.novelist.iter_items(self._default_library))
+        assert edition.primary_identifier.identifier == item['isbn']
+
+        # The book hasn't changed since two hours ago...
+        two_hours_ago = now - datetime.timedelta(hours=2)
+        [item] = list(
+            self.novelist.iter_items(self._default_library, two_hours_ago)
+        )
+
+        # ...but it hasn't changed in the past minute.
+        a_minute_ago = now - datetime.timedelta(minutes=1)
+        assert [] == list(
+            self.novelist.iter_items(self._default_library, a_minute_ago)
+        )
+
+        # Once the Work changes, the book is sent again.
+        work.last_update_time = now
+        [item] = list(
+            self.novelist.iter_items(self._default_library, a_minute_ago)
+        )
+
     def test_create_item_object(self):
         # We pass no identifier or item to process so we get nothing back.
         (currentIdentifier, existingItem, newItem, addItem) = self.novelist.create_item_object(None, None, None)
@@ -587,6 +632,65 @@ class TestNoveListAPI(DatabaseTest):
 
         self.novelist.put = oldPut
 
+    def test_put_items_novelist_in_batches(self):
+        # No books, no requests.
+        sent = []
+        def put_batch(items):
+            sent.append(items)
+            return dict(RecordsReceived=len(items))
+        self.novelist.put_batch = put_batch
+        assert [] == self.novelist.put_items_novelist_in_batches(
+            self._default_library
+        )
+        assert [] == sent
+
+        for i in range(5):
+            edition = self._edition(identifier_type=Identifier.ISBN)
+            self._licensepool(edition, collection=self._default_collection)
+
+        responses = self.novelist.put_items_novelist_in_batches(
+            self._default_library, batch_size=2
+        )
+        assert [2, 2, 1] == [x['RecordsReceived'] for x in responses]
+        assert [2, 2, 1] == [len(x) for x in sent]
+
+        # Every book was sent exactly once.
+        isbns = [item['isbn'] for batch in sent for item in batch]
+        assert 5 == len(set(isbns))
+
+    def test_put_batch(self):
+        self.novelist.UPLOAD_RETRY_DELAY = 0
+        mock_response = {'Customer': 'NYPL', 'RecordsReceived': 1}
+        responses = [
+            RemoteIntegrationException("http://url/", "timed out"),
+            MockRequestsResponse(500, content="oops"),
+            MockRequestsResponse(200, content=json.dumps(mock_response)),
+        ]
+        calls = []
+        def mock_put(url, headers, **kwargs):
+            calls.append(kwargs['data'])
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        self.novelist.put = mock_put
+
+        # The first two attempts fail, but the third one succeeds.
+        items = [dict(isbn="12345")]
+        assert mock_response == self.novelist.put_batch(items)
+        assert 3 == len(calls)
+        assert json.loads(calls[0])['records'] == items
+
+        # If every attempt fails, an exception is raised.
+        responses.extend(
+            [MockRequestsResponse(500, content="oops")] *
+            self.novelist.MAX_UPLOAD_ATTEMPTS
+        )
+        with pytest.raises(BadResponseException) as excinfo:
+            self.novelist.put_batch(items)
+        assert "oops" in str(excinfo.value)
+        assert [] == responses
+
     def test_make_novelist_data_object(self):
         bad_data = []
         result = self.novelist.make_novelist_data_object(bad_data)
@@ -29,6 +29,7 @@ from core.model import (
 from api.odl import (
     ODLImporter,
     ODLHoldReaper,
+    ODLHoldQueue,
     MockODLAPI,
     SharedODLAPI,
     MockSharedODLAPI,
@@ -891,6 +892,78 @@ class TestODLAPI(DatabaseTest, BaseODLTest):
             assert 0 == hold.position
             assert hold.end - datetime.datetime.utcnow() - datetime.timedelta(days=3) < datetime.timedelta(hours=1)
 
+    def test_update_hold_queues(self):
+        self.collection.external_integration.set_setting(
+            Collection.DEFAULT_RESERVATION_PERIOD_KEY, 3
+        )
+        now = datetime.datetime.utcnow()
+
+        # The first pool has one license and two holds.
+        self.pool.licenses_owned = 1
+        self.pool.licenses_available = 1
+        hold1, ignore = self.pool.on_hold_to(self.patron, start=now - datetime.timedelta(days=2), position=1)
+        hold2, ignore = self.pool.on_hold_to(self._patron(), start=now - datetime.timedelta(days=1), position=2)
+
+        # The second pool has two licenses, one of which is on loan,
+        # and no holds.
+        other_work = self._work(with_license_pool=True, collection=self.collection)
+        other_pool = other_work.license_pools[0]
+        other_license = self._license(other_pool, concurrent_checkouts=2)
+        other_pool.licenses_owned = 2
+        other_pool.licenses_available = 2
+        other_license.loan_to(self._patron(), end=now + datetime.timedelta(days=1))
+
+        # Both queues are updated at once.
+        assert 2 == self.api.update_hold_queues([self.pool, other_pool])
+
+        assert 0 == self.pool.licenses_available
+        assert 1 == self.pool.licenses_reserved
+        assert 2 == self.pool.patrons_in_hold_queue
+        assert 0 == hold1.position
+        assert hold1.end - now - datetime.timedelta(days=3) < datetime.timedelta(hours=1)
+        assert 2 == hold2.position
+
+        assert 1 == other_pool.licenses_available
+        assert 0 == other_pool.licenses_reserved
+        assert 0 == other_pool.patrons_in_hold_queue
+
+        # Nothing happens if there are no pools.
+        assert 0 == self.api.update_hold_queues([])
+
+    def test_hold_queue(self):
+        now = datetime.datetime.utcnow()
+        self.pool.licenses_owned = 2
+        loan, ignore = self.license.loan_to(self._patron(), end=now + datetime.timedelta(days=1))
+        expired_loan, ignore = self.license.loan_to(self._patron(), end=now - datetime.timedelta(days=1))
+        hold1, ignore = self.pool.on_hold_to(self.patron, start=now - datetime.timedelta(days=2))
+        hold2, ignore = self.pool.on_hold_to(self._patron(), start=now - datetime.timedelta(days=1))
+        expired_hold, ignore = self.pool.on_hold_to(
+            self._patron(), start=now - datetime.timedelta(days=3),
+            end=now - datetime.timedelta(days=1), position=0
+        )
+
+        # The queue is loaded with the pool's active loans and holds.
+        queue = ODLHoldQueue.for_pool(self.api, self.pool)
+        assert [loan] == queue.loans
+        assert [hold1, hold2] == queue.holds
+        assert 1 == queue.remaining_licenses
+        assert 0 == queue.holds_before(hold1)
+        assert 1 == queue.holds_before(hold2)
+
+        # Positions are calculated from the loaded loans and holds.
+        queue.update_hold_position(hold1)
+        queue.update_hold_position(hold2)
+        assert 0 == hold1.position
+        assert 2 == hold2.position
+
+        # A hold that belongs to neither a library nor an integration
+        # client gets the collection's default loan period.
+        class Orphan(object):
+            library = None
+            integration_client = None
+        assert (self.collection.default_loan_period(None) ==
+                queue._loan_period(Orphan()))
+
     def test_place_hold_success(self):
         tomorrow = datetime.datetime.utcnow() + datetime.timedelta(days=1)
         self.pool.licenses_owned = 1
@@ -1496,6 +1569,68 @@ class TestODLHoldReaper(DatabaseTest, BaseODLTest):
         assert None == progress.start
         assert None == progress.finish
 
+    def test_run_once_coalesces_pools(self):
+        collection = MockODLAPI.mock_collection(self._db)
+        collection.external_integration.set_setting(
+            Collection.DATA_SOURCE_NAME_SETTING, "Feedbooks"
+        )
+        api = MockODLAPI(self._db, collection)
+
+        recalculated = []
+        original_update_hold_queues = api.update_hold_queues
+        def update_hold_queues(pools):
+            recalculated.append(sorted(pool.id for pool in pools))
+            return original_update_hold_queues(pools)
+        api.update_hold_queues = update_hold_queues
+
+        reaper = ODLHoldReaper(self._db, collection, api=api)
+        reaper.POOL_BATCH_SIZE = 2
+
+        yesterday = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+
+        # Three pools have several expired holds each.
+        pools = []
+        for i in range(3):
+            pool = self._licensepool(None, collection=collection)
+            pool.licenses_owned = 2
+            pool.licenses_reserved = 2
+            for j in range(2):
+                pool.on_hold_to(self._patron(), end=yesterday, position=0)
+            pools.append(pool)
+
+        # A pool with no expired holds is left alone.
+        untouched = self._licensepool(None, collection=collection)
+        untouched.on_hold_to(self._patron(), position=1)
+
+        # So is a pool in another collection.
+        other = self._licensepool(None, collection=self._collection())
+        other_hold, ignore = other.on_hold_to(
+            self._patron(), end=yesterday, position=0
+        )
+
+        progress = reaper.run_once(reaper.timestamp().to_data())
+        assert ('Holds deleted: 6. License pools updated: 3' ==
+                progress.achievements)
+
+        # Each pool was recalculated once, in batches of two.
+        pool_ids = sorted(pool.id for pool in pools)
+        assert [2, 1] == [len(batch) for batch in recalculated]
+        assert pool_ids == sorted(sum(recalculated, []))
+        for pool in pools:
+            assert 2 == pool.licenses_available
+            assert 0 == pool.licenses_reserved
+
+        assert [other_hold] == self._db.query(Hold).filter(
+            Hold.end < datetime.datetime.utcnow()
+        ).all()
+
+        # If nothing has expired, nothing is recalculated.
+        recalculated = []
+        progress = reaper.run_once(reaper.timestamp().to_data())
+        assert ('Holds deleted: 0. License pools updated: 0' ==
+                progress.achievements)
+        assert [] == recalculated
+
 
 
 class TestSharedODLAPI(DatabaseTest, BaseODLTest):
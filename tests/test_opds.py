@@ -5,6 +5,7 @@ import datetime
 import os
 import re
 import json
+import time
 
 import pytest
 from lxml import etree
@@ -26,6 +27,7 @@ from core.model import (
     Contributor,
     DataSource,
     DeliveryMechanism,
+    Edition,
     ExternalIntegration,
     Hyperlink,
     Library,
@@ -82,6 +84,7 @@ from api.config import (
 from api.opds import (
     CirculationManagerAnnotator,
     LibraryAnnotator,
+    LibraryFacts,
     SharedCollectionAnnotator,
     LibraryLoanAndHoldAnnotator,
     SharedCollectionLoanAndHoldAnnotator,
@@ -93,6 +96,8 @@ from api.novelist import NoveListAPI
 from api.lanes import ContributorLane, CrawlableCustomListBasedLane
 import jwt
 
+from . import benchmark
+
 _strftime = AtomFeed._strftime
 
 
@@ -299,6 +304,8 @@ class TestCirculationManagerAnnotator(DatabaseTest):
 class TestLibraryAnnotator(VendorIDTest):
     def setup_method(self):
         super(TestLibraryAnnotator, self).setup_method()
+        NoveListAPI.reset_configuration()
+        LibraryFacts.reset()
         self.work = self._work(with_open_access_download=True)
 
         parent = self._lane(
@@ -753,7 +760,16 @@ class TestLibraryAnnotator(VendorIDTest):
 
         # If analytics are configured, a link is added to
         # create an 'open_book' analytics event for this title.
+        #
+        # Whether analytics are configured is only checked once per
+        # library, so the cached answer needs to be thrown out.
         Analytics.GLOBAL_ENABLED = True
+        LibraryFacts.reset()
+        annotator = LibraryAnnotator(
+            None, lane, self._default_library, test_mode=True,
+            library_identifies_patrons=True
+        )
+        feed = AcquisitionFeed(self._db, "test", "url", [], annotator)
         entry = feed._make_entry_xml(work, edition)
         annotator.annotate_work_entry(
             work, None, edition, identifier, feed, entry
@@ -772,6 +788,167 @@ class TestLibraryAnnotator(VendorIDTest):
         )
         assert expect == analytics_link
 
+    def test_templated_url_for(self):
+        from api.app import app
+        with app.test_request_context("/"):
+            annotator = LibraryAnnotator(
+                None, self.lane, self._default_library
+            )
+            library = self._default_library.short_name
+
+            # A URL built from a template is exactly the same as one
+            # built by url_for, no matter what characters go into it.
+            for identifier in [
+                "simple", "with spaces", "slashes/and:colons",
+                "percent%20sign", "query?and#fragment", u"\u00e9t\u00e9",
+            ]:
+                for mechanism_id in [None, 5]:
+                    kwargs = dict(
+                        identifier_type="ISBN", identifier=identifier,
+                        mechanism_id=mechanism_id,
+                        library_short_name=library
+                    )
+                    expect = annotator.url_for(
+                        "borrow", _external=True, **kwargs
+                    )
+                    assert expect == annotator.templated_url_for(
+                        "borrow", **kwargs
+                    )
+
+            # One template was built for each set of arguments.
+            assert (
+                set([("borrow", ("identifier", "identifier_type",
+                                 "library_short_name")),
+                     ("borrow", ("identifier", "identifier_type",
+                                 "library_short_name", "mechanism_id"))]) ==
+                set(annotator._url_templates.keys())
+            )
+
+            # An argument that would go into the query string can't
+            # be put in a template, so url_for is used instead.
+            kwargs = dict(
+                license_pool_id=1, library_short_name=library,
+                extra="a value"
+            )
+            assert (annotator.url_for(
+                "revoke_loan_or_hold", _external=True, **kwargs
+            ) == annotator.templated_url_for("revoke_loan_or_hold", **kwargs))
+            assert None == annotator._url_templates[(
+                "revoke_loan_or_hold",
+                ("extra", "library_short_name", "license_pool_id")
+            )]
+
+    class UntemplatedAnnotator(LibraryAnnotator):
+        """Generate every URL with url_for, the way LibraryAnnotator did
+        before it used URL templates.
+        """
+        def templated_url_for(self, route, **kwargs):
+            return self.url_for(route, _external=True, **kwargs)
+
+    def annotate_entries(self, annotator_class, works):
+        """Annotate an entry for each work.
+
+        :return: A 2-tuple (seconds taken, serialized entries).
+        """
+        from api.app import app
+        with app.test_request_context("/"):
+            annotator = annotator_class(None, self.lane, self._default_library)
+            feed = AcquisitionFeed(self._db, "test", "url", [], annotator)
+            entries = []
+            start = time.time()
+            for work in works:
+                [pool] = work.license_pools
+                edition = pool.presentation_edition
+                entry = feed._make_entry_xml(work, edition)
+                annotator.annotate_work_entry(
+                    work, pool, edition, pool.identifier, feed, entry
+                )
+                entries.append(etree.tostring(entry))
+            return time.time() - start, entries
+
+    def test_annotate_work_entry_url_templates(self):
+        # Annotating entries with and without URL templates gives
+        # identical results.
+        Analytics.GLOBAL_ENABLED = True
+        LibraryFacts.reset()
+        works = [self._work(with_license_pool=True) for i in range(50)]
+
+        ignore, untemplated = self.annotate_entries(
+            self.UntemplatedAnnotator, works
+        )
+        ignore, templated = self.annotate_entries(LibraryAnnotator, works)
+        assert untemplated == templated
+
+    @benchmark
+    def test_annotate_work_entry_benchmark(self):
+        # Annotating a feed's worth of entries is faster with URL
+        # templates than with url_for.
+        Analytics.GLOBAL_ENABLED = True
+        LibraryFacts.reset()
+        works = [self._work(with_license_pool=True) for i in range(200)]
+
+        # Warm up both annotators, so neither pays for first-time setup.
+        self.annotate_entries(self.UntemplatedAnnotator, works[:1])
+        self.annotate_entries(LibraryAnnotator, works[:1])
+
+        untemplated_time, ignore = self.annotate_entries(
+            self.UntemplatedAnnotator, works
+        )
+        templated_time, ignore = self.annotate_entries(LibraryAnnotator, works)
+        assert templated_time < untemplated_time, (
+            "Annotated %d entries in %.3fs with URL templates, %.3fs without." % (
+                len(works), templated_time, untemplated_time
+            )
+        )
+
+    def test_library_facts(self):
+        # Facts about the library's configuration are looked up when
+        # the annotator is created.
+        annotator = LibraryAnnotator(None, self.lane, self._default_library)
+        facts = annotator.library_facts
+        assert isinstance(facts, LibraryFacts)
+        assert False == facts.novelist_configured
+
+        # They're cached, so the next annotator for this library
+        # doesn't look them up again, even if the configuration
+        # changes.
+        self._external_integration(
+            ExternalIntegration.NOVELIST,
+            goal=ExternalIntegration.METADATA_GOAL, username=u'library',
+            password=u'sure', libraries=[self._default_library],
+        )
+        annotator = LibraryAnnotator(None, self.lane, self._default_library)
+        assert facts == annotator.library_facts
+
+        # Each library has its own facts.
+        other_library = self._library()
+        other = LibraryAnnotator(None, self.lane, other_library).library_facts
+        assert other != facts
+        assert False == other.novelist_configured
+
+        # Once the cache is reset, the new configuration is picked up.
+        NoveListAPI.reset_configuration()
+        LibraryFacts.reset()
+        annotator = LibraryAnnotator(None, self.lane, self._default_library)
+        assert True == annotator.library_facts.novelist_configured
+        assert False == LibraryFacts.for_library(other_library).novelist_configured
+
+    def test_related_books_available(self):
+        work = self._work()
+        work.sort_author = Edition.UNKNOWN_AUTHOR
+        work.series = None
+        m = LibraryAnnotator.related_books_available
+
+        # If the caller already knows whether NoveList is
+        # configured, it isn't looked up.
+        assert True == m(work, self._default_library, True)
+        assert False == m(work, self._default_library, False)
+        assert False == m(work, self._default_library)
+
+        # A work with a series always has related books.
+        work.series = "A Series"
+        assert True == m(work, self._default_library, False)
+
     def test_annotate_feed(self):
         lane = self._lane()
         linksets = []
@@ -956,7 +1133,8 @@ class TestLibraryAnnotator(VendorIDTest):
         assert [] == filter(lambda l: l.rel=='recommendations', entry.links)
 
         # There's a recommendation link when configuration is found, though!
-        NoveListAPI.IS_CONFIGURED = None
+        NoveListAPI.reset_configuration()
+        LibraryFacts.reset()
         self._external_integration(
             ExternalIntegration.NOVELIST,
             goal=ExternalIntegration.METADATA_GOAL, username=u'library',
@@ -2069,6 +2069,133 @@ class TestOverdriveCirculationMonitor(OverdriveAPITest):
         # and 3.
         assert "Books processed: 4." == progress.achievements
 
+    def test_constructor(self):
+        # By default, books are processed one at a time and committed
+        # individually.
+        monitor = OverdriveCirculationMonitor(
+            self._db, self.collection, api_class=MockOverdriveAPI
+        )
+        assert 0 == monitor.prefetch_workers
+        assert 1 == monitor.commit_batch_size
+
+        # The monitors that go through long lists of books prefetch
+        # availability information and commit in batches.
+        monitor = RecentOverdriveCollectionMonitor(
+            self._db, self.collection, api_class=MockOverdriveAPI
+        )
+        assert 4 == monitor.prefetch_workers
+        assert 25 == monitor.commit_batch_size
+
+        # Both values can be overridden.
+        monitor = NewTitlesOverdriveCollectionMonitor(
+            self._db, self.collection, api_class=MockOverdriveAPI,
+            prefetch_workers=2, commit_batch_size=10
+        )
+        assert 2 == monitor.prefetch_workers
+        assert 10 == monitor.commit_batch_size
+
+    def test_catch_up_from_with_prefetch(self):
+        # When prefetch_workers is set, availability information is
+        # looked up in other threads, but LicensePools are updated
+        # in this thread, in the original order.
+        class MockAPI(object):
+            collection_token = "a token"
+
+            def __init__(self, *ignore, **kwignore):
+                self.lookups = []
+                self.updated = []
+                self.retried = []
+
+            def circulation_lookup(self, book, exception_on_401=False):
+                # Lookups can't refresh the Bearer Token from another
+                # thread.
+                assert True == exception_on_401
+                self.lookups.append(book)
+                if book == 2:
+                    raise Exception("token expired")
+                return book, (200, {}, "availability for %s" % book)
+
+            def update_licensepool_with_availability(
+                self, book_id, book, status_code, content
+            ):
+                self.updated.append((book_id, status_code, content))
+                return None, False, True
+
+            def update_licensepool(self, book):
+                self.retried.append(book)
+                return None, False, False
+
+        class MockMonitor(OverdriveCirculationMonitor):
+            def recently_changed_ids(self, start, cutoff):
+                return [1, 2, None, 3] + range(4, 100)
+
+            def should_stop(self, start, book, is_changed):
+                self.should_stop_calls.append((book, is_changed))
+                return book == 3
+
+        monitor = MockMonitor(
+            self._db, self.collection, api_class=MockAPI,
+            prefetch_workers=2, commit_batch_size=2
+        )
+        monitor.should_stop_calls = []
+        progress = TimestampData()
+        monitor.catch_up_from(object(), object(), progress)
+        api = monitor.api
+
+        # Books 1 and 3 were updated with the prefetched information.
+        assert [(1, 200, "availability for 1"),
+                (3, 200, "availability for 3")] == api.updated
+
+        # The lookup for book 2 failed, so it was looked up again
+        # in this thread.
+        assert [2] == api.retried
+
+        # should_stop() saw every book, in order, and stopped the
+        # run at book 3.
+        assert [(1, True), (2, False), (3, True)] == monitor.should_stop_calls
+        assert "Books processed: 4." == progress.achievements
+
+        # Only a few books past the stopping point were looked up.
+        assert 1 in api.lookups
+        assert len(api.lookups) <= 3 + monitor.prefetch_workers * 2
+
+    def test_prefetch(self):
+        class MockAPI(object):
+            collection_token = "a token"
+
+            def __init__(self, *ignore, **kwignore):
+                pass
+
+            def circulation_lookup(self, book, exception_on_401=False):
+                return book, "looked up"
+
+        # Without prefetch workers, nothing is looked up ahead of time.
+        monitor = OverdriveCirculationMonitor(
+            self._db, self.collection, api_class=MockAPI
+        )
+        assert ([(1, None), (None, None)] ==
+                list(monitor.prefetch([1, None])))
+
+        # With prefetch workers, every real book is looked up and the
+        # results come back in order.
+        monitor.prefetch_workers = 3
+        results = [
+            (book, availability and availability.get())
+            for book, availability in monitor.prefetch(
+                [1, None, 2, 3, 4, 5, 6, 7]
+            )
+        ]
+        assert [
+            (1, (1, "looked up")),
+            (None, None),
+            (2, (2, "looked up")),
+            (3, (3, "looked up")),
+            (4, (4, "looked up")),
+            (5, (5, "looked up")),
+            (6, (6, "looked up")),
+            (7, (7, "looked up")),
+        ] == results
+
 
 class TestNewTitlesOverdriveCollectionMonitor(OverdriveAPITest):
 
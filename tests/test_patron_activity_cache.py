@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import time
+
+from api.circulation import HoldInfo, LoanInfo
+from api.config import Configuration
+from api.patron_activity_cache import (
+    InMemoryPatronActivityCache,
+    PatronActivityCache,
+    SQLitePatronActivityCache,
+)
+from core.model import ConfigurationSetting, DataSource, Identifier
+from core.testing import DatabaseTest
+
+
+class CacheTest(object):
+    """Tests that apply to every PatronActivityCache that stores data."""
+
+    def activity(self):
+        loan = LoanInfo(
+            1, DataSource.BIBLIOTHECA, Identifier.BIBLIOTHECA_ID, "loan",
+            None, None
+        )
+        hold = HoldInfo(
+            1, DataSource.BIBLIOTHECA, Identifier.BIBLIOTHECA_ID, "hold",
+            None, None, 3
+        )
+        return [loan, hold]
+
+    def test_get_set_invalidate(self):
+        cache = self.cache(ttl=60)
+        assert True == cache.enabled
+        assert None == cache.get(1, 1)
+
+        cache.set(1, 1, self.activity())
+        cache.set(1, 2, [])
+        cache.set(2, 1, self.activity())
+
+        loan, hold = cache.get(1, 1)
+        assert "loan" == loan.identifier
+        assert "hold" == hold.identifier
+        assert 3 == hold.hold_position
+        assert [] == cache.get(1, 2)
+
+        # Invalidate one collection for one patron.
+        cache.invalidate(1, 1)
+        assert None == cache.get(1, 1)
+        assert [] == cache.get(1, 2)
+
+        # Invalidate everything for one patron.
+        cache.invalidate(1)
+        assert None == cache.get(1, 2)
+
+        # Other patrons are unaffected.
+        assert 2 == len(cache.get(2, 1))
+
+    def test_expiration(self):
+        cache = self.cache(ttl=0.1)
+        cache.set(1, 1, self.activity())
+        assert 2 == len(cache.get(1, 1))
+        time.sleep(0.2)
+        assert None == cache.get(1, 1)
+
+
+class TestInMemoryPatronActivityCache(CacheTest):
+
+    def cache(self, ttl):
+        return InMemoryPatronActivityCache(ttl)
+
+
+class TestSQLitePatronActivityCache(CacheTest):
+
+    def setup_method(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        shutil.rmtree(self.directory)
+
+    def cache(self, ttl):
+        return SQLitePatronActivityCache(
+            os.path.join(self.directory, "cache.db"), ttl
+        )
+
+    def test_shared_between_instances(self):
+        # Two caches using the same file see the same data, the way
+        # two web workers would.
+        cache1 = self.cache(ttl=60)
+        cache2 = self.cache(ttl=60)
+        cache1.set(1, 1, self.activity())
+        assert 2 == len(cache2.get(1, 1))
+        cache2.invalidate(1)
+        assert None == cache1.get(1, 1)
+
+    def test_unpicklable_activity_is_not_cached(self):
+        cache = self.cache(ttl=60)
+        cache.set(1, 1, [lambda: "can't pickle this"])
+        assert None == cache.get(1, 1)
+
+    def test_database_errors_are_not_raised(self):
+        cache = SQLitePatronActivityCache(
+            os.path.join(self.directory, "no such directory", "cache.db"), 60
+        )
+        cache.set(1, 1, self.activity())
+        assert None == cache.get(1, 1)
+        cache.invalidate(1)
+
+
+class TestPatronActivityCache(DatabaseTest):
+
+    def test_default_cache_does_nothing(self):
+        cache = PatronActivityCache()
+        assert False == cache.enabled
+        cache.set(1, 1, ["activity"])
+        assert None == cache.get(1, 1)
+
+    def test_from_configuration(self):
+        # By default, there is no cache.
+        cache = PatronActivityCache.from_configuration(self._db)
+        assert PatronActivityCache == cache.__class__
+        assert False == cache.enabled
+
+        # Setting a cache time gets an in-memory cache.
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.PATRON_ACTIVITY_CACHE_TIME
+        ).value = 30
+        cache = PatronActivityCache.from_configuration(self._db)
+        assert isinstance(cache, InMemoryPatronActivityCache)
+        assert 30 == cache.ttl
+
+        # Setting a file gets a cache that can be shared between
+        # processes.
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.PATRON_ACTIVITY_CACHE_FILE
+        ).value = "/tmp/activity.db"
+        cache = PatronActivityCache.from_configuration(self._db)
+        assert isinstance(cache, SQLitePatronActivityCache)
+        assert "/tmp/activity.db" == cache.path
+        assert 30 == cache.ttl
@@ -53,7 +53,9 @@ from core.metadata_layer import (
 )
 
 from core.model import (
+    create,
     get_one_or_create,
+    CirculationEvent,
     Classification,
     ConfigurationSetting,
     Contributor,
@@ -1761,6 +1763,129 @@ class TestCirculationMonitor(RBDigitalAPITest):
         assert 1 == item_count
         pool_ebook.licenses_available = 0
 
+    def test_process_availability_in_bulk(self):
+        # Create an analytics integration so we can make sure
+        # events are tracked.
+        integration, ignore = create(
+            self._db, ExternalIntegration,
+            goal=ExternalIntegration.ANALYTICS_GOAL,
+            protocol="core.local_analytics_provider",
+        )
+        monitor = RBDigitalCirculationMonitor(
+            self._db, self.collection, api_class=MockRBDigitalAPI,
+            api_class_kwargs=dict(base_path=self.base_path)
+        )
+
+        def rbdigital_pool(owned, available):
+            edition, pool = self._edition(
+                identifier_type=Identifier.RB_DIGITAL_ID,
+                data_source_name=DataSource.RB_DIGITAL,
+                with_license_pool=True, collection=self.collection
+            )
+            pool.licenses_owned = owned
+            pool.licenses_available = available
+            return pool
+
+        # This LicensePool is up to date.
+        unchanged = rbdigital_pool(1, 1)
+
+        # This one needs updating.
+        changed = rbdigital_pool(1, 1)
+
+        # This one is in another collection, so it's ignored.
+        self._licensepool(
+            None, data_source_name=DataSource.RB_DIGITAL,
+            collection=self._collection()
+        )
+
+        # The current availability of this collection's LicensePools
+        # is loaded in a single query.
+        current = monitor.current_availability()
+        assert {
+            unchanged.identifier.identifier: (unchanged.id, 1, 1),
+            changed.identifier.identifier: (changed.id, 1, 1),
+        } == current
+
+        new_identifier = self._identifier(
+            identifier_type=Identifier.RB_DIGITAL_ID
+        )
+        availability = [
+            dict(isbn=unchanged.identifier.identifier, mediaType="eBook",
+                 availability=True),
+            dict(isbn=changed.identifier.identifier, mediaType="eBook",
+                 availability=False),
+            dict(isbn=new_identifier.identifier, mediaType="eBook",
+                 availability=True),
+        ]
+        monitor.api.queue_response(
+            status_code=200, content=json.dumps(availability)
+        )
+        # The BibliographicCoverageProvider gets called for the new
+        # license pool.
+        monitor.api.queue_response(200, content=json.dumps({}))
+
+        applied = []
+        original_apply = monitor.apply_availability_changes
+        def apply_availability_changes(changes):
+            applied.append(dict(changes))
+            return original_apply(changes)
+        monitor.apply_availability_changes = apply_availability_changes
+
+        assert 3 == monitor.process_availability()
+
+        # Only the LicensePool that changed was updated.
+        assert [{changed.id: 0}] == applied
+        assert None == unchanged.last_checked
+        assert 1 == changed.licenses_owned
+        assert 0 == changed.licenses_available
+        assert changed.last_checked is not None
+
+        # A LicensePool was created for the new title, and an
+        # analytics event was recorded for it.
+        [new_pool] = new_identifier.licensed_through
+        assert self.collection == new_pool.collection
+        assert 1 == new_pool.licenses_available
+        [event] = self._db.query(CirculationEvent).filter(
+            CirculationEvent.license_pool==new_pool
+        ).filter(
+            CirculationEvent.type==CirculationEvent.DISTRIBUTOR_TITLE_ADD
+        ).all()
+
+    def test_apply_availability_changes_in_batches(self):
+        monitor = RBDigitalCirculationMonitor(
+            self._db, self.collection, api_class=MockRBDigitalAPI,
+            api_class_kwargs=dict(base_path=self.base_path), batch_size=2
+        )
+        pools = []
+        for i in range(3):
+            edition, pool = self._edition(
+                identifier_type=Identifier.RB_DIGITAL_ID,
+                data_source_name=DataSource.RB_DIGITAL,
+                with_license_pool=True, collection=self.collection
+            )
+            pool.licenses_owned = 1
+            pool.licenses_available = 0
+            pools.append(pool)
+
+        availability = [
+            dict(isbn=p.identifier.identifier, mediaType="eBook",
+                 availability=True)
+            for p in pools
+        ]
+        monitor.api.queue_response(
+            status_code=200, content=json.dumps(availability)
+        )
+
+        applied = []
+        def apply_availability_changes(changes):
+            applied.append(len(changes))
+        monitor.apply_availability_changes = apply_availability_changes
+
+        monitor.process_availability()
+
+        # The changes were applied two at a time.
+        assert [2, 1] == applied
+
 class TestRBFulfillmentInfo(RBDigitalAPITest):
 
     def test_fulfill_part(self):
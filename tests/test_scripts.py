@@ -3,8 +3,13 @@ import contextlib
 import datetime
 import flask
 import json
+import os
+import shutil
+import tempfile
 from StringIO import StringIO
 
+from pymarc import MARCReader
+
 from api.adobe_vendor_id import (
     AdobeVendorIDModel,
     AuthdataUtility,
@@ -13,6 +18,7 @@ from api.adobe_vendor_id import (
 
 from api.config import (
     temp_config,
+    CannotLoadConfiguration,
     Configuration,
 )
 
@@ -57,6 +63,7 @@ from core.model import (
     DeliveryMechanism,
     ExternalIntegration,
     get_one,
+    get_one_or_create,
     Hyperlink,
     Identifier,
     LicensePool,
@@ -80,7 +87,10 @@ from core.util.flask_util import (
     OPDSFeedResponse
 )
 
-from api.marc import LibraryAnnotator as  MARCLibraryAnnotator
+from api.marc import (
+    LibraryAnnotator as MARCLibraryAnnotator,
+    MARCFileCheckpoint,
+)
 
 from core.testing import (
     DatabaseTest,
@@ -92,9 +102,11 @@ from scripts import (
     CacheFacetListsPerLane,
     CacheOPDSGroupFeedPerLane,
     CacheMARCFiles,
+    DashboardStatisticsSnapshotScript,
     DirectoryImportScript,
     InstanceInitializationScript,
     LanguageListScript,
+    LCPBatchMirrorScript,
     NovelistSnapshotScript,
     LocalAnalyticsExportScript,
 )
@@ -251,6 +263,90 @@ class TestCacheRepresentationPerLane(TestLaneScript):
         assert (lane, facets2, page1) == c3
         assert (lane, facets2, page2) == c4
 
+    def test_workers_argument(self):
+        script = CacheRepresentationPerLane(
+            self._db, manager=object(), cmd_args=[]
+        )
+        assert 1 == script.workers
+
+        script = CacheRepresentationPerLane(
+            self._db, manager=object(), cmd_args=["--workers=4"]
+        )
+        assert 4 == script.workers
+        assert ["--workers=4"] == script.cmd_args
+
+    def test_process_library_in_parallel(self):
+        # Each set of facets for each lane becomes a separate task,
+        # which is run by a worker process.
+
+        class MockPool(object):
+            """Run tasks in this process, the way a worker would."""
+            def __init__(self, script):
+                self.script = script
+                self.tasks = []
+                self.closed = False
+
+            def imap_unordered(self, function, tasks):
+                for task in tasks:
+                    self.tasks.append(task)
+                    yield self.script.process_task(*task)
+
+            def close(self):
+                self.closed = True
+
+            def join(self):
+                pass
+
+        parent = self._lane(display_name="parent")
+        child = self._lane(display_name="child", parent=parent)
+
+        class MockFacets(object):
+            def __init__(self, query_string):
+                self.query_string = query_string
+
+        class Mock(CacheRepresentationPerLane):
+            def should_process_lane(self, lane):
+                return isinstance(lane, Lane)
+
+            def facets(self, lane):
+                return [MockFacets("facets1"), MockFacets("facets2")]
+
+            def make_worker_pool(self):
+                self.pool = MockPool(self)
+                return self.pool
+
+            def do_generate(self, lane, facets, pagination):
+                if lane == child and facets.query_string == "facets2":
+                    raise Exception("Doom!")
+                return Response("feed for %s" % facets.query_string)
+
+        script = Mock(self._db, manager=object(), cmd_args=["--workers=2"])
+        results = script.process_library_in_parallel(self._default_library)
+
+        assert [
+            (parent.id, 0), (parent.id, 1), (child.id, 0), (child.id, 1)
+        ] == script.pool.tasks
+        assert True == script.pool.closed
+
+        # Statistics were gathered for each lane. The failure in one
+        # task didn't stop the others from running.
+        parent_stats = results[parent.id]
+        assert parent.full_identifier == parent_stats['identifier']
+        assert 2 == parent_stats['feeds']
+        assert len("feed for facets1") * 2 == parent_stats['bytes']
+        assert 0 == parent_stats['errors']
+
+        child_stats = results[child.id]
+        assert 1 == child_stats['feeds']
+        assert 1 == child_stats['errors']
+        assert 0 == child_stats['tasks']
+
+        # process_task reports what went wrong.
+        result = script.process_task(child.id, 1)
+        assert child.id == result['lane_id']
+        assert 0 == result['feeds']
+        assert "Doom!" in result['error']
+
     def test_default_facets(self):
         # By default, do_generate will only be called once, with facets=None.
         script = CacheRepresentationPerLane(
@@ -692,6 +788,247 @@ class TestCacheMARCFiles(TestLaneScript):
         assert exporter.called_with[1][3] < yesterday
         assert exporter.called_with[1][3] > last_week
 
+    def test_workers_argument(self):
+        script = CacheMARCFiles(self._db, cmd_args=[])
+        assert 1 == script.workers
+        assert CacheMARCFiles.DEFAULT_SHARD_SIZE == script.shard_size
+
+        script = CacheMARCFiles(
+            self._db, cmd_args=["--workers=4", "--shard-size=10",
+                                "--checkpoint-dir=/tmp/checkpoints"]
+        )
+        assert 4 == script.workers
+        assert 10 == script.shard_size
+        assert "/tmp/checkpoints" == script.checkpoint_dir
+
+    def test_export_in_shards(self):
+        # With more than one worker, a lane's works are divided into
+        # shards, and each shard's records are created by a worker.
+        checkpoint_dir = tempfile.mkdtemp()
+        integration = self._external_integration(
+            ExternalIntegration.MARC_EXPORT, ExternalIntegration.CATALOG_GOAL,
+            libraries=[self._default_library])
+        exporter = MARCExporter(self._db, self._default_library, integration)
+        lane = self._lane()
+        works = [self._work(with_license_pool=True) for i in range(3)]
+
+        class MockPool(object):
+            """Run tasks in this process, the way a worker would."""
+            def __init__(self, script):
+                self.script = script
+
+            def imap_unordered(self, function, tasks):
+                for task in tasks:
+                    yield self.script.process_task(*task)
+
+            def close(self):
+                pass
+
+            def join(self):
+                pass
+
+        class Mock(CacheMARCFiles):
+            work_ids_calls = 0
+            failing_shard = None
+            processed = []
+            uploaded = []
+
+            def work_ids(self, lane, start_time=None):
+                self.work_ids_calls += 1
+                return [work.id for work in works]
+
+            def make_worker_pool(self):
+                return MockPool(self)
+
+            def process_task(self, library_id, integration_id, directory,
+                             index, work_ids):
+                self.processed.append(index)
+                if index == self.failing_shard:
+                    return dict(index=index, records=0, error="Oops")
+                return super(Mock, self).process_task(
+                    library_id, integration_id, directory, index, work_ids
+                )
+
+            def upload_shards(self, lane, library, checkpoint, shard_count,
+                              *args):
+                self.uploaded.append(
+                    [checkpoint.read_shard(i) for i in range(shard_count)]
+                )
+                return "a cached file"
+
+        cmd_args = ["--workers=2", "--shard-size=2",
+                    "--checkpoint-dir=%s" % checkpoint_dir]
+        try:
+            # The first run fails partway through.
+            script = Mock(self._db, cmd_args=cmd_args)
+            script.failing_shard = 1
+            annotator = MARCLibraryAnnotator(self._default_library)
+            assert None == script.export_in_shards(
+                exporter, lane, annotator, object()
+            )
+            assert [0, 1] == script.processed
+            assert [] == script.uploaded
+
+            # The finished shard was saved in a checkpoint.
+            checkpoint = script.checkpoint(lane)
+            assert checkpoint.directory.startswith(checkpoint_dir)
+            assert True == checkpoint.is_finished(0)
+            assert False == checkpoint.is_finished(1)
+
+            # The next run picks up where the first one left off.
+            script = Mock(self._db, cmd_args=cmd_args)
+            script.processed = []
+            assert "a cached file" == script.export_in_shards(
+                exporter, lane, annotator, object()
+            )
+            assert [1] == script.processed
+            assert 0 == script.work_ids_calls
+
+            # The file was uploaded from both shards, and contains a
+            # record for every work.
+            [shards] = script.uploaded
+            assert 2 == len(shards)
+            records = list(MARCReader("".join(shards)))
+            assert 3 == len(records)
+
+            # Once the file was uploaded, the checkpoint was removed.
+            assert None == checkpoint.load()
+            assert False == os.path.exists(checkpoint.directory)
+        finally:
+            shutil.rmtree(checkpoint_dir)
+
+    def test_upload_shards(self):
+        checkpoint_dir = tempfile.mkdtemp()
+        lane = self._lane()
+
+        class MockUpload(object):
+            def __init__(self):
+                self.parts = []
+
+            def upload_part(self, content):
+                self.parts.append(content)
+
+        class MockMirror(object):
+            upload = MockUpload()
+
+            def marc_file_url(self, library, lane, end_time, start_time=None):
+                return "http://marc/%s" % lane.id
+
+            @contextlib.contextmanager
+            def multipart_upload(self, representation, url):
+                yield self.upload
+
+        try:
+            checkpoint = MARCFileCheckpoint(
+                os.path.join(checkpoint_dir, "lane")
+            )
+            end_time = datetime.datetime.utcnow()
+            checkpoint.start([[1], [2], [3]], end_time)
+            for index, content in enumerate(["aaa", "bb", "c"]):
+                checkpoint.save_shard(index, content)
+
+            # Shards are combined until they're big enough to be a
+            # part of a multipart upload.
+            script = CacheMARCFiles(self._db, cmd_args=[])
+            script.MINIMUM_UPLOAD_PART_SIZE = 4
+            mirror = MockMirror()
+            start_time = end_time - datetime.timedelta(days=1)
+            cached = script.upload_shards(
+                lane, self._default_library, checkpoint, 3, None,
+                start_time, end_time, mirror=mirror
+            )
+            assert ["aaabb", "c"] == mirror.upload.parts
+
+            # A CachedMARCFile was created for the upload.
+            assert lane == cached.lane
+            assert self._default_library == cached.library
+            assert start_time == cached.start_time
+            assert end_time == cached.end_time
+            assert "http://marc/%s" % lane.id == cached.representation.url
+            assert end_time == cached.representation.fetched_at
+        finally:
+            shutil.rmtree(checkpoint_dir)
+
+    def test_export_in_shards_with_no_works(self):
+        # An empty lane, or a delta when nothing has changed, still
+        # gets a MARC file, uploaded as a single empty part.
+        checkpoint_dir = tempfile.mkdtemp()
+        integration = self._external_integration(
+            ExternalIntegration.MARC_EXPORT, ExternalIntegration.CATALOG_GOAL,
+            libraries=[self._default_library])
+        exporter = MARCExporter(self._db, self._default_library, integration)
+        annotator = MARCLibraryAnnotator(self._default_library)
+        lane = self._lane()
+
+        class MockUpload(object):
+            def __init__(self):
+                self.parts = []
+
+            def upload_part(self, content):
+                self.parts.append(content)
+
+        class MockMirror(object):
+            def __init__(self):
+                self.upload = MockUpload()
+
+            def marc_file_url(self, library, lane, end_time, start_time=None):
+                return "http://marc/%s/%s" % (lane.id, start_time)
+
+            @contextlib.contextmanager
+            def multipart_upload(self, representation, url):
+                yield self.upload
+
+        class Mock(CacheMARCFiles):
+            def work_ids(self, lane, start_time=None):
+                return []
+
+            def make_worker_pool(self):
+                raise Exception("There's nothing for the workers to do.")
+
+            def upload_shards(self, *args, **kwargs):
+                self.mirror = MockMirror()
+                kwargs['mirror'] = self.mirror
+                return super(Mock, self).upload_shards(*args, **kwargs)
+
+        cmd_args = ["--workers=2", "--checkpoint-dir=%s" % checkpoint_dir]
+        try:
+            start_time = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+            for delta_start in (None, start_time):
+                script = Mock(self._db, cmd_args=cmd_args)
+                cached = script.export_in_shards(
+                    exporter, lane, annotator, object(), start_time=delta_start
+                )
+                assert [""] == script.mirror.upload.parts
+                assert lane == cached.lane
+                assert delta_start == cached.start_time
+
+                # The checkpoint was removed, so the next run starts over.
+                checkpoint = script.checkpoint(lane, delta_start)
+                assert None == checkpoint.load()
+        finally:
+            shutil.rmtree(checkpoint_dir)
+
+
+class TestDashboardStatisticsSnapshotScript(DatabaseTest):
+
+    def test_do_run(self):
+        class MockStatistics(object):
+            refreshed = dropped = False
+            def refresh_snapshot(self):
+                self.refreshed = True
+            def drop_snapshot(self):
+                self.dropped = True
+
+        script = DashboardStatisticsSnapshotScript(self._db)
+        statistics = MockStatistics()
+        script.do_run(cmd_args=[], statistics=statistics)
+        assert True == statistics.refreshed
+        assert False == statistics.dropped
+
+        statistics = MockStatistics()
+        script.do_run(cmd_args=["--drop"], statistics=statistics)
+        assert False == statistics.refreshed
+        assert True == statistics.dropped
 
 
 class TestInstanceInitializationScript(DatabaseTest):
@@ -1405,6 +1742,67 @@ class TestDirectoryImportScript(DatabaseTest):
         assert_not_found('thefile', 'directory', ['.another-extension'])
         assert_not_found('thefile', 'directory', [])
 
+class TestLCPBatchMirrorScript(DatabaseTest):
+
+    def test_mirror_collection(self):
+        collection = self._collection(protocol=ExternalIntegration.LCP)
+        other_collection = self._collection(name="Not LCP")
+
+        def book(content, collection=collection):
+            edition, pool = self._edition(
+                with_license_pool=True, collection=collection
+            )
+            link, ignore = pool.identifier.add_link(
+                Hyperlink.GENERIC_OPDS_ACQUISITION, self._url,
+                pool.data_source, Representation.EPUB_MEDIA_TYPE,
+                content=content
+            )
+            return link.resource.representation, pool.identifier
+
+        failing, failing_identifier = book("bad book")
+        good, good_identifier = book("good book")
+        already_mirrored, ignore = book(None)
+        book("another collection's book", other_collection)
+
+        class Result(object):
+            def __init__(self, succeeded):
+                self.succeeded = succeeded
+
+        class MockMirror(object):
+            batches = []
+
+            def book_url(self, identifier):
+                return "http://mirror/%s" % identifier.identifier
+
+            def mirror_batch(self, representations, mirror_urls, collection):
+                self.batches.append((representations, mirror_urls))
+                results = []
+                for representation in representations:
+                    # The bad book keeps its unencrypted content.
+                    if representation == good:
+                        representation.content = None
+                    results.append(Result(representation == good))
+                return results
+
+        script = LCPBatchMirrorScript(self._db)
+        assert [collection] == script.collections()
+        assert [] == script.collections(["Not LCP"])
+
+        # Books are mirrored a batch at a time. The book that failed
+        # isn't tried again in the same run.
+        mirror = MockMirror()
+        assert (1, 1) == script.mirror_collection(collection, mirror, 1)
+        assert [
+            ([failing], ["http://mirror/%s" % failing_identifier.identifier]),
+            ([good], ["http://mirror/%s" % good_identifier.identifier]),
+        ] == mirror.batches
+
+        # The next run tries the book that failed again.
+        mirror.batches = []
+        assert (0, 1) == script.mirror_collection(collection, mirror, 10)
+        assert [failing] == mirror.batches[0][0]
+
+
 class TestNovelistSnapshotScript(DatabaseTest):
 
     def mockNoveListAPI(self, *args, **kwargs):
@@ -1431,14 +1829,93 @@ class TestNovelistSnapshotScript(DatabaseTest):
 
         NoveListAPI.from_config = oldNovelistConfig
 
+    def test_do_run_in_batches(self):
+        class MockAPI(object):
+            fail = False
+            def __init__(self):
+                self.called_with = {}
+            def put_items_novelist_in_batches(self, library, since, batch_size):
+                self.called_with[library] = (since, batch_size)
+                if self.fail:
+                    raise Exception("NoveList is down")
+                return ["response1", "response2"]
+
+        api = MockAPI()
+        configured = set()
+        def from_config(cls, library):
+            if library not in configured:
+                raise CannotLoadConfiguration("Not configured")
+            return api
+
+        oldNovelistConfig = NoveListAPI.from_config
+        NoveListAPI.from_config = classmethod(from_config)
+
+        try:
+            l1 = self._library()
+            l2 = self._library()
+            configured.add(l1)
+            script = NovelistSnapshotScript(self._db)
+            output = StringIO()
+            def run(*libraries, **kwargs):
+                api.called_with = {}
+                cmd_args = [l.name for l in libraries] + ["--batch-size=100"]
+                if kwargs.get("full"):
+                    cmd_args.append("--full")
+                script.do_run(output=output, cmd_args=cmd_args)
+
+            # l1 has never been uploaded, so everything is sent. l2
+            # isn't configured yet, so it's skipped.
+            run(l1, l2)
+            assert {l1: (None, 100)} == api.called_with
+            assert "Sent %s to NoveList in 2 batches\n" % l1.name == output.getvalue()
+            l1_upload = script.last_successful_upload(l1)
+            assert l1_upload is not None
+            assert None == script.last_successful_upload(l2)
+
+            # Once l2 is configured, its whole collection is sent,
+            # even though the script has run since. l1 only gets the
+            # books that changed since its last upload.
+            configured.add(l2)
+            run(l1, l2)
+            assert {l1: (l1_upload, 100), l2: (None, 100)} == api.called_with
+            assert script.last_successful_upload(l1) > l1_upload
+            l1_upload = script.last_successful_upload(l1)
+            l2_upload = script.last_successful_upload(l2)
+
+            # A library that was left out of a run is sent everything
+            # that changed since its own last upload.
+            run(l1)
+            run(l2)
+            assert {l2: (l2_upload, 100)} == api.called_with
+
+            # --full sends everything.
+            run(l1, full=True)
+            assert {l1: (None, 100)} == api.called_with
+            l1_upload = script.last_successful_upload(l1)
+
+            # A failure is raised once every library has been
+            # processed, so this run won't count as successful, and
+            # the failed library's timestamp isn't updated.
+            api.fail = True
+            with pytest.raises(Exception) as excinfo:
+                run(l1)
+            assert "Could not send to NoveList: %s" % l1.name in str(excinfo.value)
+            assert l1_upload == script.last_successful_upload(l1)
+
+            api.fail = False
+            run(l1)
+            assert {l1: (l1_upload, 100)} == api.called_with
+        finally:
+            NoveListAPI.from_config = oldNovelistConfig
+
 class TestLocalAnalyticsExportScript(DatabaseTest):
 
     def test_do_run(self):
 
         class MockLocalAnalyticsExporter(object):
-            def export(self, _db, start, end):
+            def export_iter(self, _db, start, end):
                 self.called_with = [start, end]
-                return "test"
+                return ["te", "st"]
 
         output = StringIO()
         cmd_args = ['--start=20190820', '--end=20190827']
@@ -1449,3 +1926,17 @@ class TestLocalAnalyticsExportScript(DatabaseTest):
             exporter=exporter)
         assert "test" == output.getvalue()
         assert ['20190820', '20190827'] == exporter.called_with
+
+        # The output can be written to a file instead.
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "export.csv")
+            output = StringIO()
+            script.do_run(
+                output=output, cmd_args=cmd_args + ["--output=%s" % path],
+                exporter=exporter
+            )
+            assert "" == output.getvalue()
+            assert "test" == open(path).read()
+        finally:
+            shutil.rmtree(directory)